@@ -0,0 +1,189 @@
+"""Benchmark rendering the streaming output with api calls of the agent and excel chats.
+
+Compare the old implementation, which counts the tags, extracts and parses all api
+calls and replaces them in the whole text on every stream chunk, with the incremental
+scanner of `ApiCall`.
+
+Run:
+
+.. code-block:: shell
+
+    python benchmarks/api_call_benchmark.py
+    python benchmarks/api_call_benchmark.py --lengths 2000 20000 --calls 10 --chunk 8
+"""
+import argparse
+import json
+import time
+import xml.etree.ElementTree as ET
+from datetime import datetime
+from typing import Dict, List
+
+from pilot.base_modules.agent.commands.command_mange import ApiCall, PluginStatus
+from pilot.base_modules.agent.common.schema import Status
+from pilot.common.string_utils import extract_content, extract_content_open_ending
+
+_FILLER = "The total sales of the region grew quickly in the last quarter, 销售额持续增长。"
+
+
+class _DisplayRegistry:
+    def is_valid_command(self, name):
+        return True
+
+    def call(self, name, df):
+        return f"<chart-view content={json.dumps(df)} />"
+
+
+class _LegacyApiCall(ApiCall):
+    """The implementation before the incremental scanner"""
+
+    def _legacy_is_need_wait_plugin_call(self, api_call_context):
+        start_agent_count = api_call_context.count(self.agent_prefix)
+        if start_agent_count > 0:
+            return True
+        check_len = len(self.agent_prefix)
+        last_text = api_call_context[-check_len:]
+        for i in range(check_len):
+            if last_text[-i:] == self.agent_prefix[:i]:
+                return True
+        return False
+
+    def _legacy_check_last_plugin_call_ready(self, all_context):
+        start_agent_count = all_context.count(self.agent_prefix)
+        end_agent_count = all_context.count(self.agent_end)
+        return start_agent_count > 0 and start_agent_count == end_agent_count
+
+    def _legacy_deal_error_md_tags(self, all_context, api_context, include_end=True):
+        error_md_tags = ["```", "```python", "```xml", "```json", "```markdown"]
+        md_tag_end = "```" if include_end else ""
+        for tag in error_md_tags:
+            all_context = all_context.replace(
+                tag + api_context + md_tag_end, api_context
+            )
+            all_context = all_context.replace(
+                tag + "\n" + api_context + "\n" + md_tag_end, api_context
+            )
+            all_context = all_context.replace(
+                tag + " " + api_context + " " + md_tag_end, api_context
+            )
+            all_context = all_context.replace(tag + api_context, api_context)
+        return all_context
+
+    def api_view_context(self, all_context: str, display_mode: bool = False):
+        error_mk_tags = ["```", "```python", "```xml"]
+        call_context_map = extract_content_open_ending(
+            all_context, self.agent_prefix, self.agent_end, True
+        )
+        for api_index, api_context in call_context_map.items():
+            api_status = self.plugin_status_map.get(api_context)
+            if api_status is not None:
+                if display_mode:
+                    all_context = self._legacy_deal_error_md_tags(
+                        all_context, api_context
+                    )
+                    if api_status.api_result:
+                        view = api_status.api_result
+                    elif api_status.status == Status.FAILED.value:
+                        view = f"""\n<span style=\"color:red\">ERROR!</span>{api_status.err_msg}\n """
+                    else:
+                        view = self._waiting_view(api_status.end_time)
+                    all_context = all_context.replace(api_context, view)
+                else:
+                    all_context = self._legacy_deal_error_md_tags(
+                        all_context, api_context, False
+                    )
+                    all_context = all_context.replace(
+                        api_context, self.to_view_text(api_status)
+                    )
+            else:
+                for tag in error_mk_tags:
+                    all_context = all_context.replace(tag + api_context, api_context)
+                all_context = all_context.replace(api_context, self._waiting_view())
+        return all_context
+
+    def update_from_context(self, all_context):
+        api_context_map = extract_content(
+            all_context, self.agent_prefix, self.agent_end, True
+        )
+        for api_index, api_context in api_context_map.items():
+            api_context = api_context.replace("\\n", "").replace("\n", "")
+            api_call_element = ET.fromstring(api_context)
+            api_name = api_call_element.find("name").text
+            api_args = {}
+            for child_element in api_call_element.find("args").iter():
+                api_args[child_element.tag] = child_element.text
+            api_status = self.plugin_status_map.get(api_context)
+            if api_status is None:
+                self.plugin_status_map[api_context] = PluginStatus(
+                    name=api_name, location=[api_index], args=api_args
+                )
+            else:
+                api_status.location.append(api_index)
+
+    def run_display_sql(self, llm_text, sql_run_func):
+        if self._legacy_is_need_wait_plugin_call(llm_text):
+            if self._legacy_check_last_plugin_call_ready(llm_text):
+                self.update_from_context(llm_text)
+                for value in self.plugin_status_map.values():
+                    if value.status == Status.TODO.value:
+                        value.api_result = self._display_sql(value, sql_run_func)
+                        value.status = Status.COMPLETED.value
+                        value.end_time = datetime.now().timestamp() * 1000
+        return self.api_view_context(llm_text, True)
+
+
+def _llm_output(length: int, num_calls: int) -> str:
+    segment = max(length // (num_calls + 1), 1)
+    filler = (_FILLER * (segment // len(_FILLER) + 1))[:segment]
+    parts = [filler]
+    for i in range(num_calls):
+        call = f"<api-call><name>response_table</name><args><sql>SELECT * FROM sales WHERE id = {i}</sql></args></api-call>"
+        # The LLM sometimes writes the api call in a markdown code block
+        parts.append(f"```xml\n{call}\n```" if i % 2 else call)
+        parts.append(filler)
+    return "".join(parts)
+
+
+def _stream(api_call: ApiCall, text: str, chunk: int) -> str:
+    view = ""
+    for end in range(chunk, len(text) + chunk, chunk):
+        view = api_call.run_display_sql(text[:end], lambda sql: sql)
+    return view
+
+
+def run_benchmark(
+    lengths: List[int], num_calls: int, chunk: int, repeat: int
+) -> List[Dict]:
+    results = []
+    for length in lengths:
+        text = _llm_output(length, num_calls)
+        row = {"output_chars": len(text), "api_calls": num_calls, "chunk": chunk}
+        outputs = {}
+        for name, cls in [("legacy", _LegacyApiCall), ("incremental", ApiCall)]:
+            costs = []
+            for _ in range(repeat):
+                api_call = cls(display_registry=_DisplayRegistry())
+                start = time.perf_counter()
+                outputs[name] = _stream(api_call, text, chunk)
+                costs.append(time.perf_counter() - start)
+            row[f"{name}_ms"] = round(min(costs) * 1000, 2)
+        row["same_output"] = outputs["legacy"] == outputs["incremental"]
+        row["speedup"] = round(row["legacy_ms"] / row["incremental_ms"], 2)
+        results.append(row)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--lengths", type=int, nargs="+", default=[2000, 8000, 32000])
+    parser.add_argument("--calls", type=int, default=6)
+    parser.add_argument(
+        "--chunk", type=int, default=4, help="Characters of every stream chunk"
+    )
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+    results = run_benchmark(args.lengths, args.calls, args.chunk, args.repeat)
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
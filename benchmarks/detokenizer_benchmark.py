@@ -0,0 +1,134 @@
+"""Benchmark the per-token cost of the streaming detokenization.
+
+Compare decoding the whole output and searching stop strings with `rfind` on every
+stream step (the old implementation) with `IncrementalDetokenizer` and
+`StopStringMatcher`.
+
+Run:
+
+.. code-block:: shell
+
+    python benchmarks/detokenizer_benchmark.py
+    python benchmarks/detokenizer_benchmark.py --tokenizer /app/models/vicuna-13b-v1.5
+"""
+import argparse
+import json
+import time
+from typing import Dict, List
+
+from pilot.model.detokenizer import IncrementalDetokenizer, StopStringMatcher
+from pilot.model.llm_utils import is_partial_stop
+
+_CORPUS = [
+    "SELECT name, age, count(*) AS total FROM users WHERE age > 18 GROUP BY name ORDER BY total DESC;",
+    "你好，世界！这是一个关于数据库的测试。",
+    "The quick brown fox jumps over the lazy dog, then writes a dashboard report.",
+]
+_DECODE_KWARGS = {
+    "skip_special_tokens": True,
+    "spaces_between_special_tokens": False,
+}
+_STOP_STR = "###"
+
+
+def _build_local_tokenizer():
+    from tokenizers import Tokenizer, decoders, models, pre_tokenizers, trainers
+    from transformers import PreTrainedTokenizerFast
+
+    tokenizer = Tokenizer(models.BPE())
+    tokenizer.pre_tokenizer = pre_tokenizers.Metaspace()
+    tokenizer.decoder = decoders.Metaspace()
+    tokenizer.train_from_iterator(
+        _CORPUS * 10, trainers.BpeTrainer(vocab_size=500, special_tokens=["</s>"])
+    )
+    return PreTrainedTokenizerFast(tokenizer_object=tokenizer, eos_token="</s>")
+
+
+def _full_decode(tokenizer, prompt_ids, gen_ids, stream_interval) -> str:
+    output_ids = list(prompt_ids)
+    output = ""
+    for i, token in enumerate(gen_ids):
+        output_ids.append(token)
+        if i % stream_interval == 0 or i == len(gen_ids) - 1:
+            output = tokenizer.decode(output_ids[len(prompt_ids) :], **_DECODE_KWARGS)
+            pos = output.rfind(_STOP_STR, 0)
+            if pos != -1:
+                output = output[:pos]
+                break
+            is_partial_stop(output, _STOP_STR)
+    return output
+
+
+def _incremental_decode(tokenizer, prompt_ids, gen_ids, stream_interval) -> str:
+    detokenizer = IncrementalDetokenizer(
+        tokenizer, prompt_ids, use_prompt_context=False, **_DECODE_KWARGS
+    )
+    stop_matcher = StopStringMatcher(_STOP_STR)
+    output_ids = list(prompt_ids)
+    output = ""
+    for i, token in enumerate(gen_ids):
+        output_ids.append(token)
+        final = i == len(gen_ids) - 1
+        if i % stream_interval == 0 or final:
+            detokenizer.step(output_ids, final=final)
+            output = detokenizer.text
+            pos, _ = stop_matcher.check(output)
+            if pos != -1:
+                output = output[:pos]
+                break
+    return output
+
+
+def run_benchmark(
+    tokenizer, lengths: List[int], stream_interval: int, repeat: int
+) -> List[Dict]:
+    prompt_ids = tokenizer(" ".join(_CORPUS)).input_ids
+    text_ids = tokenizer(" ".join(_CORPUS * 200)).input_ids
+    results = []
+    for length in lengths:
+        gen_ids = (text_ids * (length // len(text_ids) + 1))[:length]
+        row = {"output_tokens": length, "stream_interval": stream_interval}
+        outputs = {}
+        for name, func in [
+            ("full_decode", _full_decode),
+            ("incremental", _incremental_decode),
+        ]:
+            costs = []
+            for _ in range(repeat):
+                start = time.perf_counter()
+                outputs[name] = func(tokenizer, prompt_ids, gen_ids, stream_interval)
+                costs.append(time.perf_counter() - start)
+            row[f"{name}_us_per_token"] = round(min(costs) / length * 1e6, 2)
+        row["same_output"] = outputs["full_decode"] == outputs["incremental"]
+        row["speedup"] = round(
+            row["full_decode_us_per_token"] / row["incremental_us_per_token"], 2
+        )
+        results.append(row)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument(
+        "--tokenizer",
+        type=str,
+        default=None,
+        help="Huggingface tokenizer name or path, use a small local tokenizer if not set",
+    )
+    parser.add_argument("--lengths", type=int, nargs="+", default=[256, 1024, 4096])
+    parser.add_argument("--stream_interval", type=int, default=2)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    if args.tokenizer:
+        from transformers import AutoTokenizer
+
+        tokenizer = AutoTokenizer.from_pretrained(args.tokenizer)
+    else:
+        tokenizer = _build_local_tokenizer()
+    results = run_benchmark(tokenizer, args.lengths, args.stream_interval, args.repeat)
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,493 @@
+"""Benchmark the model-serving path with a deterministic fake model.
+
+A fake `ModelWorker` streams a fixed text at a configured token rate, so the numbers
+only depend on the serving code. The same requests are sent to every layer of the
+serving path, each layer wraps the previous one:
+
+- worker: `ModelWorker.generate_stream` in the thread pool
+- manager: `LocalWorkerManager.generate_stream`
+- chat: `BaseChat.stream_call` of the normal chat
+- sse: `/api/v1/chat/completions` of the webserver over localhost
+- remote (with `--remote`): `RemoteWorkerManager` -> model controller and worker
+  manager api over localhost
+
+For every layer and number of concurrent clients, the time to first token, the
+inter-token latency (between the outputs the client receives, the chat and sse
+layers coalesce the outputs), the end-to-end latency, the throughput and the cpu
+time per request are reported. `overhead_ms` is the extra latency to the worker
+layer at the same concurrency. The servers run in the event loop of the clients.
+
+Run:
+
+.. code-block:: shell
+
+    python benchmarks/serving_benchmark.py
+    python benchmarks/serving_benchmark.py --concurrency 1 16 64 --tokens 256 --rate 50 --remote --output serving.json
+"""
+import argparse
+import asyncio
+import contextlib
+import json
+import logging
+import socket
+import sys
+import time
+import uuid
+import warnings
+from dataclasses import dataclass, field
+from typing import AsyncIterator, Callable, Dict, Iterator, List, Optional
+
+import httpx
+import uvicorn
+from fastapi import FastAPI
+from starlette.concurrency import iterate_in_threadpool
+
+from pilot.component import SystemApp
+from pilot.configs.config import Config
+from pilot.model.base import ModelInstance, ModelOutput
+from pilot.model.cluster.worker_base import ModelWorker
+from pilot.model.parameter import ModelParameters, ModelWorkerParameters, WorkerType
+
+CFG = Config()
+
+_MODEL_NAME = "fake-model"
+_VOCAB = [
+    "SELECT ",
+    "name",
+    ", ",
+    "count(*) ",
+    "AS ",
+    "total ",
+    "FROM ",
+    "users ",
+    "GROUP ",
+    "BY ",
+    "name",
+    "; ",
+    "数据",
+    "库 ",
+]
+
+
+def fake_tokens(num_tokens: int) -> List[str]:
+    return [_VOCAB[i % len(_VOCAB)] for i in range(num_tokens)]
+
+
+class FakeModelWorker(ModelWorker):
+    """Stream `num_tokens` tokens at `tokens_per_second` (as fast as possible if 0)
+    after `first_token_latency` seconds, like a local model in a thread."""
+
+    def __init__(
+        self,
+        num_tokens: int,
+        tokens_per_second: float,
+        first_token_latency: float = 0,
+    ) -> None:
+        self.tokens = fake_tokens(num_tokens)
+        self.tokens_per_second = tokens_per_second
+        self.first_token_latency = first_token_latency
+        self.model_name = _MODEL_NAME
+
+    def parse_parameters(self, command_args: List[str] = None) -> ModelParameters:
+        return ModelParameters(model_name=self.model_name, model_path=self.model_name)
+
+    def load_worker(self, model_name: str, model_path: str, **kwargs) -> None:
+        self.model_name = model_name
+
+    def start(
+        self, model_params: ModelParameters = None, command_args: List[str] = None
+    ) -> None:
+        pass
+
+    def stop(self) -> None:
+        pass
+
+    def generate_stream(self, params: Dict) -> Iterator[ModelOutput]:
+        start = time.perf_counter() + self.first_token_latency
+        text = ""
+        for i, token in enumerate(self.tokens):
+            if self.tokens_per_second > 0:
+                # Pace by the schedule, the sleep errors are not accumulated
+                delay = start + i / self.tokens_per_second - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+            elif i == 0 and self.first_token_latency > 0:
+                time.sleep(self.first_token_latency)
+            text += token
+            yield ModelOutput(
+                text=text,
+                error_code=0,
+                model_context={"prompt_echo_len_char": -1, "echo": False},
+            )
+
+    def generate(self, params: Dict) -> ModelOutput:
+        output = None
+        for output in self.generate_stream(params):
+            pass
+        return output
+
+    def embeddings(self, params: Dict) -> List[List[float]]:
+        raise NotImplementedError
+
+
+@dataclass
+class _Timing:
+    start: float
+    output_times: List[float] = field(default_factory=list)
+    text: str = ""
+    error: Optional[str] = None
+
+    @property
+    def ttft(self) -> float:
+        return self.output_times[0] - self.start
+
+    @property
+    def e2e(self) -> float:
+        return self.output_times[-1] - self.start
+
+    @property
+    def itls(self) -> List[float]:
+        return [b - a for a, b in zip(self.output_times, self.output_times[1:])]
+
+
+def _summary(values: List[float]) -> Dict[str, float]:
+    if not values:
+        return {}
+    values = sorted(values)
+
+    def _percentile(p: float) -> float:
+        return values[min(len(values) - 1, int(p / 100 * len(values)))]
+
+    return {
+        "mean": round(sum(values) / len(values) * 1000, 3),
+        "p50": round(_percentile(50) * 1000, 3),
+        "p95": round(_percentile(95) * 1000, 3),
+        "p99": round(_percentile(99) * 1000, 3),
+    }
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+class _Server:
+    """Uvicorn server running in the current event loop"""
+
+    def __init__(self, app: FastAPI) -> None:
+        self.port = _free_port()
+        self.url = f"http://127.0.0.1:{self.port}"
+        self._server = uvicorn.Server(
+            uvicorn.Config(app, host="127.0.0.1", port=self.port, log_level="error")
+        )
+        self._task: Optional[asyncio.Task] = None
+
+    async def start(self):
+        self._task = asyncio.create_task(self._server.serve())
+        while not self._server.started:
+            if self._task.done():
+                self._task.result()
+            await asyncio.sleep(0.01)
+
+    async def stop(self):
+        self._server.should_exit = True
+        await self._task
+
+
+class _ServingStack:
+    def __init__(self, args: argparse.Namespace) -> None:
+        self.args = args
+        self.expected_text = "".join(fake_tokens(args.tokens))
+        self.worker = FakeModelWorker(
+            args.tokens, args.rate, first_token_latency=args.first_token_latency
+        )
+        self.manager = None
+        self.remote_manager = None
+        self._servers: List[_Server] = []
+        self._sse_url = None
+        self._client: Optional[httpx.AsyncClient] = None
+
+    def _params(self) -> Dict:
+        return {"model": _MODEL_NAME, "prompt": "Who are you?", "messages": []}
+
+    async def start(self):
+        from pilot.model.cluster.worker.manager import (
+            LocalWorkerManager,
+            _DefaultWorkerManagerFactory,
+        )
+
+        self.manager = LocalWorkerManager()
+        self.manager.add_worker(
+            self.worker,
+            ModelWorkerParameters(
+                model_name=_MODEL_NAME,
+                model_path=_MODEL_NAME,
+                worker_type=WorkerType.LLM.value,
+                limit_model_concurrency=self.args.limit_model_concurrency,
+            ),
+            command_args=[""],
+        )
+        await self.manager.start()
+
+        system_app = SystemApp()
+        system_app.register_instance(
+            _DefaultWorkerManagerFactory(system_app, worker_manager=self.manager)
+        )
+        CFG.SYSTEM_APP = system_app
+        CFG.NEW_SERVER_MODE = True
+        CFG.LLM_MODEL = _MODEL_NAME
+        CFG.CHAT_HISTORY_STORE_TYPE = "memory"
+
+        self._client = httpx.AsyncClient(
+            timeout=None,
+            limits=httpx.Limits(max_connections=max(self.args.concurrency) * 2),
+        )
+        if "sse" in self.args.layers:
+            from pilot.openapi.api_v1.api_v1 import router as api_v1
+
+            app = FastAPI()
+            app.include_router(api_v1, prefix="/api")
+            server = _Server(app)
+            await server.start()
+            self._servers.append(server)
+            self._sse_url = f"{server.url}/api/v1/chat/completions"
+        if self.args.remote:
+            await self._start_remote()
+
+    async def _start_remote(self):
+        from pilot.model.cluster.controller.controller import (
+            ModelRegistryClient,
+            initialize_controller,
+        )
+        from pilot.model.cluster.worker import manager as manager_module
+        from pilot.model.cluster.worker.remote_manager import RemoteWorkerManager
+
+        app = FastAPI()
+        initialize_controller(app=app)
+        manager_module.worker_manager.worker_manager = self.manager
+        app.include_router(manager_module.router, prefix="/api")
+        server = _Server(app)
+        await server.start()
+        self._servers.append(server)
+
+        registry = ModelRegistryClient(server.url)
+        await registry.register_instance(
+            ModelInstance(
+                model_name=f"{_MODEL_NAME}@{WorkerType.LLM.value}",
+                host="127.0.0.1",
+                port=server.port,
+            )
+        )
+        self.remote_manager = RemoteWorkerManager(model_registry=registry)
+        await self.remote_manager.start()
+
+    async def stop(self):
+        await self._client.aclose()
+        for server in self._servers:
+            await server.stop()
+        await self.manager.stop()
+
+    async def worker_stream(self) -> AsyncIterator[str]:
+        async for output in iterate_in_threadpool(
+            self.worker.generate_stream(self._params())
+        ):
+            yield output.text
+
+    async def manager_stream(self) -> AsyncIterator[str]:
+        async for output in self.manager.generate_stream(self._params()):
+            yield output.text
+
+    async def remote_stream(self) -> AsyncIterator[str]:
+        async for output in self.remote_manager.generate_stream(self._params()):
+            yield output.text
+
+    async def chat_stream(self) -> AsyncIterator[str]:
+        from pilot.scene.chat_normal.chat import ChatNormal
+
+        chat = ChatNormal(
+            chat_param={
+                "chat_session_id": str(uuid.uuid1()),
+                "current_user_input": "Who are you?",
+                "select_param": None,
+                "model_name": _MODEL_NAME,
+            }
+        )
+        async for msg in chat.stream_call():
+            yield msg
+
+    async def sse_stream(self) -> AsyncIterator[str]:
+        dialogue = {
+            "conv_uid": str(uuid.uuid1()),
+            "user_input": "Who are you?",
+            "chat_mode": "chat_normal",
+            "model_name": _MODEL_NAME,
+            "incremental": True,
+        }
+        text = ""
+        async with self._client.stream("POST", self._sse_url, json=dialogue) as res:
+            async for line in res.aiter_lines():
+                if not line.startswith("data: "):
+                    continue
+                data = line[len("data: ") :]
+                if data == "[DONE]":
+                    break
+                delta = json.loads(data)["choices"][0]["delta"].get("content")
+                if delta:
+                    text += delta
+                    yield text
+
+
+async def _timed_request(stream_func: Callable[[], AsyncIterator[str]]) -> _Timing:
+    timing = _Timing(start=time.perf_counter())
+    try:
+        async for text in stream_func():
+            timing.output_times.append(time.perf_counter())
+            timing.text = text
+    except Exception as e:
+        timing.error = str(e)
+    return timing
+
+
+async def _run_layer(
+    stack: _ServingStack, layer: str, concurrency: int, requests_per_client: int
+) -> Dict:
+    stream_func = getattr(stack, f"{layer}_stream")
+    # Warm up the imports, connections and caches of the layer
+    await _timed_request(stream_func)
+
+    async def _client() -> List[_Timing]:
+        return [await _timed_request(stream_func) for _ in range(requests_per_client)]
+
+    cpu_start = time.process_time()
+    start = time.perf_counter()
+    results = await asyncio.gather(*[_client() for _ in range(concurrency)])
+    wall_time = time.perf_counter() - start
+    cpu_time = time.process_time() - cpu_start
+
+    timings = [t for client_timings in results for t in client_timings]
+    completed = [t for t in timings if not t.error and t.output_times]
+    expected_text = stack.expected_text.strip()
+    errors = [t.error for t in timings if t.error]
+    return {
+        "layer": layer,
+        "concurrency": concurrency,
+        "requests": len(timings),
+        "errors": len(timings) - len(completed),
+        "correct": bool(completed)
+        and all(t.text.strip() == expected_text for t in completed),
+        "ttft_ms": _summary([t.ttft for t in completed]),
+        "itl_ms": _summary([itl for t in completed for itl in t.itls]),
+        "e2e_ms": _summary([t.e2e for t in completed]),
+        "outputs_per_request": round(
+            sum(len(t.output_times) for t in completed) / max(len(completed), 1), 2
+        ),
+        "throughput_tokens_per_s": round(
+            len(completed) * stack.args.tokens / wall_time, 2
+        ),
+        "cpu_ms_per_request": round(cpu_time / max(len(timings), 1) * 1000, 3),
+        "first_error": errors[0] if errors else None,
+    }
+
+
+def _add_overhead(results: List[Dict]) -> None:
+    baselines = {r["concurrency"]: r for r in results if r["layer"] == "worker"}
+    for row in results:
+        baseline = baselines.get(row["concurrency"])
+        if not baseline or not row["ttft_ms"] or not baseline["ttft_ms"]:
+            continue
+        row["overhead_ms"] = {
+            "ttft": round(row["ttft_ms"]["mean"] - baseline["ttft_ms"]["mean"], 3),
+            "e2e": round(row["e2e_ms"]["mean"] - baseline["e2e_ms"]["mean"], 3),
+        }
+
+
+async def run_benchmark(args: argparse.Namespace) -> Dict:
+    layers = list(args.layers)
+    if args.remote and "remote" not in layers:
+        layers.append("remote")
+    stack = _ServingStack(args)
+    await stack.start()
+    results = []
+    try:
+        for concurrency in args.concurrency:
+            for layer in layers:
+                results.append(
+                    await _run_layer(
+                        stack, layer, concurrency, args.requests_per_client
+                    )
+                )
+    finally:
+        await stack.stop()
+    _add_overhead(results)
+    return {
+        "config": {
+            "tokens": args.tokens,
+            "rate": args.rate,
+            "first_token_latency_ms": args.first_token_latency * 1000,
+            "requests_per_client": args.requests_per_client,
+            "limit_model_concurrency": args.limit_model_concurrency,
+            "sse_flush_interval_ms": CFG.SSE_FLUSH_INTERVAL_MS,
+            "sse_flush_chars": CFG.SSE_FLUSH_CHARS,
+        },
+        "results": results,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 8, 32])
+    parser.add_argument(
+        "--layers",
+        type=str,
+        nargs="+",
+        default=["worker", "manager", "chat", "sse"],
+        choices=["worker", "manager", "chat", "sse", "remote"],
+    )
+    parser.add_argument(
+        "--remote",
+        action="store_true",
+        help="Also benchmark RemoteWorkerManager with a model controller over localhost",
+    )
+    parser.add_argument("--tokens", type=int, default=64, help="Tokens of every output")
+    parser.add_argument(
+        "--rate",
+        type=float,
+        default=100,
+        help="Tokens per second of every request, 0 to stream as fast as possible",
+    )
+    parser.add_argument(
+        "--first_token_latency",
+        type=float,
+        default=0.02,
+        help="Seconds before the first token, like the prefill of a real model",
+    )
+    parser.add_argument("--requests_per_client", type=int, default=2)
+    parser.add_argument(
+        "--limit_model_concurrency",
+        type=int,
+        default=None,
+        help="Concurrency of the fake worker, the max concurrency if not set",
+    )
+    parser.add_argument(
+        "--output", type=str, default=None, help="Also write the results to the file"
+    )
+    args = parser.parse_args()
+    if args.limit_model_concurrency is None:
+        args.limit_model_concurrency = max(args.concurrency)
+    # The logs of every request are not part of the benchmark
+    logging.disable(logging.INFO)
+    warnings.filterwarnings("ignore")
+
+    # Keep the stdout for the results, the chats print every request
+    with contextlib.redirect_stdout(sys.stderr):
+        report = asyncio.run(run_benchmark(args))
+    report_json = json.dumps(report, indent=2, ensure_ascii=False)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(report_json)
+    print(report_json)
+
+
+if __name__ == "__main__":
+    main()
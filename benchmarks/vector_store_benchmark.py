@@ -0,0 +1,200 @@
+"""Benchmark the recall and latency of the local vector store against Chroma.
+
+The documents are random vectors around a number of clusters, the fake embeddings map
+every text to its vector, so the numbers only depend on the vector stores. For every
+store the documents are loaded in batches of `--batch_size` documents, then the
+queries (perturbed document vectors) are searched. The recall@k is the overlap with
+the exact top k computed by numpy.
+
+- local: `LocalStore`, exact search
+- local_ivf: `LocalStore` with the IVF index
+- local_f16: `LocalStore` with float16 vectors, exact search
+- chroma: `ChromaStore`, skipped if chromadb is not installed
+
+Run:
+
+.. code-block:: shell
+
+    python benchmarks/vector_store_benchmark.py
+    python benchmarks/vector_store_benchmark.py --docs 200000 --dim 768 --stores local local_ivf --output vector_store.json
+"""
+import argparse
+import contextlib
+import json
+import logging
+import sys
+import tempfile
+import time
+import warnings
+from typing import Dict, List
+
+import numpy as np
+from langchain.schema import Document
+
+_STORES = ["local", "local_ivf", "local_f16", "chroma"]
+
+
+class _LookupEmbeddings:
+    """The text "<i>" is embedded to the i-th vector"""
+
+    model_name = "lookup"
+
+    def __init__(self, vectors: np.ndarray) -> None:
+        self.vectors = vectors
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self.vectors[[int(text) for text in texts]].tolist()
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.vectors[int(text)].tolist()
+
+
+def _dataset(args: argparse.Namespace):
+    rng = np.random.default_rng(args.seed)
+    centers = rng.standard_normal((args.clusters, args.dim))
+    docs = centers[rng.integers(0, args.clusters, args.docs)]
+    docs = docs + args.noise * rng.standard_normal((args.docs, args.dim))
+    queries = docs[rng.integers(0, args.docs, args.queries)]
+    queries = queries + args.noise * rng.standard_normal((args.queries, args.dim))
+    return docs.astype(np.float32), queries.astype(np.float32)
+
+
+def _ground_truth(docs: np.ndarray, queries: np.ndarray, k: int) -> List[set]:
+    docs = docs / np.linalg.norm(docs, axis=1, keepdims=True)
+    queries = queries / np.linalg.norm(queries, axis=1, keepdims=True)
+    return [set(np.argsort(-(docs @ query))[:k].tolist()) for query in queries]
+
+
+def _create_store(name: str, path: str, embeddings, args: argparse.Namespace):
+    ctx = {"vector_store_name": f"benchmark_{name}", "embeddings": embeddings}
+    if name == "chroma":
+        from pilot.vector_store.chroma_store import ChromaStore
+
+        ctx["CHROMA_PERSIST_PATH"] = path
+        return ChromaStore(ctx)
+    from pilot.vector_store.local_store import LocalStore
+
+    ctx["LOCAL_VECTOR_STORE_PATH"] = path
+    ctx["LOCAL_VECTOR_STORE_DTYPE"] = "float16" if name == "local_f16" else "float32"
+    ctx["LOCAL_VECTOR_STORE_IVF_THRESHOLD"] = 1 if name == "local_ivf" else 0
+    ctx["LOCAL_VECTOR_STORE_NPROBE"] = args.nprobe
+    return LocalStore(ctx)
+
+
+def _percentile(values: List[float], q: float) -> float:
+    return round(float(np.percentile(values, q)), 3) if values else None
+
+
+def _run_store(
+    name: str,
+    docs: np.ndarray,
+    queries: np.ndarray,
+    truth: List[set],
+    args: argparse.Namespace,
+) -> Dict:
+    all_vectors = np.concatenate([docs, queries])
+    embeddings = _LookupEmbeddings(all_vectors)
+    with tempfile.TemporaryDirectory() as path:
+        try:
+            store = _create_store(name, path, embeddings, args)
+        except ImportError as e:
+            return {"store": name, "skipped": str(e)}
+
+        start = time.perf_counter()
+        batch_ms = []
+        for batch_start in range(0, len(docs), args.batch_size):
+            batch_end = min(batch_start + args.batch_size, len(docs))
+            batch_time = time.perf_counter()
+            store.load_document(
+                [Document(page_content=str(i)) for i in range(batch_start, batch_end)]
+            )
+            batch_ms.append((time.perf_counter() - batch_time) * 1000)
+        load_seconds = time.perf_counter() - start
+
+        index_build_seconds = 0.0
+        if name.startswith("local"):
+            # Build the index in the foreground, not by the background maintenance
+            start = time.perf_counter()
+            store.index.maintain()
+            index_build_seconds = time.perf_counter() - start
+
+        latencies, hits = [], 0
+        for i, expected in enumerate(truth):
+            query_time = time.perf_counter()
+            results = store.similar_search(str(len(docs) + i), args.k)
+            latencies.append((time.perf_counter() - query_time) * 1000)
+            hits += len(expected & {int(doc.page_content) for doc in results})
+        if name.startswith("local"):
+            store.index.close()
+    return {
+        "store": name,
+        "load_docs_per_second": round(len(docs) / load_seconds, 1),
+        "load_batch_ms": {
+            "p50": _percentile(batch_ms, 50),
+            "p95": _percentile(batch_ms, 95),
+            "last": round(batch_ms[-1], 3),
+        },
+        "index_build_seconds": round(index_build_seconds, 3),
+        "query_ms": {
+            "mean": round(float(np.mean(latencies)), 3),
+            "p50": _percentile(latencies, 50),
+            "p95": _percentile(latencies, 95),
+        },
+        f"recall@{args.k}": round(hits / (len(truth) * args.k), 4),
+    }
+
+
+def run_benchmark(args: argparse.Namespace) -> Dict:
+    docs, queries = _dataset(args)
+    truth = _ground_truth(docs, queries, args.k)
+    return {
+        "config": {
+            "docs": args.docs,
+            "dim": args.dim,
+            "clusters": args.clusters,
+            "queries": args.queries,
+            "k": args.k,
+            "batch_size": args.batch_size,
+            "nprobe": args.nprobe,
+        },
+        "results": [
+            _run_store(name, docs, queries, truth, args) for name in args.stores
+        ],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument(
+        "--stores", type=str, nargs="+", default=_STORES, choices=_STORES
+    )
+    parser.add_argument("--docs", type=int, default=20000)
+    parser.add_argument("--dim", type=int, default=384)
+    parser.add_argument("--clusters", type=int, default=100)
+    parser.add_argument(
+        "--noise", type=float, default=0.5, help="Distance of the vectors to clusters"
+    )
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--batch_size", type=int, default=1000)
+    parser.add_argument("--nprobe", type=int, default=16)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument(
+        "--output", type=str, default=None, help="Also write the results to the file"
+    )
+    args = parser.parse_args()
+    logging.disable(logging.INFO)
+    warnings.filterwarnings("ignore")
+
+    # Keep the stdout for the results
+    with contextlib.redirect_stdout(sys.stderr):
+        report = run_benchmark(args)
+    report_json = json.dumps(report, indent=2, ensure_ascii=False)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(report_json)
+    print(report_json)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,18 +1,20 @@
+import asyncio
 import functools
 import importlib
 import inspect
+import threading
 import time
 import json
 import logging
 import xml.etree.ElementTree as ET
 
+from concurrent.futures import Executor, Future
 from datetime import datetime
-from typing import Any, Callable, Optional, List
+from typing import Any, AsyncIterator, Callable, Dict, Optional, List, Tuple
 from pydantic import BaseModel
 from pilot.base_modules.agent.common.schema import Status, ApiTagType
 from pilot.base_modules.agent.commands.command import execute_command
 from pilot.base_modules.agent.commands.generator import PluginPromptGenerator
-from pilot.common.string_utils import extract_content_open_ending, extract_content
 
 # Unique identifier for auto-gpt commands
 AUTO_GPT_COMMAND_IDENTIFIER = "auto_gpt_command"
@@ -185,13 +187,78 @@ class PluginStatus(BaseModel):
     end_time: int = None
 
 
+_ERROR_MD_TAGS = ["```", "```python", "```xml", "```json", "```markdown"]
+_WAITING_MD_TAGS = ["```", "```python", "```xml"]
+# Length of the longest closing markdown tag after an api call, "\n```"
+_MD_TAG_END_MAX_LEN = 4
+
+
+def _md_tags_range(
+    text: str,
+    start: int,
+    end: int,
+    floor: int,
+    md_tags: List[str],
+    md_tag_end: Optional[str],
+) -> Tuple[int, int]:
+    """The range of an api call in text with the markdown code tags wrapping it,
+    the LLM sometimes writes the api call in a code block.
+
+    Args:
+        text: The text of the llm output.
+        start: The start of the api call.
+        end: The end of the api call.
+        floor: The tags before it are not checked.
+        md_tags: The opening markdown tags.
+        md_tag_end: The closing markdown tag, only the opening tags are checked if None.
+    """
+
+    def _has_tag(tag: str) -> bool:
+        return start - len(tag) >= floor and text.startswith(tag, start - len(tag))
+
+    for tag in md_tags:
+        if md_tag_end is not None:
+            for sep in ["", "\n", " "]:
+                if _has_tag(tag + sep) and text.startswith(sep + md_tag_end, end):
+                    return start - len(tag + sep), end + len(sep + md_tag_end)
+        if _has_tag(tag):
+            return start - len(tag), end
+    return start, end
+
+
+class _ApiCallSpan:
+    """Position of an api call in the llm output"""
+
+    def __init__(self, start: int):
+        self.start = start
+        # The end of the end tag, None if the api call is not finished
+        self.end: Optional[int] = None
+        self.context: Optional[str] = None
+
+
 class ApiCall:
     agent_prefix = "<api-call>"
     agent_end = "</api-call>"
     name_prefix = "<name>"
     name_end = "</name>"
 
-    def __init__(self, plugin_generator: Any = None, display_registry: Any = None):
+    def __init__(
+        self,
+        plugin_generator: Any = None,
+        display_registry: Any = None,
+        executor: Optional[Executor] = None,
+        max_concurrency: int = 4,
+        timeout: Optional[float] = None,
+    ):
+        """
+        Args:
+            plugin_generator: The plugins which can be called.
+            display_registry: The display commands of sql result.
+            executor: Run the plugin calls without blocking the caller, the calls
+                are run one after another in the caller thread if None.
+            max_concurrency: Max number of the plugin calls running at the same time.
+            timeout: Seconds a plugin call can run, no limit if None.
+        """
         # self.name: str = ""
         # self.status: Status = Status.TODO.value
         # self.logo_url: str = None
@@ -204,136 +271,180 @@ class ApiCall:
         self.plugin_generator = plugin_generator
         self.display_registry = display_registry
         self.start_time = datetime.now().timestamp() * 1000
+        self.executor = executor
+        self.max_concurrency = max(max_concurrency, 1)
+        self.timeout = timeout
+        # api context -> future of the plugin call
+        self._futures: Dict[str, Future] = {}
+        self._call_func: Optional[Callable[[PluginStatus], Any]] = None
+        self._lock = threading.RLock()
+        self._reset_scan()
 
     def __repr__(self):
         return f"ApiCall(name={self.name}, status={self.status}, args={self.args})"
 
-    def __is_need_wait_plugin_call(self, api_call_context):
-        start_agent_count = api_call_context.count(self.agent_prefix)
-        end_agent_count = api_call_context.count(self.agent_end)
-
-        if start_agent_count > 0:
-            return True
-        else:
-            # 末尾新出字符检测
-            check_len = len(self.agent_prefix)
-            last_text = api_call_context[-check_len:]
-            for i in range(check_len):
-                text_tmp = last_text[-i:]
-                prefix_tmp = self.agent_prefix[:i]
-                if text_tmp == prefix_tmp:
-                    return True
-                else:
-                    i += 1
-        return False
-
-    def __check_last_plugin_call_ready(self, all_context):
-        start_agent_count = all_context.count(self.agent_prefix)
-        end_agent_count = all_context.count(self.agent_end)
-
-        if start_agent_count > 0 and start_agent_count == end_agent_count:
-            return True
-        return False
-
-    def __deal_error_md_tags(self, all_context, api_context, include_end: bool = True):
-        error_md_tags = ["```", "```python", "```xml", "```json", "```markdown"]
-        if include_end == False:
-            md_tag_end = ""
-        else:
-            md_tag_end = "```"
-        for tag in error_md_tags:
-            all_context = all_context.replace(
-                tag + api_context + md_tag_end, api_context
+    def _reset_scan(self):
+        self._scanned_text = ""
+        self._scan_pos = 0
+        # The text before it must not change, or the cached view is invalid
+        self._stable_len = 0
+        self._spans: List[_ApiCallSpan] = []
+        # display mode -> (view of the text before offset, offset, index of next span)
+        self._view_cache: Dict[bool, Tuple[str, int, int]] = {
+            False: ("", 0, 0),
+            True: ("", 0, 0),
+        }
+        with self._lock:
+            for api_status in self.plugin_status_map.values():
+                api_status.location.clear()
+
+    def _scan(self, all_context: str) -> bool:
+        """Scan the new text of the streaming output from the last offset, every
+        api call is parsed once when its end tag arrives.
+
+        Returns:
+            bool: True if there are new api calls.
+        """
+        stable_len = max(self._scan_pos, self._stable_len)
+        if not all_context.startswith(self._scanned_text[:stable_len]):
+            # The text before the offset was changed, scan from the beginning and
+            # keep the status of the api calls
+            self._reset_scan()
+        pos = self._scan_pos
+        has_new_call = False
+        while True:
+            span = self._spans[-1] if self._spans else None
+            if span is not None and span.end is None:
+                end_index = all_context.find(
+                    self.agent_end, max(pos, span.start + len(self.agent_prefix) + 1)
+                )
+                if end_index == -1:
+                    break
+                span.end = end_index + len(self.agent_end)
+                self._add_api_call(span, all_context[span.start : span.end])
+                has_new_call = True
+                pos = span.end
+            else:
+                start_index = all_context.find(self.agent_prefix, pos)
+                if start_index == -1:
+                    break
+                self._spans.append(_ApiCallSpan(start_index))
+                pos = start_index + len(self.agent_prefix)
+        # A tag may be cut at the end of text, scan it again with the next chunk
+        tag_len = max(len(self.agent_prefix), len(self.agent_end))
+        self._scan_pos = max(pos, len(all_context) - tag_len + 1)
+        self._scanned_text = all_context
+        return has_new_call
+
+    def _add_api_call(self, span: "_ApiCallSpan", api_context: str):
+        span.context = api_context
+        with self._lock:
+            api_status = self.plugin_status_map.get(api_context)
+            if api_status is not None:
+                api_status.location.append(span.start)
+                return
+            try:
+                api_name, api_args = self._parse_api_call(api_context)
+                api_status = PluginStatus(
+                    name=api_name, location=[span.start], args=api_args
+                )
+            except Exception as e:
+                logging.warning(f"Invalid api call {api_context}: {str(e)}")
+                api_status = PluginStatus(name="", location=[span.start], args={})
+                api_status.status = Status.FAILED.value
+                api_status.err_msg = f"Invalid api call: {str(e)}"
+            self.plugin_status_map[api_context] = api_status
+
+    @staticmethod
+    def _parse_api_call(api_context: str) -> Tuple[str, Dict]:
+        api_context = api_context.replace("\\n", "").replace("\n", "")
+        api_call_element = ET.fromstring(api_context)
+        api_name = api_call_element.find("name").text
+        if api_name.find("[") >= 0 or api_name.find("]") >= 0:
+            api_name = api_name.replace("[", "").replace("]", "")
+        api_args = {}
+        args_elements = api_call_element.find("args")
+        for child_element in args_elements.iter():
+            api_args[child_element.tag] = child_element.text
+        return api_name, api_args
+
+    def _waiting_view(self, end_time: Optional[float] = None) -> str:
+        end_time = end_time or datetime.now().timestamp() * 1000
+        cost_str = "{:.2f}".format((end_time - self.start_time) / 1000)
+        return f'\n<span style="color:green">Waiting...{cost_str}S</span>\n'
+
+    def _span_view(
+        self, all_context: str, span: "_ApiCallSpan", floor: int, display_mode: bool
+    ) -> Tuple[int, int, str, bool]:
+        """The view of an api call and the range of text it replaces.
+
+        Returns:
+            Tuple[int, int, str, bool]: The start and end of the replaced text, the
+                view and whether the view will not change any more.
+        """
+        api_status = self.plugin_status_map.get(span.context) if span.context else None
+        end = span.end if span.end is not None else len(all_context)
+        if api_status is None:
+            # not ready api call view change
+            start, end = _md_tags_range(
+                all_context, span.start, end, floor, _WAITING_MD_TAGS, None
             )
-            all_context = all_context.replace(
-                tag + "\n" + api_context + "\n" + md_tag_end, api_context
+            return start, end, self._waiting_view(), False
+        if display_mode:
+            start, end = _md_tags_range(
+                all_context, span.start, end, floor, _ERROR_MD_TAGS, "```"
             )
-            all_context = all_context.replace(
-                tag + " " + api_context + " " + md_tag_end, api_context
+            if api_status.api_result:
+                view = api_status.api_result
+            elif api_status.status == Status.FAILED.value:
+                view = f"""\n<span style=\"color:red\">ERROR!</span>{api_status.err_msg}\n """
+            else:
+                view = self._waiting_view(api_status.end_time)
+        else:
+            start, end = _md_tags_range(
+                all_context, span.start, end, floor, _ERROR_MD_TAGS, ""
             )
-            all_context = all_context.replace(tag + api_context, api_context)
-        return all_context
+            view = self.to_view_text(api_status)
+        finished = api_status.status in [Status.COMPLETED.value, Status.FAILED.value]
+        # The closing markdown tag after the api call may not be generated yet
+        finished = finished and len(all_context) - span.end >= _MD_TAG_END_MAX_LEN
+        return start, end, view, finished
 
     def api_view_context(self, all_context: str, display_mode: bool = False):
-        error_mk_tags = ["```", "```python", "```xml"]
-        call_context_map = extract_content_open_ending(
-            all_context, self.agent_prefix, self.agent_end, True
-        )
-        for api_index, api_context in call_context_map.items():
-            api_status = self.plugin_status_map.get(api_context)
-            if api_status is not None:
-                if display_mode:
-                    if api_status.api_result:
-                        all_context = self.__deal_error_md_tags(
-                            all_context, api_context
-                        )
-                        all_context = all_context.replace(
-                            api_context, api_status.api_result
-                        )
-                    else:
-                        if api_status.status == Status.FAILED.value:
-                            all_context = self.__deal_error_md_tags(
-                                all_context, api_context
-                            )
-                            all_context = all_context.replace(
-                                api_context,
-                                f"""\n<span style=\"color:red\">ERROR!</span>{api_status.err_msg}\n """,
-                            )
-                        else:
-                            cost = (api_status.end_time - self.start_time) / 1000
-                            cost_str = "{:.2f}".format(cost)
-                            all_context = self.__deal_error_md_tags(
-                                all_context, api_context
-                            )
-                            all_context = all_context.replace(
-                                api_context,
-                                f'\n<span style="color:green">Waiting...{cost_str}S</span>\n',
-                            )
-                else:
-                    all_context = self.__deal_error_md_tags(
-                        all_context, api_context, False
-                    )
-                    all_context = all_context.replace(
-                        api_context, self.to_view_text(api_status)
-                    )
-
-            else:
-                # not ready api call view change
-                now_time = datetime.now().timestamp() * 1000
-                cost = (now_time - self.start_time) / 1000
-                cost_str = "{:.2f}".format(cost)
-                for tag in error_mk_tags:
-                    all_context = all_context.replace(tag + api_context, api_context)
-                all_context = all_context.replace(
-                    api_context,
-                    f'\n<span style="color:green">Waiting...{cost_str}S</span>\n',
-                )
-
-        return all_context
+        """Replace the api calls in text with their views by splicing the known
+        spans, the view of the text before the unfinished api calls is cached"""
+        self._scan(all_context)
+        cached_view, pos, span_index = self._view_cache[display_mode]
+        parts = [cached_view]
+        cache = None
+        cacheable = True
+        for index in range(span_index, len(self._spans)):
+            start, end, view, finished = self._span_view(
+                all_context, self._spans[index], pos, display_mode
+            )
+            parts.append(all_context[pos:start])
+            parts.append(view)
+            pos = end
+            cacheable = cacheable and finished
+            if cacheable:
+                cache = (len(parts), pos, index + 1)
+        if cache is not None:
+            num_parts, offset, next_span = cache
+            self._stable_len = max(
+                self._stable_len,
+                offset,
+                self._spans[next_span - 1].end + _MD_TAG_END_MAX_LEN,
+            )
+            self._view_cache[display_mode] = (
+                "".join(parts[:num_parts]),
+                offset,
+                next_span,
+            )
+        parts.append(all_context[pos:])
+        return "".join(parts)
 
     def update_from_context(self, all_context):
-        api_context_map = extract_content(
-            all_context, self.agent_prefix, self.agent_end, True
-        )
-        for api_index, api_context in api_context_map.items():
-            api_context = api_context.replace("\\n", "").replace("\n", "")
-            api_call_element = ET.fromstring(api_context)
-            api_name = api_call_element.find("name").text
-            if api_name.find("[") >= 0 or api_name.find("]") >= 0:
-                api_name = api_name.replace("[", "").replace("]", "")
-            api_args = {}
-            args_elements = api_call_element.find("args")
-            for child_element in args_elements.iter():
-                api_args[child_element.tag] = child_element.text
-
-            api_status = self.plugin_status_map.get(api_context)
-            if api_status is None:
-                api_status = PluginStatus(
-                    name=api_name, location=[api_index], args=api_args
-                )
-                self.plugin_status_map[api_context] = api_status
-            else:
-                api_status.location.append(api_index)
+        self._scan(all_context)
 
     def __to_view_param_str(self, api_status):
         param = {}
@@ -357,52 +468,141 @@ class ApiCall:
         return result.decode("utf-8")
 
     def run(self, llm_text):
-        if self.__is_need_wait_plugin_call(llm_text):
-            # wait api call generate complete
-            if self.__check_last_plugin_call_ready(llm_text):
-                self.update_from_context(llm_text)
-                for key, value in self.plugin_status_map.items():
-                    if value.status == Status.TODO.value:
-                        value.status = Status.RUNNING.value
-                        logging.info(f"插件执行:{value.name},{value.args}")
-                        try:
-                            value.api_result = execute_command(
-                                value.name, value.args, self.plugin_generator
-                            )
-                            value.status = Status.COMPLETED.value
-                        except Exception as e:
-                            value.status = Status.FAILED.value
-                            value.err_msg = str(e)
-                        value.end_time = datetime.now().timestamp() * 1000
+        with self._lock:
+            has_new_call = self._scan(llm_text)
+        if has_new_call:
+            self._start_plugin_calls(self._execute_plugin)
         return self.api_view_context(llm_text)
 
     def run_display_sql(self, llm_text, sql_run_func):
-        if self.__is_need_wait_plugin_call(llm_text):
-            # wait api call generate complete
-            if self.__check_last_plugin_call_ready(llm_text):
-                self.update_from_context(llm_text)
-                for key, value in self.plugin_status_map.items():
-                    if value.status == Status.TODO.value:
-                        value.status = Status.RUNNING.value
-                        logging.info(f"sql展示执行:{value.name},{value.args}")
-                        try:
-                            sql = value.args["sql"]
-                            if sql:
-                                param = {
-                                    "df": sql_run_func(sql),
-                                }
-                                if self.display_registry.is_valid_command(value.name):
-                                    value.api_result = self.display_registry.call(
-                                        value.name, **param
-                                    )
-                                else:
-                                    value.api_result = self.display_registry.call(
-                                        "response_table", **param
-                                    )
-
-                            value.status = Status.COMPLETED.value
-                        except Exception as e:
-                            value.status = Status.FAILED.value
-                            value.err_msg = str(e)
-                        value.end_time = datetime.now().timestamp() * 1000
+        with self._lock:
+            has_new_call = self._scan(llm_text)
+        if has_new_call:
+            self._start_plugin_calls(
+                functools.partial(self._display_sql, sql_run_func=sql_run_func)
+            )
         return self.api_view_context(llm_text, True)
+
+    async def wait_running(self) -> AsyncIterator[None]:
+        """Wait the plugin calls still running, yields every time a call is finished
+        (or timed out) so the caller can render the view again"""
+        while True:
+            if self._call_func:
+                # Start the calls waiting for the slots of the timed out calls
+                self._start_plugin_calls(self._call_func)
+            with self._lock:
+                futures = [
+                    self._futures[key]
+                    for key, value in self.plugin_status_map.items()
+                    if value.status == Status.RUNNING.value and key in self._futures
+                ]
+                deadline = self._next_deadline()
+            if not futures:
+                return
+            timeout = None
+            if deadline is not None:
+                timeout = max(deadline - datetime.now().timestamp() * 1000, 0) / 1000
+            await asyncio.wait(
+                [asyncio.wrap_future(future) for future in futures],
+                timeout=timeout,
+                return_when=asyncio.FIRST_COMPLETED,
+            )
+            with self._lock:
+                self._check_timeout()
+            yield
+
+    def _execute_plugin(self, value: PluginStatus):
+        logging.info(f"插件执行:{value.name},{value.args}")
+        return execute_command(value.name, value.args, self.plugin_generator)
+
+    def _display_sql(self, value: PluginStatus, sql_run_func):
+        logging.info(f"sql展示执行:{value.name},{value.args}")
+        sql = value.args["sql"]
+        if not sql:
+            return None
+        param = {
+            "df": sql_run_func(sql),
+        }
+        if self.display_registry.is_valid_command(value.name):
+            return self.display_registry.call(value.name, **param)
+        return self.display_registry.call("response_table", **param)
+
+    def _start_plugin_calls(self, call_func: Callable[[PluginStatus], Any]):
+        """Start the plugin calls which are ready, at most `max_concurrency` calls
+        run at the same time and the rest are started when a running call finished"""
+        self._call_func = call_func
+        if self.executor is None:
+            for key, value in self.plugin_status_map.items():
+                if value.status == Status.TODO.value:
+                    value.status = Status.RUNNING.value
+                    self._finish_plugin_call(
+                        value, *self._call_plugin(value, call_func)
+                    )
+            return
+        with self._lock:
+            self._check_timeout()
+            running = sum(
+                1
+                for value in self.plugin_status_map.values()
+                if value.status == Status.RUNNING.value
+            )
+            for key, value in self.plugin_status_map.items():
+                if running >= self.max_concurrency:
+                    break
+                if value.status != Status.TODO.value:
+                    continue
+                value.status = Status.RUNNING.value
+                value.start_time = datetime.now().timestamp() * 1000
+                running += 1
+                self._futures[key] = self.executor.submit(
+                    self._run_plugin_call, value, call_func
+                )
+
+    def _run_plugin_call(self, value: PluginStatus, call_func):
+        self._finish_plugin_call(value, *self._call_plugin(value, call_func))
+        self._start_plugin_calls(call_func)
+
+    @staticmethod
+    def _call_plugin(value: PluginStatus, call_func):
+        try:
+            return call_func(value), None
+        except Exception as e:
+            return None, str(e)
+
+    def _finish_plugin_call(self, value: PluginStatus, result, err_msg):
+        with self._lock:
+            if value.status != Status.RUNNING.value:
+                # Timed out, the result is dropped
+                return
+            if err_msg is None:
+                value.api_result = result
+                value.status = Status.COMPLETED.value
+            else:
+                value.status = Status.FAILED.value
+                value.err_msg = err_msg
+            value.end_time = datetime.now().timestamp() * 1000
+
+    def _check_timeout(self):
+        if not self.timeout:
+            return
+        now = datetime.now().timestamp() * 1000
+        for key, value in self.plugin_status_map.items():
+            if (
+                value.status == Status.RUNNING.value
+                and key in self._futures
+                and now - value.start_time > self.timeout * 1000
+            ):
+                # The thread can't be stopped, only the status is updated
+                value.status = Status.FAILED.value
+                value.err_msg = f"Plugin call timed out after {self.timeout}s"
+                value.end_time = now
+
+    def _next_deadline(self) -> Optional[float]:
+        if not self.timeout:
+            return None
+        deadlines = [
+            value.start_time + self.timeout * 1000
+            for key, value in self.plugin_status_map.items()
+            if value.status == Status.RUNNING.value and key in self._futures
+        ]
+        return min(deadlines) if deadlines else None
@@ -0,0 +1,161 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from pilot.base_modules.agent.commands.command_mange import ApiCall
+from pilot.base_modules.agent.common.schema import Status
+
+
+class _FakeDisplayRegistry:
+    def __init__(self, delays):
+        # sql -> seconds to run
+        self.delays = delays
+        self.calls = []
+
+    def is_valid_command(self, name):
+        return name == "response_table"
+
+    def call(self, name, df):
+        time.sleep(self.delays.get(df, 0))
+        self.calls.append(df)
+        return f"<table>{df}</table>"
+
+
+def _llm_text(*sqls):
+    return "".join(
+        f"<api-call><name>response_table</name><args><sql>{sql}</sql></args></api-call>"
+        for sql in sqls
+    )
+
+
+def _statuses(api_call: ApiCall):
+    return {
+        value.args["sql"]: value.status for value in api_call.plugin_status_map.values()
+    }
+
+
+async def _wait_all(api_call: ApiCall, text: str):
+    views = []
+    async for _ in api_call.wait_running():
+        views.append(api_call.run_display_sql(text, lambda sql: sql))
+    return views
+
+
+@pytest.mark.asyncio
+async def test_plugin_calls_not_blocking():
+    registry = _FakeDisplayRegistry({"q1": 0.3, "q2": 0.3, "q3": 0.3})
+    api_call = ApiCall(
+        display_registry=registry, executor=ThreadPoolExecutor(4), max_concurrency=3
+    )
+    text = _llm_text("q1", "q2", "q3")
+    start = time.time()
+    view = api_call.run_display_sql(text, lambda sql: sql)
+    # Returns at once with the calls running in background
+    assert time.time() - start < 0.2
+    assert "Waiting" in view
+    assert set(_statuses(api_call).values()) == {Status.RUNNING.value}
+
+    views = await _wait_all(api_call, text)
+    # The calls run concurrently
+    assert time.time() - start < 0.8
+    assert set(_statuses(api_call).values()) == {Status.COMPLETED.value}
+    assert all(f"<table>{sql}</table>" in views[-1] for sql in ["q1", "q2", "q3"])
+
+
+@pytest.mark.asyncio
+async def test_plugin_calls_concurrency_limit():
+    registry = _FakeDisplayRegistry({"q1": 0.2, "q2": 0.2, "q3": 0.2})
+    api_call = ApiCall(
+        display_registry=registry, executor=ThreadPoolExecutor(4), max_concurrency=1
+    )
+    text = _llm_text("q1", "q2", "q3")
+    api_call.run_display_sql(text, lambda sql: sql)
+    assert list(_statuses(api_call).values()) == [
+        Status.RUNNING.value,
+        Status.TODO.value,
+        Status.TODO.value,
+    ]
+    views = await _wait_all(api_call, text)
+    # Streamed back as each call is finished
+    assert len(views) == 3
+    assert registry.calls == ["q1", "q2", "q3"]
+
+
+@pytest.mark.asyncio
+async def test_plugin_call_timeout():
+    registry = _FakeDisplayRegistry({"slow": 1, "fast": 0})
+    api_call = ApiCall(
+        display_registry=registry, executor=ThreadPoolExecutor(4), timeout=0.2
+    )
+    text = _llm_text("slow", "fast")
+    start = time.time()
+    api_call.run_display_sql(text, lambda sql: sql)
+    views = await _wait_all(api_call, text)
+    assert time.time() - start < 0.8
+    assert _statuses(api_call) == {
+        "slow": Status.FAILED.value,
+        "fast": Status.COMPLETED.value,
+    }
+    assert "timed out" in views[-1]
+
+
+def test_plugin_calls_without_executor():
+    registry = _FakeDisplayRegistry({})
+    api_call = ApiCall(display_registry=registry)
+    view = api_call.run_display_sql(_llm_text("q1", "q2"), lambda sql: sql)
+    assert set(_statuses(api_call).values()) == {Status.COMPLETED.value}
+    assert "<table>q1</table>" in view and "<table>q2</table>" in view
+
+
+def _stream(api_call: ApiCall, text: str, chunk: int = 3):
+    view = ""
+    for end in range(chunk, len(text) + chunk, chunk):
+        view = api_call.run_display_sql(text[:end], lambda sql: sql)
+    return view
+
+
+def test_scan_streaming_output():
+    registry = _FakeDisplayRegistry({})
+    api_call = ApiCall(display_registry=registry)
+    text = "Result: ```xml\n" + _llm_text("q1") + "\n``` and " + _llm_text("q2") + "."
+    parsed = []
+    parse_api_call = api_call._parse_api_call
+    api_call._parse_api_call = lambda context: parsed.append(context) or (
+        parse_api_call(context)
+    )
+    view = _stream(api_call, text)
+    # Every api call is parsed and run once
+    assert len(parsed) == 2
+    assert registry.calls == ["q1", "q2"]
+    # The markdown code block wrapping the api call is removed
+    assert view == "Result: <table>q1</table> and <table>q2</table>."
+    assert view == ApiCall(display_registry=registry).run_display_sql(
+        text, lambda sql: sql
+    )
+
+
+def test_scan_unfinished_api_call():
+    api_call = ApiCall(display_registry=_FakeDisplayRegistry({}))
+    text = "Result: ```" + _llm_text("q1")
+    view = api_call.run_display_sql(text[:-20], lambda sql: sql)
+    assert view.startswith("Result: \n<span") and "Waiting" in view
+    assert not api_call.plugin_status_map
+
+
+def test_scan_changed_text():
+    registry = _FakeDisplayRegistry({})
+    api_call = ApiCall(display_registry=registry)
+    api_call.run_display_sql("abc " + _llm_text("q1") + " xyz", lambda sql: sql)
+    view = api_call.run_display_sql("ab " + _llm_text("q1") + " xyz!", lambda sql: sql)
+    assert view == "ab <table>q1</table> xyz!"
+    # The status of the api call is kept
+    assert registry.calls == ["q1"]
+
+
+def test_invalid_api_call():
+    api_call = ApiCall(display_registry=_FakeDisplayRegistry({}))
+    view = api_call.run_display_sql(
+        "<api-call><name>table</args></api-call>", lambda sql: sql
+    )
+    assert "ERROR!" in view and "Invalid api call" in view
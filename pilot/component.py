@@ -50,6 +50,8 @@ class ComponentType(str, Enum):
     EXECUTOR_DEFAULT = "dbgpt_thread_pool_default"
     TRACER = "dbgpt_tracer"
     TRACER_SPAN_STORAGE = "dbgpt_tracer_span_storage"
+    HTTP_CLIENT_FACTORY = "dbgpt_http_client_factory"
+    PROXY_CREDENTIAL_CACHE = "dbgpt_proxy_credential_cache"
 
 
 class BaseComponent(LifeCycle, ABC):
@@ -167,6 +167,10 @@ class Config(metaclass=Singleton):
             self.plugins_denylist = plugins_denylist.split(",")
         else:
             self.plugins_denylist = []
+        # Max number of the plugin calls of a chat running at the same time
+        self.PLUGIN_CALL_CONCURRENCY = int(os.getenv("PLUGIN_CALL_CONCURRENCY", 4))
+        # Seconds a plugin call can run, 0 means no limit
+        self.PLUGIN_CALL_TIMEOUT = float(os.getenv("PLUGIN_CALL_TIMEOUT", 60))
         ### Native SQL Execution Capability Control Configuration
         self.NATIVE_SQL_CAN_RUN_DDL = (
             os.getenv("NATIVE_SQL_CAN_RUN_DDL", "True").lower() == "true"
@@ -189,6 +193,27 @@ class Config(metaclass=Singleton):
         self.LOCAL_DB_USER = os.getenv("LOCAL_DB_USER", "root")
         self.LOCAL_DB_PASSWORD = os.getenv("LOCAL_DB_PASSWORD", "aa123456")
         self.LOCAL_DB_POOL_SIZE = int(os.getenv("LOCAL_DB_POOL_SIZE", 10))
+        ### The connections of a datasource share one engine, their table names are
+        ### read again in background after DB_SCHEMA_CACHE_TTL seconds, 0 means never.
+        self.DB_SCHEMA_CACHE_TTL = int(os.getenv("DB_SCHEMA_CACHE_TTL", 300))
+        ### The blocking calls of a datasource run in its own pool of DB_EXECUTOR_MAX_WORKERS
+        ### threads, a query is interrupted after DB_QUERY_TIMEOUT seconds, 0 means no limit.
+        self.DB_EXECUTOR_MAX_WORKERS = int(os.getenv("DB_EXECUTOR_MAX_WORKERS", 4))
+        self.DB_QUERY_TIMEOUT = float(os.getenv("DB_QUERY_TIMEOUT", 120))
+        ### The rows of a query result are fetched up to SQL_RESULT_MAX_ROWS rows and
+        ### SQL_RESULT_MAX_BYTES bytes, 0 means no limit. The SQL editor gets the result
+        ### in pages of SQL_EDITOR_PAGE_SIZE rows.
+        self.SQL_RESULT_MAX_ROWS = int(os.getenv("SQL_RESULT_MAX_ROWS", 10000))
+        self.SQL_RESULT_MAX_BYTES = int(
+            os.getenv("SQL_RESULT_MAX_BYTES", 64 * 1024 * 1024)
+        )
+        self.SQL_EDITOR_PAGE_SIZE = int(os.getenv("SQL_EDITOR_PAGE_SIZE", 500))
+        ### The charts of a dashboard are queried at the same time, at most
+        ### DASHBOARD_CHART_CONCURRENCY of them, each for DASHBOARD_CHART_TIMEOUT seconds.
+        self.DASHBOARD_CHART_CONCURRENCY = int(
+            os.getenv("DASHBOARD_CHART_CONCURRENCY", 4)
+        )
+        self.DASHBOARD_CHART_TIMEOUT = float(os.getenv("DASHBOARD_CHART_TIMEOUT", 60))
 
         self.CHAT_HISTORY_STORE_TYPE = os.getenv("CHAT_HISTORY_STORE_TYPE", "duckdb")
 
@@ -214,6 +239,35 @@ class Config(metaclass=Singleton):
         self.MILVUS_PORT = os.getenv("MILVUS_PORT", "19530")
         self.MILVUS_USERNAME = os.getenv("MILVUS_USERNAME", None)
         self.MILVUS_PASSWORD = os.getenv("MILVUS_PASSWORD", None)
+        ### Local vector store config, the vectors are saved in
+        ### LOCAL_VECTOR_STORE_PATH (Default: pilot/data)
+        self.LOCAL_VECTOR_STORE_PATH = os.getenv("LOCAL_VECTOR_STORE_PATH")
+        ### float32 or float16, float16 halves the size of the vectors but the exact
+        ### search is slower
+        self.LOCAL_VECTOR_STORE_DTYPE = os.getenv("LOCAL_VECTOR_STORE_DTYPE", "float32")
+        self.LOCAL_VECTOR_STORE_SEGMENT_ROWS = int(
+            os.getenv("LOCAL_VECTOR_STORE_SEGMENT_ROWS", 65536)
+        )
+        ### The spaces with more vectors are searched with an IVF index instead of
+        ### exactly, LOCAL_VECTOR_STORE_NPROBE lists of the index are searched
+        self.LOCAL_VECTOR_STORE_IVF_THRESHOLD = int(
+            os.getenv("LOCAL_VECTOR_STORE_IVF_THRESHOLD", 50000)
+        )
+        self.LOCAL_VECTOR_STORE_NPROBE = int(os.getenv("LOCAL_VECTOR_STORE_NPROBE", 16))
+        ### Number of live vector store clients kept by (vector store type, space,
+        ### embedding model), set it to 0 to open a new client for every request
+        self.VECTOR_STORE_POOL_SIZE = int(os.getenv("VECTOR_STORE_POOL_SIZE", 16))
+        ### The documents are written into the vector stores in batches of
+        ### VECTOR_STORE_BATCH_SIZE, a failed batch is retried VECTOR_STORE_BATCH_RETRIES
+        ### times, the stores which support it write VECTOR_STORE_BATCH_PARALLELISM
+        ### batches concurrently
+        self.VECTOR_STORE_BATCH_SIZE = int(os.getenv("VECTOR_STORE_BATCH_SIZE", 500))
+        self.VECTOR_STORE_BATCH_RETRIES = int(
+            os.getenv("VECTOR_STORE_BATCH_RETRIES", 2)
+        )
+        self.VECTOR_STORE_BATCH_PARALLELISM = int(
+            os.getenv("VECTOR_STORE_BATCH_PARALLELISM", 4)
+        )
 
         # QLoRA
         self.QLoRA = os.getenv("QUANTIZE_QLORA", "True")
@@ -233,16 +287,75 @@ class Config(metaclass=Singleton):
         self.KNOWLEDGE_SEARCH_MAX_TOKEN = int(
             os.getenv("KNOWLEDGE_SEARCH_MAX_TOKEN", 2000)
         )
+        ### Fuse the vector search with a BM25 search of the knowledge chunks, the
+        ### chunks are also indexed by words when they are synced
+        self.KNOWLEDGE_SEARCH_HYBRID = (
+            os.getenv("KNOWLEDGE_SEARCH_HYBRID", "True").lower() == "true"
+        )
+        ### The chunks with lower relevance score (0~1) are not added to the prompt,
+        ### the recall_score of a knowledge space overrides it
+        self.KNOWLEDGE_SEARCH_SCORE_THRESHOLD = float(
+            os.getenv("KNOWLEDGE_SEARCH_SCORE_THRESHOLD", 0.0)
+        )
+        ### The name or path of a cross-encoder model to rerank the knowledge chunks,
+        ### e.g. BAAI/bge-reranker-base (needs sentence-transformers)
+        self.KNOWLEDGE_RERANK_MODEL = os.getenv("KNOWLEDGE_RERANK_MODEL")
+        ### The directory of the BM25 indexes (Default: pilot/data/lexical_index)
+        self.KNOWLEDGE_LEXICAL_INDEX_PATH = os.getenv("KNOWLEDGE_LEXICAL_INDEX_PATH")
         ### Control whether to display the source document of knowledge on the front end.
         self.KNOWLEDGE_CHAT_SHOW_RELATIONS = (
             os.getenv("KNOWLEDGE_CHAT_SHOW_RELATIONS", "False").lower() == "true"
         )
 
+        ### Knowledge document sync pipeline, chunks are embedded and written into
+        ### vector store in batches of KNOWLEDGE_SYNC_BATCH_SIZE chunks, and
+        ### KNOWLEDGE_SYNC_CONCURRENCY batches are embedded concurrently.
+        self.KNOWLEDGE_SYNC_BATCH_SIZE = int(os.getenv("KNOWLEDGE_SYNC_BATCH_SIZE", 64))
+        self.KNOWLEDGE_SYNC_CONCURRENCY = int(
+            os.getenv("KNOWLEDGE_SYNC_CONCURRENCY", 4)
+        )
+        self.KNOWLEDGE_SYNC_MAX_RETRIES = int(
+            os.getenv("KNOWLEDGE_SYNC_MAX_RETRIES", 3)
+        )
+        self.KNOWLEDGE_SYNC_QUEUE_SIZE = int(os.getenv("KNOWLEDGE_SYNC_QUEUE_SIZE", 16))
+
+        ### Cache the embedding vectors by (embedding model, text)
+        self.EMBEDDING_CACHE_ENABLED = (
+            os.getenv("EMBEDDING_CACHE_ENABLED", "True").lower() == "true"
+        )
+        self.EMBEDDING_CACHE_MEMORY_ENTRIES = int(
+            os.getenv("EMBEDDING_CACHE_MEMORY_ENTRIES", 10000)
+        )
+        ### The SQLite file of the on-disk tier, set it to empty to only cache in memory
+        self.EMBEDDING_CACHE_DISK_PATH = os.getenv("EMBEDDING_CACHE_DISK_PATH")
+        if self.EMBEDDING_CACHE_DISK_PATH is None:
+            from pilot.configs.model_config import DATA_DIR
+
+            self.EMBEDDING_CACHE_DISK_PATH = os.path.join(
+                DATA_DIR, "embedding_cache.db"
+            )
+
         ### SUMMARY_CONFIG Configuration
         self.SUMMARY_CONFIG = os.getenv("SUMMARY_CONFIG", "FAST")
 
         self.MAX_GPU_MEMORY = os.getenv("MAX_GPU_MEMORY", None)
 
+        ### Streaming response, the outputs of model are coalesced into one SSE frame
+        ### until SSE_FLUSH_INTERVAL_MS milliseconds have passed or SSE_FLUSH_CHARS
+        ### characters are generated, set both of them to 0 to send every output.
+        self.SSE_FLUSH_INTERVAL_MS = int(os.getenv("SSE_FLUSH_INTERVAL_MS", 30))
+        self.SSE_FLUSH_CHARS = int(os.getenv("SSE_FLUSH_CHARS", 512))
+
+        ### The chat scenes whose LLM responses are cached, the same request of these
+        ### scenes is answered from cache (see llm_cache_* in ModelWorkerParameters)
+        self.LLM_CACHE_SCENES = [
+            scene.strip()
+            for scene in os.getenv(
+                "LLM_CACHE_SCENES", "inner_chat_db_summary,excel_learning"
+            ).split(",")
+            if scene.strip()
+        ]
+
         ### Log level
         self.DBGPT_LOG_LEVEL = os.getenv("DBGPT_LOG_LEVEL", "INFO")
 
@@ -1,5 +1,9 @@
 import threading
 import asyncio
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Awaitable, Callable, Dict, Optional, TypeVar
 
 from pilot.configs.config import Config
 from pilot.connections.manages.connect_storage_duckdb import DuckdbConnectConfig
@@ -14,7 +18,7 @@ from pilot.connections.rdbms.conn_mysql import MySQLConnect
 from pilot.connections.rdbms.conn_duckdb import DuckDbConnect
 from pilot.connections.rdbms.conn_sqlite import SQLiteConnect
 from pilot.connections.rdbms.conn_mssql import MSSQLConnect
-from pilot.connections.rdbms.base import RDBMSDatabase
+from pilot.connections.rdbms.base import RDBMSDatabase, SchemaCache
 from pilot.connections.rdbms.conn_clickhouse import ClickhouseConnect
 from pilot.connections.rdbms.conn_postgresql import PostgreSQLDatabase
 from pilot.singleton import Singleton
@@ -25,6 +29,23 @@ from pilot.summary.db_summary_client import DBSummaryClient
 
 CFG = Config()
 
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+# Seconds between the checks whether the caller of a database call has gone
+_CANCEL_CHECK_INTERVAL = 0.5
+
+
+class _CachedDatasource:
+    """The engine and schema cache shared by the connections of a datasource"""
+
+    def __init__(self, connect_cls, engine, schema_cache: SchemaCache) -> None:
+        self.connect_cls = connect_cls
+        self.engine = engine
+        self.schema_cache = schema_cache
+        self.refreshing = False
+
 
 class ConnectManager:
     def get_all_subclasses(self, cls):
@@ -54,6 +75,10 @@ class ConnectManager:
     def __init__(self, system_app: SystemApp):
         self.storage = DuckdbConnectConfig()
         self.db_summary_client = DBSummaryClient(system_app)
+        self._datasources: Dict[str, _CachedDatasource] = {}
+        self._datasources_lock = threading.Lock()
+        # db_name -> executor of the blocking calls of the datasource
+        self._executors: Dict[str, ThreadPoolExecutor] = {}
         # self.__load_config_db()
 
     def __load_config_db(self):
@@ -134,6 +159,142 @@ class ConnectManager:
         return db_type, db_name
 
     def get_connect(self, db_name):
+        """Get a connection of the datasource.
+
+        Every call returns a new connection with its own session, the connections of a
+        datasource share one pooled engine and the cached schema.
+        """
+        with self._datasources_lock:
+            datasource = self._datasources.get(db_name)
+        if datasource:
+            connect = datasource.connect_cls(
+                datasource.engine, schema_cache=datasource.schema_cache
+            )
+            self._refresh_schema_if_expired(db_name, datasource, connect)
+            return connect
+        connect = self._create_connect(db_name)
+        if isinstance(connect, RDBMSDatabase):
+            with self._datasources_lock:
+                if db_name not in self._datasources:
+                    self._datasources[db_name] = _CachedDatasource(
+                        type(connect), connect._engine, connect.schema_cache
+                    )
+        return connect
+
+    def _refresh_schema_if_expired(
+        self, db_name: str, datasource: _CachedDatasource, connect: RDBMSDatabase
+    ) -> None:
+        if not datasource.schema_cache.is_expired(CFG.DB_SCHEMA_CACHE_TTL):
+            return
+        with self._datasources_lock:
+            if datasource.refreshing:
+                return
+            datasource.refreshing = True
+
+        def _refresh():
+            try:
+                connect.refresh_schema()
+            except Exception as e:
+                logger.warning(f"Refresh schema of {db_name} error: {str(e)}")
+            finally:
+                datasource.refreshing = False
+
+        executor = CFG.SYSTEM_APP.get_component(
+            ComponentType.EXECUTOR_DEFAULT, ExecutorFactory
+        ).create()
+        executor.submit(_refresh)
+
+    def get_executor(self, db_name: str) -> ThreadPoolExecutor:
+        """The bounded executor of the blocking calls of the datasource, a slow query
+        only takes the threads of its own datasource"""
+        with self._datasources_lock:
+            executor = self._executors.get(db_name)
+            if executor is None:
+                executor = ThreadPoolExecutor(
+                    max_workers=CFG.DB_EXECUTOR_MAX_WORKERS,
+                    thread_name_prefix=f"db_{db_name}",
+                )
+                self._executors[db_name] = executor
+            return executor
+
+    async def async_run(
+        self,
+        db_name: str,
+        func: Callable[[BaseConnect], T],
+        timeout: Optional[float] = None,
+        is_cancelled: Optional[Callable[[], Awaitable[bool]]] = None,
+    ) -> T:
+        """Run the blocking database call in the executor of the datasource, so it
+        does not block the event loop.
+
+        Args:
+            db_name (str): The datasource.
+            func (Callable[[BaseConnect], T]): The call with a new connection of the
+                datasource.
+            timeout (Optional[float]): Seconds the statements can run, use
+                DB_QUERY_TIMEOUT if None, 0 means no limit.
+            is_cancelled (Optional[Callable[[], Awaitable[bool]]]): Whether the caller
+                has gone, such as the client of request is disconnected.
+
+        Raises:
+            ValueError: The call is timed out or cancelled, the running statement is
+                interrupted.
+        """
+        timeout = CFG.DB_QUERY_TIMEOUT if timeout is None else timeout
+        running = {}
+
+        def _run():
+            connect = self.get_connect(db_name)
+            if not isinstance(connect, RDBMSDatabase):
+                return func(connect)
+            running["connect"] = connect
+            try:
+                connect.set_statement_timeout(timeout)
+                return func(connect)
+            finally:
+                running.pop("connect", None)
+                connect.close()
+
+        future = asyncio.get_running_loop().run_in_executor(
+            self.get_executor(db_name), _run
+        )
+        deadline = time.time() + timeout if timeout else None
+        try:
+            while True:
+                wait = _CANCEL_CHECK_INTERVAL if is_cancelled else None
+                if deadline is not None:
+                    remaining = deadline - time.time()
+                    if remaining <= 0:
+                        raise ValueError(
+                            f"The query on {db_name} timed out after {timeout}s"
+                        )
+                    wait = min(wait, remaining) if wait else remaining
+                done, _ = await asyncio.wait({future}, timeout=wait)
+                if done:
+                    return future.result()
+                if is_cancelled and await is_cancelled():
+                    raise ValueError(f"The query on {db_name} is cancelled")
+        except (ValueError, asyncio.CancelledError):
+            if not future.done():
+                connect = running.get("connect")
+                if connect and not connect.interrupt():
+                    logger.warning(f"The query on {db_name} can't be interrupted")
+            raise
+
+    def invalidate_connect(self, db_name: str) -> None:
+        """Drop the cached engine and schema of the datasource"""
+        with self._datasources_lock:
+            datasource = self._datasources.pop(db_name, None)
+            executor = self._executors.pop(db_name, None)
+        if executor:
+            # The running calls are finished with the old connections
+            executor.shutdown(wait=False)
+        if datasource:
+            # Close the idle pooled connections, the connections in use are closed
+            # when they are returned
+            datasource.engine.dispose()
+
+    def _create_connect(self, db_name):
         db_config = self.storage.get_db_config(db_name)
         db_type = DBType.of_db_type(db_config.get("db_type"))
         connect_instance = self.get_cls_by_dbtype(db_type.value())
@@ -180,10 +341,12 @@ class ConnectManager:
         return self.storage.get_db_names()
 
     def delete_db(self, db_name: str):
-        return self.storage.delete_db(db_name)
+        result = self.storage.delete_db(db_name)
+        self.invalidate_connect(db_name)
+        return result
 
     def edit_db(self, db_info: DBConfig):
-        return self.storage.update_db_info(
+        result = self.storage.update_db_info(
             db_info.db_name,
             db_info.db_type,
             db_info.file_path,
@@ -193,6 +356,9 @@ class ConnectManager:
             db_info.db_pwd,
             db_info.comment,
         )
+        # Connect with the new config next time
+        self.invalidate_connect(db_info.db_name)
+        return result
 
     async def async_db_summary_embedding(self, db_name, db_type):
         # 在这里执行需要异步运行的代码
@@ -200,6 +366,7 @@ class ConnectManager:
 
     def add_db(self, db_info: DBConfig):
         print(f"add_db:{db_info.__dict__}")
+        self.invalidate_connect(db_info.db_name)
         try:
             db_type = DBType.of_db_type(db_info.db_type)
             if db_type.is_file_db():
@@ -0,0 +1,107 @@
+"""
+Run unit test with command: pytest pilot/connections/manages/tests/test_async_run.py
+"""
+import asyncio
+import os
+import tempfile
+import threading
+import time
+
+import pytest
+from sqlalchemy import text
+
+from pilot.connections.manages.connection_manager import CFG, ConnectManager
+from pilot.connections.rdbms.conn_sqlite import SQLiteConnect
+
+_SLOW_SQL = (
+    "WITH RECURSIVE c(x) AS (SELECT 1 UNION ALL SELECT x + 1 FROM c "
+    "WHERE x < 1000000000) SELECT count(*) FROM c"
+)
+
+
+@pytest.fixture
+def manager(monkeypatch):
+    temp_db_file = tempfile.NamedTemporaryFile(delete=False)
+    temp_db_file.close()
+    db = SQLiteConnect.from_file_path(temp_db_file.name)
+    with db._engine.begin() as c:
+        c.execute(text("CREATE TABLE user (id INTEGER PRIMARY KEY, name TEXT)"))
+        c.execute(text("INSERT INTO user VALUES (1, 'a'), (2, 'b')"))
+    # Without the storage of datasources
+    manager = ConnectManager.__new__(ConnectManager)
+    manager._datasources = {}
+    manager._datasources_lock = threading.Lock()
+    manager._executors = {}
+    monkeypatch.setattr(
+        manager,
+        "get_connect",
+        lambda db_name: SQLiteConnect(db._engine, schema_cache=db.schema_cache),
+    )
+    monkeypatch.setattr(CFG, "DB_EXECUTOR_MAX_WORKERS", 1)
+    yield manager
+    for executor in manager._executors.values():
+        executor.shutdown(wait=True)
+    db._engine.dispose()
+    os.unlink(temp_db_file.name)
+
+
+@pytest.mark.asyncio
+async def test_async_run(manager):
+    assert threading.current_thread().name == "MainThread"
+    thread_name, result = await manager.async_run(
+        "test_db",
+        lambda conn: (threading.current_thread().name, conn.run("SELECT * FROM user")),
+    )
+    assert thread_name.startswith("db_test_db")
+    assert result == [("id", "name"), (1, "a"), (2, "b")]
+
+
+@pytest.mark.asyncio
+async def test_async_run_not_block_event_loop(manager):
+    ticks = []
+
+    async def _tick():
+        for _ in range(5):
+            ticks.append(time.time())
+            await asyncio.sleep(0.01)
+
+    await asyncio.gather(
+        manager.async_run("test_db", lambda conn: time.sleep(0.2)), _tick()
+    )
+    assert len(ticks) == 5
+    assert ticks[-1] - ticks[0] < 0.2
+
+
+@pytest.mark.asyncio
+async def test_async_run_timeout_interrupted(manager):
+    start = time.time()
+    with pytest.raises(ValueError, match="timed out"):
+        await manager.async_run(
+            "test_db", lambda conn: conn.run(_SLOW_SQL), timeout=0.2
+        )
+    # The only thread of datasource is free again after the statement is interrupted
+    result = await manager.async_run(
+        "test_db", lambda conn: conn.run("SELECT count(*) FROM user")
+    )
+    assert result[1] == (2,)
+    assert time.time() - start < 5
+
+
+@pytest.mark.asyncio
+async def test_async_run_cancelled(manager):
+    async def _is_cancelled():
+        return True
+
+    with pytest.raises(ValueError, match="cancelled"):
+        await manager.async_run(
+            "test_db",
+            lambda conn: conn.run(_SLOW_SQL),
+            timeout=0,
+            is_cancelled=_is_cancelled,
+        )
+
+
+@pytest.mark.asyncio
+async def test_executor_per_datasource(manager):
+    assert manager.get_executor("db1") is manager.get_executor("db1")
+    assert manager.get_executor("db1") is not manager.get_executor("db2")
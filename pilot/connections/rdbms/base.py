@@ -1,10 +1,13 @@
 from __future__ import annotations
 from urllib.parse import quote
+import logging
+import threading
+import time
 import warnings
 import sqlparse
 import regex as re
 import pandas as pd
-from typing import Any, Iterable, List, Optional
+from typing import Any, Iterable, List, NamedTuple, Optional, Tuple
 from pydantic import BaseModel, Field, root_validator, validator, Extra
 from abc import ABC, abstractmethod
 import sqlalchemy
@@ -27,6 +30,60 @@ from pilot.configs.config import Config
 
 CFG = Config()
 
+logger = logging.getLogger(__name__)
+
+# Rows fetched from the cursor at a time
+_FETCH_BATCH_SIZE = 1000
+
+
+class QueryPage(NamedTuple):
+    field_names: List[str]
+    rows: List[Tuple]
+    # Whether there are rows after the page
+    has_more: bool
+
+
+def _row_size(row) -> int:
+    """Estimate the bytes of a row, the numbers and dates count as 8 bytes"""
+    return sum(len(value) if isinstance(value, (str, bytes)) else 8 for value in row)
+
+
+def _fetch_rows(
+    cursor: CursorResult,
+    max_rows: Optional[int] = None,
+    max_bytes: Optional[int] = None,
+    skip: int = 0,
+) -> Tuple[List, bool]:
+    """Fetch the rows in batches until the limits are reached, 0 or None means no
+    limit.
+
+    Returns:
+        Tuple[List, bool]: The rows, and whether there are rows left in the cursor.
+    """
+    rows = []
+    size = 0
+    while skip > 0:
+        skipped = cursor.fetchmany(min(skip, _FETCH_BATCH_SIZE))
+        if not skipped:
+            return rows, False
+        skip -= len(skipped)
+    while True:
+        batch_size = _FETCH_BATCH_SIZE
+        if max_rows:
+            # One more row to know whether there are rows left
+            batch_size = min(batch_size, max_rows - len(rows) + 1)
+        batch = cursor.fetchmany(batch_size)
+        if not batch:
+            return rows, False
+        for row in batch:
+            if max_rows and len(rows) >= max_rows:
+                return rows, True
+            if max_bytes:
+                size += _row_size(row)
+                if size > max_bytes and rows:
+                    return rows, True
+            rows.append(row)
+
 
 def _format_index(index: sqlalchemy.engine.interfaces.ReflectedIndex) -> str:
     return (
@@ -35,10 +92,42 @@ def _format_index(index: sqlalchemy.engine.interfaces.ReflectedIndex) -> str:
     )
 
 
+class SchemaCache:
+    """Table names and reflected table metadata of a database.
+
+    It is shared by the connections of the same datasource, the tables are reflected
+    lazily when their information is needed for the first time.
+    """
+
+    def __init__(self) -> None:
+        self.all_tables: Optional[set] = None
+        self.metadata = MetaData()
+        self.reflected_tables: set = set()
+        self.refreshed_at = 0.0
+        self.lock = threading.RLock()
+
+    def set_tables(self, tables: Iterable[str]) -> None:
+        with self.lock:
+            self.all_tables = set(tables)
+            # Reflect the tables again, they may be altered
+            self.metadata = MetaData()
+            self.reflected_tables = set()
+            self.refreshed_at = time.time()
+
+    def is_expired(self, ttl: float) -> bool:
+        return ttl > 0 and time.time() - self.refreshed_at > ttl
+
+
 class RDBMSDatabase(BaseConnect):
     """SQLAlchemy wrapper around a database."""
 
     db_type: str = None
+    # The sql limiting the milliseconds a statement of the session can run, 0 means
+    # no limit. None if the dialect does not support it.
+    statement_timeout_sql: Optional[str] = None
+    # Whether the timeout outlives the transaction and must be reset before the
+    # connection is returned to the pool
+    statement_timeout_in_session: bool = True
 
     def __init__(
         self,
@@ -51,6 +140,7 @@ class RDBMSDatabase(BaseConnect):
         indexes_in_table_info: bool = False,
         custom_table_info: Optional[dict] = None,
         view_support: bool = False,
+        schema_cache: Optional[SchemaCache] = None,
     ):
         """Create engine from database URI.
         Args:
@@ -63,6 +153,8 @@ class RDBMSDatabase(BaseConnect):
            - indexes_in_table_info: bool = False,
            - custom_table_info: Optional[dict] = None,
            - view_support: bool = False,
+           - schema_cache: Optional[SchemaCache], the schema cache shared with other
+             connections of the database, the tables are read from database if None.
         """
         self._engine = engine
         self._schema = schema
@@ -75,7 +167,7 @@ class RDBMSDatabase(BaseConnect):
         self._db_sessions = Session_Manages
         self.session = self.get_session()
 
-        self._all_tables = set()
+        self._schema_cache = schema_cache or SchemaCache()
         self.view_support = False
         self._usable_tables = set()
         self._include_tables = set()
@@ -87,10 +179,8 @@ class RDBMSDatabase(BaseConnect):
         self._sample_rows_in_table_info = set()
         self._indexes_in_table_info = indexes_in_table_info
 
-        self._metadata = MetaData()
-        self._metadata.reflect(bind=self._engine)
-
-        self._all_tables = self._sync_tables_from_db()
+        if self._schema_cache.all_tables is None:
+            self._sync_tables_from_db()
 
     @classmethod
     def from_uri_db(
@@ -135,6 +225,42 @@ class RDBMSDatabase(BaseConnect):
         _engine_args = engine_args or {}
         return cls(create_engine(database_uri, **_engine_args), **kwargs)
 
+    @property
+    def _all_tables(self) -> set:
+        return self._schema_cache.all_tables or set()
+
+    @_all_tables.setter
+    def _all_tables(self, tables: Iterable[str]) -> None:
+        self._schema_cache.set_tables(tables)
+
+    @property
+    def _metadata(self) -> MetaData:
+        return self._schema_cache.metadata
+
+    @property
+    def schema_cache(self) -> SchemaCache:
+        return self._schema_cache
+
+    def refresh_schema(self) -> Iterable[str]:
+        """Read the table names again and drop the reflected tables"""
+        # The inspector caches what it has read
+        self._inspector = inspect(self._engine)
+        return self._sync_tables_from_db()
+
+    def _reflect_tables(self, table_names: Iterable[str]) -> List[Table]:
+        """Reflect the tables not reflected yet, returns the tables sorted by their
+        dependencies"""
+        table_names = set(table_names)
+        cache = self._schema_cache
+        with cache.lock:
+            missing = table_names - cache.reflected_tables
+            if missing:
+                cache.metadata.reflect(bind=self._engine, only=list(missing))
+                cache.reflected_tables.update(missing)
+            return [
+                tbl for tbl in cache.metadata.sorted_tables if tbl.name in table_names
+            ]
+
     @property
     def dialect(self) -> str:
         """Return string representation of dialect to use."""
@@ -142,8 +268,6 @@ class RDBMSDatabase(BaseConnect):
 
     def _sync_tables_from_db(self) -> Iterable[str]:
         """Read table information from database"""
-        # TODO Use a background thread to refresh periodically
-
         # SQL will raise error with schema
         _schema = (
             None if self.db_type == DBType.SQLite.value() else self._engine.url.database
@@ -175,6 +299,62 @@ class RDBMSDatabase(BaseConnect):
 
         return session
 
+    def set_statement_timeout(self, timeout: Optional[float]) -> None:
+        """Limit the seconds a statement of the session can run, 0 or None means no
+        limit.
+
+        It binds the session to a connection, so that `interrupt` can cancel the
+        running statement from another thread.
+        """
+        if self.statement_timeout_sql:
+            timeout_ms = int((timeout or 0) * 1000)
+            try:
+                self.session.execute(
+                    text(self.statement_timeout_sql.format(timeout_ms=timeout_ms))
+                )
+            except SQLAlchemyError as e:
+                # Old versions of database, the caller still has its own timeout
+                logger.warning(f"Set statement timeout error: {str(e)}")
+                self.session.rollback()
+        connection = self.session.connection()
+        self._dbapi_connection = connection.connection.dbapi_connection
+
+    def interrupt(self) -> bool:
+        """Cancel the statement running in the session, called from another thread.
+
+        Returns:
+            bool: False if the driver can't cancel a running statement.
+        """
+        dbapi_connection = getattr(self, "_dbapi_connection", None)
+        # cancel: psycopg2, interrupt: sqlite3 and duckdb
+        for method_name in ["cancel", "interrupt"]:
+            method = getattr(dbapi_connection, method_name, None)
+            if callable(method):
+                try:
+                    method()
+                    return True
+                except Exception as e:
+                    logger.warning(f"Interrupt statement error: {str(e)}")
+        return False
+
+    def close(self) -> None:
+        """Return the connection of the session to the pool"""
+        try:
+            if (
+                self.statement_timeout_sql
+                and self.statement_timeout_in_session
+                and getattr(self, "_dbapi_connection", None)
+            ):
+                # The connection is reused by others
+                self.session.execute(
+                    text(self.statement_timeout_sql.format(timeout_ms=0))
+                )
+        except Exception as e:
+            logger.warning(f"Reset statement timeout error: {str(e)}")
+        finally:
+            self._dbapi_connection = None
+            self.session.close()
+
     def get_current_db_name(self) -> str:
         return self.session.execute(text("SELECT DATABASE()")).scalar()
 
@@ -210,9 +390,8 @@ class RDBMSDatabase(BaseConnect):
 
         meta_tables = [
             tbl
-            for tbl in self._metadata.sorted_tables
-            if tbl.name in set(all_table_names)
-            and not (self.dialect == "sqlite" and tbl.name.startswith("sqlite_"))
+            for tbl in self._reflect_tables(all_table_names)
+            if not (self.dialect == "sqlite" and tbl.name.startswith("sqlite_"))
         ]
 
         tables = []
@@ -292,6 +471,49 @@ class RDBMSDatabase(BaseConnect):
         print(f"SQL[{write_sql}], result:{result.rowcount}")
         return result.rowcount
 
+    def _execute_stream(self, query: str) -> CursorResult:
+        """Execute the query with a server side cursor where the driver supports it,
+        the rows are not loaded into memory until they are fetched"""
+        return self.session.execute(
+            text(query), execution_options={"stream_results": True}
+        )
+
+    def _fetch_limited(self, cursor: CursorResult, query: str) -> List:
+        """Fetch the rows up to SQL_RESULT_MAX_ROWS and SQL_RESULT_MAX_BYTES"""
+        try:
+            rows, truncated = _fetch_rows(
+                cursor, CFG.SQL_RESULT_MAX_ROWS, CFG.SQL_RESULT_MAX_BYTES
+            )
+        finally:
+            cursor.close()
+        if truncated:
+            logger.warning(
+                f"The result of query is truncated to {len(rows)} rows: {query}"
+            )
+        return rows
+
+    def query_page(self, query: str, page_size: int, offset: int = 0) -> QueryPage:
+        """Query a page of the result, only the rows of the page are kept in memory.
+
+        Args:
+            query (str): The query.
+            page_size (int): Max number of the rows of the page, the page is smaller if
+                its rows are more than SQL_RESULT_MAX_BYTES.
+            offset (int): The rows skipped before the page.
+        """
+        print(f"Query[{query}]")
+        cursor = self._execute_stream(query)
+        try:
+            if not cursor.returns_rows:
+                return QueryPage([], [], False)
+            field_names = list(cursor.keys())
+            rows, has_more = _fetch_rows(
+                cursor, page_size, CFG.SQL_RESULT_MAX_BYTES, skip=offset
+            )
+        finally:
+            cursor.close()
+        return QueryPage(field_names, [tuple(row) for row in rows], has_more)
+
     def __query(self, query, fetch: str = "all"):
         """
         only for query
@@ -306,15 +528,15 @@ class RDBMSDatabase(BaseConnect):
         print(f"Query[{query}]")
         if not query:
             return []
-        cursor = self.session.execute(text(query))
+        cursor = self._execute_stream(query)
         if cursor.returns_rows:
+            field_names = tuple(i[0:] for i in cursor.keys())
             if fetch == "all":
-                result = cursor.fetchall()
+                result = self._fetch_limited(cursor, query)
             elif fetch == "one":
                 result = cursor.fetchone()[0]  # type: ignore
             else:
                 raise ValueError("Fetch parameter must be either 'one' or 'all'")
-            field_names = tuple(i[0:] for i in cursor.keys())
 
             result = list(result)
             result.insert(0, field_names)
@@ -332,15 +554,15 @@ class RDBMSDatabase(BaseConnect):
         print(f"Query[{query}]")
         if not query:
             return []
-        cursor = self.session.execute(text(query))
+        cursor = self._execute_stream(query)
         if cursor.returns_rows:
+            field_names = list(i[0:] for i in cursor.keys())
             if fetch == "all":
-                result = cursor.fetchall()
+                result = self._fetch_limited(cursor, query)
             elif fetch == "one":
                 result = cursor.fetchone()[0]  # type: ignore
             else:
                 raise ValueError("Fetch parameter must be either 'one' or 'all'")
-            field_names = list(i[0:] for i in cursor.keys())
 
             result = list(result)
             return field_names, result
@@ -365,10 +587,12 @@ class RDBMSDatabase(BaseConnect):
             print(f"DDL execution determines whether to enable through configuration ")
             cursor = self.session.execute(text(command))
             self.session.commit()
+            if ttype == sqlparse.tokens.DDL:
+                # Other connections of the database see the new schema too
+                self.refresh_schema()
             if cursor.returns_rows:
-                result = cursor.fetchall()
                 field_names = tuple(i[0:] for i in cursor.keys())
-                result = list(result)
+                result = self._fetch_limited(cursor, command)
                 result.insert(0, field_names)
                 print("DDL Result:" + str(result))
                 if not result:
@@ -378,11 +602,23 @@ class RDBMSDatabase(BaseConnect):
                 return self.__query(f"SHOW COLUMNS FROM {table_name}")
 
     def run_to_df(self, command: str, fetch: str = "all"):
+        parsed, ttype, sql_type, table_name = self.__sql_parse(command)
+        if ttype == sqlparse.tokens.DML and sql_type == "SELECT" and fetch == "all":
+            return self._query_df(command)
         result_lst = self.run(command, fetch)
         colunms = result_lst[0]
         values = result_lst[1:]
         return pd.DataFrame(values, columns=colunms)
 
+    def _query_df(self, query: str) -> pd.DataFrame:
+        """Stream the rows of query into a DataFrame, limited by SQL_RESULT_MAX_ROWS
+        and SQL_RESULT_MAX_BYTES"""
+        print(f"Query[{query}]")
+        cursor = self._execute_stream(query)
+        field_names = list(cursor.keys())
+        rows = self._fetch_limited(cursor, query)
+        return pd.DataFrame.from_records(rows, columns=field_names)
+
     def run_no_throw(self, command: str, fetch: str = "all") -> List:
         """Execute a SQL command and return a string representing the results.
 
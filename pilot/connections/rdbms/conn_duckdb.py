@@ -9,8 +9,17 @@ from sqlalchemy import (
 )
 from sqlalchemy.ext.declarative import declarative_base
 
+import logging
+
+import pandas as pd
+
+from pilot.configs.config import Config
 from pilot.connections.rdbms.base import RDBMSDatabase
 
+CFG = Config()
+
+logger = logging.getLogger(__name__)
+
 
 class DuckDbConnect(RDBMSDatabase):
     """Connect Duckdb Database fetch MetaData
@@ -29,6 +38,20 @@ class DuckDbConnect(RDBMSDatabase):
         _engine_args = engine_args or {}
         return cls(create_engine("duckdb:///" + file_path, **_engine_args), **kwargs)
 
+    def _query_df(self, query: str) -> pd.DataFrame:
+        """Convert the result to DataFrame by columns in duckdb instead of row by row"""
+        print(f"Query[{query}]")
+        max_rows = CFG.SQL_RESULT_MAX_ROWS
+        if max_rows:
+            query = query.strip().rstrip(";")
+            query = f"SELECT * FROM ({query}) AS t LIMIT {max_rows + 1}"
+        dbapi_connection = self.session.connection().connection.dbapi_connection
+        df = dbapi_connection.execute(query).df()
+        if max_rows and len(df) > max_rows:
+            logger.warning(f"The result of query is truncated to {max_rows} rows")
+            df = df.head(max_rows)
+        return df
+
     def get_users(self):
         cursor = self.session.execute(
             text(
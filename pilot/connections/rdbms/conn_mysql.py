@@ -1,9 +1,14 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
+import logging
 from typing import Optional, Any
 
+from sqlalchemy import text
+
 from pilot.connections.rdbms.base import RDBMSDatabase
 
+logger = logging.getLogger(__name__)
+
 
 class MySQLConnect(RDBMSDatabase):
     """Connect MySQL Database fetch MetaData
@@ -14,5 +19,22 @@ class MySQLConnect(RDBMSDatabase):
     db_type: str = "mysql"
     db_dialect: str = "mysql"
     driver: str = "mysql+pymysql"
+    # Only limits the SELECT statements
+    statement_timeout_sql = "SET SESSION MAX_EXECUTION_TIME = {timeout_ms}"
 
     default_db = ["information_schema", "performance_schema", "sys", "mysql"]
+
+    def interrupt(self) -> bool:
+        """pymysql can't cancel a running statement, kill it with another connection"""
+        dbapi_connection = getattr(self, "_dbapi_connection", None)
+        if dbapi_connection is None:
+            return False
+        try:
+            with self._engine.connect() as connection:
+                connection.execute(
+                    text(f"KILL QUERY {int(dbapi_connection.thread_id())}")
+                )
+            return True
+        except Exception as e:
+            logger.warning(f"Kill query error: {str(e)}")
+            return False
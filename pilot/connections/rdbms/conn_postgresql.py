@@ -8,6 +8,9 @@ class PostgreSQLDatabase(RDBMSDatabase):
     driver = "postgresql+psycopg2"
     db_type = "postgresql"
     db_dialect = "postgresql"
+    # Reverted when the transaction ends
+    statement_timeout_sql = "SET LOCAL statement_timeout = {timeout_ms}"
+    statement_timeout_in_session = False
 
     @classmethod
     def from_uri_db(
@@ -49,7 +52,6 @@ class PostgreSQLDatabase(RDBMSDatabase):
         table_results = set(row[0] for row in table_results)
         view_results = set(row[0] for row in view_results)
         self._all_tables = table_results.union(view_results)
-        self._metadata.reflect(bind=self._engine)
         return self._all_tables
 
     def get_grants(self):
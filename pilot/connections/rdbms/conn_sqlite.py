@@ -82,7 +82,6 @@ class SQLiteConnect(RDBMSDatabase):
         table_results = set(row[0] for row in table_results)
         view_results = set(row[0] for row in view_results)
         self._all_tables = table_results.union(view_results)
-        self._metadata.reflect(bind=self._engine)
         return self._all_tables
 
     def _write(self, session, write_sql):
@@ -0,0 +1,92 @@
+"""
+Run unit test with command: pytest pilot/connections/rdbms/tests/test_query_limits.py
+"""
+import os
+import tempfile
+
+import pytest
+from sqlalchemy import text
+
+from pilot.connections.rdbms.base import CFG
+from pilot.connections.rdbms.conn_duckdb import DuckDbConnect
+from pilot.connections.rdbms.conn_sqlite import SQLiteConnect
+
+
+@pytest.fixture
+def db(monkeypatch):
+    temp_db_file = tempfile.NamedTemporaryFile(delete=False)
+    temp_db_file.close()
+    conn = SQLiteConnect.from_file_path(temp_db_file.name)
+    with conn._engine.begin() as c:
+        c.execute(text("CREATE TABLE item (id INTEGER PRIMARY KEY, name TEXT)"))
+        c.execute(
+            text("INSERT INTO item VALUES (:id, :name)"),
+            [{"id": i, "name": f"name{i}"} for i in range(2500)],
+        )
+    monkeypatch.setattr(CFG, "SQL_RESULT_MAX_ROWS", 0)
+    monkeypatch.setattr(CFG, "SQL_RESULT_MAX_BYTES", 0)
+    yield conn
+    conn._engine.dispose()
+    os.unlink(temp_db_file.name)
+
+
+def test_query_not_limited(db):
+    field_names, rows = db.query_ex("SELECT * FROM item")
+    assert field_names == ["id", "name"]
+    assert len(rows) == 2500
+    assert len(db.run("SELECT * FROM item")) == 2501
+
+
+def test_query_max_rows(db, monkeypatch):
+    monkeypatch.setattr(CFG, "SQL_RESULT_MAX_ROWS", 1200)
+    field_names, rows = db.query_ex("SELECT * FROM item ORDER BY id")
+    assert len(rows) == 1200
+    assert tuple(rows[-1]) == (1199, "name1199")
+    result = db.run("SELECT * FROM item")
+    assert result[0] == ("id", "name")
+    assert len(result) == 1201
+
+
+def test_query_max_bytes(db, monkeypatch):
+    # 8 bytes of id and 6 bytes of name
+    monkeypatch.setattr(CFG, "SQL_RESULT_MAX_BYTES", 14 * 10)
+    _, rows = db.query_ex("SELECT * FROM item WHERE id < 10")
+    assert len(rows) == 10
+    _, rows = db.query_ex("SELECT * FROM item ORDER BY id")
+    assert len(rows) == 10
+
+
+def test_query_page(db):
+    pages = []
+    offset = 0
+    while True:
+        page = db.query_page("SELECT * FROM item ORDER BY id", 1000, offset)
+        assert page.field_names == ["id", "name"]
+        pages.append(page)
+        offset += len(page.rows)
+        if not page.has_more:
+            break
+    assert [len(page.rows) for page in pages] == [1000, 1000, 500]
+    assert pages[1].rows[0] == (1000, "name1000")
+    page = db.query_page("SELECT * FROM item", 10, 2500)
+    assert page.rows == [] and not page.has_more
+
+
+def test_run_to_df(db, monkeypatch):
+    monkeypatch.setattr(CFG, "SQL_RESULT_MAX_ROWS", 100)
+    df = db.run_to_df("SELECT * FROM item ORDER BY id")
+    assert list(df.columns) == ["id", "name"]
+    assert len(df) == 100
+    assert df["name"].iloc[-1] == "name99"
+
+
+def test_duckdb_run_to_df(monkeypatch):
+    monkeypatch.setattr(CFG, "SQL_RESULT_MAX_ROWS", 100)
+    conn = DuckDbConnect.from_file_path(":memory:")
+    conn.session.execute(
+        text("CREATE TABLE item AS SELECT range AS id FROM range(1000)")
+    )
+    df = conn.run_to_df("SELECT * FROM item ORDER BY id;")
+    assert list(df.columns) == ["id"]
+    assert len(df) == 100
+    assert df["id"].iloc[-1] == 99
@@ -0,0 +1,60 @@
+"""
+Run unit test with command: pytest pilot/connections/rdbms/tests/test_schema_cache.py
+"""
+import os
+import tempfile
+
+import pytest
+from sqlalchemy import text
+
+from pilot.connections.rdbms.conn_sqlite import SQLiteConnect
+
+
+@pytest.fixture
+def db():
+    temp_db_file = tempfile.NamedTemporaryFile(delete=False)
+    temp_db_file.close()
+    conn = SQLiteConnect.from_file_path(temp_db_file.name)
+    with conn._engine.begin() as c:
+        c.execute(text("CREATE TABLE user (id INTEGER PRIMARY KEY, name TEXT)"))
+        c.execute(text("CREATE TABLE orders (id INTEGER PRIMARY KEY, amount REAL)"))
+    conn.refresh_schema()
+    yield conn
+    conn._engine.dispose()
+    os.unlink(temp_db_file.name)
+
+
+def test_tables_reflected_lazily(db):
+    assert set(db.get_table_names()) == {"user", "orders"}
+    assert db.schema_cache.reflected_tables == set()
+    table_info = db.get_table_info(["user"])
+    assert "CREATE TABLE user" in table_info
+    assert "CREATE TABLE orders" not in table_info
+    assert db.schema_cache.reflected_tables == {"user"}
+
+
+def test_schema_cache_shared(db):
+    other = SQLiteConnect(db._engine, schema_cache=db.schema_cache)
+    assert other._engine is db._engine
+    assert set(other.get_table_names()) == {"user", "orders"}
+    db.get_table_info(["orders"])
+    assert "orders" in other.schema_cache.reflected_tables
+    # The sessions are not shared
+    assert other.session is not db.session
+
+
+def test_ddl_refreshes_schema(db):
+    other = SQLiteConnect(db._engine, schema_cache=db.schema_cache)
+    db.get_table_info()
+    db.run_no_throw("CREATE TABLE item (id INTEGER PRIMARY KEY)")
+    assert "item" in set(other.get_table_names())
+    assert "CREATE TABLE item" in other.get_table_info(["item"])
+
+
+def test_schema_cache_expired(db):
+    assert not db.schema_cache.is_expired(300)
+    assert not db.schema_cache.is_expired(0)
+    db.schema_cache.refreshed_at -= 301
+    assert db.schema_cache.is_expired(300)
+    db.refresh_schema()
+    assert not db.schema_cache.is_expired(300)
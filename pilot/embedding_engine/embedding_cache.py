@@ -0,0 +1,291 @@
+"""Content-addressed cache of embedding vectors.
+
+The vectors are keyed by the hash of (model name, text), so re-syncing a document,
+summarizing the same db schema again or asking the same question does not compute the
+vectors again. The cache has two tiers:
+
+1. An in-memory LRU of float32 arrays.
+2. An optional on-disk tier in SQLite, the vectors are stored as float32 blobs.
+
+Use `CachedEmbeddings` to wrap any langchain `Embeddings` transparently.
+"""
+from __future__ import annotations
+
+import hashlib
+import logging
+import os
+import sqlite3
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+from langchain.embeddings.base import Embeddings
+
+logger = logging.getLogger(__name__)
+
+# Max number of host parameters in one sqlite statement
+_SQLITE_MAX_VARIABLES = 500
+
+
+def embedding_cache_key(model_name: str, text: str, namespace: str = "doc") -> str:
+    """The key of a text embedded by a model.
+
+    Some models embed queries differently (e.g. with an instruction), so the query and
+    document vectors are cached in different namespaces.
+    """
+    content = f"{model_name}\0{namespace}\0{text}".encode("utf-8")
+    return hashlib.sha256(content).hexdigest()
+
+
+class _MemoryTier:
+    def __init__(self, max_entries: int) -> None:
+        self.max_entries = max_entries
+        self._data: "OrderedDict[str, np.ndarray]" = OrderedDict()
+
+    def get_many(self, keys: Sequence[str]) -> List[Optional[np.ndarray]]:
+        results = []
+        for key in keys:
+            vector = self._data.get(key)
+            if vector is not None:
+                self._data.move_to_end(key)
+            results.append(vector)
+        return results
+
+    def put_many(self, items: Dict[str, np.ndarray]) -> None:
+        if self.max_entries <= 0:
+            return
+        for key, vector in items.items():
+            self._data[key] = vector
+            self._data.move_to_end(key)
+        while len(self._data) > self.max_entries:
+            self._data.popitem(last=False)
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+
+class _SQLiteTier:
+    def __init__(self, path: str) -> None:
+        dirname = os.path.dirname(path)
+        if dirname:
+            os.makedirs(dirname, exist_ok=True)
+        self.path = path
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS embedding_cache "
+            "(cache_key TEXT PRIMARY KEY, dim INTEGER NOT NULL, vector BLOB NOT NULL)"
+        )
+        self._conn.commit()
+
+    def get_many(self, keys: Sequence[str]) -> List[Optional[np.ndarray]]:
+        found: Dict[str, np.ndarray] = {}
+        for i in range(0, len(keys), _SQLITE_MAX_VARIABLES):
+            chunk = keys[i : i + _SQLITE_MAX_VARIABLES]
+            placeholders = ",".join("?" * len(chunk))
+            rows = self._conn.execute(
+                f"SELECT cache_key, dim, vector FROM embedding_cache WHERE cache_key IN ({placeholders})",
+                list(chunk),
+            ).fetchall()
+            for key, dim, blob in rows:
+                vector = np.frombuffer(blob, dtype=np.float32)
+                if vector.shape[0] == dim:
+                    found[key] = vector
+        return [found.get(key) for key in keys]
+
+    def put_many(self, items: Dict[str, np.ndarray]) -> None:
+        self._conn.executemany(
+            "INSERT OR REPLACE INTO embedding_cache (cache_key, dim, vector) VALUES (?, ?, ?)",
+            [
+                (key, vector.shape[0], vector.astype(np.float32).tobytes())
+                for key, vector in items.items()
+            ],
+        )
+        self._conn.commit()
+
+    def close(self) -> None:
+        self._conn.close()
+
+
+class EmbeddingCache:
+    """Two tier cache of embedding vectors.
+
+    Args:
+        max_memory_entries (int): Max number of vectors in the in-memory LRU tier.
+        disk_path (Optional[str]): The SQLite file of the on-disk tier, no disk tier
+            if None.
+    """
+
+    def __init__(
+        self, max_memory_entries: int = 10000, disk_path: Optional[str] = None
+    ) -> None:
+        self._memory = _MemoryTier(max_memory_entries)
+        self._disk = _SQLiteTier(disk_path) if disk_path else None
+        self._lock = threading.Lock()
+        self._memory_hits = 0
+        self._disk_hits = 0
+        self._misses = 0
+
+    def get_many(self, keys: Sequence[str]) -> List[Optional[np.ndarray]]:
+        """Look up the vectors of keys, None for the missed keys"""
+        with self._lock:
+            results = self._memory.get_many(keys)
+            missed = [i for i, vector in enumerate(results) if vector is None]
+            self._memory_hits += len(keys) - len(missed)
+            if missed and self._disk:
+                disk_results = self._disk.get_many([keys[i] for i in missed])
+                promoted = {}
+                for i, vector in zip(missed, disk_results):
+                    if vector is not None:
+                        results[i] = vector
+                        promoted[keys[i]] = vector
+                self._disk_hits += len(promoted)
+                self._memory.put_many(promoted)
+                self._misses += len(missed) - len(promoted)
+            else:
+                self._misses += len(missed)
+            return results
+
+    def put_many(self, items: Dict[str, np.ndarray]) -> None:
+        if not items:
+            return
+        with self._lock:
+            self._memory.put_many(items)
+            if self._disk:
+                self._disk.put_many(items)
+
+    def stats(self) -> Dict:
+        with self._lock:
+            lookups = self._memory_hits + self._disk_hits + self._misses
+            hits = self._memory_hits + self._disk_hits
+            return {
+                "memory_hits": self._memory_hits,
+                "disk_hits": self._disk_hits,
+                "misses": self._misses,
+                "hit_rate": hits / lookups if lookups else 0,
+                "memory_entries": len(self._memory),
+                "disk_path": self._disk.path if self._disk else None,
+            }
+
+
+class CachedEmbeddings(Embeddings):
+    """Wrap an `Embeddings`, only the texts missed in cache are embedded.
+
+    The missed texts of a call are deduplicated and embedded in one
+    `embed_documents` call.
+    """
+
+    def __init__(
+        self, model_name: str, embeddings: Embeddings, cache: EmbeddingCache
+    ) -> None:
+        self.model_name = model_name
+        self.embeddings = embeddings
+        self.cache = cache
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        keys = [embedding_cache_key(self.model_name, text) for text in texts]
+        cached = self.cache.get_many(keys)
+        missed = self._missed_texts(keys, texts, cached)
+        if missed:
+            vectors = self.embeddings.embed_documents(list(missed.values()))
+            self._fill(keys, cached, missed, vectors)
+        return _to_lists(cached)
+
+    def embed_query(self, text: str) -> List[float]:
+        key = embedding_cache_key(self.model_name, text, namespace="query")
+        vector = self.cache.get_many([key])[0]
+        if vector is None:
+            vector = np.asarray(self.embeddings.embed_query(text), dtype=np.float32)
+            self.cache.put_many({key: vector})
+        return vector.tolist()
+
+    async def aembed_documents(self, texts: List[str]) -> List[List[float]]:
+        keys = [embedding_cache_key(self.model_name, text) for text in texts]
+        cached = self.cache.get_many(keys)
+        missed = self._missed_texts(keys, texts, cached)
+        if missed:
+            vectors = await self.embeddings.aembed_documents(list(missed.values()))
+            self._fill(keys, cached, missed, vectors)
+        return _to_lists(cached)
+
+    async def aembed_query(self, text: str) -> List[float]:
+        key = embedding_cache_key(self.model_name, text, namespace="query")
+        vector = self.cache.get_many([key])[0]
+        if vector is None:
+            vector = np.asarray(
+                await self.embeddings.aembed_query(text), dtype=np.float32
+            )
+            self.cache.put_many({key: vector})
+        return vector.tolist()
+
+    @staticmethod
+    def _missed_texts(
+        keys: List[str], texts: List[str], cached: List[Optional[np.ndarray]]
+    ) -> Dict[str, str]:
+        missed: Dict[str, str] = {}
+        for key, text, vector in zip(keys, texts, cached):
+            if vector is None and key not in missed:
+                missed[key] = text
+        return missed
+
+    def _fill(
+        self,
+        keys: List[str],
+        cached: List[Optional[np.ndarray]],
+        missed: Dict[str, str],
+        vectors: List[List[float]],
+    ) -> None:
+        array = np.asarray(vectors, dtype=np.float32)
+        new_items = dict(zip(missed.keys(), array))
+        self.cache.put_many(new_items)
+        for i, key in enumerate(keys):
+            if cached[i] is None:
+                cached[i] = new_items[key]
+
+
+def _to_lists(vectors: List[np.ndarray]) -> List[List[float]]:
+    if not vectors:
+        return []
+    return np.stack(vectors).tolist()
+
+
+_embedding_cache: Optional[EmbeddingCache] = None
+_embedding_cache_lock = threading.Lock()
+
+
+def get_embedding_cache() -> Optional[EmbeddingCache]:
+    """The process-wide embedding cache configured by the EMBEDDING_CACHE_* settings,
+    None if the cache is disabled."""
+    global _embedding_cache
+    from pilot.configs.config import Config
+
+    cfg = Config()
+    if not cfg.EMBEDDING_CACHE_ENABLED:
+        return None
+    with _embedding_cache_lock:
+        if _embedding_cache is None:
+            disk_path = cfg.EMBEDDING_CACHE_DISK_PATH or None
+            try:
+                _embedding_cache = EmbeddingCache(
+                    max_memory_entries=cfg.EMBEDDING_CACHE_MEMORY_ENTRIES,
+                    disk_path=disk_path,
+                )
+            except sqlite3.Error as e:
+                logger.warning(
+                    f"Open embedding cache {disk_path} error, only cache in memory: {e}"
+                )
+                _embedding_cache = EmbeddingCache(
+                    max_memory_entries=cfg.EMBEDDING_CACHE_MEMORY_ENTRIES
+                )
+        return _embedding_cache
+
+
+def wrap_embeddings_with_cache(model_name: str, embeddings: Embeddings) -> Embeddings:
+    """Wrap the embeddings with the process-wide cache if it is enabled"""
+    if embeddings is None or isinstance(embeddings, CachedEmbeddings):
+        return embeddings
+    cache = get_embedding_cache()
+    if not cache or not model_name:
+        return embeddings
+    return CachedEmbeddings(model_name, embeddings, cache)
@@ -7,6 +7,7 @@ from pilot.embedding_engine.embedding_factory import (
     DefaultEmbeddingFactory,
 )
 from pilot.embedding_engine.knowledge_type import get_knowledge_embedding, KnowledgeType
+from pilot.embedding_engine.lexical_index import delete_chunks
 from pilot.vector_store.connector import VectorStoreConnector
 
 
@@ -104,3 +105,4 @@ class EmbeddingEngine:
             self.vector_store_config["vector_store_type"], self.vector_store_config
         )
         vector_client.delete_by_ids(ids=ids)
+        delete_chunks(self.vector_store_config["vector_store_name"], ids)
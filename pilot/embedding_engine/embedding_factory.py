@@ -1,8 +1,10 @@
 from __future__ import annotations
+import threading
 from abc import ABC, abstractmethod
-from typing import Any, Type, TYPE_CHECKING
+from typing import Any, Dict, Tuple, Type, TYPE_CHECKING
 
 from pilot.component import BaseComponent
+from pilot.embedding_engine.embedding_cache import wrap_embeddings_with_cache
 
 if TYPE_CHECKING:
     from langchain.embeddings.base import Embeddings
@@ -18,6 +20,11 @@ class EmbeddingFactory(BaseComponent, ABC):
         """Create embedding"""
 
 
+# Loading a model is slow, the embeddings are shared by all DefaultEmbeddingFactory
+_default_embeddings: Dict[Tuple, "Embeddings"] = {}
+_default_embeddings_lock = threading.Lock()
+
+
 class DefaultEmbeddingFactory(EmbeddingFactory):
     def __init__(
         self, system_app=None, default_model_name: str = None, **kwargs: Any
@@ -38,9 +45,16 @@ class DefaultEmbeddingFactory(EmbeddingFactory):
         new_kwargs = {k: v for k, v in self.kwargs.items()}
         new_kwargs["model_name"] = model_name
 
-        if embedding_cls:
-            return embedding_cls(**new_kwargs)
-        else:
-            from langchain.embeddings import HuggingFaceEmbeddings
-
-            return HuggingFaceEmbeddings(**new_kwargs)
+        key = (model_name, embedding_cls, repr(sorted(self.kwargs.items())))
+        with _default_embeddings_lock:
+            embeddings = _default_embeddings.get(key)
+            if embeddings is None:
+                if embedding_cls:
+                    embeddings = embedding_cls(**new_kwargs)
+                else:
+                    from langchain.embeddings import HuggingFaceEmbeddings
+
+                    embeddings = HuggingFaceEmbeddings(**new_kwargs)
+                embeddings = wrap_embeddings_with_cache(model_name, embeddings)
+                _default_embeddings[key] = embeddings
+            return embeddings
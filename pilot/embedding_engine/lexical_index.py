@@ -0,0 +1,199 @@
+"""BM25 inverted index of the chunks of a knowledge space.
+
+The chunks are indexed when they are written into the vector store, so the retrieval
+can also find the chunks which share the rare words of the question (table names,
+error codes, product names) but are not close to it in the embedding space. The index
+is a SQLite FTS5 table of a vector store, ranked with the builtin bm25 function.
+
+The texts are tokenized before they are indexed: latin words are lowercased and the
+runs of CJK characters are split into bigrams, the FTS5 tokenizer does not split them.
+"""
+from __future__ import annotations
+
+import json
+import logging
+import os
+import re
+import sqlite3
+import threading
+import uuid
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from pilot.configs.config import Config
+
+logger = logging.getLogger(__name__)
+CFG = Config()
+
+_CJK_PATTERN = r"\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uac00-\ud7af"
+_TOKEN_RE = re.compile(rf"[{_CJK_PATTERN}]+|[^\W_{_CJK_PATTERN}]+")
+_CJK_RE = re.compile(f"[{_CJK_PATTERN}]")
+
+
+def tokenize(text: str) -> List[str]:
+    """The lexical tokens of the text"""
+    tokens = []
+    for match in _TOKEN_RE.finditer(text.lower()):
+        word = match.group()
+        if _CJK_RE.match(word):
+            if len(word) == 1:
+                tokens.append(word)
+            else:
+                tokens.extend(word[i : i + 2] for i in range(len(word) - 1))
+        else:
+            tokens.append(word)
+    return tokens
+
+
+class LexicalIndex:
+    """BM25 index of the chunks of a vector store.
+
+    Args:
+        path: The SQLite file of the index.
+    """
+
+    def __init__(self, path: str) -> None:
+        dirname = os.path.dirname(path)
+        if dirname:
+            os.makedirs(dirname, exist_ok=True)
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE VIRTUAL TABLE IF NOT EXISTS chunks USING fts5("
+            "tokens, chunk_id UNINDEXED, content UNINDEXED, metadata UNINDEXED)"
+        )
+        self._conn.commit()
+
+    def add(
+        self,
+        chunk_ids: Sequence[str],
+        texts: Sequence[str],
+        metadatas: Sequence[Optional[Dict]],
+    ) -> None:
+        """Add the chunks, the chunks of the same ids are replaced"""
+        rows = {
+            str(chunk_id): (
+                " ".join(tokenize(text)),
+                str(chunk_id),
+                text,
+                json.dumps(metadata or {}, ensure_ascii=False, default=str),
+            )
+            for chunk_id, text, metadata in zip(chunk_ids, texts, metadatas)
+        }
+        with self._lock:
+            self._delete(list(rows))
+            self._conn.executemany(
+                "INSERT INTO chunks(tokens, chunk_id, content, metadata) VALUES (?, ?, ?, ?)",
+                list(rows.values()),
+            )
+            self._conn.commit()
+
+    def delete(self, chunk_ids: Sequence[str]) -> None:
+        with self._lock:
+            self._delete([str(chunk_id) for chunk_id in chunk_ids])
+            self._conn.commit()
+
+    def _delete(self, chunk_ids: List[str]) -> None:
+        for i in range(0, len(chunk_ids), 500):
+            chunk = chunk_ids[i : i + 500]
+            self._conn.execute(
+                f"DELETE FROM chunks WHERE chunk_id IN ({','.join('?' * len(chunk))})",
+                chunk,
+            )
+
+    def search(self, query: str, topk: int) -> List[Tuple[str, str, Dict, float]]:
+        """The (chunk_id, content, metadata, bm25 score) of the best matched chunks,
+        higher score is better"""
+        tokens = list(dict.fromkeys(tokenize(query)))
+        if not tokens or topk <= 0:
+            return []
+        # Quote the tokens, they are not FTS5 query syntax
+        match = " OR ".join('"' + token.replace('"', '""') + '"' for token in tokens)
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT chunk_id, content, metadata, bm25(chunks) FROM chunks "
+                "WHERE chunks MATCH ? ORDER BY bm25(chunks) LIMIT ?",
+                [match, topk],
+            ).fetchall()
+        # bm25() is lower for better matches
+        return [
+            (chunk_id, content, json.loads(metadata or "{}"), -score)
+            for chunk_id, content, metadata, score in rows
+        ]
+
+    def count(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT count(*) FROM chunks").fetchone()[0]
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+_indexes: Dict[str, LexicalIndex] = {}
+_indexes_lock = threading.Lock()
+
+
+def _index_path(vector_store_name: str) -> str:
+    index_dir = CFG.KNOWLEDGE_LEXICAL_INDEX_PATH
+    if not index_dir:
+        from pilot.configs.model_config import DATA_DIR
+
+        index_dir = os.path.join(DATA_DIR, "lexical_index")
+    return os.path.join(index_dir, f"{vector_store_name}.db")
+
+
+def get_lexical_index(
+    vector_store_name: str, create: bool = True
+) -> Optional[LexicalIndex]:
+    """The process-wide lexical index of a vector store, None if it does not exist and
+    create is False"""
+    path = _index_path(vector_store_name)
+    with _indexes_lock:
+        index = _indexes.get(path)
+        if index is None:
+            if not create and not os.path.exists(path):
+                return None
+            index = LexicalIndex(path)
+            _indexes[path] = index
+        return index
+
+
+def drop_lexical_index(vector_store_name: str) -> None:
+    """Delete the lexical index of a deleted vector store"""
+    path = _index_path(vector_store_name)
+    with _indexes_lock:
+        index = _indexes.pop(path, None)
+        if index is not None:
+            index.close()
+        for suffix in ("", "-wal", "-shm"):
+            if os.path.exists(path + suffix):
+                os.remove(path + suffix)
+
+
+def index_chunks(vector_store_name: str, chunk_ids, docs: List) -> None:
+    """Add the chunks written into the vector store to its lexical index, the chunk ids
+    are the ids returned by the vector store"""
+    if not docs:
+        return
+    if not isinstance(chunk_ids, list) or len(chunk_ids) != len(docs):
+        # The store does not return the ids, the chunks can't be deleted by ids
+        chunk_ids = [uuid.uuid4().hex for _ in docs]
+    try:
+        get_lexical_index(vector_store_name).add(
+            chunk_ids,
+            [doc.page_content for doc in docs],
+            [doc.metadata for doc in docs],
+        )
+    except Exception as e:
+        logger.warning(f"Lexical index of {vector_store_name} error: {str(e)}")
+
+
+def delete_chunks(vector_store_name: str, chunk_ids) -> None:
+    """Delete the chunks deleted from the vector store from its lexical index"""
+    if isinstance(chunk_ids, str):
+        chunk_ids = chunk_ids.split(",")
+    index = get_lexical_index(vector_store_name, create=False)
+    if index is not None:
+        index.delete(chunk_ids)
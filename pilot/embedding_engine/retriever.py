@@ -0,0 +1,161 @@
+"""Retrieval of the knowledge chunks for a question.
+
+    vector search (score threshold) + BM25 search -> reciprocal rank fusion -> rerank
+
+The vector search drops the chunks whose relevance score is lower than the threshold,
+so the unrelated chunks don't pad the prompt. The lexical search finds the chunks which
+share the rare words of the question. The two rankings are fused with the reciprocal
+rank, and a local cross-encoder can rerank the fused chunks.
+"""
+from __future__ import annotations
+
+import logging
+import threading
+from typing import Dict, List, Optional, Tuple, TYPE_CHECKING
+
+from pilot.configs.config import Config
+from pilot.embedding_engine.lexical_index import get_lexical_index
+from pilot.vector_store.connector import VectorStoreConnector
+
+if TYPE_CHECKING:
+    from langchain.schema import Document
+
+logger = logging.getLogger(__name__)
+CFG = Config()
+
+# The constant of reciprocal rank fusion, a larger one flattens the ranks
+_RRF_K = 60
+# The lexical matches scored lower than this ratio of the best match are dropped, most
+# of them only share the common words of the question
+_LEXICAL_MIN_SCORE_RATIO = 0.5
+
+
+class CrossEncoderReranker:
+    """Rerank the chunks with a local cross-encoder of sentence-transformers"""
+
+    def __init__(self, model_name_or_path: str) -> None:
+        try:
+            from sentence_transformers import CrossEncoder
+        except ImportError:
+            raise ValueError(
+                "Could not import sentence_transformers python package. "
+                "Please install it with `pip install sentence-transformers`."
+            )
+        self.model = CrossEncoder(model_name_or_path)
+
+    def rerank(self, query: str, texts: List[str]) -> List[float]:
+        if not texts:
+            return []
+        return [float(s) for s in self.model.predict([(query, t) for t in texts])]
+
+
+_rerankers: Dict[str, CrossEncoderReranker] = {}
+_rerankers_lock = threading.Lock()
+
+
+def get_reranker(model_name_or_path: str) -> CrossEncoderReranker:
+    """The process-wide reranker of the model, the model is loaded once"""
+    with _rerankers_lock:
+        reranker = _rerankers.get(model_name_or_path)
+        if reranker is None:
+            reranker = CrossEncoderReranker(model_name_or_path)
+            _rerankers[model_name_or_path] = reranker
+        return reranker
+
+
+def reciprocal_rank_fusion(
+    rankings: List[List[str]], k: int = _RRF_K
+) -> List[Tuple[str, float]]:
+    """Fuse the rankings of keys, a key ranked high by more rankings is better.
+    Return the (key, fused score) pairs, the best first"""
+    scores: Dict[str, float] = {}
+    for ranking in rankings:
+        for rank, key in enumerate(ranking):
+            scores[key] = scores.get(key, 0.0) + 1.0 / (k + rank + 1)
+    return sorted(scores.items(), key=lambda item: item[1], reverse=True)
+
+
+class KnowledgeRetriever:
+    """Retrieve the chunks of a vector store for a question.
+
+    Args:
+        vector_store_config: The config of the vector store with the embeddings.
+        top_k: Max number of the retrieved chunks.
+        score_threshold: The vector search drops the chunks with lower relevance
+            score, 0 to keep all chunks.
+        hybrid: Fuse the vector search with the BM25 search of the chunks.
+        rerank_model: The name or path of a cross-encoder model to rerank the chunks.
+    """
+
+    def __init__(
+        self,
+        vector_store_config: Dict,
+        top_k: int,
+        score_threshold: float = 0.0,
+        hybrid: bool = True,
+        rerank_model: Optional[str] = None,
+    ) -> None:
+        self.vector_store_config = vector_store_config
+        self.top_k = top_k
+        self.score_threshold = score_threshold
+        self.hybrid = hybrid
+        self.rerank_model = rerank_model
+
+    def retrieve(self, query: str) -> List["Document"]:
+        """The retrieved chunks, the best first"""
+        return [doc for doc, _ in self.retrieve_with_scores(query)]
+
+    def retrieve_with_scores(self, query: str) -> List[Tuple["Document", float]]:
+        """The retrieved chunks with the fused (or rerank) scores, the best first"""
+        # Fetch more candidates when the chunks are fused or reranked
+        num_candidates = (
+            self.top_k * 2 if self.hybrid or self.rerank_model else self.top_k
+        )
+        docs: Dict[str, "Document"] = {}
+        vector_ranking = []
+        for doc, _ in self._vector_search(query, num_candidates):
+            if doc.page_content not in docs:
+                docs[doc.page_content] = doc
+                vector_ranking.append(doc.page_content)
+        rankings = [vector_ranking]
+        if self.hybrid:
+            lexical_ranking = []
+            for doc in self._lexical_search(query, num_candidates):
+                docs.setdefault(doc.page_content, doc)
+                lexical_ranking.append(doc.page_content)
+            rankings.append(lexical_ranking)
+
+        fused = reciprocal_rank_fusion(rankings)
+        if self.rerank_model and fused:
+            keys = [key for key, _ in fused]
+            rerank_scores = get_reranker(self.rerank_model).rerank(query, keys)
+            fused = sorted(zip(keys, rerank_scores), key=lambda x: x[1], reverse=True)
+        return [(docs[key], score) for key, score in fused[: self.top_k]]
+
+    def _vector_search(self, query: str, topk: int) -> List[Tuple["Document", float]]:
+        vector_client = VectorStoreConnector(
+            self.vector_store_config["vector_store_type"], self.vector_store_config
+        )
+        return vector_client.similar_search_with_scores(
+            query, topk, self.score_threshold
+        )
+
+    def _lexical_search(self, query: str, topk: int) -> List["Document"]:
+        from langchain.schema import Document
+
+        try:
+            index = get_lexical_index(
+                self.vector_store_config["vector_store_name"], create=False
+            )
+            matches = index.search(query, topk) if index else []
+        except Exception as e:
+            logger.warning(f"Lexical search error, only use vector search: {str(e)}")
+            return []
+        if not matches:
+            return []
+        min_score = matches[0][3] * _LEXICAL_MIN_SCORE_RATIO
+        return [
+            Document(page_content=content, metadata=metadata)
+            for _, content, metadata, score in matches
+            if score >= min_score
+        ]
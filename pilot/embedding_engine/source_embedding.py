@@ -5,8 +5,12 @@ from typing import Dict, List, Optional
 
 from langchain.text_splitter import TextSplitter
 
+from pilot.configs.config import Config
+from pilot.embedding_engine.lexical_index import index_chunks
 from pilot.vector_store.connector import VectorStoreConnector
 
+CFG = Config()
+
 registered_methods = []
 
 
@@ -81,7 +85,10 @@ class SourceEmbedding(ABC):
         self.vector_client = VectorStoreConnector(
             self.vector_store_config["vector_store_type"], self.vector_store_config
         )
-        return self.vector_client.load_document(docs)
+        ids = self.vector_client.load_document(docs)
+        if CFG.KNOWLEDGE_SEARCH_HYBRID:
+            index_chunks(self.vector_store_config["vector_store_name"], ids, docs)
+        return ids
 
     @register
     def similar_search(self, doc, topk):
@@ -1 +1,5 @@
-from .chat_history.chat_history_db import ChatHistoryEntity, ChatHistoryDao
+from .chat_history.chat_history_db import (
+    ChatHistoryEntity,
+    ChatHistoryMessageEntity,
+    ChatHistoryDao,
+)
@@ -1,7 +1,8 @@
 from __future__ import annotations
 
+import json
 from abc import ABC, abstractmethod
-from typing import List
+from typing import Dict, Iterable, List, Optional, Tuple
 from enum import Enum
 from pilot.scene.message import OnceConversation
 
@@ -56,6 +57,51 @@ class BaseChatHistoryMemory(ABC):
     def get_messages(self) -> List[OnceConversation]:
         pass
 
+    def count_rounds(self) -> int:
+        """The number of rounds of the conversation"""
+        return len(self.messages())
+
+    def select_rounds(self, head: int = 0, tail: Optional[int] = None) -> List[Dict]:
+        """The first `head` rounds and the last `tail` rounds (all rounds if None) of
+        the conversation.
+
+        The stores which save every message in a row only load the selected rounds.
+        """
+        rounds = self.messages()
+        if tail is None or head + tail >= len(rounds):
+            return list(rounds)
+        return rounds[:head] + rounds[len(rounds) - tail :]
+
     @staticmethod
     def conv_list(cls, user_name: str = None) -> None:
         pass
+
+    @staticmethod
+    def migrate() -> int:
+        """Migrate the conversations saved in the old format, return the number of
+        the migrated conversations"""
+        return 0
+
+
+def _round_to_rows(once: Dict) -> Tuple[str, List[Tuple[int, str, str]]]:
+    """Split a round of conversation to its detail and message rows of
+    (message_index, message_type, message_detail)"""
+    round_detail = {k: v for k, v in once.items() if k != "messages"}
+    rows = [
+        (index, message["type"], json.dumps(message, ensure_ascii=False))
+        for index, message in enumerate(once.get("messages", []))
+    ]
+    return json.dumps(round_detail, ensure_ascii=False), rows
+
+
+def _rows_to_rounds(rows: Iterable[Tuple[int, str, str]]) -> List[Dict]:
+    """Rebuild the rounds of conversation from the rows of (round_index,
+    round_detail, message_detail) ordered by round and message index"""
+    rounds = []
+    last_round_index = None
+    for round_index, round_detail, message_detail in rows:
+        if round_index != last_round_index:
+            rounds.append({**json.loads(round_detail), "messages": []})
+            last_round_index = round_index
+        rounds[-1]["messages"].append(json.loads(message_detail))
+    return rounds
@@ -1,8 +1,16 @@
+import json
+import threading
 from pilot.base_modules.meta_data.base_dao import BaseDao
 from pilot.base_modules.meta_data.meta_data import Base, engine, session
-from typing import List
+from typing import Dict, List, Optional
 from sqlalchemy import Column, Integer, String, Index, DateTime, func, Boolean, Text
 from sqlalchemy import UniqueConstraint
+from sqlalchemy.orm import defer
+
+from pilot.memory.chat_history.base import _round_to_rows, _rows_to_rounds
+
+# Only one thread moves the rounds of a conversation from the old format
+_migrate_lock = threading.Lock()
 
 
 class ChatHistoryEntity(Base):
@@ -23,7 +31,15 @@ class ChatHistoryEntity(Base):
     chat_mode = Column(String(255), nullable=False, comment="Conversation scene mode")
     summary = Column(String(255), nullable=False, comment="Conversation record summary")
     user_name = Column(String(255), nullable=True, comment="interlocutor")
-    messages = Column(Text, nullable=True, comment="Conversation details")
+    messages = Column(
+        Text,
+        nullable=True,
+        comment="Conversation details of the old format, moved to chat_history_message",
+    )
+    model_name = Column(String(255), nullable=True, comment="Model of the last round")
+    select_param = Column(
+        String(255), nullable=True, comment="Select param of the last round"
+    )
 
     UniqueConstraint("conv_uid", name="uk_conversation")
     Index("idx_q_user", "user_name")
@@ -31,6 +47,38 @@ class ChatHistoryEntity(Base):
     Index("idx_q_conv", "summary")
 
 
+class ChatHistoryMessageEntity(Base):
+    """A message of conversation, the rounds are appended without reading the
+    previous rounds"""
+
+    __tablename__ = "chat_history_message"
+    id = Column(
+        Integer, primary_key=True, autoincrement=True, comment="autoincrement id"
+    )
+    conv_uid = Column(
+        String(255), nullable=False, comment="Conversation record unique id"
+    )
+    round_index = Column(Integer, nullable=False, comment="Round of the conversation")
+    message_index = Column(Integer, nullable=False, comment="Message of the round")
+    message_type = Column(String(64), nullable=False, comment="Message type")
+    round_detail = Column(
+        Text, nullable=False, comment="Round details except the messages"
+    )
+    message_detail = Column(Text, nullable=False, comment="Message details")
+    __table_args__ = (
+        UniqueConstraint(
+            "conv_uid",
+            "round_index",
+            "message_index",
+            name="uk_conversation_message",
+        ),
+        {
+            "mysql_charset": "utf8mb4",
+            "mysql_collate": "utf8mb4_unicode_ci",
+        },
+    )
+
+
 class ChatHistoryDao(BaseDao[ChatHistoryEntity]):
     def __init__(self):
         super().__init__(
@@ -38,8 +86,21 @@ class ChatHistoryDao(BaseDao[ChatHistoryEntity]):
         )
 
     def list_last_20(self, user_name: str = None):
+        """The last 20 conversations, the messages are not loaded"""
+        result = self._list_last_20(user_name)
+        legacy_uids = self._legacy_conv_uids([history.id for history in result])
+        if legacy_uids:
+            # Fill the columns of the last round
+            for conv_uid in legacy_uids:
+                self.migrate_legacy_messages(conv_uid)
+            result = self._list_last_20(user_name)
+        return result
+
+    def _list_last_20(self, user_name: str = None):
         session = self.get_session()
-        chat_history = session.query(ChatHistoryEntity)
+        chat_history = session.query(ChatHistoryEntity).options(
+            defer(ChatHistoryEntity.messages)
+        )
         if user_name:
             chat_history = chat_history.filter(ChatHistoryEntity.user_name == user_name)
 
@@ -49,26 +110,33 @@ class ChatHistoryDao(BaseDao[ChatHistoryEntity]):
         session.close()
         return result
 
-    def update(self, entity: ChatHistoryEntity):
+    def _legacy_conv_uids(self, ids: Optional[List[int]] = None) -> List[str]:
+        """The conversations whose rounds are still in the old format"""
         session = self.get_session()
         try:
-            updated = session.merge(entity)
-            session.commit()
-            return updated.id
+            query = session.query(ChatHistoryEntity.conv_uid).filter(
+                ChatHistoryEntity.messages.isnot(None),
+                ChatHistoryEntity.messages != "",
+            )
+            if ids is not None:
+                query = query.filter(ChatHistoryEntity.id.in_(ids))
+            return [row[0] for row in query.all()]
         finally:
             session.close()
 
-    def update_message_by_uid(self, message: str, conv_uid: str):
+    def update(self, entity: ChatHistoryEntity):
         session = self.get_session()
         try:
-            chat_history = session.query(ChatHistoryEntity)
-            chat_history = chat_history.filter(ChatHistoryEntity.conv_uid == conv_uid)
-            updated = chat_history.update({ChatHistoryEntity.messages: message})
+            updated = session.merge(entity)
             session.commit()
             return updated.id
         finally:
             session.close()
 
+    def update_message_by_uid(self, message: str, conv_uid: str):
+        """Replace all rounds of the conversation with the json list of rounds"""
+        self.replace_rounds(conv_uid, json.loads(message))
+
     def delete(self, conv_uid: int):
         session = self.get_session()
         if conv_uid is None:
@@ -77,13 +145,194 @@ class ChatHistoryDao(BaseDao[ChatHistoryEntity]):
         chat_history = session.query(ChatHistoryEntity)
         chat_history = chat_history.filter(ChatHistoryEntity.conv_uid == conv_uid)
         chat_history.delete()
+        session.query(ChatHistoryMessageEntity).filter(
+            ChatHistoryMessageEntity.conv_uid == conv_uid
+        ).delete()
         session.commit()
         session.close()
 
     def get_by_uid(self, conv_uid: str) -> ChatHistoryEntity:
+        """The conversation without messages"""
         session = self.get_session()
-        chat_history = session.query(ChatHistoryEntity)
+        chat_history = session.query(ChatHistoryEntity).options(
+            defer(ChatHistoryEntity.messages)
+        )
         chat_history = chat_history.filter(ChatHistoryEntity.conv_uid == conv_uid)
         result = chat_history.first()
         session.close()
         return result
+
+    def append_round(
+        self,
+        conv_uid: str,
+        once: Dict,
+        summary: str,
+        user_name: str = "default",
+    ) -> None:
+        """Insert the messages of a round, the conversation is created if it does
+        not exist"""
+        self.migrate_legacy_messages(conv_uid)
+        session = self.get_session()
+        try:
+            chat_history = (
+                session.query(ChatHistoryEntity)
+                .options(defer(ChatHistoryEntity.messages))
+                .filter(ChatHistoryEntity.conv_uid == conv_uid)
+                .first()
+            )
+            if not chat_history:
+                chat_history = ChatHistoryEntity(
+                    conv_uid=conv_uid,
+                    chat_mode=once.get("chat_mode"),
+                    user_name=user_name,
+                    summary=summary,
+                )
+                session.add(chat_history)
+            elif not chat_history.summary:
+                chat_history.summary = summary
+            self._add_rounds(
+                session, conv_uid, [once], self._count_rounds(session, conv_uid)
+            )
+            self._update_last_round(chat_history, once)
+            session.commit()
+        finally:
+            session.close()
+
+    def replace_rounds(self, conv_uid: str, rounds: List[Dict]) -> None:
+        self.migrate_legacy_messages(conv_uid)
+        session = self.get_session()
+        try:
+            session.query(ChatHistoryMessageEntity).filter(
+                ChatHistoryMessageEntity.conv_uid == conv_uid
+            ).delete()
+            self._add_rounds(session, conv_uid, rounds, 0)
+            chat_history = (
+                session.query(ChatHistoryEntity)
+                .options(defer(ChatHistoryEntity.messages))
+                .filter(ChatHistoryEntity.conv_uid == conv_uid)
+                .first()
+            )
+            if chat_history and rounds:
+                self._update_last_round(chat_history, rounds[-1])
+            session.commit()
+        finally:
+            session.close()
+
+    def count_rounds(self, conv_uid: str) -> int:
+        self.migrate_legacy_messages(conv_uid)
+        session = self.get_session()
+        try:
+            return self._count_rounds(session, conv_uid)
+        finally:
+            session.close()
+
+    def get_rounds(
+        self, conv_uid: str, head: int = 0, tail: Optional[int] = None
+    ) -> List[Dict]:
+        """The first `head` rounds and the last `tail` rounds (all rounds if None)"""
+        self.migrate_legacy_messages(conv_uid)
+        session = self.get_session()
+        try:
+            query = session.query(
+                ChatHistoryMessageEntity.round_index,
+                ChatHistoryMessageEntity.round_detail,
+                ChatHistoryMessageEntity.message_detail,
+            ).filter(ChatHistoryMessageEntity.conv_uid == conv_uid)
+            if tail is not None:
+                tail_start = max(self._count_rounds(session, conv_uid) - tail, head)
+                query = query.filter(
+                    (ChatHistoryMessageEntity.round_index < head)
+                    | (ChatHistoryMessageEntity.round_index >= tail_start)
+                )
+            rows = query.order_by(
+                ChatHistoryMessageEntity.round_index,
+                ChatHistoryMessageEntity.message_index,
+            ).all()
+            return _rows_to_rounds(rows)
+        finally:
+            session.close()
+
+    def migrate_legacy_messages(self, conv_uid: str) -> bool:
+        """Move the rounds of the old format (a json list in chat_history.messages)
+        to chat_history_message, return True if the conversation is migrated"""
+        if not self._is_legacy(conv_uid):
+            return False
+        with _migrate_lock:
+            session = self.get_session()
+            try:
+                chat_history = (
+                    session.query(ChatHistoryEntity)
+                    .filter(ChatHistoryEntity.conv_uid == conv_uid)
+                    .first()
+                )
+                if not chat_history or not chat_history.messages:
+                    # Migrated by another thread
+                    return False
+                rounds = json.loads(chat_history.messages)
+                self._add_rounds(
+                    session, conv_uid, rounds, self._count_rounds(session, conv_uid)
+                )
+                if rounds:
+                    self._update_last_round(chat_history, rounds[-1])
+                chat_history.messages = None
+                session.commit()
+                return True
+            finally:
+                session.close()
+
+    def migrate_all_legacy_messages(self) -> int:
+        """Migrate all conversations of the old format, return the number of the
+        migrated conversations"""
+        return sum(
+            1
+            for conv_uid in self._legacy_conv_uids()
+            if self.migrate_legacy_messages(conv_uid)
+        )
+
+    def _is_legacy(self, conv_uid: str) -> bool:
+        session = self.get_session()
+        try:
+            return (
+                session.query(ChatHistoryEntity.id)
+                .filter(
+                    ChatHistoryEntity.conv_uid == conv_uid,
+                    ChatHistoryEntity.messages.isnot(None),
+                    ChatHistoryEntity.messages != "",
+                )
+                .first()
+                is not None
+            )
+        finally:
+            session.close()
+
+    @staticmethod
+    def _count_rounds(session, conv_uid: str) -> int:
+        last_round = (
+            session.query(func.max(ChatHistoryMessageEntity.round_index))
+            .filter(ChatHistoryMessageEntity.conv_uid == conv_uid)
+            .scalar()
+        )
+        return 0 if last_round is None else last_round + 1
+
+    @staticmethod
+    def _add_rounds(session, conv_uid: str, rounds: List[Dict], start: int) -> None:
+        for round_index, once in enumerate(rounds, start):
+            round_detail, rows = _round_to_rows(once)
+            session.add_all(
+                [
+                    ChatHistoryMessageEntity(
+                        conv_uid=conv_uid,
+                        round_index=round_index,
+                        message_index=message_index,
+                        message_type=message_type,
+                        round_detail=round_detail,
+                        message_detail=message_detail,
+                    )
+                    for message_index, message_type, message_detail in rows
+                ]
+            )
+
+    @staticmethod
+    def _update_last_round(chat_history: ChatHistoryEntity, once: Dict) -> None:
+        chat_history.model_name = once.get("model_name")
+        chat_history.select_param = once.get("param_value") or ""
@@ -1,10 +1,15 @@
 import json
 import os
+import threading
 import duckdb
-from typing import List
+from typing import Dict, List, Optional
 
 from pilot.configs.config import Config
-from pilot.memory.chat_history.base import BaseChatHistoryMemory
+from pilot.memory.chat_history.base import (
+    BaseChatHistoryMemory,
+    _round_to_rows,
+    _rows_to_rounds,
+)
 from pilot.scene.message import (
     OnceConversation,
     _conversation_to_dic,
@@ -15,9 +20,43 @@ from ..base import MemoryStoreType
 default_db_path = os.path.join(os.getcwd(), "message")
 duckdb_path = os.getenv("DB_DUCKDB_PATH", default_db_path + "/chat_history.db")
 table_name = "chat_history"
+message_table_name = "chat_history_message"
 
 CFG = Config()
 
+# Only one thread moves the rounds of a conversation from the old format
+_migrate_lock = threading.Lock()
+
+
+def _init_chat_history_tables(connect):
+    # 检查表是否存在
+    result = connect.execute(
+        "SELECT name FROM sqlite_master WHERE type='table' AND name=?", [table_name]
+    ).fetchall()
+
+    if not result:
+        # 如果表不存在，则创建新表
+        connect.execute(
+            "CREATE TABLE chat_history (id integer primary key, conv_uid VARCHAR(100) UNIQUE, chat_mode VARCHAR(50), summary VARCHAR(255),  user_name VARCHAR(100), messages TEXT)"
+        )
+        connect.execute("CREATE SEQUENCE seq_id START 1;")
+    # The columns of the last round, the conversations are listed without the messages
+    connect.execute(
+        "ALTER TABLE chat_history ADD COLUMN IF NOT EXISTS model_name VARCHAR(100)"
+    )
+    connect.execute(
+        "ALTER TABLE chat_history ADD COLUMN IF NOT EXISTS select_param VARCHAR(255)"
+    )
+    # A row for every message, the rounds are appended without reading the previous
+    # rounds. The messages column of chat_history is only used by the old versions.
+    # Not a primary key, duckdb can't delete and insert the same key in a transaction.
+    connect.execute(
+        f"CREATE TABLE IF NOT EXISTS {message_table_name} (conv_uid VARCHAR(100), round_index INTEGER, message_index INTEGER, message_type VARCHAR(50), round_detail TEXT, message_detail TEXT)"
+    )
+    connect.execute(
+        f"CREATE INDEX IF NOT EXISTS idx_conv_round ON {message_table_name} (conv_uid, round_index)"
+    )
+
 
 class DuckdbHistoryMemory(BaseChatHistoryMemory):
     store_type: str = MemoryStoreType.DuckDb.value
@@ -26,43 +65,107 @@ class DuckdbHistoryMemory(BaseChatHistoryMemory):
         self.chat_seesion_id = chat_session_id
         os.makedirs(default_db_path, exist_ok=True)
         self.connect = duckdb.connect(duckdb_path)
-        self.__init_chat_history_tables()
+        _init_chat_history_tables(self.connect)
 
-    def __init_chat_history_tables(self):
-        # 检查表是否存在
-        result = self.connect.execute(
-            "SELECT name FROM sqlite_master WHERE type='table' AND name=?", [table_name]
-        ).fetchall()
+    def __count_rounds(self, cursor) -> int:
+        cursor.execute(
+            f"SELECT max(round_index) FROM {message_table_name} where conv_uid=?",
+            [self.chat_seesion_id],
+        )
+        last_round = cursor.fetchone()[0]
+        return 0 if last_round is None else last_round + 1
 
-        if not result:
-            # 如果表不存在，则创建新表
-            self.connect.execute(
-                "CREATE TABLE chat_history (id integer primary key, conv_uid VARCHAR(100) UNIQUE, chat_mode VARCHAR(50), summary VARCHAR(255),  user_name VARCHAR(100), messages TEXT)"
+    def __insert_rounds(self, cursor, rounds: List[Dict], start: int) -> None:
+        rows = []
+        for round_index, once in enumerate(rounds, start):
+            round_detail, message_rows = _round_to_rows(once)
+            for message_index, message_type, message_detail in message_rows:
+                rows.append(
+                    [
+                        self.chat_seesion_id,
+                        round_index,
+                        message_index,
+                        message_type,
+                        round_detail,
+                        message_detail,
+                    ]
+                )
+        if rows:
+            cursor.executemany(
+                f"INSERT INTO {message_table_name}(conv_uid, round_index, message_index, message_type, round_detail, message_detail)VALUES(?,?,?,?,?,?)",
+                rows,
             )
-            self.connect.execute("CREATE SEQUENCE seq_id START 1;")
 
-    def __get_messages_by_conv_uid(self, conv_uid: str):
+    def __update_last_round(self, cursor, once: Dict) -> None:
+        cursor.execute(
+            "UPDATE chat_history set model_name=?, select_param=? where conv_uid=?",
+            [
+                once.get("model_name"),
+                once.get("param_value") or "",
+                self.chat_seesion_id,
+            ],
+        )
+
+    def _migrate(self) -> bool:
+        """Move the rounds of the old format (a json list in chat_history.messages)
+        to chat_history_message"""
         cursor = self.connect.cursor()
-        cursor.execute("SELECT messages FROM chat_history where conv_uid=?", [conv_uid])
-        content = cursor.fetchone()
-        if content:
-            return content[0]
-        else:
-            return None
+        cursor.execute(
+            "SELECT count(*) FROM chat_history where conv_uid=? and messages is not null and messages != ''",
+            [self.chat_seesion_id],
+        )
+        if not cursor.fetchone()[0]:
+            return False
+        with _migrate_lock:
+            cursor.execute(
+                "SELECT messages FROM chat_history where conv_uid=?",
+                [self.chat_seesion_id],
+            )
+            content = cursor.fetchone()
+            if not content or not content[0]:
+                # Migrated by another thread
+                return False
+            rounds = json.loads(content[0])
+            cursor.begin()
+            try:
+                self.__insert_rounds(cursor, rounds, self.__count_rounds(cursor))
+                if rounds:
+                    self.__update_last_round(cursor, rounds[-1])
+                cursor.execute(
+                    "UPDATE chat_history set messages=NULL where conv_uid=?",
+                    [self.chat_seesion_id],
+                )
+                cursor.commit()
+            except Exception:
+                cursor.rollback()
+                raise
+            return True
 
-    def messages(self) -> List[OnceConversation]:
-        context = self.__get_messages_by_conv_uid(self.chat_seesion_id)
-        if context:
-            conversations: List[OnceConversation] = json.loads(context)
-            return conversations
-        return []
+    def messages(self) -> List[Dict]:
+        return self.select_rounds()
+
+    def count_rounds(self) -> int:
+        self._migrate()
+        return self.__count_rounds(self.connect.cursor())
+
+    def select_rounds(self, head: int = 0, tail: Optional[int] = None) -> List[Dict]:
+        self._migrate()
+        cursor = self.connect.cursor()
+        sql = f"SELECT round_index, round_detail, message_detail FROM {message_table_name} where conv_uid=?"
+        params = [self.chat_seesion_id]
+        if tail is not None:
+            tail_start = max(self.__count_rounds(cursor) - tail, head)
+            sql += " and (round_index < ? or round_index >= ?)"
+            params += [head, tail_start]
+        cursor.execute(sql + " order by round_index, message_index", params)
+        return _rows_to_rounds(cursor.fetchall())
 
     def create(self, chat_mode, summary: str, user_name: str) -> None:
         try:
             cursor = self.connect.cursor()
             cursor.execute(
-                "INSERT INTO chat_history(id, conv_uid, chat_mode summary, user_name, messages)VALUES(nextval('seq_id'),?,?,?,?,?)",
-                [self.chat_seesion_id, chat_mode, summary, user_name, ""],
+                "INSERT INTO chat_history(id, conv_uid, chat_mode, summary, user_name)VALUES(nextval('seq_id'),?,?,?,?)",
+                [self.chat_seesion_id, chat_mode, summary, user_name],
             )
             cursor.commit()
             self.connect.commit()
@@ -70,104 +173,120 @@ class DuckdbHistoryMemory(BaseChatHistoryMemory):
             print("init create conversation log error！" + str(e))
 
     def append(self, once_message: OnceConversation) -> None:
-        context = self.__get_messages_by_conv_uid(self.chat_seesion_id)
-        conversations: List[OnceConversation] = []
-        if context:
-            conversations = json.loads(context)
-        conversations.append(_conversation_to_dic(once_message))
+        self._migrate()
+        once = _conversation_to_dic(once_message)
         cursor = self.connect.cursor()
-        if context:
-            cursor.execute(
-                "UPDATE chat_history set messages=? where conv_uid=?",
-                [json.dumps(conversations, ensure_ascii=False), self.chat_seesion_id],
-            )
-        else:
+        cursor.begin()
+        try:
             cursor.execute(
-                "INSERT INTO chat_history(id, conv_uid, chat_mode,  summary, user_name, messages)VALUES(nextval('seq_id'),?,?,?,?,?)",
-                [
-                    self.chat_seesion_id,
-                    once_message.chat_mode,
-                    once_message.get_user_conv().content,
-                    "",
-                    json.dumps(conversations, ensure_ascii=False),
-                ],
+                "SELECT count(*) FROM chat_history where conv_uid=?",
+                [self.chat_seesion_id],
             )
-        cursor.commit()
-        self.connect.commit()
+            if not cursor.fetchone()[0]:
+                cursor.execute(
+                    "INSERT INTO chat_history(id, conv_uid, chat_mode,  summary, user_name)VALUES(nextval('seq_id'),?,?,?,?)",
+                    [
+                        self.chat_seesion_id,
+                        once_message.chat_mode,
+                        once_message.get_user_conv().content,
+                        "",
+                    ],
+                )
+            self.__insert_rounds(cursor, [once], self.__count_rounds(cursor))
+            self.__update_last_round(cursor, once)
+            cursor.commit()
+        except Exception:
+            cursor.rollback()
+            raise
 
-    def update(self, messages: List[OnceConversation]) -> None:
+    def update(self, messages: List[Dict]) -> None:
+        self._migrate()
         cursor = self.connect.cursor()
-        cursor.execute(
-            "UPDATE chat_history set messages=? where conv_uid=?",
-            [json.dumps(messages, ensure_ascii=False), self.chat_seesion_id],
-        )
-        cursor.commit()
-        self.connect.commit()
+        cursor.begin()
+        try:
+            cursor.execute(
+                f"DELETE FROM {message_table_name} where conv_uid=?",
+                [self.chat_seesion_id],
+            )
+            self.__insert_rounds(cursor, messages, 0)
+            if messages:
+                self.__update_last_round(cursor, messages[-1])
+            cursor.commit()
+        except Exception:
+            cursor.rollback()
+            raise
 
     def clear(self) -> None:
-        cursor = self.connect.cursor()
-        cursor.execute(
-            "DELETE FROM chat_history where conv_uid=?", [self.chat_seesion_id]
-        )
-        cursor.commit()
-        self.connect.commit()
+        self.delete()
 
     def delete(self) -> bool:
         cursor = self.connect.cursor()
         cursor.execute(
             "DELETE FROM chat_history where conv_uid=?", [self.chat_seesion_id]
         )
+        cursor.execute(
+            f"DELETE FROM {message_table_name} where conv_uid=?",
+            [self.chat_seesion_id],
+        )
         cursor.commit()
         return True
 
     def conv_info(self, conv_uid: str = None) -> None:
         cursor = self.connect.cursor()
         cursor.execute(
-            "SELECT * FROM chat_history where conv_uid=? ",
+            "SELECT id, conv_uid, chat_mode, summary, user_name, model_name, select_param FROM chat_history where conv_uid=? ",
             [conv_uid],
         )
         # 获取查询结果字段名
         fields = [field[0] for field in cursor.description]
 
-        for row in cursor.fetchone():
-            row_dict = {}
-            for i, field in enumerate(fields):
-                row_dict[field] = row[i]
-            return row_dict
+        row = cursor.fetchone()
+        if row:
+            return dict(zip(fields, row))
 
         return {}
 
-    def get_messages(self) -> List[OnceConversation]:
-        cursor = self.connect.cursor()
-        cursor.execute(
-            "SELECT messages FROM chat_history where conv_uid=?", [self.chat_seesion_id]
-        )
-        context = cursor.fetchone()
-        if context:
-            if context[0]:
-                return json.loads(context[0])
-        return None
+    def get_messages(self) -> List[Dict]:
+        return self.messages()
 
     @staticmethod
     def conv_list(cls, user_name: str = None) -> None:
         if os.path.isfile(duckdb_path):
-            cursor = duckdb.connect(duckdb_path).cursor()
-            if user_name:
-                cursor.execute(
-                    "SELECT * FROM chat_history where user_name=? order by id desc limit 20",
-                    [user_name],
-                )
-            else:
-                cursor.execute("SELECT * FROM chat_history order by id desc limit 20")
-            # 获取查询结果字段名
-            fields = [field[0] for field in cursor.description]
-            data = []
-            for row in cursor.fetchall():
-                row_dict = {}
-                for i, field in enumerate(fields):
-                    row_dict[field] = row[i]
-                data.append(row_dict)
-
+            connect = duckdb.connect(duckdb_path)
+            _init_chat_history_tables(connect)
+            data = DuckdbHistoryMemory._list_last_20(connect, user_name)
+            legacy = [item["conv_uid"] for item in data if item.pop("legacy")]
+            if legacy:
+                # Fill the columns of the last round
+                for conv_uid in legacy:
+                    DuckdbHistoryMemory(conv_uid)._migrate()
+                data = DuckdbHistoryMemory._list_last_20(connect, user_name)
             return data
 
         return []
+
+    @staticmethod
+    def _list_last_20(connect, user_name: str = None) -> List[Dict]:
+        # The messages are not loaded
+        sql = "SELECT id, conv_uid, chat_mode, summary, user_name, model_name, select_param, (messages is not null and messages != '') as legacy FROM chat_history"
+        cursor = connect.cursor()
+        if user_name:
+            cursor.execute(
+                sql + " where user_name=? order by id desc limit 20", [user_name]
+            )
+        else:
+            cursor.execute(sql + " order by id desc limit 20")
+        # 获取查询结果字段名
+        fields = [field[0] for field in cursor.description]
+        return [dict(zip(fields, row)) for row in cursor.fetchall()]
+
+    @staticmethod
+    def migrate() -> int:
+        if not os.path.isfile(duckdb_path):
+            return 0
+        connect = duckdb.connect(duckdb_path)
+        _init_chat_history_tables(connect)
+        conv_uids = connect.execute(
+            "SELECT conv_uid FROM chat_history where messages is not null and messages != ''"
+        ).fetchall()
+        return sum(1 for row in conv_uids if DuckdbHistoryMemory(row[0])._migrate())
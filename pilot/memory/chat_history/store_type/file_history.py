@@ -1,4 +1,4 @@
-from typing import List
+from typing import Dict, List
 import json
 import os
 import datetime
@@ -8,8 +8,7 @@ from pathlib import Path
 from pilot.configs.config import Config
 from pilot.scene.message import (
     OnceConversation,
-    conversation_from_dict,
-    conversations_to_dict,
+    _conversation_to_dic,
 )
 from pilot.memory.chat_history.base import MemoryStoreType
 
@@ -17,6 +16,13 @@ CFG = Config()
 
 
 class FileHistoryMemory(BaseChatHistoryMemory):
+    """Save a round of the conversation in a line of the `.jsonl` file, a round is
+    appended without reading the previous rounds.
+
+    The `.json` files (a json list of all rounds) of the old versions are converted
+    when they are used.
+    """
+
     store_type: str = MemoryStoreType.File.value
 
     def __init__(self, chat_session_id: str):
@@ -26,26 +32,52 @@ class FileHistoryMemory(BaseChatHistoryMemory):
         os.makedirs(path, exist_ok=True)
 
         dir_path = Path(path)
-        self.file_path = Path(dir_path / f"{chat_session_id}.json")
-        if not self.file_path.exists():
-            self.file_path.touch()
-            self.file_path.write_text(json.dumps([]))
+        self.file_path = Path(dir_path / f"{chat_session_id}.jsonl")
+        self._migrate(Path(dir_path / f"{chat_session_id}.json"))
 
-    def messages(self) -> List[OnceConversation]:
-        items = json.loads(self.file_path.read_text())
-        history: List[OnceConversation] = []
-        for onece in items:
-            messages = conversation_from_dict(onece)
-            history.append(messages)
-        return history
+    def _migrate(self, legacy_path: Path) -> bool:
+        if not legacy_path.exists():
+            return False
+        items = json.loads(legacy_path.read_text(encoding="UTF-8") or "[]")
+        self._write(items)
+        legacy_path.unlink()
+        return True
 
-    def append(self, once_message: OnceConversation) -> None:
-        historys = self.messages()
-        historys.append(once_message)
+    def _write(self, items: List[Dict]) -> None:
         self.file_path.write_text(
-            json.dumps(conversations_to_dict(historys), ensure_ascii=False, indent=4),
+            "".join(json.dumps(once, ensure_ascii=False) + "\n" for once in items),
             encoding="UTF-8",
         )
 
+    def messages(self) -> List[Dict]:
+        if not self.file_path.exists():
+            return []
+        with self.file_path.open(encoding="UTF-8") as f:
+            return [json.loads(line) for line in f if line.strip()]
+
+    def create(self, chat_mode, summary: str, user_name: str) -> None:
+        self.file_path.touch()
+
+    def append(self, once_message: OnceConversation) -> None:
+        with self.file_path.open("a", encoding="UTF-8") as f:
+            f.write(
+                json.dumps(_conversation_to_dic(once_message), ensure_ascii=False)
+                + "\n"
+            )
+
+    def update(self, messages: List[Dict]) -> None:
+        self._write(messages)
+
     def clear(self) -> None:
-        self.file_path.write_text(json.dumps([]))
+        self._write([])
+
+    def delete(self) -> bool:
+        if self.file_path.exists():
+            self.file_path.unlink()
+        return True
+
+    def conv_info(self, conv_uid: str = None) -> Dict:
+        return {}
+
+    def get_messages(self) -> List[Dict]:
+        return self.messages()
@@ -1,8 +1,8 @@
-from typing import List
+from typing import Dict, List
 from pilot.memory.chat_history.base import BaseChatHistoryMemory
 
 from pilot.configs.config import Config
-from pilot.scene.message import OnceConversation
+from pilot.scene.message import OnceConversation, _conversation_to_dic
 from pilot.common.custom_data_structure import FixedSizeDict
 from pilot.memory.chat_history.base import MemoryStoreType
 
@@ -13,16 +13,58 @@ class MemHistoryMemory(BaseChatHistoryMemory):
     store_type: str = MemoryStoreType.Memory.value
 
     histroies_map = FixedSizeDict(100)
+    conv_infos = FixedSizeDict(100)
 
     def __init__(self, chat_session_id: str):
         self.chat_seesion_id = chat_session_id
-        self.histroies_map.update({chat_session_id: []})
+        if chat_session_id not in self.histroies_map:
+            self.histroies_map.update({chat_session_id: []})
 
-    def messages(self) -> List[OnceConversation]:
-        return self.histroies_map.get(self.chat_seesion_id)
+    def messages(self) -> List[Dict]:
+        return self.histroies_map.get(self.chat_seesion_id, [])
+
+    def create(self, chat_mode, summary: str, user_name: str) -> None:
+        self.conv_infos[self.chat_seesion_id] = {
+            "conv_uid": self.chat_seesion_id,
+            "chat_mode": chat_mode,
+            "summary": summary,
+            "user_name": user_name,
+        }
 
     def append(self, once_message: OnceConversation) -> None:
-        self.histroies_map.get(self.chat_seesion_id).append(once_message)
+        # The session may be dropped from the map by the newer sessions
+        once = _conversation_to_dic(once_message)
+        self.histroies_map.setdefault(self.chat_seesion_id, []).append(once)
+        conv_info = self.conv_infos.get(self.chat_seesion_id)
+        if conv_info is None:
+            self.create(
+                once_message.chat_mode, once_message.get_user_conv().content, "default"
+            )
+            conv_info = self.conv_infos[self.chat_seesion_id]
+        conv_info["model_name"] = once["model_name"]
+        conv_info["select_param"] = once["param_value"] or ""
+
+    def update(self, messages: List[Dict]) -> None:
+        self.histroies_map[self.chat_seesion_id] = messages
 
     def clear(self) -> None:
-        self.histroies_map.pop(self.chat_seesion_id)
+        self.histroies_map.pop(self.chat_seesion_id, None)
+
+    def delete(self) -> bool:
+        self.clear()
+        self.conv_infos.pop(self.chat_seesion_id, None)
+        return True
+
+    def conv_info(self, conv_uid: str = None) -> Dict:
+        return self.conv_infos.get(conv_uid or self.chat_seesion_id, {})
+
+    def get_messages(self) -> List[Dict]:
+        return self.messages()
+
+    @staticmethod
+    def conv_list(cls, user_name: str = None) -> List[Dict]:
+        return [
+            info
+            for info in reversed(MemHistoryMemory.conv_infos.values())
+            if not user_name or info.get("user_name") == user_name
+        ][:20]
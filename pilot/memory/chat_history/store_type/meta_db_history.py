@@ -1,8 +1,5 @@
-import json
 import logging
-from typing import List
-from sqlalchemy import Column, Integer, String, Index, DateTime, func, Boolean, Text
-from sqlalchemy import UniqueConstraint
+from typing import Dict, List, Optional
 from pilot.configs.config import Config
 from pilot.memory.chat_history.base import BaseChatHistoryMemory
 from pilot.scene.message import (
@@ -18,26 +15,32 @@ logger = logging.getLogger("db_chat_history")
 
 
 class DbHistoryMemory(BaseChatHistoryMemory):
+    """Save every message of the conversation in a row of chat_history_message, a
+    round is inserted without reading the previous rounds.
+
+    The conversations saved as a json list in chat_history.messages by the old
+    versions are migrated when they are used.
+    """
+
     store_type: str = MemoryStoreType.DB.value
 
     def __init__(self, chat_session_id: str):
         self.chat_seesion_id = chat_session_id
         self.chat_history_dao = ChatHistoryDao()
 
-    def messages(self) -> List[OnceConversation]:
-        chat_history: ChatHistoryEntity = self.chat_history_dao.get_by_uid(
-            self.chat_seesion_id
-        )
-        if chat_history:
-            context = chat_history.messages
-            if context:
-                conversations: List[OnceConversation] = json.loads(context)
-                return conversations
-        return []
+    def messages(self) -> List[Dict]:
+        return self.chat_history_dao.get_rounds(self.chat_seesion_id)
+
+    def count_rounds(self) -> int:
+        return self.chat_history_dao.count_rounds(self.chat_seesion_id)
+
+    def select_rounds(self, head: int = 0, tail: Optional[int] = None) -> List[Dict]:
+        return self.chat_history_dao.get_rounds(self.chat_seesion_id, head, tail)
 
     def create(self, chat_mode, summary: str, user_name: str) -> None:
         try:
             chat_history: ChatHistoryEntity = ChatHistoryEntity()
+            chat_history.conv_uid = self.chat_seesion_id
             chat_history.chat_mode = chat_mode
             chat_history.summary = summary
             chat_history.user_name = user_name
@@ -48,48 +51,26 @@ class DbHistoryMemory(BaseChatHistoryMemory):
 
     def append(self, once_message: OnceConversation) -> None:
         logger.info("db history append:{}", once_message)
-        chat_history: ChatHistoryEntity = self.chat_history_dao.get_by_uid(
-            self.chat_seesion_id
+        self.chat_history_dao.append_round(
+            self.chat_seesion_id,
+            _conversation_to_dic(once_message),
+            summary=once_message.get_user_conv().content,
         )
-        conversations: List[OnceConversation] = []
-        if chat_history:
-            context = chat_history.messages
-            if context:
-                conversations = json.loads(context)
-            else:
-                chat_history.summary = once_message.get_user_conv().content
-        else:
-            chat_history: ChatHistoryEntity = ChatHistoryEntity()
-            chat_history.conv_uid = self.chat_seesion_id
-            chat_history.chat_mode = once_message.chat_mode
-            chat_history.user_name = "default"
-            chat_history.summary = once_message.get_user_conv().content
-
-        conversations.append(_conversation_to_dic(once_message))
-        chat_history.messages = json.dumps(conversations, ensure_ascii=False)
-
-        self.chat_history_dao.update(chat_history)
 
-    def update(self, messages: List[OnceConversation]) -> None:
-        self.chat_history_dao.update_message_by_uid(
-            json.dumps(messages, ensure_ascii=False), self.chat_seesion_id
-        )
+    def update(self, messages: List[Dict]) -> None:
+        self.chat_history_dao.replace_rounds(self.chat_seesion_id, messages)
 
     def delete(self) -> bool:
         self.chat_history_dao.delete(self.chat_seesion_id)
+        return True
 
     def conv_info(self, conv_uid: str = None) -> None:
         logger.info("conv_info:{}", conv_uid)
         chat_history = self.chat_history_dao.get_by_uid(conv_uid)
         return chat_history.__dict__
 
-    def get_messages(self) -> List[OnceConversation]:
-        # logger.info("get_messages:{}", self.chat_seesion_id)
-        chat_history = self.chat_history_dao.get_by_uid(self.chat_seesion_id)
-        if chat_history:
-            context = chat_history.messages
-            return json.loads(context)
-        return []
+    def get_messages(self) -> List[Dict]:
+        return self.messages()
 
     @staticmethod
     def conv_list(cls, user_name: str = None) -> None:
@@ -99,3 +80,7 @@ class DbHistoryMemory(BaseChatHistoryMemory):
         for history in history_list:
             result.append(history.__dict__)
         return result
+
+    @staticmethod
+    def migrate() -> int:
+        return ChatHistoryDao().migrate_all_legacy_messages()
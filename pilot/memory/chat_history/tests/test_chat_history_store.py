@@ -0,0 +1,177 @@
+import json
+
+import pytest
+from sqlalchemy import create_engine
+
+from pilot.memory.chat_history import chat_history_db
+from pilot.memory.chat_history.chat_history_db import (
+    ChatHistoryDao,
+    ChatHistoryEntity,
+    ChatHistoryMessageEntity,
+)
+from pilot.memory.chat_history.store_type import duckdb_history
+from pilot.memory.chat_history.store_type.duckdb_history import DuckdbHistoryMemory
+from pilot.memory.chat_history.store_type.file_history import FileHistoryMemory, CFG
+from pilot.memory.chat_history.store_type.mem_history import MemHistoryMemory
+from pilot.memory.chat_history.store_type.meta_db_history import DbHistoryMemory
+from pilot.scene.message import OnceConversation, _conversation_to_dic
+
+
+def _once(order: int, param_value: str = "db") -> OnceConversation:
+    once = OnceConversation("chat_with_db_execute")
+    once.chat_order = order
+    once.model_name = "vicuna-13b-v1.5"
+    once.param_value = param_value
+    once.add_user_message(f"question {order}")
+    once.add_ai_message(f"answer {order}")
+    once.add_view_message(f"view {order}")
+    return once
+
+
+@pytest.fixture
+def duckdb_store(tmp_path, monkeypatch):
+    monkeypatch.setattr(duckdb_history, "default_db_path", str(tmp_path))
+    monkeypatch.setattr(duckdb_history, "duckdb_path", str(tmp_path / "history.db"))
+    return DuckdbHistoryMemory
+
+
+@pytest.fixture
+def db_store(tmp_path, monkeypatch):
+    engine = create_engine(f"sqlite:///{tmp_path / 'dbgpt.db'}")
+    ChatHistoryEntity.__table__.create(engine)
+    ChatHistoryMessageEntity.__table__.create(engine)
+    monkeypatch.setattr(chat_history_db, "engine", engine)
+    return DbHistoryMemory
+
+
+@pytest.fixture
+def file_store(tmp_path, monkeypatch):
+    monkeypatch.setattr(CFG, "message_dir", str(tmp_path))
+    return FileHistoryMemory
+
+
+@pytest.fixture(params=["duckdb_store", "db_store", "file_store", "mem_store"])
+def store(request):
+    if request.param == "mem_store":
+        return MemHistoryMemory
+    return request.getfixturevalue(request.param)
+
+
+def test_append_and_select_rounds(store):
+    memory = store("conv1")
+    assert memory.count_rounds() == 0
+    assert memory.messages() == []
+    rounds = [_once(i) for i in range(1, 6)]
+    for once in rounds:
+        memory.append(once)
+    store("conv2").append(_once(1))
+
+    memory = store("conv1")
+    expected = [_conversation_to_dic(once) for once in rounds]
+    assert memory.count_rounds() == 5
+    assert memory.messages() == expected
+    assert memory.get_messages() == expected
+    assert memory.select_rounds(head=1, tail=2) == [expected[0]] + expected[-2:]
+    assert memory.select_rounds(head=1, tail=0) == expected[:1]
+    assert memory.select_rounds(head=2, tail=10) == expected
+    assert store("conv2").count_rounds() == 1
+
+
+def test_update_and_delete(store):
+    memory = store("conv1")
+    for i in range(1, 4):
+        memory.append(_once(i))
+    rounds = memory.get_messages()
+    rounds[-1]["messages"][-1]["data"]["content"] = "edited view"
+    memory.update(rounds)
+    assert store("conv1").get_messages() == rounds
+
+    store("conv1").delete()
+    assert store("conv1").count_rounds() == 0
+
+
+@pytest.mark.parametrize("store_fixture", ["duckdb_store", "db_store"])
+def test_conv_list_without_messages(store_fixture, request):
+    store = request.getfixturevalue(store_fixture)
+    memory = store("conv1")
+    memory.append(_once(1, "db1"))
+    memory.append(_once(2, "db2"))
+    conversations = store.conv_list(store)
+    assert len(conversations) == 1
+    conversation = conversations[0]
+    assert conversation["conv_uid"] == "conv1"
+    assert conversation["summary"] == "question 1"
+    assert conversation["select_param"] == "db2"
+    assert conversation["model_name"] == "vicuna-13b-v1.5"
+    assert not conversation.get("messages")
+
+
+def _legacy_rounds():
+    return [_conversation_to_dic(_once(i, f"db{i}")) for i in range(1, 4)]
+
+
+def test_duckdb_migrate_legacy_messages(duckdb_store):
+    # Create the tables
+    memory = duckdb_store("conv0")
+    for conv_uid in ["conv1", "conv2"]:
+        memory.connect.execute(
+            "INSERT INTO chat_history(id, conv_uid, chat_mode, summary, user_name, messages)VALUES(nextval('seq_id'),?,?,?,?,?)",
+            [
+                conv_uid,
+                "chat_with_db_execute",
+                "question 1",
+                "",
+                json.dumps(_legacy_rounds()),
+            ],
+        )
+    rounds = _legacy_rounds()
+    memory = duckdb_store("conv1")
+    assert memory.count_rounds() == 3
+    assert memory.messages() == rounds
+    memory.append(_once(4))
+    assert memory.messages() == rounds + [_conversation_to_dic(_once(4))]
+
+    # conv2 is migrated when listed
+    conversations = {c["conv_uid"]: c for c in duckdb_store.conv_list(duckdb_store)}
+    assert conversations["conv2"]["select_param"] == "db3"
+    assert duckdb_store.migrate() == 0
+    assert duckdb_store("conv2").messages() == rounds
+
+
+def test_db_migrate_legacy_messages(db_store):
+    dao = ChatHistoryDao()
+    for conv_uid in ["conv1", "conv2", "conv3"]:
+        dao.update(
+            ChatHistoryEntity(
+                conv_uid=conv_uid,
+                chat_mode="chat_with_db_execute",
+                summary="question 1",
+                user_name="default",
+                messages=json.dumps(_legacy_rounds()),
+            )
+        )
+    rounds = _legacy_rounds()
+    memory = db_store("conv1")
+    assert memory.count_rounds() == 3
+    assert memory.select_rounds(head=1, tail=1) == [rounds[0], rounds[-1]]
+    memory.append(_once(4))
+    assert memory.messages() == rounds + [_conversation_to_dic(_once(4))]
+
+    assert db_store.migrate() == 2
+    assert db_store.migrate() == 0
+    assert db_store("conv2").messages() == rounds
+    conversations = {c["conv_uid"]: c for c in db_store.conv_list(db_store)}
+    assert conversations["conv3"]["select_param"] == "db3"
+
+
+def test_file_migrate_legacy_messages(file_store, tmp_path):
+    # Create the directory of today
+    file_store("conv0")
+    legacy_path = next(tmp_path.iterdir()) / "conv1.json"
+    legacy_path.write_text(json.dumps(_legacy_rounds(), indent=4))
+    memory = file_store("conv1")
+    assert not legacy_path.exists()
+    memory.append(_once(4))
+    assert file_store("conv1").messages() == _legacy_rounds() + [
+        _conversation_to_dic(_once(4))
+    ]
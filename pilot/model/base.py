@@ -52,9 +52,72 @@ class ModelOutput:
     text: str
     error_code: int
     model_context: Dict = None
+    # If True, `text` only contains the new text, and `text_offset` is the position
+    # of it in the full text. Only used between workers and worker managers.
+    incremental: Optional[bool] = None
+    text_offset: Optional[int] = None
 
     def to_dict(self) -> Dict:
-        return asdict(self)
+        data = asdict(self)
+        if not self.incremental:
+            # Keep the same format as before for the clients which do not know it
+            data.pop("incremental")
+            data.pop("text_offset")
+        return data
+
+
+class ModelOutputDeltaEncoder:
+    """Convert the model outputs which contain the full text to incremental outputs
+
+    Only the text after the previous output is sent. If the new text does not extend
+    the previous text (e.g. a partial stop string is removed), the full text is sent
+    with `text_offset=0`.
+    """
+
+    def __init__(self) -> None:
+        self._previous_text = ""
+
+    def encode(self, output: ModelOutput) -> ModelOutput:
+        text = output.text or ""
+        previous_len = len(self._previous_text)
+        if text.startswith(self._previous_text):
+            delta, offset = text[previous_len:], previous_len
+        else:
+            delta, offset = text, 0
+        self._previous_text = text
+        return ModelOutput(
+            text=delta,
+            error_code=output.error_code,
+            model_context=output.model_context,
+            incremental=True,
+            text_offset=offset,
+        )
+
+
+class ModelOutputDeltaDecoder:
+    """Rebuild the full text model outputs from incremental outputs
+
+    The outputs which are not incremental (sent by the workers which do not support
+    incremental outputs) are returned as they are.
+    """
+
+    def __init__(self) -> None:
+        self._text = ""
+
+    def decode(self, output: ModelOutput) -> ModelOutput:
+        if not output.incremental:
+            self._text = output.text or ""
+            return output
+        offset = output.text_offset or 0
+        if offset == len(self._text):
+            self._text += output.text
+        else:
+            self._text = self._text[:offset] + output.text
+        return ModelOutput(
+            text=self._text,
+            error_code=output.error_code,
+            model_context=output.model_context,
+        )
 
 
 @dataclass
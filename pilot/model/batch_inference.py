@@ -0,0 +1,506 @@
+"""Continuous batching for huggingface decoder-only models.
+
+Requests are admitted into a running batch between decode steps instead of waiting
+for the whole batch to finish. Every step of the scheduler:
+
+1. Prefills all newly admitted requests in one forward pass (left padded).
+2. Merges their KV caches into the running batch.
+3. Runs one batched decode forward pass for every in-flight request.
+4. Samples per request, handles stop tokens and stop strings, and retires finished
+   requests from the batch.
+"""
+import gc
+import inspect
+import logging
+import queue
+import threading
+import time
+import uuid
+from dataclasses import dataclass, field
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+import torch
+
+from pilot.model.inference import prepare_logits_processor
+from pilot.model.detokenizer import IncrementalDetokenizer, StopStringMatcher
+
+logger = logging.getLogger(__name__)
+
+_FINISH = object()
+
+
+@dataclass
+class BatchRequestStats:
+    """Token and latency statistics of one request"""
+
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+    submit_time: float = field(default_factory=time.time)
+    first_token_time: Optional[float] = None
+    finish_time: Optional[float] = None
+
+    def tokens_per_second(self) -> float:
+        if not self.first_token_time or not self.completion_tokens:
+            return 0.0
+        end_time = self.finish_time or time.time()
+        cost = end_time - self.submit_time
+        return self.completion_tokens / cost if cost > 0 else 0.0
+
+    def to_dict(self) -> Dict:
+        ttft = None
+        if self.first_token_time:
+            ttft = self.first_token_time - self.submit_time
+        return {
+            "prompt_tokens": self.prompt_tokens,
+            "completion_tokens": self.completion_tokens,
+            "total_tokens": self.prompt_tokens + self.completion_tokens,
+            "time_to_first_token": ttft,
+            "tokens_per_second": self.tokens_per_second(),
+        }
+
+
+class BatchRequest:
+    """The state of one request in the continuous batching scheduler"""
+
+    def __init__(
+        self, tokenizer, params: Dict, context_len: int, stream_interval: int = 2
+    ) -> None:
+        self.request_id = params.get("request_id") or uuid.uuid4().hex
+        self.prompt = params["prompt"]
+        self.temperature = float(params.get("temperature", 1.0))
+        self.repetition_penalty = float(params.get("repetition_penalty", 1.0))
+        self.top_p = float(params.get("top_p", 1.0))
+        self.top_k = int(params.get("top_k", -1))  # -1 means disable
+        self.max_new_tokens = int(params.get("max_new_tokens", 2048))
+        self.echo = bool(params.get("echo", True))
+        self.stop_str = params.get("stop", None)
+        self.stop_token_ids = list(params.get("stop_token_ids", None) or [])
+        if tokenizer.eos_token_id is not None:
+            self.stop_token_ids.append(tokenizer.eos_token_id)
+        self.stream_interval = max(stream_interval, 1)
+        self.logits_processor = prepare_logits_processor(
+            self.temperature, self.repetition_penalty, self.top_p, self.top_k
+        )
+
+        input_ids = tokenizer(self.prompt).input_ids
+        max_src_len = context_len - self.max_new_tokens - 1
+        if max_src_len > 0:
+            input_ids = input_ids[-max_src_len:]
+        self.input_ids: List[int] = input_ids
+        self.output_ids: List[int] = list(input_ids)
+        self.stats = BatchRequestStats(prompt_tokens=len(input_ids))
+
+        decode_kwargs = {
+            "skip_special_tokens": True,
+            "spaces_between_special_tokens": False,
+            "clean_up_tokenization_spaces": True,
+        }
+        self.detokenizer = IncrementalDetokenizer(
+            tokenizer, input_ids, use_prompt_context=self.echo, **decode_kwargs
+        )
+        if self.echo:
+            self.prompt_output = tokenizer.decode(input_ids, **decode_kwargs)
+            self.stop_matcher = StopStringMatcher(self.stop_str, len(self.prompt))
+        else:
+            self.prompt_output = ""
+            self.stop_matcher = StopStringMatcher(self.stop_str)
+
+        self.output_queue: queue.Queue = queue.Queue()
+        self.finish_reason: Optional[str] = None
+        self.output: str = ""
+        self.aborted = False
+
+    @property
+    def num_generated(self) -> int:
+        return len(self.output_ids) - len(self.input_ids)
+
+    def abort(self) -> None:
+        """Mark the request as aborted, the scheduler will retire it at next step"""
+        self.aborted = True
+
+
+class ContinuousBatchingScheduler:
+    """Schedule the prefill and decode steps of many requests on one huggingface
+    model with iteration level (continuous) batching.
+
+    Each request owns its rows of the batch KV cache. New requests join the batch
+    between decode steps and finished requests leave it immediately, so a short
+    answer never waits for a long one.
+
+    Args:
+        model: The huggingface causal language model.
+        tokenizer: The tokenizer of the model.
+        device (str): The device to run model.
+        context_len (int): The max context length of the model.
+        max_batch_size (int): Max number of requests in one running batch.
+        stream_interval (int): Yield output every `stream_interval` tokens.
+    """
+
+    def __init__(
+        self,
+        model,
+        tokenizer,
+        device: str,
+        context_len: int,
+        max_batch_size: int = 8,
+        stream_interval: int = 2,
+    ) -> None:
+        if model.config.is_encoder_decoder:
+            raise ValueError("Continuous batching not support encoder-decoder model")
+        forward_params = inspect.signature(model.forward).parameters
+        if "position_ids" not in forward_params:
+            raise ValueError(
+                f"Continuous batching requires model forward support position_ids, model: {model.__class__.__name__}"
+            )
+        self.model = model
+        self.tokenizer = tokenizer
+        self.device = device
+        self.context_len = context_len
+        self.max_batch_size = max_batch_size
+        self.stream_interval = stream_interval
+
+        self._waiting: queue.Queue = queue.Queue()
+        self._running: List[BatchRequest] = []
+        # Batch KV cache, tuple of (key, value) for each layer, shape of key and value is
+        # [batch_size, num_heads, seq_len, head_dim]
+        self._past_key_values: Optional[Tuple[Tuple[torch.Tensor, ...], ...]] = None
+        # Attention mask of batch KV cache, shape is [batch_size, seq_len]
+        self._attention_mask: Optional[torch.Tensor] = None
+        # Whether the model returns the cache object of newer transformers
+        self._use_cache_object = False
+
+        self._stop_event = threading.Event()
+        self._has_work = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+
+        self._total_completion_tokens = 0
+        self._total_requests = 0
+        self._busy_time = 0.0
+        self._start_time = None
+
+    def start(self) -> None:
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop_event.clear()
+        self._start_time = time.time()
+        self._thread = threading.Thread(
+            target=self._run_loop, name="ContinuousBatchingScheduler", daemon=True
+        )
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop_event.set()
+        self._has_work.set()
+        if self._thread:
+            self._thread.join()
+            self._thread = None
+        for req in self._running:
+            self._finish(req, "abort")
+        self._running = []
+        while not self._waiting.empty():
+            self._finish(self._waiting.get_nowait(), "abort")
+        self._reset_batch_cache()
+
+    def submit(self, params: Dict) -> BatchRequest:
+        """Submit a request to the scheduler, the outputs will be put into
+        `BatchRequest.output_queue`"""
+        req = BatchRequest(
+            self.tokenizer, params, self.context_len, self.stream_interval
+        )
+        self._waiting.put(req)
+        self._has_work.set()
+        return req
+
+    def generate_stream(self, params: Dict) -> Iterator[Dict]:
+        """Generate stream output, same output format as `generate_stream` in
+        fastchat, the output text contains all text generated so far."""
+        if not self._thread:
+            self.start()
+        req = self.submit(params)
+        try:
+            while True:
+                output = req.output_queue.get()
+                if output is _FINISH:
+                    break
+                if isinstance(output, Exception):
+                    raise output
+                yield output
+        finally:
+            # The consumer may close the generator early (e.g. client disconnected)
+            req.abort()
+
+    def stats(self) -> Dict:
+        """Aggregate statistics of the scheduler"""
+        with self._lock:
+            uptime = time.time() - self._start_time if self._start_time else 0.0
+            return {
+                "running": len(self._running),
+                "waiting": self._waiting.qsize(),
+                "total_requests": self._total_requests,
+                "total_completion_tokens": self._total_completion_tokens,
+                "tokens_per_second": self._total_completion_tokens / self._busy_time
+                if self._busy_time > 0
+                else 0.0,
+                "busy_ratio": self._busy_time / uptime if uptime > 0 else 0.0,
+            }
+
+    def _run_loop(self) -> None:
+        while not self._stop_event.is_set():
+            if not self._running and self._waiting.empty():
+                self._has_work.wait(timeout=1)
+                self._has_work.clear()
+                continue
+            start_time = time.time()
+            try:
+                self.step()
+            except Exception as e:
+                logger.exception(f"Continuous batching step error: {str(e)}")
+                running, self._running = self._running, []
+                self._reset_batch_cache()
+                for req in running:
+                    req.output_queue.put(e)
+                    self._finish(req, "error")
+            with self._lock:
+                self._busy_time += time.time() - start_time
+
+    @torch.inference_mode()
+    def step(self) -> None:
+        """Run one scheduler iteration: admit, prefill, decode and retire."""
+        self._retire([req for req in self._running if req.aborted], "abort")
+        new_requests = []
+        while len(self._running) + len(new_requests) < self.max_batch_size:
+            try:
+                req = self._waiting.get_nowait()
+            except queue.Empty:
+                break
+            if not req.aborted:
+                new_requests.append(req)
+        if self._running:
+            self._decode()
+        if new_requests:
+            self._prefill(new_requests)
+
+    def _prefill(self, requests: List[BatchRequest]) -> None:
+        max_len = max(len(req.input_ids) for req in requests)
+        pad_id = self._pad_token_id()
+        input_ids, attention_mask = [], []
+        for req in requests:
+            pad_len = max_len - len(req.input_ids)
+            input_ids.append([pad_id] * pad_len + req.input_ids)
+            attention_mask.append([0] * pad_len + [1] * len(req.input_ids))
+        input_ids = torch.as_tensor(input_ids, device=self.device)
+        attention_mask = torch.as_tensor(attention_mask, device=self.device)
+        position_ids = (attention_mask.cumsum(-1) - 1).clamp(min=0)
+
+        out = self.model(
+            input_ids=input_ids,
+            attention_mask=attention_mask,
+            position_ids=position_ids,
+            use_cache=True,
+        )
+        self._use_cache_object = not isinstance(out.past_key_values, tuple)
+        past_key_values = _to_legacy_cache(out.past_key_values)
+        self._merge_batch(requests, past_key_values, attention_mask)
+        self._sample_and_emit(requests, out.logits[:, -1, :])
+
+    def _decode(self) -> None:
+        input_ids = torch.as_tensor(
+            [[req.output_ids[-1]] for req in self._running], device=self.device
+        )
+        position_ids = self._attention_mask.sum(-1, keepdim=True)
+        attention_mask = torch.cat(
+            [
+                self._attention_mask,
+                self._attention_mask.new_ones((len(self._running), 1)),
+            ],
+            dim=-1,
+        )
+        out = self.model(
+            input_ids=input_ids,
+            attention_mask=attention_mask,
+            position_ids=position_ids,
+            past_key_values=_from_legacy_cache(self._past_key_values)
+            if self._use_cache_object
+            else self._past_key_values,
+            use_cache=True,
+        )
+        self._past_key_values = _to_legacy_cache(out.past_key_values)
+        self._attention_mask = attention_mask
+        self._sample_and_emit(list(self._running), out.logits[:, -1, :])
+
+    def _sample_and_emit(
+        self, requests: List[BatchRequest], last_logits: torch.Tensor
+    ) -> None:
+        finished = []
+        for i, req in enumerate(requests):
+            token = self._sample(req, last_logits[i : i + 1])
+            req.output_ids.append(token)
+            if req.stats.first_token_time is None:
+                req.stats.first_token_time = time.time()
+            req.stats.completion_tokens += 1
+            if self._emit(req, token):
+                finished.append(req)
+        with self._lock:
+            self._total_completion_tokens += len(requests)
+        if finished:
+            self._retire(finished, None)
+
+    def _sample(self, req: BatchRequest, logits: torch.Tensor) -> int:
+        if req.logits_processor:
+            if req.repetition_penalty > 1.0:
+                tmp_output_ids = torch.as_tensor([req.output_ids], device=logits.device)
+            else:
+                tmp_output_ids = None
+            last_token_logits = req.logits_processor(tmp_output_ids, logits)[0]
+        else:
+            last_token_logits = logits[0]
+
+        if self.device == "mps":
+            # Switch to CPU by avoiding some bugs in mps backend.
+            last_token_logits = last_token_logits.float().to("cpu")
+
+        if req.temperature < 1e-5 or req.top_p < 1e-8:  # greedy
+            return int(torch.argmax(last_token_logits))
+        probs = torch.softmax(last_token_logits.float(), dim=-1)
+        return int(torch.multinomial(probs, num_samples=1))
+
+    def _emit(self, req: BatchRequest, token: int) -> bool:
+        """Decode and push output of request, return True if request is finished"""
+        i = req.num_generated - 1
+        stopped = token in req.stop_token_ids
+        length_limit = req.num_generated >= req.max_new_tokens
+        if not (i % req.stream_interval == 0 or length_limit or stopped):
+            return False
+
+        req.detokenizer.step(req.output_ids, final=stopped or length_limit)
+        output = req.prompt_output + req.detokenizer.text
+        pos, partially_stopped = req.stop_matcher.check(output)
+        if pos != -1:
+            output = output[:pos]
+            stopped = True
+        if not partially_stopped or stopped or length_limit:
+            req.output = output
+            if stopped:
+                req.finish_reason = "stop"
+            elif length_limit:
+                req.finish_reason = "length"
+            req.output_queue.put(
+                {
+                    "text": output,
+                    "error_code": 0,
+                    "usage": req.stats.to_dict(),
+                    "finish_reason": req.finish_reason,
+                }
+            )
+        return stopped or length_limit
+
+    def _retire(self, requests: List[BatchRequest], finish_reason: str) -> None:
+        if not requests:
+            return
+        retired = set(id(req) for req in requests)
+        keep_index = [
+            i for i, req in enumerate(self._running) if id(req) not in retired
+        ]
+        self._running = [self._running[i] for i in keep_index]
+        for req in requests:
+            self._finish(req, finish_reason or req.finish_reason)
+        if not self._running:
+            self._reset_batch_cache()
+            return
+        index = torch.as_tensor(keep_index, device=self._attention_mask.device)
+        attention_mask = self._attention_mask.index_select(0, index)
+        # Drop the leading columns which are padding for all remaining requests
+        valid_columns = attention_mask.sum(0).nonzero()
+        first_column = int(valid_columns[0]) if len(valid_columns) else 0
+        self._attention_mask = attention_mask[:, first_column:]
+        self._past_key_values = tuple(
+            tuple(t.index_select(0, index)[:, :, first_column:] for t in layer)
+            for layer in self._past_key_values
+        )
+
+    def _finish(self, req: BatchRequest, finish_reason: Optional[str]) -> None:
+        req.finish_reason = req.finish_reason or finish_reason
+        req.stats.finish_time = time.time()
+        with self._lock:
+            self._total_requests += 1
+        logger.debug(
+            f"Request {req.request_id} finished, reason: {req.finish_reason}, stats: {req.stats.to_dict()}"
+        )
+        req.output_queue.put(_FINISH)
+
+    def _merge_batch(
+        self,
+        requests: List[BatchRequest],
+        past_key_values: Tuple[Tuple[torch.Tensor, ...], ...],
+        attention_mask: torch.Tensor,
+    ) -> None:
+        """Merge the KV cache of new requests into the running batch, the shorter
+        one is left padded"""
+        if not self._running:
+            self._past_key_values = past_key_values
+            self._attention_mask = attention_mask
+            self._running = list(requests)
+            return
+        old_len = self._attention_mask.shape[-1]
+        new_len = attention_mask.shape[-1]
+        seq_len = max(old_len, new_len)
+        self._past_key_values = tuple(
+            tuple(
+                torch.cat(
+                    [
+                        _left_pad(old_t, seq_len - old_len, dim=2),
+                        _left_pad(new_t, seq_len - new_len, dim=2),
+                    ],
+                    dim=0,
+                )
+                for old_t, new_t in zip(old_layer, new_layer)
+            )
+            for old_layer, new_layer in zip(self._past_key_values, past_key_values)
+        )
+        self._attention_mask = torch.cat(
+            [
+                _left_pad(self._attention_mask, seq_len - old_len, dim=1),
+                _left_pad(attention_mask, seq_len - new_len, dim=1),
+            ],
+            dim=0,
+        )
+        self._running.extend(requests)
+
+    def _reset_batch_cache(self) -> None:
+        self._past_key_values = None
+        self._attention_mask = None
+        gc.collect()
+        if torch.cuda.is_available():
+            torch.cuda.empty_cache()
+
+    def _pad_token_id(self) -> int:
+        if self.tokenizer.pad_token_id is not None:
+            return self.tokenizer.pad_token_id
+        if self.tokenizer.eos_token_id is not None:
+            return self.tokenizer.eos_token_id
+        return 0
+
+
+def _left_pad(t: torch.Tensor, pad_len: int, dim: int) -> torch.Tensor:
+    if pad_len <= 0:
+        return t
+    shape = list(t.shape)
+    shape[dim] = pad_len
+    return torch.cat([t.new_zeros(shape), t], dim=dim)
+
+
+def _to_legacy_cache(past_key_values: Any) -> Tuple[Tuple[torch.Tensor, ...], ...]:
+    """Convert the cache object of newer transformers to tuple format"""
+    if hasattr(past_key_values, "to_legacy_cache"):
+        return past_key_values.to_legacy_cache()
+    return past_key_values
+
+
+def _from_legacy_cache(past_key_values: Tuple[Tuple[torch.Tensor, ...], ...]) -> Any:
+    try:
+        from transformers import DynamicCache
+
+        return DynamicCache.from_legacy_cache(past_key_values)
+    except (ImportError, AttributeError):
+        return past_key_values
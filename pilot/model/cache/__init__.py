@@ -1,4 +1,5 @@
 from .base import Cache
 from .disk_cache import DiskCache
-from .memory_cache import InMemoryCache
+from .memory_cache import InMemoryCache, LRUCache
 from .gpt_cache import GPTCache
+from .llm_cache import LLMResponseCache, llm_cache_key
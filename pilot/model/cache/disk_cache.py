@@ -1,6 +1,4 @@
 import os
-import diskcache
-import platformdirs
 from pilot.model.cache import Cache
 
 
@@ -10,6 +8,14 @@ class DiskCache(Cache):
     """
 
     def __init__(self, llm_name: str):
+        try:
+            import diskcache
+            import platformdirs
+        except ImportError:
+            raise ValueError(
+                "Could not import diskcache python package. "
+                "Please install it with `pip install diskcache platformdirs`."
+            )
         self._diskcache = diskcache.Cache(
             os.path.join(platformdirs.user_cache_dir("dbgpt"), f"_{llm_name}.diskcache")
         )
@@ -0,0 +1,272 @@
+"""Cache of the LLM responses.
+
+Only the requests which opt in with `params["cache"] = True` are cached, the chat
+scenes listed in `LLM_CACHE_SCENES` do it for their requests.
+
+There are two match modes:
+
+1. Exact match, the key is the hash of the model, the normalized messages (or the
+   prompt if there are no messages) and the sampling parameters.
+2. Semantic match (optional), the request text is embedded by the embedding model and
+   the most similar cached request of the same model and sampling parameters is used
+   when the similarity is above the threshold.
+
+A cached stream is replayed chunk by chunk with the same chunk boundaries.
+"""
+from __future__ import annotations
+
+import hashlib
+import json
+import logging
+import re
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Dict, Iterator, List, Optional
+
+import numpy as np
+
+from pilot.model.base import ModelOutput
+from pilot.model.cache.base import Cache
+from pilot.model.cache.memory_cache import LRUCache
+
+logger = logging.getLogger(__name__)
+
+# The parameters which change the output of model
+_SAMPLING_PARAMS = (
+    "temperature",
+    "top_p",
+    "top_k",
+    "max_new_tokens",
+    "stop",
+    "stop_token_ids",
+    "echo",
+    "repetition_penalty",
+    "presence_penalty",
+    "frequency_penalty",
+)
+
+EmbedFunc = Callable[[str], Awaitable[List[float]]]
+
+
+def _normalize_text(text: str) -> str:
+    return re.sub(r"\s+", " ", text or "").strip()
+
+
+def _normalize_messages(params: Dict) -> List[List[str]]:
+    messages = params.get("messages")
+    if not messages:
+        return [["prompt", _normalize_text(params.get("prompt"))]]
+    normalized = []
+    for message in messages:
+        if isinstance(message, dict):
+            role, content = message.get("role"), message.get("content")
+        else:
+            role, content = message.role, message.content
+        normalized.append([str(role), _normalize_text(content)])
+    return normalized
+
+
+def _hash(data: Any) -> str:
+    content = json.dumps(data, ensure_ascii=False, sort_keys=True, default=str)
+    return hashlib.sha256(content.encode("utf-8")).hexdigest()
+
+
+def llm_cache_key(params: Dict) -> str:
+    """The exact match key of a request"""
+    return LLMCacheRequest.from_params(params).key
+
+
+@dataclass
+class LLMCacheRequest:
+    """The cache keys of a request, built once before the request is sent to model.
+
+    Args:
+        key: The exact match key.
+        scope: The hash of the model and the sampling parameters, only the requests in
+            the same scope are matched semantically.
+        text: The normalized text of the request, it is embedded for semantic match.
+    """
+
+    key: str
+    scope: str
+    text: str
+    vector: Optional[np.ndarray] = None
+
+    @staticmethod
+    def from_params(params: Dict) -> "LLMCacheRequest":
+        sampling = {name: params.get(name) for name in _SAMPLING_PARAMS}
+        scope = _hash([params.get("model"), sampling])
+        messages = _normalize_messages(params)
+        text = "\n".join(f"{role}: {content}" for role, content in messages)
+        return LLMCacheRequest(key=_hash([scope, messages]), scope=scope, text=text)
+
+
+@dataclass
+class CachedResponse:
+    text: str
+    # The text length of every output of the stream
+    chunk_offsets: List[int]
+    model_context: Optional[Dict] = None
+    created_at: float = field(default_factory=time.time)
+
+    def replay(self) -> Iterator[ModelOutput]:
+        for offset in self.chunk_offsets:
+            yield ModelOutput(
+                text=self.text[:offset], error_code=0, model_context=self.model_context
+            )
+
+    def final_output(self) -> ModelOutput:
+        return ModelOutput(
+            text=self.text, error_code=0, model_context=self.model_context
+        )
+
+
+class LLMResponseCache:
+    """Cache the responses of the requests which opt in.
+
+    Args:
+        cache (Cache): The storage of the responses, a LRU cache in memory by default.
+        max_entries (int): Max number of the responses in the default storage.
+        ttl (float): Seconds a response is valid, 0 means forever.
+        embed_func (EmbedFunc): Embed the request text for semantic match, only exact
+            match is used if None.
+        semantic_threshold (float): Min cosine similarity of a semantic match.
+    """
+
+    def __init__(
+        self,
+        cache: Optional[Cache] = None,
+        max_entries: int = 1000,
+        ttl: float = 3600,
+        embed_func: Optional[EmbedFunc] = None,
+        semantic_threshold: float = 0.95,
+    ) -> None:
+        self.cache = cache if cache is not None else LRUCache(max_entries)
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.embed_func = embed_func
+        self.semantic_threshold = semantic_threshold
+        # scope -> {key: normalized vector}
+        self._vectors: Dict[str, Dict[str, np.ndarray]] = {}
+        self._lock = threading.Lock()
+        self._exact_hits = 0
+        self._semantic_hits = 0
+        self._misses = 0
+        self._puts = 0
+
+    @staticmethod
+    def is_cacheable(params: Dict) -> bool:
+        return bool(params.get("cache"))
+
+    async def get(self, request: LLMCacheRequest) -> Optional[CachedResponse]:
+        response = self._get_valid(request.key)
+        if response:
+            self._exact_hits += 1
+            return response
+        if self.embed_func:
+            response = await self._semantic_get(request)
+            if response:
+                self._semantic_hits += 1
+                return response
+        self._misses += 1
+        return None
+
+    async def put(
+        self, request: LLMCacheRequest, outputs: List[ModelOutput]
+    ) -> Optional[CachedResponse]:
+        """Cache the outputs of a finished request, the failed outputs are not cached"""
+        if not outputs or any(output.error_code != 0 for output in outputs):
+            return None
+        final = outputs[-1]
+        if not final.text:
+            return None
+        response = CachedResponse(
+            text=final.text,
+            chunk_offsets=[len(output.text or "") for output in outputs],
+            model_context=final.model_context,
+        )
+        self.cache[request.key] = response
+        self._puts += 1
+        if self.embed_func:
+            await self._put_vector(request)
+        return response
+
+    def stats(self) -> Dict:
+        lookups = self._exact_hits + self._semantic_hits + self._misses
+        hits = self._exact_hits + self._semantic_hits
+        entries = len(self.cache) if hasattr(self.cache, "__len__") else None
+        return {
+            "exact_hits": self._exact_hits,
+            "semantic_hits": self._semantic_hits,
+            "misses": self._misses,
+            "puts": self._puts,
+            "hit_rate": hits / lookups if lookups else 0,
+            "entries": entries,
+            "semantic": self.embed_func is not None,
+        }
+
+    def clear(self) -> None:
+        self.cache.clear()
+        with self._lock:
+            self._vectors.clear()
+
+    def _get_valid(self, key: str) -> Optional[CachedResponse]:
+        try:
+            response: CachedResponse = self.cache[key]
+        except KeyError:
+            return None
+        if self.ttl > 0 and time.time() - response.created_at > self.ttl:
+            self._delete(key)
+            return None
+        return response
+
+    def _delete(self, key: str) -> None:
+        try:
+            del self.cache[key]
+        except (KeyError, TypeError, NotImplementedError):
+            pass
+
+    async def _embed(self, request: LLMCacheRequest) -> Optional[np.ndarray]:
+        if request.vector is None:
+            try:
+                vector = np.asarray(await self.embed_func(request.text), np.float32)
+            except Exception as e:
+                logger.warning(f"Embed request text for semantic cache error: {e}")
+                return None
+            norm = np.linalg.norm(vector)
+            request.vector = vector / norm if norm else vector
+        return request.vector
+
+    async def _semantic_get(self, request: LLMCacheRequest) -> Optional[CachedResponse]:
+        with self._lock:
+            candidates = dict(self._vectors.get(request.scope, {}))
+        if not candidates:
+            return None
+        vector = await self._embed(request)
+        if vector is None:
+            return None
+        keys = list(candidates.keys())
+        scores = np.stack([candidates[key] for key in keys]) @ vector
+        for i in np.argsort(-scores):
+            if scores[i] < self.semantic_threshold:
+                break
+            response = self._get_valid(keys[i])
+            if response:
+                return response
+            # Evicted or expired
+            with self._lock:
+                self._vectors.get(request.scope, {}).pop(keys[i], None)
+        return None
+
+    async def _put_vector(self, request: LLMCacheRequest) -> None:
+        vector = await self._embed(request)
+        if vector is None:
+            return
+        with self._lock:
+            vectors = self._vectors.setdefault(request.scope, {})
+            vectors.pop(request.key, None)
+            vectors[request.key] = vector
+            # The dict keeps the insertion order, drop the oldest vectors
+            while len(vectors) > self.max_entries:
+                vectors.pop(next(iter(vectors)))
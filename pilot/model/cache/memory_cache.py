@@ -1,3 +1,5 @@
+import threading
+from collections import OrderedDict
 from typing import Dict, Any
 from pilot.model.cache import Cache
 
@@ -21,3 +23,44 @@ class InMemoryCache(Cache):
 
     def __contains__(self, key: str) -> bool:
         return self._cache.get(key, None) is not None
+
+
+class LRUCache(Cache):
+    """In-memory cache which evicts the least recently used items.
+
+    Args:
+        max_entries (int): Max number of items in cache.
+    """
+
+    def __init__(self, max_entries: int = 1000) -> None:
+        self.max_entries = max_entries
+        self._cache: "OrderedDict[str, Any]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def clear(self):
+        with self._lock:
+            self._cache.clear()
+
+    def __setitem__(self, key: str, value: Any) -> None:
+        with self._lock:
+            self._cache[key] = value
+            self._cache.move_to_end(key)
+            while len(self._cache) > self.max_entries:
+                self._cache.popitem(last=False)
+
+    def __getitem__(self, key: str) -> Any:
+        with self._lock:
+            value = self._cache[key]
+            self._cache.move_to_end(key)
+            return value
+
+    def __delitem__(self, key: str) -> None:
+        with self._lock:
+            self._cache.pop(key, None)
+
+    def __contains__(self, key: str) -> bool:
+        with self._lock:
+            return key in self._cache
+
+    def __len__(self) -> int:
+        return len(self._cache)
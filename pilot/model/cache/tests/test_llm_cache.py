@@ -0,0 +1,101 @@
+import pytest
+
+from pilot.model.base import ModelOutput
+from pilot.model.cache import LLMResponseCache, LRUCache, llm_cache_key
+from pilot.model.cache.llm_cache import LLMCacheRequest
+
+
+def _request(**kwargs):
+    params = {"model": "vicuna-13b-v1.5", "prompt": "hello", "temperature": 0}
+    params.update(kwargs)
+    return LLMCacheRequest.from_params(params)
+
+
+def _outputs(*texts):
+    return [ModelOutput(text=text, error_code=0) for text in texts]
+
+
+def test_cache_key():
+    messages = [{"role": "human", "content": "Hello   world\n"}]
+    key = llm_cache_key({"model": "m", "messages": messages, "span_id": "1"})
+    # Whitespaces are normalized and span id is ignored
+    assert key == llm_cache_key(
+        {"model": "m", "messages": [{"role": "human", "content": "Hello world"}]}
+    )
+    assert key != llm_cache_key({"model": "m2", "messages": messages})
+    assert key != llm_cache_key({"model": "m", "messages": messages, "top_p": 0.5})
+    assert key != llm_cache_key(
+        {"model": "m", "messages": [{"role": "ai", "content": "Hello world"}]}
+    )
+
+
+def test_lru_cache():
+    cache = LRUCache(max_entries=2)
+    cache["a"] = 1
+    cache["b"] = 2
+    assert cache["a"] == 1
+    cache["c"] = 3
+    assert "b" not in cache
+    assert "a" in cache and "c" in cache
+    assert len(cache) == 2
+
+
+@pytest.mark.asyncio
+async def test_get_and_put():
+    cache = LLMResponseCache()
+    request = _request()
+    assert await cache.get(request) is None
+    await cache.put(request, _outputs("Hi", "Hi there"))
+    cached = await cache.get(_request())
+    assert [out.text for out in cached.replay()] == ["Hi", "Hi there"]
+    assert cached.final_output().text == "Hi there"
+    assert await cache.get(_request(temperature=0.7)) is None
+    stats = cache.stats()
+    assert stats["exact_hits"] == 1
+    assert stats["misses"] == 2
+    assert stats["entries"] == 1
+
+
+@pytest.mark.asyncio
+async def test_failed_outputs_not_cached():
+    cache = LLMResponseCache()
+    request = _request()
+    outputs = _outputs("Hi")
+    outputs.append(ModelOutput(text="error", error_code=1))
+    assert await cache.put(request, outputs) is None
+    assert await cache.put(request, _outputs("")) is None
+    assert await cache.get(request) is None
+
+
+@pytest.mark.asyncio
+async def test_ttl():
+    cache = LLMResponseCache(ttl=10)
+    request = _request()
+    response = await cache.put(request, _outputs("Hi"))
+    assert await cache.get(request) is not None
+    response.created_at -= 11
+    assert await cache.get(request) is None
+    assert cache.stats()["entries"] == 0
+
+
+@pytest.mark.asyncio
+async def test_semantic_match():
+    vectors = {
+        "prompt: how many users": [1.0, 0.0],
+        "prompt: how many users?": [0.99, 0.05],
+        "prompt: list the orders": [0.0, 1.0],
+    }
+
+    async def embed_func(text):
+        return vectors[text]
+
+    cache = LLMResponseCache(embed_func=embed_func, semantic_threshold=0.95)
+    await cache.put(_request(prompt="how many users"), _outputs("42"))
+    cached = await cache.get(_request(prompt="how many users?"))
+    assert cached.final_output().text == "42"
+    assert await cache.get(_request(prompt="list the orders")) is None
+    # Only the requests with the same sampling parameters are matched
+    assert await cache.get(_request(prompt="how many users?", temperature=1)) is None
+    stats = cache.stats()
+    assert stats["semantic_hits"] == 1
+    assert stats["misses"] == 2
@@ -19,6 +19,8 @@ class PromptRequest(BaseModel):
     stop: str = None
     echo: bool = True
     span_id: str = None
+    incremental: bool = False
+    """Whether the stream outputs only contain the new text, see ModelOutput.incremental"""
 
 
 class EmbeddingsRequest(BaseModel):
@@ -0,0 +1,187 @@
+"""Micro-batching for the embeddings model.
+
+Knowledge chats, db summary and document sync call the embeddings model concurrently
+with a few texts in each call. The batcher gathers the concurrent calls for up to
+`max_wait_ms` milliseconds or `max_batch_size` texts, runs one `embed_documents` on
+all of them and returns each caller its own part of the result.
+"""
+from __future__ import annotations
+
+import logging
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from typing import TYPE_CHECKING, Dict, List, Optional
+
+from pilot.utils.tracer import root_tracer
+
+if TYPE_CHECKING:
+    from langchain.embeddings.base import Embeddings
+
+logger = logging.getLogger(__name__)
+
+_FINISH = object()
+
+
+class _EmbeddingRequest:
+    def __init__(self, texts: List[str], span_id: Optional[str] = None) -> None:
+        self.texts = texts
+        self.span_id = span_id
+        self.future: Future = Future()
+        self.submit_time = time.perf_counter()
+
+
+class EmbeddingBatcher:
+    """Coalesce concurrent embedding calls into batches.
+
+    Args:
+        embeddings (Embeddings): The embeddings model.
+        max_batch_size (int): Max number of texts in one batch, a single call with more
+            texts runs as its own batch.
+        max_wait_ms (float): Max time to wait for more calls after the first call of a
+            batch arrives.
+
+    Examples:
+
+        .. code-block:: python
+
+            batcher = EmbeddingBatcher(embeddings, max_batch_size=64, max_wait_ms=5)
+            batcher.start()
+            # Called concurrently from many threads
+            vectors = batcher.embed_documents(["text1", "text2"])
+            batcher.stop()
+    """
+
+    def __init__(
+        self,
+        embeddings: "Embeddings",
+        max_batch_size: int = 64,
+        max_wait_ms: float = 5,
+    ) -> None:
+        self.embeddings = embeddings
+        self.max_batch_size = max(max_batch_size, 1)
+        self.max_wait = max(max_wait_ms, 0) / 1000
+        self._queue: queue.Queue = queue.Queue()
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+        self._num_batches = 0
+        self._num_requests = 0
+        self._num_texts = 0
+        self._total_batch_latency = 0.0
+
+    def start(self) -> None:
+        with self._lock:
+            if self._thread and self._thread.is_alive():
+                return
+            self._thread = threading.Thread(
+                target=self._run_loop, name="embedding_batcher", daemon=True
+            )
+            self._thread.start()
+
+    def stop(self) -> None:
+        with self._lock:
+            thread, self._thread = self._thread, None
+        if thread and thread.is_alive():
+            self._queue.put(_FINISH)
+            thread.join()
+
+    def embed_documents(
+        self, texts: List[str], span_id: Optional[str] = None
+    ) -> List[List[float]]:
+        """Embed texts in a batch with other concurrent calls, blocks until done"""
+        if not texts:
+            return []
+        if not self._thread:
+            raise RuntimeError("Embedding batcher is not running")
+        request = _EmbeddingRequest(texts, span_id)
+        self._queue.put(request)
+        return request.future.result()
+
+    def stats(self) -> Dict:
+        num_batches = self._num_batches
+        return {
+            "num_batches": num_batches,
+            "num_requests": self._num_requests,
+            "num_texts": self._num_texts,
+            "avg_batch_size": self._num_texts / num_batches if num_batches else 0,
+            "avg_batch_latency_ms": (
+                self._total_batch_latency * 1000 / num_batches if num_batches else 0
+            ),
+        }
+
+    def _run_loop(self) -> None:
+        carry: Optional[_EmbeddingRequest] = None
+        while True:
+            first = carry if carry is not None else self._queue.get()
+            carry = None
+            if first is _FINISH:
+                break
+            batch = [first]
+            num_texts = len(first.texts)
+            deadline = time.perf_counter() + self.max_wait
+            finished = False
+            while num_texts < self.max_batch_size:
+                timeout = deadline - time.perf_counter()
+                try:
+                    if timeout > 0:
+                        request = self._queue.get(timeout=timeout)
+                    else:
+                        # Wait budget is used up, only take the queued calls
+                        request = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if request is _FINISH:
+                    finished = True
+                    break
+                if num_texts + len(request.texts) > self.max_batch_size:
+                    carry = request
+                    break
+                batch.append(request)
+                num_texts += len(request.texts)
+            self._run_batch(batch, num_texts)
+            if finished:
+                break
+        # Fail the calls after stop instead of blocking them forever
+        while True:
+            try:
+                request = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if request is not _FINISH:
+                request.future.set_exception(
+                    RuntimeError("Embedding batcher is stopped")
+                )
+
+    def _run_batch(self, batch: List[_EmbeddingRequest], num_texts: int) -> None:
+        start_time = time.perf_counter()
+        span = root_tracer.start_span(
+            "EmbeddingBatcher.run_batch",
+            batch[0].span_id,
+            metadata={
+                "num_requests": len(batch),
+                "num_texts": num_texts,
+                "max_batch_size": self.max_batch_size,
+                "max_wait_ms": self.max_wait * 1000,
+                "queue_wait_ms": round((start_time - batch[0].submit_time) * 1000, 2),
+            },
+        )
+        texts = [text for request in batch for text in request.texts]
+        try:
+            vectors = self.embeddings.embed_documents(texts)
+        except Exception as e:
+            logger.warning(f"Run embedding batch with {num_texts} texts error: {e}")
+            for request in batch:
+                request.future.set_exception(e)
+            span.end(metadata={"error": str(e)})
+            return
+        latency = time.perf_counter() - start_time
+        offset = 0
+        for request in batch:
+            request.future.set_result(vectors[offset : offset + len(request.texts)])
+            offset += len(request.texts)
+        self._num_batches += 1
+        self._num_requests += len(batch)
+        self._num_texts += num_texts
+        self._total_batch_latency += latency
+        span.end(metadata={"latency_ms": round(latency * 1000, 2)})
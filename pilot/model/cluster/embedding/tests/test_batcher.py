@@ -0,0 +1,74 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import List
+
+import pytest
+
+from pilot.model.cluster.embedding.batcher import EmbeddingBatcher
+
+
+class MockEmbeddings:
+    def __init__(self, error: bool = False) -> None:
+        self.batches: List[List[str]] = []
+        self.error = error
+        self._lock = threading.Lock()
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        if self.error:
+            raise ValueError("Embedding error for mock")
+        with self._lock:
+            self.batches.append(list(texts))
+        return [[float(len(text)), float(text.count("a"))] for text in texts]
+
+
+@pytest.fixture
+def embeddings():
+    return MockEmbeddings()
+
+
+def _run_concurrently(batcher: EmbeddingBatcher, inputs: List[List[str]]):
+    with ThreadPoolExecutor(max_workers=len(inputs)) as executor:
+        return list(executor.map(batcher.embed_documents, inputs))
+
+
+def test_concurrent_calls_are_batched(embeddings: MockEmbeddings):
+    batcher = EmbeddingBatcher(embeddings, max_batch_size=64, max_wait_ms=200)
+    batcher.start()
+    inputs = [[f"text{i}", "a" * i] for i in range(16)]
+    results = _run_concurrently(batcher, inputs)
+    batcher.stop()
+
+    # 16 calls in fewer batches
+    assert len(embeddings.batches) < 16
+    for texts, vectors in zip(inputs, results):
+        assert vectors == embeddings.embed_documents(texts)
+    stats = batcher.stats()
+    assert stats["num_requests"] == 16
+    assert stats["num_texts"] == 32
+
+
+def test_max_batch_size(embeddings: MockEmbeddings):
+    batcher = EmbeddingBatcher(embeddings, max_batch_size=4, max_wait_ms=100)
+    batcher.start()
+    inputs = [["a", "b", "c"] for _ in range(8)] + [["x"] * 10]
+    results = _run_concurrently(batcher, inputs)
+    batcher.stop()
+
+    assert [len(vectors) for vectors in results] == [3] * 8 + [10]
+    # The call with more texts than max_batch_size runs alone
+    assert all(len(batch) <= 4 or batch == ["x"] * 10 for batch in embeddings.batches)
+
+
+def test_batch_error():
+    batcher = EmbeddingBatcher(MockEmbeddings(error=True), max_wait_ms=1)
+    batcher.start()
+    with pytest.raises(ValueError):
+        batcher.embed_documents(["text"])
+    batcher.stop()
+
+
+def test_not_started(embeddings: MockEmbeddings):
+    batcher = EmbeddingBatcher(embeddings)
+    assert batcher.embed_documents([]) == []
+    with pytest.raises(RuntimeError):
+        batcher.embed_documents(["text"])
@@ -1,5 +1,6 @@
 import asyncio
-from dataclasses import dataclass
+from dataclasses import dataclass, field
+import time
 from typing import List, Optional, Dict, Iterator, Callable
 from abc import ABC, abstractmethod
 from datetime import datetime
@@ -12,6 +13,44 @@ from pilot.model.parameter import ModelWorkerParameters, ModelParameters
 from pilot.utils.parameter_utils import ParameterDescription
 
 
+@dataclass
+class WorkerStats:
+    """The load statistics of a worker instance, used by the instance selectors.
+
+    The statistics are kept in the `WorkerRunData` of the instance, so they persist
+    across requests.
+    """
+
+    in_flight: int = 0
+    total_requests: int = 0
+    total_errors: int = 0
+    # Exponentially weighted moving average of latency (seconds)
+    ewma_latency: Optional[float] = None
+    ewma_alpha: float = 0.3
+
+    def begin(self) -> float:
+        self.in_flight += 1
+        self.total_requests += 1
+        return time.perf_counter()
+
+    def end(
+        self, start_time: float, error: bool = False, record_latency: bool = True
+    ) -> None:
+        self.in_flight = max(self.in_flight - 1, 0)
+        if error:
+            self.total_errors += 1
+        elif record_latency:
+            self.observe_latency(time.perf_counter() - start_time)
+
+    def observe_latency(self, latency: float) -> None:
+        if self.ewma_latency is None:
+            self.ewma_latency = latency
+        else:
+            self.ewma_latency = (
+                self.ewma_alpha * latency + (1 - self.ewma_alpha) * self.ewma_latency
+            )
+
+
 @dataclass
 class WorkerRunData:
     host: str
@@ -23,6 +62,8 @@ class WorkerRunData:
     stop_event: asyncio.Event
     semaphore: asyncio.Semaphore = None
     command_args: List[str] = None
+    weight: Optional[float] = 1.0
+    stats: WorkerStats = field(default_factory=WorkerStats)
     _heartbeat_future: Optional[Future] = None
     _last_heartbeat: Optional[datetime] = None
 
@@ -1,10 +1,10 @@
 import os
 import logging
-from typing import Dict, Iterator, List
+from typing import Dict, Iterator, List, Optional
 
 from pilot.configs.model_config import get_device
 from pilot.model.model_adapter import get_llm_model_adapter, LLMModelAdaper
-from pilot.model.base import ModelOutput
+from pilot.model.base import ModelOutput, ModelType
 from pilot.model.loader import ModelLoader, _get_model_real_path
 from pilot.model.parameter import ModelParameters
 from pilot.model.cluster.worker_base import ModelWorker
@@ -12,6 +12,7 @@ from pilot.utils.model_utils import _clear_model_cache
 from pilot.utils.parameter_utils import EnvArgumentParser, _get_dict_from_obj
 from pilot.utils.tracer import root_tracer, SpanType, SpanTypeRunName
 from pilot.utils.system_utils import get_system_info
+from pilot.utils.stream_utils import StreamMetrics
 
 logger = logging.getLogger(__name__)
 
@@ -24,6 +25,40 @@ except ImportError:
     pass
 
 
+_DEFAULT_CONTEXT_LEN = 2048
+
+# The attributes of model config which may hold the max context length
+_CONTEXT_LEN_ATTRS = (
+    "max_sequence_length",
+    "seq_length",
+    "max_seq_len",
+    "max_position_embeddings",
+    "max_seq_length",
+    "model_max_length",
+    "n_positions",
+)
+
+
+def _get_context_len(model, model_params: ModelParameters) -> int:
+    """Read the max context length from the config of the model, use
+    `max_context_size` of the parameters for the models without config (llama.cpp)"""
+    config = getattr(model, "config", None)
+    if config is not None and not callable(config):
+        rope_scaling = getattr(config, "rope_scaling", None)
+        rope_factor = 1
+        if isinstance(rope_scaling, dict) and rope_scaling.get("factor"):
+            rope_factor = rope_scaling["factor"]
+        for attr in _CONTEXT_LEN_ATTRS:
+            value = getattr(config, attr, None)
+            # Tokenizers use a huge number for no limit
+            if isinstance(value, int) and 0 < value < 10_000_000:
+                return int(rope_factor * value)
+    max_context_size = getattr(model_params, "max_context_size", None)
+    if max_context_size:
+        return max_context_size
+    return _DEFAULT_CONTEXT_LEN
+
+
 class DefaultModelWorker(ModelWorker):
     def __init__(self) -> None:
         self.model = None
@@ -31,6 +66,7 @@ class DefaultModelWorker(ModelWorker):
         self._model_params = None
         self.llm_adapter: LLMModelAdaper = None
         self._support_async = False
+        self._batch_scheduler = None
 
     def load_worker(self, model_name: str, model_path: str, **kwargs) -> None:
         if model_path.endswith("/"):
@@ -60,8 +96,8 @@ class DefaultModelWorker(ModelWorker):
         self.ml: ModelLoader = ModelLoader(
             model_path=self.model_path, model_name=self.model_name
         )
-        # TODO read context len from model config
-        self.context_len = 2048
+        # Updated from the model config when the model is loaded
+        self.context_len = _DEFAULT_CONTEXT_LEN
 
     def model_param_class(self) -> ModelParameters:
         return self.param_cls
@@ -111,11 +147,44 @@ class DefaultModelWorker(ModelWorker):
             self.model, self.tokenizer = self.ml.loader_with_params(
                 model_params, self.llm_adapter
             )
+            self.context_len = _get_context_len(self.model, model_params)
+            logger.info(
+                f"Context length of model {self.model_name}: {self.context_len}"
+            )
+            self._start_batch_scheduler(model_params)
+
+    def _start_batch_scheduler(self, model_params: ModelParameters) -> None:
+        if (
+            not getattr(model_params, "continuous_batching", False)
+            or self.llm_adapter.model_type() != ModelType.HF
+            or self.support_async()
+        ):
+            return
+        from pilot.model.batch_inference import ContinuousBatchingScheduler
+
+        try:
+            self._batch_scheduler = ContinuousBatchingScheduler(
+                self.model,
+                self.tokenizer,
+                model_params.device,
+                self.context_len,
+                max_batch_size=model_params.max_batch_size,
+            )
+        except ValueError as e:
+            logger.warn(f"Continuous batching is disabled: {str(e)}")
+            return
+        self._batch_scheduler.start()
+        logger.info(
+            f"Start continuous batching scheduler, max_batch_size: {model_params.max_batch_size}"
+        )
 
     def stop(self) -> None:
         if not self.model:
             logger.warn("Model has been stopped!!")
             return
+        if self._batch_scheduler:
+            self._batch_scheduler.stop()
+            self._batch_scheduler = None
         del self.model
         del self.tokenizer
         self.model = None
@@ -138,19 +207,30 @@ class DefaultModelWorker(ModelWorker):
             )
 
             previous_response = ""
+            usage = None
+            metrics = StreamMetrics()
 
             for output in generate_stream_func(
                 self.model, self.tokenizer, params, get_device(), self.context_len
             ):
+                if isinstance(output, dict):
+                    usage = output.get("usage", usage)
                 model_output, incremental_output, output_str = self._handle_output(
                     output, previous_response, model_context
                 )
                 previous_response = output_str
+                metrics.on_output(len(output_str))
                 yield model_output
             print(
                 f"\n\nfull stream output:\n{previous_response}\n\nmodel generate_stream params:\n{params}"
             )
-            model_span.end(metadata={"output": previous_response})
+            metadata = {"output": previous_response}
+            if usage:
+                metadata["usage"] = usage
+            metadata["metrics"] = metrics.to_dict(_completion_tokens(usage))
+            if self._batch_scheduler:
+                metadata["batch_stats"] = self._batch_scheduler.stats()
+            model_span.end(metadata=metadata)
             span.end()
         except Exception as e:
             output = self._handle_exception(e)
@@ -183,19 +263,29 @@ class DefaultModelWorker(ModelWorker):
             )
 
             previous_response = ""
+            usage = None
+            metrics = StreamMetrics()
 
             async for output in generate_stream_func(
                 self.model, self.tokenizer, params, get_device(), self.context_len
             ):
+                if isinstance(output, dict):
+                    usage = output.get("usage", usage)
                 model_output, incremental_output, output_str = self._handle_output(
                     output, previous_response, model_context
                 )
                 previous_response = output_str
+                metrics.on_output(len(output_str))
                 yield model_output
             print(
                 f"\n\nfull stream output:\n{previous_response}\n\nmodel generate_stream params:\n{params}"
             )
-            model_span.end(metadata={"output": previous_response})
+            model_span.end(
+                metadata={
+                    "output": previous_response,
+                    "metrics": metrics.to_dict(_completion_tokens(usage)),
+                }
+            )
             span.end()
         except Exception as e:
             output = self._handle_exception(e)
@@ -224,6 +314,9 @@ class DefaultModelWorker(ModelWorker):
             logger.info(
                 "current generate stream function is asynchronous stream function"
             )
+        elif self._batch_scheduler:
+            generate_stream_func = self._batch_generate_stream
+            stream_type = "batched "
         else:
             generate_stream_func = self.llm_adapter.get_generate_stream_function(
                 self.model, self.model_path
@@ -255,6 +348,13 @@ class DefaultModelWorker(ModelWorker):
 
         return params, model_context, generate_stream_func, model_span
 
+    def _batch_generate_stream(
+        self, model, tokenizer, params: Dict, device: str, context_len: int
+    ) -> Iterator[Dict]:
+        """Same signature as generate stream function of model, run in continuous
+        batching scheduler"""
+        return self._batch_scheduler.generate_stream(params)
+
     def _handle_output(self, output, previous_response, model_context):
         if isinstance(output, dict):
             finish_reason = output.get("finish_reason")
@@ -280,3 +380,9 @@ class DefaultModelWorker(ModelWorker):
                 error_code=0,
             )
         return model_output
+
+
+def _completion_tokens(usage: Optional[Dict]) -> Optional[int]:
+    if not usage or not isinstance(usage, dict):
+        return None
+    return usage.get("completion_tokens")
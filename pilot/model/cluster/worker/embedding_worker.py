@@ -11,6 +11,7 @@ from pilot.model.parameter import (
 )
 from pilot.model.cluster.worker_base import ModelWorker
 from pilot.model.cluster.embedding.loader import EmbeddingLoader
+from pilot.model.cluster.embedding.batcher import EmbeddingBatcher
 from pilot.utils.model_utils import _clear_model_cache
 from pilot.utils.parameter_utils import EnvArgumentParser
 
@@ -32,6 +33,7 @@ class EmbeddingsModelWorker(ModelWorker):
         self.model_name = None
         self.model_path = None
         self._loader = EmbeddingLoader()
+        self._batcher: EmbeddingBatcher = None
 
     def load_worker(self, model_name: str, model_path: str, **kwargs) -> None:
         if model_path.endswith("/"):
@@ -70,6 +72,13 @@ class EmbeddingsModelWorker(ModelWorker):
             model_params = self.parse_parameters(command_args)
         self._model_params = model_params
         self._embeddings_impl = self._loader.load(self.model_name, model_params)
+        if getattr(model_params, "batch_embeddings", False):
+            self._batcher = EmbeddingBatcher(
+                self._embeddings_impl,
+                max_batch_size=model_params.max_batch_size,
+                max_wait_ms=model_params.max_batch_wait_ms,
+            )
+            self._batcher.start()
 
     def __del__(self):
         self.stop()
@@ -77,6 +86,9 @@ class EmbeddingsModelWorker(ModelWorker):
     def stop(self) -> None:
         if not self._embeddings_impl:
             return
+        if self._batcher:
+            self._batcher.stop()
+            self._batcher = None
         del self._embeddings_impl
         self._embeddings_impl = None
         _clear_model_cache(self._model_params.device)
@@ -93,6 +105,8 @@ class EmbeddingsModelWorker(ModelWorker):
         model = params.get("model")
         logger.info(f"Receive embeddings request, model: {model}")
         input: List[str] = params["input"]
+        if self._batcher:
+            return self._batcher.embed_documents(input, params.get("span_id"))
         return self._embeddings_impl.embed_documents(input)
 
 
@@ -3,21 +3,23 @@ import itertools
 import json
 import logging
 import os
-import random
 import sys
 import time
 from concurrent.futures import ThreadPoolExecutor
 from dataclasses import asdict
-from typing import Awaitable, Callable, Dict, Iterator, List
+from typing import Awaitable, Callable, Dict, Iterator, List, Optional
 
 from fastapi import APIRouter, FastAPI
 from fastapi.responses import StreamingResponse
 
 from pilot.component import SystemApp
 from pilot.configs.model_config import LOGDIR
+from pilot.model.cache import LLMResponseCache
+from pilot.model.cache.llm_cache import LLMCacheRequest
 from pilot.model.base import (
     ModelInstance,
     ModelOutput,
+    ModelOutputDeltaEncoder,
     WorkerApplyOutput,
     WorkerApplyType,
     WorkerSupportedModel,
@@ -30,6 +32,11 @@ from pilot.model.cluster.manager_base import (
 )
 from pilot.model.cluster.registry import ModelRegistry
 from pilot.model.cluster.worker_base import ModelWorker
+from pilot.model.cluster.worker.selector import (
+    InstanceSelector,
+    RandomSelector,
+    create_selector,
+)
 from pilot.model.llm_utils import list_supported_models
 from pilot.model.parameter import ModelParameters, ModelWorkerParameters, WorkerType
 from pilot.utils.parameter_utils import (
@@ -41,6 +48,8 @@ from pilot.utils.parameter_utils import (
 from pilot.utils.utils import setup_logging
 from pilot.utils.tracer import initialize_tracer, root_tracer, SpanType, SpanTypeRunName
 from pilot.utils.system_utils import get_system_info
+from pilot.utils.http_client import get_http_client_factory, initialize_http_client
+from pilot.model.proxy.llms.credential_cache import initialize_credential_cache
 
 logger = logging.getLogger(__name__)
 
@@ -73,6 +82,8 @@ class LocalWorkerManager(WorkerManager):
         model_registry: ModelRegistry = None,
         host: str = None,
         port: int = None,
+        selector: InstanceSelector = None,
+        llm_cache: Optional[LLMResponseCache] = None,
     ) -> None:
         self.workers: Dict[str, List[WorkerRunData]] = dict()
         self.executor = ThreadPoolExecutor(max_workers=os.cpu_count() * 5)
@@ -83,6 +94,8 @@ class LocalWorkerManager(WorkerManager):
         self.host = host
         self.port = port
         self.start_listeners = []
+        self.selector = selector or RandomSelector()
+        self.llm_cache = llm_cache
 
         self.run_data = WorkerRunData(
             host=self.host,
@@ -283,7 +296,7 @@ class LocalWorkerManager(WorkerManager):
             raise Exception(
                 f"Cound not found worker instances for model name {model_name} and worker type {worker_type}"
             )
-        worker_run_data = random.choice(worker_instances)
+        worker_run_data = self.selector.select(worker_instances)
         return worker_run_data
 
     async def select_one_instance(
@@ -322,6 +335,15 @@ class LocalWorkerManager(WorkerManager):
             "WorkerManager.generate_stream", params.get("span_id")
         ) as span:
             params["span_id"] = span.span_id
+            cache_request = self._cache_request(params)
+            if cache_request:
+                cached = await self.llm_cache.get(cache_request)
+                span.metadata = {"cache_hit": cached is not None}
+                if cached:
+                    for output in cached.replay():
+                        yield output
+                    return
+                outputs = []
             try:
                 worker_run_data = await self._get_model(params)
             except Exception as e:
@@ -331,20 +353,40 @@ class LocalWorkerManager(WorkerManager):
                 )
                 return
             async with worker_run_data.semaphore:
-                if worker_run_data.worker.support_async():
-                    async for outout in worker_run_data.worker.async_generate_stream(
-                        params
-                    ):
-                        yield outout
-                else:
-                    if not async_wrapper:
-                        from starlette.concurrency import iterate_in_threadpool
-
-                        async_wrapper = iterate_in_threadpool
-                    async for output in async_wrapper(
-                        worker_run_data.worker.generate_stream(params)
-                    ):
+                # The latency of a stream is its time to first output, the total time
+                # depends on the output length.
+                start_time = worker_run_data.stats.begin()
+                first_output = True
+                error = True
+                try:
+                    if worker_run_data.worker.support_async():
+                        stream = worker_run_data.worker.async_generate_stream(params)
+                    else:
+                        if not async_wrapper:
+                            from starlette.concurrency import iterate_in_threadpool
+
+                            async_wrapper = iterate_in_threadpool
+                        stream = async_wrapper(
+                            worker_run_data.worker.generate_stream(params)
+                        )
+                    async for output in stream:
+                        if first_output:
+                            first_output = False
+                            worker_run_data.stats.observe_latency(
+                                time.perf_counter() - start_time
+                            )
+                        if cache_request:
+                            outputs.append(output)
                         yield output
+                    error = False
+                finally:
+                    worker_run_data.stats.end(
+                        start_time, error=error, record_latency=False
+                    )
+                    if error:
+                        self._on_worker_error(worker_run_data)
+            if cache_request:
+                await self.llm_cache.put(cache_request, outputs)
 
     async def generate(self, params: Dict) -> ModelOutput:
         """Generate non stream result"""
@@ -352,6 +394,12 @@ class LocalWorkerManager(WorkerManager):
             "WorkerManager.generate", params.get("span_id")
         ) as span:
             params["span_id"] = span.span_id
+            cache_request = self._cache_request(params)
+            if cache_request:
+                cached = await self.llm_cache.get(cache_request)
+                span.metadata = {"cache_hit": cached is not None}
+                if cached:
+                    return cached.final_output()
             try:
                 worker_run_data = await self._get_model(params)
             except Exception as e:
@@ -360,12 +408,27 @@ class LocalWorkerManager(WorkerManager):
                     error_code=0,
                 )
             async with worker_run_data.semaphore:
-                if worker_run_data.worker.support_async():
-                    return await worker_run_data.worker.async_generate(params)
-                else:
-                    return await self.run_blocking_func(
-                        worker_run_data.worker.generate, params
-                    )
+                start_time = worker_run_data.stats.begin()
+                try:
+                    if worker_run_data.worker.support_async():
+                        output = await worker_run_data.worker.async_generate(params)
+                    else:
+                        output = await self.run_blocking_func(
+                            worker_run_data.worker.generate, params
+                        )
+                except Exception:
+                    worker_run_data.stats.end(start_time, error=True)
+                    self._on_worker_error(worker_run_data)
+                    raise
+                worker_run_data.stats.end(start_time)
+            if cache_request:
+                await self.llm_cache.put(cache_request, [output])
+            return output
+
+    def _cache_request(self, params: Dict) -> Optional[LLMCacheRequest]:
+        if not self.llm_cache or not self.llm_cache.is_cacheable(params):
+            return None
+        return LLMCacheRequest.from_params(params)
 
     async def embeddings(self, params: Dict) -> List[List[float]]:
         """Embed input"""
@@ -378,16 +441,36 @@ class LocalWorkerManager(WorkerManager):
             except Exception as e:
                 raise e
             async with worker_run_data.semaphore:
-                if worker_run_data.worker.support_async():
-                    return await worker_run_data.worker.async_embeddings(params)
-                else:
-                    return await self.run_blocking_func(
-                        worker_run_data.worker.embeddings, params
-                    )
+                start_time = worker_run_data.stats.begin()
+                try:
+                    if worker_run_data.worker.support_async():
+                        output = await worker_run_data.worker.async_embeddings(params)
+                    else:
+                        output = await self.run_blocking_func(
+                            worker_run_data.worker.embeddings, params
+                        )
+                except Exception:
+                    worker_run_data.stats.end(start_time, error=True)
+                    self._on_worker_error(worker_run_data)
+                    raise
+                worker_run_data.stats.end(start_time)
+                return output
 
     def sync_embeddings(self, params: Dict) -> List[List[float]]:
         worker_run_data = self._sync_get_model(params, worker_type="text2vec")
-        return worker_run_data.worker.embeddings(params)
+        start_time = worker_run_data.stats.begin()
+        try:
+            output = worker_run_data.worker.embeddings(params)
+        except Exception:
+            worker_run_data.stats.end(start_time, error=True)
+            self._on_worker_error(worker_run_data)
+            raise
+        worker_run_data.stats.end(start_time)
+        return output
+
+    def _on_worker_error(self, worker_run_data: WorkerRunData) -> None:
+        """Called when a request to the worker instance failed"""
+        pass
 
     async def worker_apply(self, apply_req: WorkerApplyRequest) -> WorkerApplyOutput:
         apply_func: Callable[[WorkerApplyRequest], Awaitable[str]] = None
@@ -661,10 +744,13 @@ router = APIRouter()
 async def generate_json_stream(params):
     from starlette.concurrency import iterate_in_threadpool
 
+    encoder = ModelOutputDeltaEncoder() if params.pop("incremental", False) else None
     async for output in worker_manager.generate_stream(
         params, async_wrapper=iterate_in_threadpool
     ):
-        yield json.dumps(asdict(output), ensure_ascii=False).encode() + b"\0"
+        if encoder:
+            output = encoder.encode(output)
+        yield json.dumps(output.to_dict(), ensure_ascii=False).encode() + b"\0"
 
 
 @router.post("/worker/generate_stream")
@@ -680,10 +766,12 @@ async def api_generate_stream(request: PromptRequest):
 @router.post("/worker/generate")
 async def api_generate(request: PromptRequest):
     params = request.dict(exclude_none=True)
+    params.pop("incremental", None)
     span_id = root_tracer.get_current_span_id()
     if "span_id" not in params and span_id:
         params["span_id"] = span_id
-    return await worker_manager.generate(params)
+    output = await worker_manager.generate(params)
+    return output.to_dict()
 
 
 @router.post("/worker/embeddings")
@@ -730,6 +818,21 @@ async def api_model_shutdown(request: WorkerStartupRequest):
     return await worker_manager.model_shutdown(request)
 
 
+@router.get("/worker/llm_cache/metrics")
+async def api_llm_cache_metrics():
+    """Get the hit rate of the LLM response cache."""
+    llm_cache = getattr(worker_manager.worker_manager, "llm_cache", None)
+    if not llm_cache:
+        return {"enabled": False}
+    return {"enabled": True, **llm_cache.stats()}
+
+
+@router.get("/worker/http_client/metrics")
+async def api_http_client_metrics():
+    """Get the connection pool utilization of the shared HTTP clients."""
+    return get_http_client_factory().metrics()
+
+
 def _setup_fastapi(
     worker_params: ModelWorkerParameters, app=None, ignore_exception: bool = False
 ):
@@ -801,6 +904,29 @@ def _parse_worker_params(
     return worker_params
 
 
+def _create_llm_cache(
+    worker_params: ModelWorkerParameters,
+) -> Optional[LLMResponseCache]:
+    if not worker_params.llm_cache_enabled:
+        return None
+    embed_func = None
+    if worker_params.llm_cache_semantic_model:
+
+        async def embed_func(text: str) -> List[float]:
+            # Embed with the embedding worker of the current worker manager
+            output = await worker_manager.embeddings(
+                {"model": worker_params.llm_cache_semantic_model, "input": [text]}
+            )
+            return output[0]
+
+    return LLMResponseCache(
+        max_entries=worker_params.llm_cache_max_entries,
+        ttl=worker_params.llm_cache_ttl,
+        embed_func=embed_func,
+        semantic_threshold=worker_params.llm_cache_semantic_threshold,
+    )
+
+
 def _create_local_model_manager(
     worker_params: ModelWorkerParameters,
 ) -> LocalWorkerManager:
@@ -816,7 +942,9 @@ def _create_local_model_manager(
         logger.info(
             f"Not register current to controller, register: {worker_params.register}, controller_addr: {worker_params.controller_addr}"
         )
-        return LocalWorkerManager(host=host, port=port)
+        return LocalWorkerManager(
+            host=host, port=port, llm_cache=_create_llm_cache(worker_params)
+        )
     else:
         from pilot.model.cluster.controller.controller import ModelRegistryClient
 
@@ -846,6 +974,7 @@ def _create_local_model_manager(
             send_heartbeat_func=send_heartbeat_func,
             host=host,
             port=port,
+            llm_cache=_create_llm_cache(worker_params),
         )
 
 
@@ -972,7 +1101,12 @@ def initialize_worker_manager_in_client(
         controller_addr = worker_params.controller_addr
         logger.info(f"Worker params: {worker_params}")
         client = ModelRegistryClient(worker_params.controller_addr)
-        worker_manager.worker_manager = RemoteWorkerManager(client)
+        worker_manager.worker_manager = RemoteWorkerManager(
+            client,
+            selector=create_selector(worker_params.instance_select_strategy),
+            registry_cache_ttl=worker_params.registry_cache_ttl,
+            llm_cache=_create_llm_cache(worker_params),
+        )
         worker_manager.after_start(start_listener)
         initialize_controller(
             app=app, remote_controller_addr=worker_params.controller_addr
@@ -984,6 +1118,8 @@ def initialize_worker_manager_in_client(
         # mount WorkerManager router
         app.include_router(router, prefix="/api")
     if system_app:
+        initialize_http_client(system_app)
+        initialize_credential_cache(system_app)
         system_app.register(_DefaultWorkerManagerFactory, worker_manager)
 
 
@@ -1022,6 +1158,8 @@ def run_worker_manager(
         os.path.join(LOGDIR, worker_params.tracer_file),
         root_operation_name="DB-GPT-WorkerManager-Entry",
     )
+    initialize_http_client(system_app)
+    initialize_credential_cache(system_app)
 
     _start_local_worker(worker_manager, worker_params)
     _start_local_embedding_worker(
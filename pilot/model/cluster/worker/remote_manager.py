@@ -1,17 +1,47 @@
 import asyncio
-from typing import Any, Callable
+import threading
+import time
+from typing import Any, Callable, Dict, Optional, Tuple
 
-import httpx
 from pilot.model.base import ModelInstance, WorkerApplyOutput, WorkerSupportedModel
+from pilot.model.cache import LLMResponseCache
 from pilot.model.cluster.base import *
 from pilot.model.cluster.registry import ModelRegistry
 from pilot.model.cluster.worker.manager import LocalWorkerManager, WorkerRunData, logger
 from pilot.model.cluster.worker.remote_worker import RemoteModelWorker
+from pilot.model.cluster.worker.selector import InstanceSelector
+from pilot.utils.http_client import get_http_client_factory
 
 
 class RemoteWorkerManager(LocalWorkerManager):
-    def __init__(self, model_registry: ModelRegistry = None) -> None:
-        super().__init__(model_registry=model_registry)
+    """Worker manager which sends the requests to the remote workers
+
+    The instances fetched from the model registry are cached for `registry_cache_ttl`
+    seconds. After the ttl, the cached instances are still used while they are being
+    refreshed in background, so the model controller round trip is not in the path of
+    requests. The `WorkerRunData` of an instance is reused as long as the instance is
+    registered, it keeps the load statistics used by the selector.
+    """
+
+    def __init__(
+        self,
+        model_registry: ModelRegistry = None,
+        selector: InstanceSelector = None,
+        registry_cache_ttl: float = 10,
+        llm_cache: Optional[LLMResponseCache] = None,
+    ) -> None:
+        super().__init__(
+            model_registry=model_registry, selector=selector, llm_cache=llm_cache
+        )
+        self._registry_cache_ttl = registry_cache_ttl
+        # (worker_key, healthy_only) -> (fetch time, instances)
+        self._instances_cache: Dict[
+            Tuple[str, bool], Tuple[float, List[WorkerRunData]]
+        ] = {}
+        # (worker_key, host, port) -> WorkerRunData
+        self._run_data_cache: Dict[Tuple[str, str, int], WorkerRunData] = {}
+        self._refresh_tasks: Dict[Tuple[str, bool], asyncio.Task] = {}
+        self._lock = threading.Lock()
 
     async def start(self):
         for listener in self.start_listeners:
@@ -35,26 +65,26 @@ class RemoteWorkerManager(LocalWorkerManager):
         headers = {**worker_run_data.worker.headers, **(additional_headers or {})}
         timeout = worker_run_data.worker.timeout
 
-        async with httpx.AsyncClient() as client:
-            request = client.build_request(
-                method,
-                url,
-                json=json,  # using json for data to ensure it sends as application/json
-                params=params,
-                headers=headers,
-                timeout=timeout,
-            )
+        client = get_http_client_factory().get_async_client(url)
+        request = client.build_request(
+            method,
+            url,
+            json=json,  # using json for data to ensure it sends as application/json
+            params=params,
+            headers=headers,
+            timeout=timeout,
+        )
 
-            response = await client.send(request)
-            if response.status_code != 200:
-                if error_handler:
-                    return error_handler(response)
-                else:
-                    error_msg = f"Request to {url} failed, error: {response.text}"
-                    raise Exception(error_msg)
-            if success_handler:
-                return success_handler(response)
-            return response.json()
+        response = await client.send(request)
+        if response.status_code != 200:
+            if error_handler:
+                return error_handler(response)
+            else:
+                error_msg = f"Request to {url} failed, error: {response.text}"
+                raise Exception(error_msg)
+        if success_handler:
+            return success_handler(response)
+        return response.json()
 
     async def _apply_to_worker_manager_instances(self):
         pass
@@ -128,39 +158,127 @@ class RemoteWorkerManager(LocalWorkerManager):
         self, model_name: str, instances: List[ModelInstance]
     ) -> List[WorkerRunData]:
         worker_instances = []
-        for ins in instances:
-            worker = RemoteModelWorker()
-            worker.load_worker(model_name, model_name, host=ins.host, port=ins.port)
-            wr = WorkerRunData(
-                host=ins.host,
-                port=ins.port,
-                worker_key=ins.model_name,
-                worker=worker,
-                worker_params=None,
-                model_params=None,
-                stop_event=asyncio.Event(),
-                semaphore=asyncio.Semaphore(100),  # Not limit in client
-            )
-            worker_instances.append(wr)
+        with self._lock:
+            for ins in instances:
+                key = (ins.model_name, ins.host, ins.port)
+                wr = self._run_data_cache.get(key)
+                if not wr:
+                    worker = RemoteModelWorker()
+                    worker.load_worker(
+                        model_name, model_name, host=ins.host, port=ins.port
+                    )
+                    wr = WorkerRunData(
+                        host=ins.host,
+                        port=ins.port,
+                        worker_key=ins.model_name,
+                        worker=worker,
+                        worker_params=None,
+                        model_params=None,
+                        stop_event=asyncio.Event(),
+                        semaphore=asyncio.Semaphore(100),  # Not limit in client
+                    )
+                    self._run_data_cache[key] = wr
+                wr.weight = ins.weight
+                worker_instances.append(wr)
         return worker_instances
 
+    def _prune_run_data_cache(
+        self, worker_key: str, worker_instances: List[WorkerRunData]
+    ) -> None:
+        """Remove the instances of worker_key which are not registered any more"""
+        alive = set((wr.host, wr.port) for wr in worker_instances)
+        with self._lock:
+            for key in list(self._run_data_cache.keys()):
+                if key[0] == worker_key and (key[1], key[2]) not in alive:
+                    del self._run_data_cache[key]
+
     async def get_model_instances(
         self, worker_type: str, model_name: str, healthy_only: bool = True
     ) -> List[WorkerRunData]:
         worker_key = self._worker_key(worker_type, model_name)
-        instances: List[ModelInstance] = await self.model_registry.get_all_instances(
-            worker_key, healthy_only
-        )
-        return self._build_worker_instances(model_name, instances)
+        cache_key = (worker_key, healthy_only)
+        cached = self._instances_cache.get(cache_key)
+        if cached:
+            fetch_time, worker_instances = cached
+            if time.time() - fetch_time > self._registry_cache_ttl:
+                self._refresh_instances_in_background(model_name, cache_key)
+            return worker_instances
+        return await self._refresh_instances(model_name, cache_key)
 
     def sync_get_model_instances(
         self, worker_type: str, model_name: str, healthy_only: bool = True
     ) -> List[WorkerRunData]:
         worker_key = self._worker_key(worker_type, model_name)
+        cache_key = (worker_key, healthy_only)
+        cached = self._instances_cache.get(cache_key)
+        if cached and time.time() - cached[0] <= self._registry_cache_ttl:
+            return cached[1]
         instances: List[ModelInstance] = self.model_registry.sync_get_all_instances(
             worker_key, healthy_only
         )
-        return self._build_worker_instances(model_name, instances)
+        return self._update_instances_cache(model_name, cache_key, instances)
+
+    def invalidate_instances_cache(self, worker_key: str = None) -> None:
+        """Drop the cached instances of worker_key (all if None), the next request
+        fetches the instances from the model registry."""
+        for cache_key in list(self._instances_cache.keys()):
+            if worker_key is None or cache_key[0] == worker_key:
+                self._instances_cache.pop(cache_key, None)
+
+    def _on_worker_error(self, worker_run_data: WorkerRunData) -> None:
+        # The instance may be gone, fetch the latest instances for next request
+        self.invalidate_instances_cache(worker_run_data.worker_key)
+
+    async def _refresh_instances(
+        self, model_name: str, cache_key: Tuple[str, bool]
+    ) -> List[WorkerRunData]:
+        task = self._refresh_tasks.get(cache_key)
+        if not task or task.done() or task.get_loop() is not asyncio.get_running_loop():
+            task = asyncio.create_task(self._fetch_instances(model_name, cache_key))
+            self._refresh_tasks[cache_key] = task
+        # Concurrent requests share one fetch
+        return await asyncio.shield(task)
+
+    def _refresh_instances_in_background(
+        self, model_name: str, cache_key: Tuple[str, bool]
+    ) -> None:
+        task = self._refresh_tasks.get(cache_key)
+        if task and not task.done():
+            return
+
+        async def _refresh():
+            try:
+                await self._fetch_instances(model_name, cache_key)
+            except Exception as e:
+                logger.warning(
+                    f"Refresh model instances of {cache_key[0]} error, use the cached instances: {e}"
+                )
+
+        self._refresh_tasks[cache_key] = asyncio.create_task(_refresh())
+
+    async def _fetch_instances(
+        self, model_name: str, cache_key: Tuple[str, bool]
+    ) -> List[WorkerRunData]:
+        worker_key, healthy_only = cache_key
+        instances: List[ModelInstance] = await self.model_registry.get_all_instances(
+            worker_key, healthy_only
+        )
+        return self._update_instances_cache(model_name, cache_key, instances)
+
+    def _update_instances_cache(
+        self,
+        model_name: str,
+        cache_key: Tuple[str, bool],
+        instances: List[ModelInstance],
+    ) -> List[WorkerRunData]:
+        worker_instances = self._build_worker_instances(model_name, instances)
+        self._prune_run_data_cache(cache_key[0], worker_instances)
+        if worker_instances and self._registry_cache_ttl > 0:
+            self._instances_cache[cache_key] = (time.time(), worker_instances)
+        else:
+            # Not cache empty instances, the model may be registered soon
+            self._instances_cache.pop(cache_key, None)
+        return worker_instances
 
     async def worker_apply(self, apply_req: WorkerApplyRequest) -> WorkerApplyOutput:
         async def _remote_apply_func(worker_run_data: WorkerRunData):
@@ -1,9 +1,10 @@
 import json
 from typing import Dict, Iterator, List
 import logging
-from pilot.model.base import ModelOutput
+from pilot.model.base import ModelOutput, ModelOutputDeltaDecoder
 from pilot.model.parameter import ModelParameters
 from pilot.model.cluster.worker_base import ModelWorker
+from pilot.utils.http_client import get_http_client_factory
 
 
 logger = logging.getLogger(__name__)
@@ -47,29 +48,30 @@ class RemoteModelWorker(ModelWorker):
 
     async def async_generate_stream(self, params: Dict) -> Iterator[ModelOutput]:
         """Asynchronous generate stream"""
-        import httpx
-
-        async with httpx.AsyncClient() as client:
-            delimiter = b"\0"
-            buffer = b""
-            url = self.worker_addr + "/generate_stream"
-            logger.debug(f"Send async_generate_stream to url {url}, params: {params}")
-            async with client.stream(
-                "POST",
-                url,
-                headers=self.headers,
-                json=params,
-                timeout=self.timeout,
-            ) as response:
-                async for raw_chunk in response.aiter_raw():
-                    buffer += raw_chunk
-                    while delimiter in buffer:
-                        chunk, buffer = buffer.split(delimiter, 1)
-                        if not chunk:
-                            continue
-                        chunk = chunk.decode()
-                        data = json.loads(chunk)
-                        yield ModelOutput(**data)
+        delimiter = b"\0"
+        buffer = b""
+        url = self.worker_addr + "/generate_stream"
+        logger.debug(f"Send async_generate_stream to url {url}, params: {params}")
+        # Only the new text is transferred, the full text is rebuilt here
+        params = {**params, "incremental": True}
+        decoder = ModelOutputDeltaDecoder()
+        client = get_http_client_factory().get_async_client(url)
+        async with client.stream(
+            "POST",
+            url,
+            headers=self.headers,
+            json=params,
+            timeout=self.timeout,
+        ) as response:
+            async for raw_chunk in response.aiter_raw():
+                buffer += raw_chunk
+                while delimiter in buffer:
+                    chunk, buffer = buffer.split(delimiter, 1)
+                    if not chunk:
+                        continue
+                    chunk = chunk.decode()
+                    data = json.loads(chunk)
+                    yield decoder.decode(ModelOutput(**data))
 
     def generate(self, params: Dict) -> ModelOutput:
         """Generate non stream"""
@@ -77,26 +79,23 @@ class RemoteModelWorker(ModelWorker):
 
     async def async_generate(self, params: Dict) -> ModelOutput:
         """Asynchronous generate non stream"""
-        import httpx
-
-        async with httpx.AsyncClient() as client:
-            url = self.worker_addr + "/generate"
-            logger.debug(f"Send async_generate to url {url}, params: {params}")
-            response = await client.post(
-                url,
-                headers=self.headers,
-                json=params,
-                timeout=self.timeout,
-            )
-            return ModelOutput(**response.json())
+        url = self.worker_addr + "/generate"
+        logger.debug(f"Send async_generate to url {url}, params: {params}")
+        client = get_http_client_factory().get_async_client(url)
+        response = await client.post(
+            url,
+            headers=self.headers,
+            json=params,
+            timeout=self.timeout,
+        )
+        return ModelOutput(**response.json())
 
     def embeddings(self, params: Dict) -> List[List[float]]:
         """Get embeddings for input"""
-        import requests
-
         url = self.worker_addr + "/embeddings"
         logger.debug(f"Send embeddings to url {url}, params: {params}")
-        response = requests.post(
+        client = get_http_client_factory().get_sync_client(url)
+        response = client.post(
             url,
             headers=self.headers,
             json=params,
@@ -106,15 +105,13 @@ class RemoteModelWorker(ModelWorker):
 
     async def async_embeddings(self, params: Dict) -> List[List[float]]:
         """Asynchronous get embeddings for input"""
-        import httpx
-
-        async with httpx.AsyncClient() as client:
-            url = self.worker_addr + "/embeddings"
-            logger.debug(f"Send async_embeddings to url {url}")
-            response = await client.post(
-                url,
-                headers=self.headers,
-                json=params,
-                timeout=self.timeout,
-            )
-            return response.json()
+        url = self.worker_addr + "/embeddings"
+        logger.debug(f"Send async_embeddings to url {url}")
+        client = get_http_client_factory().get_async_client(url)
+        response = await client.post(
+            url,
+            headers=self.headers,
+            json=params,
+            timeout=self.timeout,
+        )
+        return response.json()
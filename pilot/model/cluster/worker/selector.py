@@ -0,0 +1,114 @@
+"""Strategies to select one worker instance for a request.
+
+The load aware strategies read `WorkerRunData.stats`, which the worker manager updates
+around every request.
+"""
+from abc import ABC, abstractmethod
+import random
+import threading
+from typing import Dict, List, Tuple, Type
+
+from pilot.model.cluster.manager_base import WorkerRunData
+
+
+class InstanceSelector(ABC):
+    @abstractmethod
+    def select(self, worker_instances: List[WorkerRunData]) -> WorkerRunData:
+        """Select one instance from the non-empty instances"""
+
+
+class RandomSelector(InstanceSelector):
+    def select(self, worker_instances: List[WorkerRunData]) -> WorkerRunData:
+        return random.choice(worker_instances)
+
+
+class LeastOutstandingSelector(InstanceSelector):
+    """Select the instance with the fewest in-flight requests relative to its weight,
+    ties are broken randomly."""
+
+    def select(self, worker_instances: List[WorkerRunData]) -> WorkerRunData:
+        def _load(wr: WorkerRunData) -> float:
+            return wr.stats.in_flight / _weight_of(wr)
+
+        min_load = min(_load(wr) for wr in worker_instances)
+        return random.choice([wr for wr in worker_instances if _load(wr) == min_load])
+
+
+class WeightedRoundRobinSelector(InstanceSelector):
+    """Smooth weighted round-robin, same as nginx.
+
+    Every selection adds the weight of each instance to its current weight, picks the
+    instance with the highest current weight and subtracts the total weight from it.
+    """
+
+    def __init__(self) -> None:
+        self._current_weights: Dict[Tuple, float] = {}
+        self._lock = threading.Lock()
+
+    def select(self, worker_instances: List[WorkerRunData]) -> WorkerRunData:
+        with self._lock:
+            total = 0.0
+            best, best_weight = None, None
+            for wr in worker_instances:
+                key = _instance_key(wr)
+                weight = _weight_of(wr)
+                current = self._current_weights.get(key, 0.0) + weight
+                self._current_weights[key] = current
+                total += weight
+                if best is None or current > best_weight:
+                    best, best_weight = wr, current
+            self._current_weights[_instance_key(best)] -= total
+            return best
+
+
+class LatencyEWMASelector(InstanceSelector):
+    """Select the instance with the lowest expected latency.
+
+    The expected latency is the latency EWMA multiplied by the queue length
+    (in-flight requests + 1), divided by the weight. Instances without latency
+    observations are tried first.
+    """
+
+    def select(self, worker_instances: List[WorkerRunData]) -> WorkerRunData:
+        unobserved = [wr for wr in worker_instances if wr.stats.ewma_latency is None]
+        if unobserved:
+            return LeastOutstandingSelector().select(unobserved)
+
+        def _score(wr: WorkerRunData) -> float:
+            return wr.stats.ewma_latency * (wr.stats.in_flight + 1) / _weight_of(wr)
+
+        return min(worker_instances, key=_score)
+
+
+_SELECTORS: Dict[str, Type[InstanceSelector]] = {
+    "random": RandomSelector,
+    "least_outstanding": LeastOutstandingSelector,
+    "weighted_round_robin": WeightedRoundRobinSelector,
+    "latency_ewma": LatencyEWMASelector,
+}
+
+
+def supported_selectors() -> List[str]:
+    return list(_SELECTORS.keys())
+
+
+def create_selector(strategy: str = None) -> InstanceSelector:
+    """Create the instance selector by strategy name, default is random"""
+    if not strategy:
+        strategy = "random"
+    selector_cls = _SELECTORS.get(strategy)
+    if not selector_cls:
+        raise ValueError(
+            f"Unsupported instance select strategy {strategy}, supported strategies: {supported_selectors()}"
+        )
+    return selector_cls()
+
+
+def _weight_of(wr: WorkerRunData) -> float:
+    if wr.weight is None or wr.weight <= 0:
+        return 1.0
+    return wr.weight
+
+
+def _instance_key(wr: WorkerRunData) -> Tuple:
+    return (wr.worker_key, wr.host, wr.port)
@@ -125,6 +125,7 @@ async def _start_worker_manager(**kwargs):
         deregister_func=deregister_func,
         send_heartbeat_func=send_heartbeat_func,
         model_registry=model_registry,
+        llm_cache=kwargs.get("llm_cache"),
     )
 
     for worker, worker_params in _create_workers(
@@ -0,0 +1,37 @@
+from types import SimpleNamespace
+
+from pilot.model.cluster.worker.default_worker import _get_context_len
+from pilot.model.parameter import ModelParameters, ProxyModelParameters
+
+
+def _params(**kwargs):
+    return ModelParameters(model_name="test", model_path="/tmp/test", **kwargs)
+
+
+def test_context_len_from_model_config():
+    model = SimpleNamespace(config=SimpleNamespace(max_position_embeddings=8192))
+    assert _get_context_len(model, _params()) == 8192
+    model = SimpleNamespace(config=SimpleNamespace(seq_length=32768))
+    assert _get_context_len(model, _params()) == 32768
+
+
+def test_context_len_rope_scaling():
+    config = SimpleNamespace(
+        max_position_embeddings=4096, rope_scaling={"type": "linear", "factor": 2.0}
+    )
+    assert _get_context_len(SimpleNamespace(config=config), _params()) == 8192
+
+
+def test_context_len_fallback():
+    # Models without config, such as llama.cpp models
+    assert _get_context_len(object(), _params(max_context_size=3000)) == 3000
+    config = SimpleNamespace(model_max_length=int(1e30))
+    assert _get_context_len(SimpleNamespace(config=config), _params()) == 4096
+    params = ProxyModelParameters(
+        model_name="proxyllm",
+        model_path="proxyllm",
+        proxy_server_url="",
+        proxy_api_key="",
+        max_context_size=8192,
+    )
+    assert _get_context_len(object(), params) == 8192
@@ -7,6 +7,7 @@ from pilot.model.base import ModelOutput, WorkerApplyType
 from pilot.model.cluster.base import WorkerApplyRequest, WorkerStartupRequest
 from pilot.model.cluster.worker_base import ModelWorker
 from pilot.model.cluster.manager_base import WorkerRunData
+from pilot.model.cache import LLMResponseCache
 from pilot.model.cluster.worker.manager import (
     LocalWorkerManager,
     RegisterFunc,
@@ -465,6 +466,32 @@ async def test_embeddings(
         assert out == expected_embedding
 
 
+@pytest.mark.asyncio
+async def test_generate_with_llm_cache():
+    llm_cache = LLMResponseCache()
+    workers = _create_workers(1, stream_messags=["Hello", "Hello world."])
+    worker, worker_params = workers[0]
+    async with _start_worker_manager(workers=workers, llm_cache=llm_cache) as manager:
+        params = {"model": worker_params.model_name, "prompt": "hi", "cache": True}
+        texts = [out.text async for out in manager.generate_stream(dict(params))]
+        assert texts == ["Hello", "Hello world."]
+        # Replayed chunk by chunk without calling the worker
+        worker.stream_messags = ["Changed"]
+        texts = [out.text async for out in manager.generate_stream(dict(params))]
+        assert texts == ["Hello", "Hello world."]
+        out = await manager.generate(dict(params))
+        assert out.text == "Hello world."
+        # Not opted in
+        out = await manager.generate({**params, "cache": False})
+        assert out.text == "Changed"
+        # Other sampling parameters
+        out = await manager.generate({**params, "temperature": 0.5})
+        assert out.text == "Changed"
+    stats = llm_cache.stats()
+    assert stats["exact_hits"] == 2
+    assert stats["misses"] == 2
+
+
 @pytest.mark.asyncio
 async def test_parameter_descriptions(
     manager_with_2_workers: Tuple[
@@ -0,0 +1,78 @@
+import asyncio
+from unittest.mock import AsyncMock
+
+import pytest
+
+from pilot.model.base import ModelInstance
+from pilot.model.cluster.registry import EmbeddedModelRegistry
+from pilot.model.cluster.worker.remote_manager import RemoteWorkerManager
+
+_TEST_MODEL_NAME = "vicuna-13b-v1.5"
+_TEST_WORKER_KEY = "vicuna-13b-v1.5@llm"
+
+
+async def _registry_with_instances(num_instances: int) -> EmbeddedModelRegistry:
+    registry = EmbeddedModelRegistry()
+    for i in range(num_instances):
+        await registry.register_instance(
+            ModelInstance(model_name=_TEST_WORKER_KEY, host="127.0.0.1", port=8000 + i)
+        )
+    return registry
+
+
+@pytest.mark.asyncio
+async def test_get_model_instances_cached():
+    registry = await _registry_with_instances(2)
+    registry.get_all_instances = AsyncMock(wraps=registry.get_all_instances)
+    manager = RemoteWorkerManager(registry, registry_cache_ttl=60)
+
+    instances = await manager.get_model_instances("llm", _TEST_MODEL_NAME)
+    assert len(instances) == 2
+    for _ in range(5):
+        assert await manager.get_model_instances("llm", _TEST_MODEL_NAME) == instances
+    assert registry.get_all_instances.call_count == 1
+
+    # The run data (and its stats) is reused after the cache is invalidated
+    instances[0].stats.begin()
+    manager.invalidate_instances_cache()
+    new_instances = await manager.get_model_instances("llm", _TEST_MODEL_NAME)
+    assert registry.get_all_instances.call_count == 2
+    assert new_instances[0] is instances[0]
+    assert new_instances[0].stats.in_flight == 1
+
+
+@pytest.mark.asyncio
+async def test_get_model_instances_refresh_after_ttl():
+    registry = await _registry_with_instances(1)
+    manager = RemoteWorkerManager(registry, registry_cache_ttl=0.01)
+    instances = await manager.get_model_instances("llm", _TEST_MODEL_NAME)
+    assert len(instances) == 1
+
+    await registry.register_instance(
+        ModelInstance(model_name=_TEST_WORKER_KEY, host="127.0.0.1", port=9000)
+    )
+
+    await asyncio.sleep(0.02)
+    # Stale instances are returned while refreshing in background
+    assert len(await manager.get_model_instances("llm", _TEST_MODEL_NAME)) == 1
+    await asyncio.sleep(0.01)
+    assert len(await manager.get_model_instances("llm", _TEST_MODEL_NAME)) == 2
+
+
+@pytest.mark.asyncio
+async def test_get_model_instances_without_cache():
+    registry = await _registry_with_instances(1)
+    registry.get_all_instances = AsyncMock(wraps=registry.get_all_instances)
+    manager = RemoteWorkerManager(registry, registry_cache_ttl=0)
+    for _ in range(3):
+        await manager.get_model_instances("llm", _TEST_MODEL_NAME)
+    assert registry.get_all_instances.call_count == 3
+
+
+@pytest.mark.asyncio
+async def test_worker_error_invalidates_cache():
+    registry = await _registry_with_instances(1)
+    manager = RemoteWorkerManager(registry, registry_cache_ttl=60)
+    instances = await manager.get_model_instances("llm", _TEST_MODEL_NAME)
+    manager._on_worker_error(instances[0])
+    assert not manager._instances_cache
@@ -0,0 +1,83 @@
+import asyncio
+from collections import Counter
+from typing import List
+
+import pytest
+
+from pilot.model.cluster.manager_base import WorkerRunData
+from pilot.model.cluster.worker.selector import (
+    LatencyEWMASelector,
+    LeastOutstandingSelector,
+    RandomSelector,
+    WeightedRoundRobinSelector,
+    create_selector,
+)
+
+
+def _instances(weights: List[float]) -> List[WorkerRunData]:
+    return [
+        WorkerRunData(
+            host="127.0.0.1",
+            port=8000 + i,
+            worker_key="vicuna-13b-v1.5@llm",
+            worker=None,
+            worker_params=None,
+            model_params=None,
+            stop_event=asyncio.Event(),
+            weight=weight,
+        )
+        for i, weight in enumerate(weights)
+    ]
+
+
+def test_create_selector():
+    assert isinstance(create_selector(), RandomSelector)
+    assert isinstance(create_selector("least_outstanding"), LeastOutstandingSelector)
+    with pytest.raises(ValueError):
+        create_selector("not_exist_strategy")
+
+
+def test_least_outstanding_selector():
+    instances = _instances([1, 1, 1])
+    instances[0].stats.in_flight = 3
+    instances[1].stats.in_flight = 1
+    instances[2].stats.in_flight = 2
+    selector = LeastOutstandingSelector()
+    assert selector.select(instances) is instances[1]
+    instances[1].stats.begin()
+    instances[1].stats.begin()
+    assert selector.select(instances) is instances[2]
+
+
+def test_weighted_round_robin_selector():
+    instances = _instances([5, 1, 1])
+    selector = WeightedRoundRobinSelector()
+    selected = [selector.select(instances).port for _ in range(7)]
+    assert Counter(selected) == {8000: 5, 8001: 1, 8002: 1}
+    # Smooth, the heavy instance is not selected 5 times in a row
+    assert selected[:3] != [8000, 8000, 8000]
+
+
+def test_latency_ewma_selector():
+    instances = _instances([1, 1])
+    selector = LatencyEWMASelector()
+    # Instances without latency observations are tried first
+    instances[0].stats.observe_latency(0.1)
+    assert selector.select(instances) is instances[1]
+    instances[1].stats.observe_latency(1.0)
+    assert selector.select(instances) is instances[0]
+    # The fast instance is busy
+    instances[0].stats.in_flight = 10
+    assert selector.select(instances) is instances[1]
+
+
+def test_worker_stats():
+    stats = _instances([1])[0].stats
+    start_time = stats.begin()
+    assert stats.in_flight == 1
+    stats.end(start_time)
+    assert stats.in_flight == 0
+    assert stats.ewma_latency is not None
+    stats.end(stats.begin(), error=True)
+    assert stats.total_requests == 2
+    assert stats.total_errors == 1
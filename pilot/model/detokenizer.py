@@ -0,0 +1,169 @@
+"""Incremental detokenizer and stop string matcher for the streaming generate loops.
+
+Decoding the whole `output_ids` on every stream step and searching the whole output
+for stop strings makes a response O(n^2) in its length. The classes here keep a small
+window of already decoded tokens as context and only decode the new tokens, and only
+search the tail of the output that may contain a new stop string.
+"""
+from typing import Iterable, List, Optional, Tuple, Union
+
+from pilot.model.llm_utils import is_partial_stop
+
+# Replacement character, the tokenizer emits it for incomplete utf-8 bytes
+_REPLACEMENT_CHAR = "\ufffd"
+
+
+class IncrementalDetokenizer:
+    """Decode generated tokens incrementally.
+
+    The text of the new tokens is the difference between decoding
+    `ids[prefix_offset:]` and `ids[prefix_offset:read_offset]`, the prefix tokens give
+    the tokenizer enough context to decode leading spaces and multi-token characters
+    correctly.
+
+    Args:
+        tokenizer: The huggingface tokenizer.
+        prompt_ids (List[int]): The prompt token ids, the generated tokens follow them
+            in the token ids passed to `step`.
+        skip_special_tokens (bool): Same as `tokenizer.decode`.
+        spaces_between_special_tokens (bool): Same as `tokenizer.decode`.
+        clean_up_tokenization_spaces (bool): Same as `tokenizer.decode`.
+        prefix_window (int): Number of decoded tokens used as context.
+        use_prompt_context (bool): Whether to use the tail of prompt as the context of
+            the first generated tokens. If False, the text is the same as decoding the
+            generated tokens alone (e.g. the leading space of the first token is
+            dropped by sentencepiece tokenizers).
+
+    Examples:
+
+        .. code-block:: python
+
+            detokenizer = IncrementalDetokenizer(tokenizer, input_ids)
+            output_ids = list(input_ids)
+            for token in tokens:
+                output_ids.append(token)
+                new_text = detokenizer.step(output_ids)
+            print(detokenizer.text)
+    """
+
+    def __init__(
+        self,
+        tokenizer,
+        prompt_ids: Optional[List[int]] = None,
+        skip_special_tokens: bool = True,
+        spaces_between_special_tokens: bool = True,
+        clean_up_tokenization_spaces: Optional[bool] = None,
+        prefix_window: int = 6,
+        use_prompt_context: bool = True,
+    ) -> None:
+        self.tokenizer = tokenizer
+        self._decode_kwargs = {
+            "skip_special_tokens": skip_special_tokens,
+            "spaces_between_special_tokens": spaces_between_special_tokens,
+        }
+        if clean_up_tokenization_spaces is not None:
+            self._decode_kwargs[
+                "clean_up_tokenization_spaces"
+            ] = clean_up_tokenization_spaces
+        num_prompt_tokens = len(prompt_ids) if prompt_ids else 0
+        self.read_offset = num_prompt_tokens
+        if use_prompt_context:
+            self.prefix_offset = max(num_prompt_tokens - prefix_window, 0)
+        else:
+            self.prefix_offset = num_prompt_tokens
+        self.text = ""
+
+    def step(self, token_ids: List[int], final: bool = False) -> str:
+        """Decode the tokens which have not been decoded yet.
+
+        Args:
+            token_ids (List[int]): All token ids, include the prompt token ids.
+            final (bool): Whether it is the last step, if True, the incomplete utf-8
+                bytes at the end will be decoded as replacement characters.
+
+        Returns:
+            str: The new text
+        """
+        if len(token_ids) <= self.read_offset:
+            return ""
+        prefix_text = self._decode(token_ids[self.prefix_offset : self.read_offset])
+        new_text = self._decode(token_ids[self.prefix_offset :])
+        if len(new_text) <= len(prefix_text):
+            # Special tokens or incomplete characters, nothing to output now
+            return ""
+        if new_text.endswith(_REPLACEMENT_CHAR) and not final:
+            return ""
+        delta = new_text[len(prefix_text) :]
+        self.text += delta
+        self.prefix_offset = self.read_offset
+        self.read_offset = len(token_ids)
+        return delta
+
+    def _decode(self, token_ids: List[int]) -> str:
+        if not token_ids:
+            return ""
+        return self.tokenizer.decode(token_ids, **self._decode_kwargs)
+
+
+class StopStringMatcher:
+    """Find stop strings in a growing output.
+
+    Only the tail of the output which has not been searched yet (plus the length of
+    the longest stop string) is searched, so every character is scanned a bounded
+    number of times. The result is the same as `output.rfind(stop_str, start)` on the
+    whole output, because a stop string before the tail would have been found by the
+    previous check.
+
+    Args:
+        stop_str (Union[str, Iterable[str], None]): The stop string or stop strings.
+        start (int): The position to start searching, the output before it (e.g. the
+            echoed prompt) is never searched.
+    """
+
+    def __init__(
+        self, stop_str: Union[str, Iterable[str], None], start: int = 0
+    ) -> None:
+        if not stop_str:
+            stop_strs = []
+        elif isinstance(stop_str, str):
+            stop_strs = [stop_str]
+        elif isinstance(stop_str, Iterable):
+            stop_strs = [s for s in stop_str if s]
+        else:
+            raise ValueError("Invalid stop field type.")
+        self.stop_strs: List[str] = stop_strs
+        self.start = start
+        self._max_stop_len = max((len(s) for s in stop_strs), default=0)
+        self._checked_len = start
+
+    def check(self, output: str) -> Tuple[int, bool]:
+        """Check the output for stop strings.
+
+        Args:
+            output (str): The whole output so far, it must extend the output of the
+                previous check.
+
+        Returns:
+            Tuple[int, bool]: The position of the stop string (-1 if not found) and
+                whether the output ends with a prefix of a stop string.
+        """
+        if not self.stop_strs:
+            return -1, False
+        window_start = max(self.start, self._checked_len - self._max_stop_len + 1)
+        self._checked_len = len(output)
+        partially_stopped = False
+        for each_stop in self.stop_strs:
+            pos = output.rfind(each_stop, window_start)
+            if pos != -1:
+                return pos, False
+            partially_stopped = _is_partial_stop(output, each_stop)
+            if partially_stopped:
+                break
+        return -1, partially_stopped
+
+
+def _is_partial_stop(output: str, stop_str: str) -> bool:
+    """Same as `is_partial_stop`, but only look at the tail of the output"""
+    if len(output) <= len(stop_str):
+        return is_partial_stop(output, stop_str)
+    return any(stop_str.startswith(output[-i:]) for i in range(1, len(stop_str)))
@@ -7,7 +7,8 @@ We have integrated fastchat. For details, see: pilot/model/model_adapter.py
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
 import gc
-from typing import Iterable, Dict
+import logging
+from typing import Dict
 
 import torch
 
@@ -19,7 +20,10 @@ from transformers.generation.logits_process import (
     TopPLogitsWarper,
 )
 
-from pilot.model.llm_utils import is_sentence_complete, is_partial_stop
+from pilot.model.detokenizer import IncrementalDetokenizer, StopStringMatcher
+from pilot.model.llm_utils import is_sentence_complete
+
+logger = logging.getLogger(__name__)
 
 
 def prepare_logits_processor(
@@ -72,6 +76,10 @@ def generate_stream(
     else:  # truncate
         max_src_len = context_len - max_new_tokens - 1
 
+    if len(input_ids) > max_src_len:
+        logger.warning(
+            f"Prompt of {len(input_ids)} tokens exceeds the context length {context_len}, truncated to the last {max_src_len} tokens"
+        )
     input_ids = input_ids[-max_src_len:]
     output_ids = list(input_ids)
     input_echo_len = len(input_ids)
@@ -86,6 +94,21 @@ def generate_stream(
             device=device,
         )
 
+    decode_kwargs = {
+        "skip_special_tokens": True,
+        "spaces_between_special_tokens": False,
+        "clean_up_tokenization_spaces": True,
+    }
+    detokenizer = IncrementalDetokenizer(
+        tokenizer, input_ids, use_prompt_context=echo, **decode_kwargs
+    )
+    if echo:
+        prompt_output = tokenizer.decode(input_ids, **decode_kwargs)
+        stop_matcher = StopStringMatcher(stop_str, len_prompt)
+    else:
+        prompt_output = ""
+        stop_matcher = StopStringMatcher(stop_str)
+
     past_key_values = out = None
     sent_interrupt = False
     for i in range(max_new_tokens):
@@ -156,19 +179,9 @@ def generate_stream(
 
         # Yield the output tokens
         if i % stream_interval == 0 or i == max_new_tokens - 1 or stopped:
-            if echo:
-                tmp_output_ids = output_ids
-                rfind_start = len_prompt
-            else:
-                tmp_output_ids = output_ids[input_echo_len:]
-                rfind_start = 0
-
-            output = tokenizer.decode(
-                tmp_output_ids,
-                skip_special_tokens=True,
-                spaces_between_special_tokens=False,
-                clean_up_tokenization_spaces=True,
-            )
+            # Only decode the new tokens, the whole output is never decoded again
+            detokenizer.step(output_ids, final=i == max_new_tokens - 1 or stopped)
+            output = prompt_output + detokenizer.text
             # TODO: For the issue of incomplete sentences interrupting output, apply a patch and others can also modify it to a more elegant way
             if judge_sent_end and stopped and not is_sentence_complete(output):
                 if len(tokens) > 1:
@@ -178,29 +191,16 @@ def generate_stream(
                     output_ids.pop()
                 stopped = False
                 sent_interrupt = True
+                # The last decoded token is replaced, decode the output again
+                detokenizer = IncrementalDetokenizer(
+                    tokenizer, input_ids, use_prompt_context=echo, **decode_kwargs
+                )
+                stop_matcher = StopStringMatcher(stop_str, stop_matcher.start)
 
-            partially_stopped = False
-            if stop_str:
-                if isinstance(stop_str, str):
-                    pos = output.rfind(stop_str, rfind_start)
-                    if pos != -1:
-                        output = output[:pos]
-                        stopped = True
-                    else:
-                        partially_stopped = is_partial_stop(output, stop_str)
-                elif isinstance(stop_str, Iterable):
-                    for each_stop in stop_str:
-                        pos = output.rfind(each_stop, rfind_start)
-                        if pos != -1:
-                            output = output[:pos]
-                            stopped = True
-                            break
-                        else:
-                            partially_stopped = is_partial_stop(output, each_stop)
-                            if partially_stopped:
-                                break
-                else:
-                    raise ValueError("Invalid stop field type.")
+            pos, partially_stopped = stop_matcher.check(output)
+            if pos != -1:
+                output = output[:pos]
+                stopped = True
 
             # Prevent yielding partial stop sequence
             if not partially_stopped:
@@ -2,14 +2,35 @@
 # -*- coding: utf-8 -*-
 import time
 
-from pilot.model.proxy.llms.chatgpt import chatgpt_generate_stream
-from pilot.model.proxy.llms.bard import bard_generate_stream
-from pilot.model.proxy.llms.claude import claude_generate_stream
-from pilot.model.proxy.llms.wenxin import wenxin_generate_stream
-from pilot.model.proxy.llms.tongyi import tongyi_generate_stream
-from pilot.model.proxy.llms.zhipu import zhipu_generate_stream
-from pilot.model.proxy.llms.baichuan import baichuan_generate_stream
-from pilot.model.proxy.llms.spark import spark_generate_stream
+from pilot.model.proxy.llms.chatgpt import (
+    chatgpt_generate_stream,
+    async_chatgpt_generate_stream,
+)
+from pilot.model.proxy.llms.bard import bard_generate_stream, async_bard_generate_stream
+from pilot.model.proxy.llms.claude import (
+    claude_generate_stream,
+    async_claude_generate_stream,
+)
+from pilot.model.proxy.llms.wenxin import (
+    wenxin_generate_stream,
+    async_wenxin_generate_stream,
+)
+from pilot.model.proxy.llms.tongyi import (
+    tongyi_generate_stream,
+    async_tongyi_generate_stream,
+)
+from pilot.model.proxy.llms.zhipu import (
+    zhipu_generate_stream,
+    async_zhipu_generate_stream,
+)
+from pilot.model.proxy.llms.baichuan import (
+    baichuan_generate_stream,
+    async_baichuan_generate_stream,
+)
+from pilot.model.proxy.llms.spark import (
+    spark_generate_stream,
+    async_spark_generate_stream,
+)
 from pilot.model.proxy.llms.proxy_model import ProxyModel
 
 
@@ -36,3 +57,32 @@ def proxyllm_generate_stream(
     )
 
     yield from generator_function(model, tokenizer, params, device, context_len)
+
+
+async def async_proxyllm_generate_stream(
+    model: ProxyModel, tokenizer, params, device, context_len=2048
+):
+    """Stream the output of proxy model in the event loop, the requests share the
+    pooled connections instead of taking a thread each"""
+    generator_mapping = {
+        "proxyllm": async_chatgpt_generate_stream,
+        "chatgpt_proxyllm": async_chatgpt_generate_stream,
+        "bard_proxyllm": async_bard_generate_stream,
+        "claude_proxyllm": async_claude_generate_stream,
+        "wenxin_proxyllm": async_wenxin_generate_stream,
+        "tongyi_proxyllm": async_tongyi_generate_stream,
+        "zhipu_proxyllm": async_zhipu_generate_stream,
+        "bc_proxyllm": async_baichuan_generate_stream,
+        "spark_proxyllm": async_spark_generate_stream,
+    }
+    model_params = model.get_params()
+    model_name = model_params.model_name
+    generator_function = generator_mapping.get(model_name)
+    if not generator_function:
+        yield f"{model_name} LLM is not supported"
+        return
+
+    async for output in generator_function(
+        model, tokenizer, params, device, context_len
+    ):
+        yield output
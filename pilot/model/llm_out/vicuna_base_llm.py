@@ -3,6 +3,8 @@
 
 import torch
 
+from pilot.model.detokenizer import IncrementalDetokenizer, StopStringMatcher
+
 
 @torch.inference_mode()
 def generate_stream(
@@ -17,6 +19,11 @@ def generate_stream(
     stop_str = params.get("stop", None)
     input_ids = tokenizer(prompt).input_ids
     output_ids = list(input_ids)
+    detokenizer = IncrementalDetokenizer(
+        tokenizer, output_ids, skip_special_tokens=True
+    )
+    prompt_output = tokenizer.decode(output_ids, skip_special_tokens=True)
+    stop_matcher = StopStringMatcher(stop_str, l_prompt)
 
     max_src_len = context_len - max_new_tokens - 8
     input_ids = input_ids[-max_src_len:]
@@ -59,8 +66,9 @@ def generate_stream(
             stopped = False
 
         if i % stream_interval == 0 or i == max_new_tokens - 1 or stopped:
-            output = tokenizer.decode(output_ids, skip_special_tokens=True)
-            pos = output.rfind(stop_str, l_prompt)
+            detokenizer.step(output_ids, final=i == max_new_tokens - 1 or stopped)
+            output = prompt_output + detokenizer.text
+            pos, _ = stop_matcher.check(output)
             if pos != -1:
                 output = output[:pos]
                 stopped = True
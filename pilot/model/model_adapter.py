@@ -195,6 +195,12 @@ class OldLLMModelAdaperWrapper(LLMModelAdaper):
     def get_generate_stream_function(self, model, model_path: str):
         return self._chat_adapter.get_generate_stream_func(model_path)
 
+    def support_async(self) -> bool:
+        return self._chat_adapter.support_async()
+
+    def get_async_generate_stream_function(self, model, model_path: str):
+        return self._chat_adapter.get_async_generate_stream_func(model_path)
+
     def __str__(self) -> str:
         return "{}({}.{})".format(
             self.__class__.__name__,
@@ -118,6 +118,48 @@ class ModelWorkerParameters(BaseModelParameters):
     heartbeat_interval: Optional[int] = field(
         default=20, metadata={"help": "The interval for sending heartbeats (seconds)"}
     )
+    instance_select_strategy: Optional[str] = field(
+        default="random",
+        metadata={
+            "help": "The strategy to select one of the model instances when the model is deployed on multiple workers",
+            "valid_values": [
+                "random",
+                "least_outstanding",
+                "weighted_round_robin",
+                "latency_ewma",
+            ],
+        },
+    )
+    registry_cache_ttl: Optional[int] = field(
+        default=10,
+        metadata={
+            "help": "Seconds to cache the model instances fetched from model controller, 0 means no cache"
+        },
+    )
+    llm_cache_enabled: Optional[bool] = field(
+        default=True,
+        metadata={
+            "help": "Cache the LLM responses of the requests which opt in, e.g. the chat scenes in LLM_CACHE_SCENES"
+        },
+    )
+    llm_cache_max_entries: Optional[int] = field(
+        default=1000,
+        metadata={"help": "Max number of the cached LLM responses"},
+    )
+    llm_cache_ttl: Optional[int] = field(
+        default=3600,
+        metadata={"help": "Seconds a cached LLM response is valid, 0 means forever"},
+    )
+    llm_cache_semantic_model: Optional[str] = field(
+        default=None,
+        metadata={
+            "help": "The embedding model to match the cached LLM responses semantically, only exact match is used if not set"
+        },
+    )
+    llm_cache_semantic_threshold: Optional[float] = field(
+        default=0.95,
+        metadata={"help": "Min cosine similarity of a semantic match"},
+    )
 
     log_level: Optional[str] = field(
         default=None,
@@ -169,6 +211,24 @@ class EmbeddingModelParameters(BaseEmbeddingModelParameters):
             "help": "Determines whether the model's embeddings should be normalized."
         },
     )
+    batch_embeddings: Optional[bool] = field(
+        default=False,
+        metadata={
+            "help": "Gather concurrent embedding requests into one batch, the batch is run when max_batch_size texts are gathered or max_batch_wait_ms has passed"
+        },
+    )
+    max_batch_size: Optional[int] = field(
+        default=64,
+        metadata={
+            "help": "Max number of texts in one embedding batch, only valid when batch_embeddings=True"
+        },
+    )
+    max_batch_wait_ms: Optional[float] = field(
+        default=5,
+        metadata={
+            "help": "Max milliseconds to wait for more requests after the first request of a batch arrives, only valid when batch_embeddings=True"
+        },
+    )
 
     def build_kwargs(self, **kwargs) -> Dict:
         model_kwargs, encode_kwargs = None, None
@@ -253,6 +313,18 @@ class ModelParameters(BaseModelParameters):
     verbose: Optional[bool] = field(
         default=False, metadata={"help": "Show verbose output."}
     )
+    continuous_batching: Optional[bool] = field(
+        default=False,
+        metadata={
+            "help": "Merge the prefill and decode steps of concurrent requests into batched forward passes, only valid for huggingface decoder-only models"
+        },
+    )
+    max_batch_size: Optional[int] = field(
+        default=8,
+        metadata={
+            "help": "Max number of requests in one running batch, only valid when continuous_batching=True. limit_model_concurrency should be no less than it"
+        },
+    )
 
 
 @dataclass
@@ -311,6 +383,19 @@ class ProxyModelParameters(BaseModelParameters):
         metadata={"tags": "privacy", "help": "The api key of current proxy LLM"},
     )
 
+    proxy_api_secret: Optional[str] = field(
+        default=None,
+        metadata={
+            "tags": "privacy",
+            "help": "The api secret of current proxy LLM, such as wenxin, spark and baichuan",
+        },
+    )
+
+    proxy_app_id: Optional[str] = field(
+        default=None,
+        metadata={"help": "The app id of current proxy LLM, such as spark"},
+    )
+
     proxy_api_base: str = field(
         default=None,
         metadata={
@@ -3,7 +3,12 @@ import hashlib
 import json
 import time
 import requests
-from typing import List
+from typing import Dict, List, Optional, Tuple
+from pilot.model.proxy.llms.http_client import (
+    get_async_client,
+    iter_sse_events,
+    read_error_message,
+)
 from pilot.model.proxy.llms.proxy_model import ProxyModel
 from pilot.scene.base_message import ModelMessage, ModelMessageRoleType
 
@@ -24,9 +29,7 @@ def _sign(data: dict, secret_key: str, timestamp: str):
     return signature
 
 
-def baichuan_generate_stream(
-    model: ProxyModel, tokenizer, params, device, context_len=4096
-):
+def _build_request(model: ProxyModel, params) -> Tuple[str, Dict, Dict]:
     model_params = model.get_params()
     url = "https://api.baichuan-ai.com/v1/stream/chat"
 
@@ -67,9 +70,21 @@ def baichuan_generate_stream(
         "X-BC-Signature": _signature,
         "X-BC-Sign-Algo": "MD5",
     }
+    print(f"Send request to {url} with real model {model_name}")
+    return url, payload, headers
+
 
+def _parse_content(data: str) -> Optional[str]:
+    if data.lower() == "[DONE]".lower():
+        return None
+    return json.loads(data)["data"]["messages"][0].get("content")
+
+
+def baichuan_generate_stream(
+    model: ProxyModel, tokenizer, params, device, context_len=4096
+):
+    url, payload, headers = _build_request(model, params)
     res = requests.post(url=url, json=payload, headers=headers, stream=True)
-    print(f"Send request to {url} with real model {model_name}")
 
     text = ""
     for line in res.iter_lines():
@@ -79,10 +94,27 @@ def baichuan_generate_stream(
                 yield error_message
             else:
                 json_data = line.split(b": ", 1)[1]
-                decoded_line = json_data.decode("utf-8")
-                if decoded_line.lower() != "[DONE]".lower():
-                    obj = json.loads(json_data)
-                    if obj["data"]["messages"][0].get("content") is not None:
-                        content = obj["data"]["messages"][0].get("content")
-                        text += content
+                content = _parse_content(json_data.decode("utf-8"))
+                if content is not None:
+                    text += content
                 yield text
+
+
+async def async_baichuan_generate_stream(
+    model: ProxyModel, tokenizer, params, device, context_len=4096
+):
+    url, payload, headers = _build_request(model, params)
+
+    text = ""
+    async with get_async_client(url).stream(
+        "POST", url, json=payload, headers=headers
+    ) as response:
+        error_message = await read_error_message(response)
+        if error_message:
+            yield error_message
+            return
+        async for event in iter_sse_events(response):
+            content = _parse_content(event.data)
+            if content is not None:
+                text += content
+            yield text
@@ -1,18 +1,12 @@
+import asyncio
 import requests
 from typing import List
+from pilot.model.proxy.llms.http_client import get_async_client
 from pilot.scene.base_message import ModelMessage, ModelMessageRoleType
 from pilot.model.proxy.llms.proxy_model import ProxyModel
 
 
-def bard_generate_stream(
-    model: ProxyModel, tokenizer, params, device, context_len=2048
-):
-    model_params = model.get_params()
-    print(f"Model: {model}, model_params: {model_params}")
-
-    proxy_api_key = model_params.proxy_api_key
-    proxy_server_url = model_params.proxy_server_url
-
+def _build_input(params) -> str:
     history = []
     messages: List[ModelMessage] = params["messages"]
     for message in messages:
@@ -39,10 +33,34 @@ def bard_generate_stream(
     for msg in history:
         if msg.get("content"):
             msgs.append(msg["content"])
+    return "\n".join(msgs)
+
+
+def _bardapi_answer(proxy_api_key: str, input_text: str) -> str:
+    import bardapi
+
+    response = bardapi.core.Bard(proxy_api_key).get_answer(input_text)
+
+    if response is not None and response.get("content") is not None:
+        return str(response["content"])
+    else:
+        return f"bard response error: {str(response)}"
+
+
+def bard_generate_stream(
+    model: ProxyModel, tokenizer, params, device, context_len=2048
+):
+    model_params = model.get_params()
+    print(f"Model: {model}, model_params: {model_params}")
+
+    proxy_api_key = model_params.proxy_api_key
+    proxy_server_url = model_params.proxy_server_url
+
+    input_text = _build_input(params)
 
     if proxy_server_url is not None:
         headers = {"Content-Type": "application/json"}
-        payloads = {"input": "\n".join(msgs)}
+        payloads = {"input": input_text}
         response = requests.post(
             proxy_server_url, headers=headers, json=payloads, stream=False
         )
@@ -51,11 +69,27 @@ def bard_generate_stream(
         else:
             yield f"bard proxy url request failed!, response = {str(response)}"
     else:
-        import bardapi
+        yield _bardapi_answer(proxy_api_key, input_text)
 
-        response = bardapi.core.Bard(proxy_api_key).get_answer("\n".join(msgs))
 
-        if response is not None and response.get("content") is not None:
-            yield str(response["content"])
+async def async_bard_generate_stream(
+    model: ProxyModel, tokenizer, params, device, context_len=2048
+):
+    model_params = model.get_params()
+    input_text = _build_input(params)
+
+    if model_params.proxy_server_url is not None:
+        headers = {"Content-Type": "application/json"}
+        payloads = {"input": input_text}
+        response = await get_async_client(model_params.proxy_server_url).post(
+            model_params.proxy_server_url, headers=headers, json=payloads
+        )
+        if response.is_success:
+            yield response.text
         else:
-            yield f"bard response error: {str(response)}"
+            yield f"bard proxy url request failed!, response = {str(response)}"
+    else:
+        # bardapi has no async api
+        yield await asyncio.get_running_loop().run_in_executor(
+            None, _bardapi_answer, model_params.proxy_api_key, input_text
+        )
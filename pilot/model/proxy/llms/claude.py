@@ -5,3 +5,9 @@ def claude_generate_stream(
     model: ProxyModel, tokenizer, params, device, context_len=2048
 ):
     yield "claude LLM was not supported!"
+
+
+async def async_claude_generate_stream(
+    model: ProxyModel, tokenizer, params, device, context_len=2048
+):
+    yield "claude LLM was not supported!"
@@ -0,0 +1,209 @@
+"""Cache of the short-lived credentials of the proxy models.
+
+Some proxy models need a credential which is fetched or signed before the request,
+such as the access token of wenxin (a round trip to the OAuth endpoint), the JWT token
+of zhipu and the signed url of spark. The credentials are cached and shared by the
+worker threads and event loops:
+
+1. A valid credential is returned at once.
+2. A credential close to its expiry is refreshed in background, the requests keep
+   using the old one until the new one arrives.
+3. A missing or expired credential is fetched once, the concurrent requests of the
+   same key wait for it.
+4. After a failed fetch, the key is not fetched again until the backoff (doubled on
+   every failure) passes.
+"""
+import asyncio
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Callable, Dict, Optional
+
+from pilot.component import BaseComponent, ComponentType, SystemApp
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class Credential:
+    value: str
+    # Epoch seconds the credential expires at
+    expires_at: float
+
+
+CredentialFetcher = Callable[[], Credential]
+
+
+class _Entry:
+    def __init__(self) -> None:
+        self.credential: Optional[Credential] = None
+        self.refresh_at: float = 0
+        self.refreshing = False
+        self.failures = 0
+        self.retry_at: float = 0
+        self.error: Optional[Exception] = None
+        self.lock = threading.Lock()
+
+
+class CredentialCache(BaseComponent):
+    """Cache the credentials of proxy models by key.
+
+    Args:
+        refresh_ahead (float): Seconds before the expiry a credential is refreshed in
+            background, at most half of its lifetime.
+        min_backoff (float): Seconds to wait after the first failed fetch.
+        max_backoff (float): Max seconds to wait after the failed fetches.
+    """
+
+    name = ComponentType.PROXY_CREDENTIAL_CACHE.value
+
+    def __init__(
+        self,
+        system_app: Optional[SystemApp] = None,
+        refresh_ahead: float = 300,
+        min_backoff: float = 1,
+        max_backoff: float = 60,
+    ):
+        self.refresh_ahead = refresh_ahead
+        self.min_backoff = min_backoff
+        self.max_backoff = max_backoff
+        self._entries: Dict[str, _Entry] = {}
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(
+            max_workers=2, thread_name_prefix="credential_refresh"
+        )
+        super().__init__(system_app)
+
+    def init_app(self, system_app: SystemApp):
+        global _credential_cache
+        _credential_cache = self
+
+    def before_stop(self):
+        self._executor.shutdown(wait=False)
+
+    def get(self, key: str, fetcher: CredentialFetcher) -> str:
+        """Get the credential of key, fetch it if it is missing or expired.
+
+        Raises:
+            ValueError: The credential can't be fetched.
+        """
+        entry = self._entry(key)
+        now = time.time()
+        credential = entry.credential
+        if credential and now < credential.expires_at:
+            if now >= entry.refresh_at:
+                self._refresh_in_background(key, entry, fetcher)
+            return credential.value
+        with entry.lock:
+            # Fetched by another thread while waiting for the lock
+            credential = entry.credential
+            if credential and time.time() < credential.expires_at:
+                return credential.value
+            if time.time() < entry.retry_at:
+                raise ValueError(
+                    f"Fetch credential failed, retry later: {str(entry.error)}"
+                )
+            self._fetch(entry, fetcher)
+            return entry.credential.value
+
+    async def async_get(self, key: str, fetcher: CredentialFetcher) -> str:
+        """Get the credential without blocking the event loop, the fetcher only runs
+        in the executor if the credential is missing or expired"""
+        entry = self._entry(key)
+        credential = entry.credential
+        now = time.time()
+        if credential and now < credential.expires_at:
+            if now >= entry.refresh_at:
+                self._refresh_in_background(key, entry, fetcher)
+            return credential.value
+        return await asyncio.get_running_loop().run_in_executor(
+            None, self.get, key, fetcher
+        )
+
+    def invalidate(self, key: str) -> None:
+        """Drop the credential, e.g. it is rejected by the server"""
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def _entry(self, key: str) -> _Entry:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                entry = _Entry()
+                self._entries[key] = entry
+            return entry
+
+    def _fetch(self, entry: _Entry, fetcher: CredentialFetcher) -> None:
+        """Fetch the credential with the lock of entry"""
+        try:
+            credential = fetcher()
+            if not credential or not credential.value:
+                raise ValueError("Empty credential")
+        except Exception as e:
+            entry.failures += 1
+            entry.error = e
+            backoff = min(
+                self.max_backoff, self.min_backoff * 2 ** (entry.failures - 1)
+            )
+            entry.retry_at = time.time() + backoff
+            raise ValueError(f"Fetch credential failed: {str(e)}") from e
+        now = time.time()
+        entry.credential = credential
+        entry.failures = 0
+        entry.error = None
+        entry.retry_at = 0
+        # Refresh in the second half of the lifetime
+        lifetime = max(credential.expires_at - now, 0)
+        entry.refresh_at = max(
+            now + lifetime / 2, credential.expires_at - self.refresh_ahead
+        )
+
+    def _refresh_in_background(
+        self, key: str, entry: _Entry, fetcher: CredentialFetcher
+    ) -> None:
+        with entry.lock:
+            if entry.refreshing or time.time() < entry.retry_at:
+                return
+            entry.refreshing = True
+
+        def _refresh():
+            try:
+                with entry.lock:
+                    self._fetch(entry, fetcher)
+            except Exception as e:
+                # The key may contain the api key
+                logger.warning(f"Refresh credential error: {str(e)}")
+            finally:
+                entry.refreshing = False
+
+        try:
+            self._executor.submit(_refresh)
+        except RuntimeError:
+            # The executor is shut down
+            entry.refreshing = False
+
+
+_credential_cache: Optional[CredentialCache] = None
+
+
+def get_credential_cache() -> CredentialCache:
+    """Get the cache registered to the SystemApp, a default one is created if no
+    cache has been registered"""
+    global _credential_cache
+    if _credential_cache is None:
+        _credential_cache = CredentialCache()
+    return _credential_cache
+
+
+def initialize_credential_cache(system_app: SystemApp) -> CredentialCache:
+    if not system_app:
+        return get_credential_cache()
+    cache = system_app.get_component(
+        ComponentType.PROXY_CREDENTIAL_CACHE, CredentialCache, None
+    )
+    if cache is None:
+        cache = CredentialCache()
+        system_app.register_instance(cache)
+    return cache
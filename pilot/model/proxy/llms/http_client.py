@@ -0,0 +1,64 @@
+"""Async http helpers of the proxy models.
+
+The requests of the proxy models use the pooled clients of `HttpClientFactory`, so a
+proxy worker can stream hundreds of requests in its event loop instead of taking a
+thread for each request.
+"""
+from dataclasses import dataclass
+from typing import AsyncIterator, Optional
+
+import httpx
+
+from pilot.utils.http_client import get_http_client_factory
+
+
+def get_async_client(url: str) -> httpx.AsyncClient:
+    """The shared client of the host of url in the running event loop"""
+    return get_http_client_factory().get_async_client(url)
+
+
+@dataclass
+class ServerSentEvent:
+    event: str = "message"
+    data: str = ""
+    id: Optional[str] = None
+
+
+async def iter_sse_events(response: httpx.Response) -> AsyncIterator[ServerSentEvent]:
+    """Parse the server-sent events of the streaming response.
+
+    See https://html.spec.whatwg.org/multipage/server-sent-events.html
+    """
+    event, event_id, data_lines = None, None, []
+    async for line in response.aiter_lines():
+        if not line:
+            # Dispatch the event
+            if data_lines:
+                yield ServerSentEvent(
+                    event or "message", "\n".join(data_lines), event_id
+                )
+            event, data_lines = None, []
+            continue
+        if line.startswith(":"):
+            # Comment
+            continue
+        name, _, value = line.partition(":")
+        if value.startswith(" "):
+            value = value[1:]
+        if name == "data":
+            data_lines.append(value)
+        elif name == "event":
+            event = value
+        elif name == "id":
+            event_id = value
+    if data_lines:
+        yield ServerSentEvent(event or "message", "\n".join(data_lines), event_id)
+
+
+async def read_error_message(response: httpx.Response) -> Optional[str]:
+    """The body of the response if it is an error instead of an event stream"""
+    content_type = response.headers.get("content-type", "")
+    if response.status_code < 400 and "application/json" not in content_type:
+        return None
+    body = await response.aread()
+    return body.decode("utf-8", errors="replace")
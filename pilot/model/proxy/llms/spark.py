@@ -3,7 +3,7 @@ import json
 import base64
 import hmac
 import hashlib
-import websockets
+import time
 from datetime import datetime
 from typing import List
 from time import mktime
@@ -11,14 +11,15 @@ from urllib.parse import urlencode
 from urllib.parse import urlparse
 from wsgiref.handlers import format_date_time
 from pilot.scene.base_message import ModelMessage, ModelMessageRoleType
+from pilot.model.proxy.llms.credential_cache import Credential, get_credential_cache
 from pilot.model.proxy.llms.proxy_model import ProxyModel
 
 SPARK_DEFAULT_API_VERSION = "v2"
+# The server rejects the url signed more than 300 seconds ago
+_SIGNED_URL_EXPIRES_IN = 240
 
 
-def spark_generate_stream(
-    model: ProxyModel, tokenizer, params, device, context_len=2048
-):
+def _build_request(model: ProxyModel, params, context_len: int):
     model_params = model.get_params()
     proxy_api_version = model_params.proxyllm_backend or SPARK_DEFAULT_API_VERSION
     proxy_api_key = model_params.proxy_api_key
@@ -47,7 +48,17 @@ def spark_generate_stream(
             pass
 
     spark_api = SparkAPI(proxy_app_id, proxy_api_key, proxy_api_secret, url)
-    request_url = spark_api.gen_url()
+    # The signed url is reused until it is close to be rejected
+    key = (
+        "spark:"
+        + hashlib.sha256(
+            f"{proxy_app_id}:{proxy_api_key}:{proxy_api_secret}:{url}".encode("utf-8")
+        ).hexdigest()
+    )
+    request_url = get_credential_cache().get(
+        key,
+        lambda: Credential(spark_api.gen_url(), time.time() + _SIGNED_URL_EXPIRES_IN),
+    )
 
     temp_his = history[::-1]
     last_user_input = None
@@ -69,18 +80,40 @@ def spark_generate_stream(
         },
         "payload": {"message": {"text": last_user_input.get("content")}},
     }
+    return request_url, data
 
+
+def spark_generate_stream(
+    model: ProxyModel, tokenizer, params, device, context_len=2048
+):
+    request_url, data = _build_request(model, params, context_len)
     async_call(request_url, data)
 
 
+async def async_spark_generate_stream(
+    model: ProxyModel, tokenizer, params, device, context_len=2048
+):
+    request_url, data = _build_request(model, params, context_len)
+    text = ""
+    async for content in async_call(request_url, data):
+        text += content
+        yield text
+
+
 async def async_call(request_url, data):
+    import websockets
+
     async with websockets.connect(request_url) as ws:
         await ws.send(json.dumps(data, ensure_ascii=False))
         finish = False
         while not finish:
-            chunk = ws.recv()
+            chunk = await ws.recv()
             response = json.loads(chunk)
-            if response.get("header", {}).get("status") == 2:
+            header = response.get("header", {})
+            if header.get("code", 0) != 0:
+                yield f"spark response error: {header.get('message')}"
+                break
+            if header.get("status") == 2:
                 finish = True
             if text := response.get("payload", {}).get("choices", {}).get("text"):
                 yield text[0]["content"]
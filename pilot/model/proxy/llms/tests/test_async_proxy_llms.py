@@ -0,0 +1,204 @@
+import asyncio
+import json
+import time
+from typing import Dict, List
+
+import httpx
+import pytest
+
+from pilot.model.llm_out.proxy_llm import async_proxyllm_generate_stream
+from pilot.model.parameter import ProxyModelParameters
+from pilot.model.proxy.llms import (
+    baichuan,
+    credential_cache,
+    http_client,
+    tongyi,
+    wenxin,
+    zhipu,
+)
+from pilot.model.proxy.llms.credential_cache import Credential, CredentialCache
+from pilot.model.proxy.llms.proxy_model import ProxyModel
+from pilot.scene.base_message import ModelMessage, ModelMessageRoleType
+
+
+def _model(model_name: str, **kwargs) -> ProxyModel:
+    return ProxyModel(
+        ProxyModelParameters(
+            model_name=model_name,
+            model_path=model_name,
+            proxy_server_url="",
+            proxy_api_key=kwargs.pop("proxy_api_key", "id.secret"),
+            **kwargs,
+        )
+    )
+
+
+def _params() -> Dict:
+    return {
+        "messages": [
+            ModelMessage(role=ModelMessageRoleType.SYSTEM, content="You are a bot"),
+            ModelMessage(role=ModelMessageRoleType.HUMAN, content="Hello"),
+        ],
+        "temperature": 0.7,
+    }
+
+
+def _sse(*events: str, headers=None) -> httpx.Response:
+    return httpx.Response(
+        200,
+        headers=headers or {"content-type": "text/event-stream"},
+        content="".join(events).encode("utf-8"),
+    )
+
+
+@pytest.fixture
+def requests(monkeypatch):
+    """The requests sent to the proxy servers and the handler of the responses"""
+    sent: List[httpx.Request] = []
+    handlers = {}
+
+    async def _handle(request: httpx.Request) -> httpx.Response:
+        sent.append(request)
+        await asyncio.sleep(0.05)
+        return handlers["handler"](request)
+
+    client = httpx.AsyncClient(transport=httpx.MockTransport(_handle))
+    monkeypatch.setattr(credential_cache, "_credential_cache", CredentialCache())
+    monkeypatch.setattr(http_client, "get_async_client", lambda url: client)
+    for module in [baichuan, tongyi, wenxin, zhipu]:
+        monkeypatch.setattr(module, "get_async_client", lambda url: client)
+    return sent, handlers
+
+
+async def _collect(model, params=None) -> List[str]:
+    return [
+        output
+        async for output in async_proxyllm_generate_stream(
+            model, None, params or _params(), "cpu"
+        )
+    ]
+
+
+@pytest.mark.asyncio
+async def test_iter_sse_events():
+    response = _sse(
+        ": comment\n",
+        "event: add\ndata: line1\ndata: line2\n\n",
+        "id: 2\ndata:{}\n\n",
+        "data: last",
+    )
+    events = [event async for event in http_client.iter_sse_events(response)]
+    assert [(event.event, event.data, event.id) for event in events] == [
+        ("add", "line1\nline2", None),
+        ("message", "{}", "2"),
+        # The last event id is kept
+        ("message", "last", "2"),
+    ]
+
+
+@pytest.mark.asyncio
+async def test_async_wenxin(requests, monkeypatch):
+    sent, handlers = requests
+    monkeypatch.setattr(
+        wenxin,
+        "_fetch_access_token",
+        lambda key, secret: Credential("token", time.time() + 3600),
+    )
+    handlers["handler"] = lambda request: _sse(
+        'data: {"result": "Hello"}\n\n',
+        'data: {"result": " world"}\n\n',
+    )
+    model = _model(
+        "wenxin_proxyllm", proxyllm_backend="ERNIE-Bot", proxy_api_secret="secret"
+    )
+    assert await _collect(model) == ["Hello", "Hello world"]
+    assert sent[0].url.params["access_token"] == "token"
+    assert json.loads(sent[0].content)["system"] == "You are a bot"
+
+
+@pytest.mark.asyncio
+async def test_async_wenxin_error(requests, monkeypatch):
+    _, handlers = requests
+    monkeypatch.setattr(
+        wenxin,
+        "_fetch_access_token",
+        lambda key, secret: Credential("token", time.time() + 3600),
+    )
+    handlers["handler"] = lambda request: httpx.Response(
+        200, json={"error_code": 110, "error_msg": "Access token invalid"}
+    )
+    model = _model(
+        "wenxin_proxyllm", proxyllm_backend="ERNIE-Bot", proxy_api_secret="secret"
+    )
+    outputs = await _collect(model)
+    assert len(outputs) == 1 and "Access token invalid" in outputs[0]
+
+
+@pytest.mark.asyncio
+async def test_async_baichuan(requests):
+    sent, handlers = requests
+    chunk = lambda content: json.dumps({"data": {"messages": [{"content": content}]}})
+    handlers["handler"] = lambda request: _sse(
+        f"data: {chunk('Hi')}\n\n", f"data: {chunk('!')}\n\n", "data: [DONE]\n\n"
+    )
+    model = _model("bc_proxyllm", proxy_api_secret="secret")
+    assert await _collect(model) == ["Hi", "Hi!", "Hi!"]
+    assert sent[0].headers["X-BC-Sign-Algo"] == "MD5"
+
+
+@pytest.mark.asyncio
+async def test_async_zhipu(requests):
+    sent, handlers = requests
+    handlers["handler"] = lambda request: _sse(
+        "event: add\ndata: Hi\n\n",
+        "event: add\ndata: Hi there\n\n",
+        'event: finish\ndata: Hi there\nmeta: {"usage": {}}\n\n',
+    )
+    assert await _collect(_model("zhipu_proxyllm")) == ["Hi", "Hi there"]
+    assert sent[0].url.path.endswith("/chatglm_pro/sse-invoke")
+    assert sent[0].headers["Authorization"].count(".") == 2
+
+
+@pytest.mark.asyncio
+async def test_async_tongyi(requests):
+    sent, handlers = requests
+    chunk = lambda content: json.dumps(
+        {"output": {"choices": [{"message": {"content": content}}]}}
+    )
+    handlers["handler"] = lambda request: _sse(
+        f"id:1\nevent:result\n:HTTP_STATUS/200\ndata:{chunk('Hi')}\n\n",
+        f"id:2\nevent:result\n:HTTP_STATUS/200\ndata:{chunk('Hi there')}\n\n",
+    )
+    assert await _collect(_model("tongyi_proxyllm")) == ["Hi", "Hi there"]
+    assert sent[0].headers["X-DashScope-SSE"] == "enable"
+    assert json.loads(sent[0].content)["model"] == "qwen-turbo"
+
+
+@pytest.mark.asyncio
+async def test_concurrent_streams_in_event_loop(requests):
+    _, handlers = requests
+    handlers["handler"] = lambda request: _sse("event: add\ndata: Hi\n\n")
+    # 200 streams waiting for the server at the same time, 0.05s each
+    results = await asyncio.wait_for(
+        asyncio.gather(*[_collect(_model("zhipu_proxyllm")) for _ in range(200)]),
+        timeout=5,
+    )
+    assert results == [["Hi"]] * 200
+
+
+@pytest.mark.asyncio
+async def test_unsupported_model():
+    assert await _collect(_model("unknown_proxyllm")) == [
+        "unknown_proxyllm LLM is not supported"
+    ]
+
+
+def test_proxy_adapter_support_async():
+    from pilot.model.model_adapter import get_llm_model_adapter
+
+    adapter = get_llm_model_adapter("zhipu_proxyllm", "zhipu_proxyllm")
+    assert adapter.support_async()
+    assert (
+        adapter.get_async_generate_stream_function(None, "zhipu_proxyllm")
+        is async_proxyllm_generate_stream
+    )
@@ -0,0 +1,125 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+from pilot.model.proxy.llms import credential_cache, wenxin
+from pilot.model.proxy.llms.credential_cache import Credential, CredentialCache
+
+
+class _Fetcher:
+    def __init__(self, expires_in: float = 3600, fail: bool = False, delay=0):
+        self.expires_in = expires_in
+        self.fail = fail
+        self.delay = delay
+        self.calls = 0
+
+    def __call__(self) -> Credential:
+        self.calls += 1
+        time.sleep(self.delay)
+        if self.fail:
+            raise ConnectionError("OAuth endpoint is down")
+        return Credential(f"token{self.calls}", time.time() + self.expires_in)
+
+
+@pytest.fixture
+def cache(monkeypatch):
+    cache = CredentialCache(refresh_ahead=300, min_backoff=0.2, max_backoff=1)
+    monkeypatch.setattr(credential_cache, "_credential_cache", cache)
+    yield cache
+    cache.before_stop()
+
+
+def test_credential_cached(cache):
+    fetcher = _Fetcher()
+    assert cache.get("key", fetcher) == "token1"
+    assert cache.get("key", fetcher) == "token1"
+    assert fetcher.calls == 1
+    # Other keys are fetched separately
+    assert cache.get("other_key", _Fetcher()) == "token1"
+
+
+def test_concurrent_fetch_once(cache):
+    fetcher = _Fetcher(delay=0.1)
+    results = []
+    threads = [
+        threading.Thread(target=lambda: results.append(cache.get("key", fetcher)))
+        for _ in range(10)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert results == ["token1"] * 10
+    assert fetcher.calls == 1
+
+
+def test_refresh_in_background(cache):
+    # Refreshed in the second half of the lifetime
+    fetcher = _Fetcher(expires_in=0.4, delay=0.1)
+    assert cache.get("key", fetcher) == "token1"
+    time.sleep(0.25)
+    # The old credential is returned while refreshing
+    assert cache.get("key", fetcher) == "token1"
+    time.sleep(0.15)
+    assert cache.get("key", fetcher) == "token2"
+    assert fetcher.calls == 2
+
+
+def test_expired_credential_fetched_again(cache):
+    fetcher = _Fetcher(expires_in=0.1)
+    assert cache.get("key", fetcher) == "token1"
+    time.sleep(0.15)
+    assert cache.get("key", fetcher) == "token2"
+
+
+def test_backoff_on_failures(cache):
+    fetcher = _Fetcher(fail=True)
+    with pytest.raises(ValueError, match="OAuth endpoint is down"):
+        cache.get("key", fetcher)
+    # Not fetched again during the backoff
+    with pytest.raises(ValueError, match="retry later"):
+        cache.get("key", fetcher)
+    assert fetcher.calls == 1
+    time.sleep(0.25)
+    fetcher.fail = False
+    assert cache.get("key", fetcher) == "token2"
+
+
+def test_invalidate(cache):
+    fetcher = _Fetcher()
+    cache.get("key", fetcher)
+    cache.invalidate("key")
+    assert cache.get("key", fetcher) == "token2"
+
+
+@pytest.mark.asyncio
+async def test_async_get(cache):
+    fetcher = _Fetcher(delay=0.1)
+    results = await asyncio.gather(*[cache.async_get("key", fetcher) for _ in range(5)])
+    assert results == ["token1"] * 5
+    assert fetcher.calls == 1
+
+
+def test_wenxin_access_token_cached(cache, monkeypatch):
+    fetcher = _Fetcher()
+    monkeypatch.setattr(
+        wenxin, "_fetch_access_token", lambda api_key, secret_key: fetcher()
+    )
+    assert wenxin._build_access_token("ak", "sk") == "token1"
+    assert wenxin._build_access_token("ak", "sk") == "token1"
+    assert fetcher.calls == 1
+    # The server rejects the token
+    wenxin._check_token_error(
+        '{"error_code": 111, "error_msg": "Access token expired"}', "ak", "sk"
+    )
+    assert wenxin._build_access_token("ak", "sk") == "token2"
+
+
+def test_wenxin_access_token_failed(cache, monkeypatch):
+    fetcher = _Fetcher(fail=True)
+    monkeypatch.setattr(
+        wenxin, "_fetch_access_token", lambda api_key, secret_key: fetcher()
+    )
+    assert wenxin._build_access_token("ak", "sk") is None
@@ -1,28 +1,24 @@
 import os
+import json
 import logging
-from typing import List
+from typing import Dict, List
+from pilot.model.proxy.llms.http_client import (
+    get_async_client,
+    iter_sse_events,
+    read_error_message,
+)
 from pilot.model.proxy.llms.proxy_model import ProxyModel
 from pilot.scene.base_message import ModelMessage, ModelMessageRoleType
 
 logger = logging.getLogger(__name__)
 
+TONGYI_DEFAULT_MODEL = "qwen-turbo"
+DASHSCOPE_GENERATION_URL = (
+    "https://dashscope.aliyuncs.com/api/v1/services/aigc/text-generation/generation"
+)
 
-def tongyi_generate_stream(
-    model: ProxyModel, tokenizer, params, device, context_len=2048
-):
-    import dashscope
-    from dashscope import Generation
-
-    model_params = model.get_params()
-    print(f"Model: {model}, model_params: {model_params}")
-
-    proxy_api_key = model_params.proxy_api_key
-    dashscope.api_key = proxy_api_key
-
-    proxyllm_backend = model_params.proxyllm_backend
-    if not proxyllm_backend:
-        proxyllm_backend = Generation.Models.qwen_turbo  # By Default qwen_turbo
 
+def _build_history(params) -> List[Dict]:
     history = []
 
     messages: List[ModelMessage] = params["messages"]
@@ -56,6 +52,26 @@ def tongyi_generate_stream(
     if last_user_input:
         history.remove(last_user_input)
         history.append(last_user_input)
+    return history
+
+
+def tongyi_generate_stream(
+    model: ProxyModel, tokenizer, params, device, context_len=2048
+):
+    import dashscope
+    from dashscope import Generation
+
+    model_params = model.get_params()
+    print(f"Model: {model}, model_params: {model_params}")
+
+    proxy_api_key = model_params.proxy_api_key
+    dashscope.api_key = proxy_api_key
+
+    proxyllm_backend = model_params.proxyllm_backend
+    if not proxyllm_backend:
+        proxyllm_backend = Generation.Models.qwen_turbo  # By Default qwen_turbo
+
+    history = _build_history(params)
 
     gen = Generation()
     res = gen.call(
@@ -74,3 +90,37 @@ def tongyi_generate_stream(
             else:
                 content = r["code"] + ":" + r["message"]
                 yield content
+
+
+async def async_tongyi_generate_stream(
+    model: ProxyModel, tokenizer, params, device, context_len=2048
+):
+    """Call the http api of dashscope with the shared async client"""
+    model_params = model.get_params()
+    headers = {
+        "Authorization": f"Bearer {model_params.proxy_api_key}",
+        "Accept": "text/event-stream",
+        "X-DashScope-SSE": "enable",
+    }
+    payload = {
+        "model": model_params.proxyllm_backend or TONGYI_DEFAULT_MODEL,
+        "input": {"messages": _build_history(params)},
+        "parameters": {
+            "top_p": params.get("top_p", 0.8),
+            "result_format": "message",
+        },
+    }
+    async with get_async_client(DASHSCOPE_GENERATION_URL).stream(
+        "POST", DASHSCOPE_GENERATION_URL, headers=headers, json=payload
+    ) as response:
+        error_message = await read_error_message(response)
+        if error_message:
+            yield error_message
+            return
+        async for event in iter_sse_events(response):
+            data = json.loads(event.data)
+            if event.event == "error" or "output" not in data:
+                yield f"{data.get('code')}:{data.get('message')}"
+                return
+            # The content is the whole text generated so far
+            yield data["output"]["choices"][0]["message"].get("content")
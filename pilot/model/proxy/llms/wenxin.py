@@ -1,14 +1,29 @@
+import hashlib
 import os
+import logging
+import time
 import requests
 import json
-from typing import List
+from typing import List, Optional
+from pilot.model.proxy.llms.credential_cache import Credential, get_credential_cache
+from pilot.model.proxy.llms.http_client import (
+    get_async_client,
+    iter_sse_events,
+    read_error_message,
+)
 from pilot.model.proxy.llms.proxy_model import ProxyModel
 from pilot.scene.base_message import ModelMessage, ModelMessageRoleType
-from cachetools import cached, TTLCache
 
+logger = logging.getLogger(__name__)
 
-@cached(TTLCache(1, 1800))
-def _build_access_token(api_key: str, secret_key: str) -> str:
+
+# Seconds the access token is used if the response has no expires_in
+_DEFAULT_TOKEN_EXPIRES_IN = 1800
+# The access token is invalid or expired
+_TOKEN_ERROR_CODES = [110, 111]
+
+
+def _fetch_access_token(api_key: str, secret_key: str) -> Credential:
     """
     Generate Access token according AK, SK
     """
@@ -20,37 +35,49 @@ def _build_access_token(api_key: str, secret_key: str) -> str:
         "client_secret": secret_key,
     }
 
-    res = requests.get(url=url, params=params)
+    res = requests.get(url=url, params=params, timeout=10)
+    res.raise_for_status()
+    data = res.json()
+    if not data.get("access_token"):
+        raise ValueError(f"Get access token error: {data}")
+    expires_in = data.get("expires_in") or _DEFAULT_TOKEN_EXPIRES_IN
+    return Credential(data["access_token"], time.time() + expires_in)
 
-    if res.status_code == 200:
-        return res.json().get("access_token")
 
+def _token_key(api_key: str, secret_key: str) -> str:
+    return "wenxin:" + hashlib.sha256(f"{api_key}:{secret_key}".encode()).hexdigest()
 
-def wenxin_generate_stream(
-    model: ProxyModel, tokenizer, params, device, context_len=2048
-):
-    MODEL_VERSION = {
-        "ERNIE-Bot": "completions",
-        "ERNIE-Bot-turbo": "eb-instant",
-    }
 
-    model_params = model.get_params()
-    model_name = model_params.proxyllm_backend
-    model_version = MODEL_VERSION.get(model_name)
-    if not model_version:
-        yield f"Unsupport model version {model_name}"
+def _build_access_token(api_key: str, secret_key: str) -> Optional[str]:
+    """The cached access token, it is refreshed in background before its expiry"""
+    try:
+        return get_credential_cache().get(
+            _token_key(api_key, secret_key),
+            lambda: _fetch_access_token(api_key, secret_key),
+        )
+    except ValueError as e:
+        logger.warning(str(e))
+        return None
 
-    proxy_api_key = model_params.proxy_api_key
-    proxy_api_secret = model_params.proxy_api_secret
-    access_token = _build_access_token(proxy_api_key, proxy_api_secret)
 
-    headers = {"Content-Type": "application/json", "Accept": "application/json"}
+async def _async_build_access_token(api_key: str, secret_key: str) -> Optional[str]:
+    try:
+        return await get_credential_cache().async_get(
+            _token_key(api_key, secret_key),
+            lambda: _fetch_access_token(api_key, secret_key),
+        )
+    except ValueError as e:
+        logger.warning(str(e))
+        return None
 
-    proxy_server_url = f"https://aip.baidubce.com/rpc/2.0/ai_custom/v1/wenxinworkshop/chat/{model_version}?access_token={access_token}"
 
-    if not access_token:
-        yield "Failed to get access token. please set the correct api_key and secret key."
+MODEL_VERSION = {
+    "ERNIE-Bot": "completions",
+    "ERNIE-Bot-turbo": "eb-instant",
+}
 
+
+def _build_payload(params) -> dict:
     history = []
 
     messages: List[ModelMessage] = params["messages"]
@@ -85,13 +112,56 @@ def wenxin_generate_stream(
         history.remove(last_user_input)
         history.append(last_user_input)
 
-    payload = {
+    return {
         "messages": history,
         "system": system,
         "temperature": params.get("temperature"),
         "stream": True,
     }
 
+
+def _check_token_error(error_message: str, api_key: str, secret_key: str) -> None:
+    """Drop the cached access token if the server rejects it"""
+    try:
+        error_code = json.loads(error_message).get("error_code")
+    except Exception:
+        return
+    if error_code in _TOKEN_ERROR_CODES:
+        get_credential_cache().invalidate(_token_key(api_key, secret_key))
+
+
+def _chat_url(model_version: str, access_token: str) -> str:
+    return f"https://aip.baidubce.com/rpc/2.0/ai_custom/v1/wenxinworkshop/chat/{model_version}?access_token={access_token}"
+
+
+def _parse_result(data: str) -> Optional[str]:
+    if data.lower() == "[DONE]".lower():
+        return None
+    return json.loads(data)["result"]
+
+
+def wenxin_generate_stream(
+    model: ProxyModel, tokenizer, params, device, context_len=2048
+):
+    model_params = model.get_params()
+    model_name = model_params.proxyllm_backend
+    model_version = MODEL_VERSION.get(model_name)
+    if not model_version:
+        yield f"Unsupport model version {model_name}"
+
+    proxy_api_key = model_params.proxy_api_key
+    proxy_api_secret = model_params.proxy_api_secret
+    access_token = _build_access_token(proxy_api_key, proxy_api_secret)
+
+    headers = {"Content-Type": "application/json", "Accept": "application/json"}
+
+    proxy_server_url = _chat_url(model_version, access_token)
+
+    if not access_token:
+        yield "Failed to get access token. please set the correct api_key and secret key."
+
+    payload = _build_payload(params)
+
     text = ""
     res = requests.post(proxy_server_url, headers=headers, json=payload, stream=True)
     print(f"Send request to {proxy_server_url} with real model {model_name}")
@@ -99,13 +169,51 @@ def wenxin_generate_stream(
         if line:
             if not line.startswith(b"data: "):
                 error_message = line.decode("utf-8")
+                _check_token_error(error_message, proxy_api_key, proxy_api_secret)
                 yield error_message
             else:
                 json_data = line.split(b": ", 1)[1]
-                decoded_line = json_data.decode("utf-8")
-                if decoded_line.lower() != "[DONE]".lower():
-                    obj = json.loads(json_data)
-                    if obj["result"] is not None:
-                        content = obj["result"]
-                        text += content
+                content = _parse_result(json_data.decode("utf-8"))
+                if content is not None:
+                    text += content
                 yield text
+
+
+async def async_wenxin_generate_stream(
+    model: ProxyModel, tokenizer, params, device, context_len=2048
+):
+    model_params = model.get_params()
+    model_name = model_params.proxyllm_backend
+    model_version = MODEL_VERSION.get(model_name)
+    if not model_version:
+        yield f"Unsupport model version {model_name}"
+        return
+
+    access_token = await _async_build_access_token(
+        model_params.proxy_api_key, model_params.proxy_api_secret
+    )
+    if not access_token:
+        yield "Failed to get access token. please set the correct api_key and secret key."
+        return
+
+    headers = {"Content-Type": "application/json", "Accept": "application/json"}
+    payload = _build_payload(params)
+    logger.info(f"Send request to wenxin with real model {model_name}")
+
+    text = ""
+    url = _chat_url(model_version, access_token)
+    async with get_async_client(url).stream(
+        "POST", url, headers=headers, json=payload
+    ) as response:
+        error_message = await read_error_message(response)
+        if error_message:
+            _check_token_error(
+                error_message, model_params.proxy_api_key, model_params.proxy_api_secret
+            )
+            yield error_message
+            return
+        async for event in iter_sse_events(response):
+            content = _parse_result(event.data)
+            if content is not None:
+                text += content
+            yield text
@@ -1,27 +1,29 @@
 import os
+import base64
+import hashlib
+import hmac
 import json
-from typing import List
+import time
+from typing import Dict, List
 
+from pilot.model.proxy.llms.credential_cache import Credential, get_credential_cache
+from pilot.model.proxy.llms.http_client import (
+    get_async_client,
+    iter_sse_events,
+    read_error_message,
+)
 from pilot.model.proxy.llms.proxy_model import ProxyModel
 from pilot.scene.base_message import ModelMessage, ModelMessageRoleType
 
 CHATGLM_DEFAULT_MODEL = "chatglm_pro"
+# Seconds the signed token is valid
+_TOKEN_EXPIRES_IN = 3600
+ZHIPU_SSE_INVOKE_URL = (
+    "https://open.bigmodel.cn/api/paas/v3/model-api/{model}/sse-invoke"
+)
 
 
-def zhipu_generate_stream(
-    model: ProxyModel, tokenizer, params, device, context_len=2048
-):
-    """Zhipu ai, see: https://open.bigmodel.cn/dev/api#overview"""
-    model_params = model.get_params()
-    print(f"Model: {model}, model_params: {model_params}")
-
-    # TODO proxy model use unified config?
-    proxy_api_key = model_params.proxy_api_key
-    proxyllm_backend = CHATGLM_DEFAULT_MODEL or model_params.proxyllm_backend
-
-    import zhipuai
-
-    zhipuai.api_key = proxy_api_key
+def _build_history(params) -> List[Dict]:
     history = []
 
     messages: List[ModelMessage] = params["messages"]
@@ -55,6 +57,59 @@ def zhipu_generate_stream(
     if last_user_input:
         history.remove(last_user_input)
         history.append(last_user_input)
+    return history
+
+
+def _base64url(data: bytes) -> str:
+    return base64.urlsafe_b64encode(data).rstrip(b"=").decode("utf-8")
+
+
+def generate_token(api_key: str, exp_seconds: int = 3600) -> str:
+    """The JWT token of the api key ("{id}.{secret}"), signed like the zhipuai sdk"""
+    try:
+        api_key_id, secret = api_key.split(".")
+    except Exception as e:
+        raise ValueError("Invalid zhipu api key, it should be {id}.{secret}") from e
+    now = int(round(time.time() * 1000))
+    header = {"alg": "HS256", "sign_type": "SIGN"}
+    payload = {"api_key": api_key_id, "exp": now + exp_seconds * 1000, "timestamp": now}
+    signing_input = ".".join(
+        _base64url(json.dumps(part, separators=(",", ":")).encode("utf-8"))
+        for part in [header, payload]
+    )
+    signature = hmac.new(
+        secret.encode("utf-8"), signing_input.encode("utf-8"), hashlib.sha256
+    ).digest()
+    return f"{signing_input}.{_base64url(signature)}"
+
+
+def _get_token(api_key: str) -> str:
+    """The cached token of the api key, it is signed again before its expiry"""
+    key = "zhipu:" + hashlib.sha256(api_key.encode("utf-8")).hexdigest()
+    return get_credential_cache().get(
+        key,
+        lambda: Credential(
+            generate_token(api_key, _TOKEN_EXPIRES_IN),
+            time.time() + _TOKEN_EXPIRES_IN,
+        ),
+    )
+
+
+def zhipu_generate_stream(
+    model: ProxyModel, tokenizer, params, device, context_len=2048
+):
+    """Zhipu ai, see: https://open.bigmodel.cn/dev/api#overview"""
+    model_params = model.get_params()
+    print(f"Model: {model}, model_params: {model_params}")
+
+    # TODO proxy model use unified config?
+    proxy_api_key = model_params.proxy_api_key
+    proxyllm_backend = CHATGLM_DEFAULT_MODEL or model_params.proxyllm_backend
+
+    import zhipuai
+
+    zhipuai.api_key = proxy_api_key
+    history = _build_history(params)
 
     res = zhipuai.model_api.sse_invoke(
         model=proxyllm_backend,
@@ -66,3 +121,34 @@ def zhipu_generate_stream(
     for r in res.events():
         if r.event == "add":
             yield r.data
+
+
+async def async_zhipu_generate_stream(
+    model: ProxyModel, tokenizer, params, device, context_len=2048
+):
+    """Call the sse api of zhipu ai with the shared async client"""
+    model_params = model.get_params()
+    proxyllm_backend = CHATGLM_DEFAULT_MODEL or model_params.proxyllm_backend
+    url = ZHIPU_SSE_INVOKE_URL.format(model=proxyllm_backend)
+    headers = {
+        "Accept": "text/event-stream",
+        "Authorization": _get_token(model_params.proxy_api_key),
+    }
+    payload = {
+        "prompt": _build_history(params),
+        "temperature": params.get("temperature"),
+        "top_p": params.get("top_p"),
+        "incremental": False,
+    }
+    async with get_async_client(url).stream(
+        "POST", url, headers=headers, json=payload
+    ) as response:
+        error_message = await read_error_message(response)
+        if error_message:
+            yield error_message
+            return
+        async for event in iter_sse_events(response):
+            if event.event == "add":
+                yield event.data
+            elif event.event in ["error", "interrupted"]:
+                yield f"zhipu response error: {event.data}"
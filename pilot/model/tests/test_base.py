@@ -0,0 +1,38 @@
+import json
+
+from pilot.model.base import (
+    ModelOutput,
+    ModelOutputDeltaDecoder,
+    ModelOutputDeltaEncoder,
+)
+
+
+def test_model_output_to_dict_compatible():
+    output = ModelOutput(text="hello", error_code=0)
+    assert output.to_dict() == {"text": "hello", "error_code": 0, "model_context": None}
+
+
+def test_delta_encode_and_decode():
+    texts = ["SELECT", "SELECT *", "SELECT * FROM", "SELECT * FR", "SELECT * FROM t;"]
+    encoder = ModelOutputDeltaEncoder()
+    decoder = ModelOutputDeltaDecoder()
+    deltas = []
+    for text in texts:
+        delta = encoder.encode(ModelOutput(text=text, error_code=0))
+        # Transfer by json, same as the worker api
+        delta = ModelOutput(**json.loads(json.dumps(delta.to_dict())))
+        deltas.append((delta.text, delta.text_offset))
+        assert decoder.decode(delta).text == text
+    assert deltas == [
+        ("SELECT", 0),
+        (" *", 6),
+        (" FROM", 8),
+        ("SELECT * FR", 0),
+        ("OM t;", 11),
+    ]
+
+
+def test_delta_decode_full_text_output():
+    decoder = ModelOutputDeltaDecoder()
+    assert decoder.decode(ModelOutput(text="a", error_code=0)).text == "a"
+    assert decoder.decode(ModelOutput(text="ab", error_code=0)).text == "ab"
@@ -0,0 +1,104 @@
+from types import SimpleNamespace
+from typing import List
+
+import pytest
+
+torch = pytest.importorskip("torch")
+
+from pilot.model.batch_inference import ContinuousBatchingScheduler
+
+_VOCAB_SIZE = 128
+
+
+class MockTokenizer:
+    eos_token_id = 0
+    pad_token_id = None
+
+    def __call__(self, prompt: str):
+        return SimpleNamespace(input_ids=[ord(c) for c in prompt])
+
+    def decode(self, ids: List[int], **kwargs) -> str:
+        return "".join(chr(i) for i in ids if i != self.eos_token_id)
+
+
+class MockModel(torch.nn.Module):
+    """The next token is always the last input token plus one, the KV cache just
+    stores the input ids"""
+
+    def __init__(self):
+        super().__init__()
+        self.config = SimpleNamespace(is_encoder_decoder=False)
+        self.batch_sizes = []
+
+    def forward(
+        self,
+        input_ids=None,
+        attention_mask=None,
+        position_ids=None,
+        past_key_values=None,
+        use_cache=True,
+    ):
+        self.batch_sizes.append(input_ids.shape[0])
+        kv = input_ids.float()[:, None, :, None]
+        if past_key_values:
+            past_k, past_v = past_key_values[0]
+            assert past_k.shape[2] + input_ids.shape[1] == attention_mask.shape[1]
+            kv = torch.cat([past_k, kv], dim=2)
+        logits = torch.nn.functional.one_hot(
+            (input_ids + 1) % _VOCAB_SIZE, _VOCAB_SIZE
+        ).float()
+        return SimpleNamespace(logits=logits, past_key_values=((kv, kv),))
+
+
+@pytest.fixture
+def scheduler():
+    model = MockModel()
+    scheduler = ContinuousBatchingScheduler(
+        model, MockTokenizer(), "cpu", 2048, max_batch_size=4, stream_interval=1
+    )
+    scheduler.start()
+    yield scheduler
+    scheduler.stop()
+
+
+def _params(prompt: str, **kwargs):
+    return dict(prompt=prompt, temperature=0, echo=False, **kwargs)
+
+
+def test_generate_stream_stop_str(scheduler: ContinuousBatchingScheduler):
+    outputs = list(scheduler.generate_stream(_params("a", stop="e")))
+    assert outputs[-1]["text"] == "bcd"
+    assert outputs[-1]["finish_reason"] == "stop"
+    assert outputs[-1]["usage"]["prompt_tokens"] == 1
+
+
+def test_generate_stream_max_new_tokens(scheduler: ContinuousBatchingScheduler):
+    outputs = list(scheduler.generate_stream(_params("abc", max_new_tokens=3)))
+    assert [o["text"] for o in outputs] == ["d", "de", "def"]
+    assert outputs[-1]["finish_reason"] == "length"
+    assert outputs[-1]["usage"]["completion_tokens"] == 3
+
+
+def test_concurrent_requests_batched(scheduler: ContinuousBatchingScheduler):
+    scheduler.stop()
+    reqs = [
+        scheduler.submit(_params("a", max_new_tokens=5)),
+        scheduler.submit(_params("hello", max_new_tokens=2)),
+        scheduler.submit(_params("x", stop="z")),
+    ]
+    scheduler.start()
+    results = []
+    for req in reqs:
+        outputs = []
+        while True:
+            output = req.output_queue.get(timeout=10)
+            if not isinstance(output, dict):
+                break
+            outputs.append(output)
+        results.append(outputs[-1]["text"])
+    assert results == ["bcdef", "pq", "y"]
+    # The prefill of all requests is merged into one forward pass
+    assert scheduler.model.batch_sizes[0] == 3
+    stats = scheduler.stats()
+    assert stats["total_requests"] == 3
+    assert stats["running"] == 0
@@ -0,0 +1,114 @@
+import random
+
+import pytest
+
+from pilot.model.detokenizer import IncrementalDetokenizer, StopStringMatcher
+from pilot.model.llm_utils import is_partial_stop
+
+_CORPUS = [
+    "SELECT name, age FROM users WHERE age > 18 ORDER BY name;",
+    "你好，世界！这是一个测试。",
+    "The quick brown fox jumps over the lazy dog.",
+]
+
+_DECODE_KWARGS = {
+    "skip_special_tokens": True,
+    "spaces_between_special_tokens": False,
+}
+
+
+def _build_tokenizer(byte_level: bool):
+    tokenizers = pytest.importorskip("tokenizers")
+    transformers = pytest.importorskip("transformers")
+    from tokenizers import decoders, models, pre_tokenizers, trainers
+
+    tokenizer = tokenizers.Tokenizer(models.BPE())
+    trainer_kwargs = {"vocab_size": 300, "special_tokens": ["</s>"]}
+    if byte_level:
+        tokenizer.pre_tokenizer = pre_tokenizers.ByteLevel(add_prefix_space=False)
+        tokenizer.decoder = decoders.ByteLevel()
+        trainer_kwargs["initial_alphabet"] = pre_tokenizers.ByteLevel.alphabet()
+    else:
+        # Sentencepiece style, the leading space of a text is dropped when decoding
+        tokenizer.pre_tokenizer = pre_tokenizers.Metaspace()
+        tokenizer.decoder = decoders.Metaspace()
+    tokenizer.train_from_iterator(_CORPUS * 10, trainers.BpeTrainer(**trainer_kwargs))
+    return transformers.PreTrainedTokenizerFast(
+        tokenizer_object=tokenizer, eos_token="</s>"
+    )
+
+
+def _incremental_decode(
+    tokenizer, prompt_ids, gen_ids, stream_interval, use_prompt_context=True
+):
+    detokenizer = IncrementalDetokenizer(
+        tokenizer,
+        prompt_ids,
+        use_prompt_context=use_prompt_context,
+        **_DECODE_KWARGS,
+    )
+    output_ids = list(prompt_ids)
+    for i, token in enumerate(gen_ids):
+        output_ids.append(token)
+        final = i == len(gen_ids) - 1
+        if i % stream_interval == 0 or final:
+            detokenizer.step(output_ids, final=final)
+    return detokenizer.text
+
+
+@pytest.mark.parametrize("byte_level", [True, False])
+@pytest.mark.parametrize("stream_interval", [1, 2, 5])
+def test_incremental_detokenizer_same_as_decode(byte_level, stream_interval):
+    tokenizer = _build_tokenizer(byte_level)
+    prompt_ids = tokenizer(" ".join(_CORPUS)).input_ids
+    rnd = random.Random(42)
+    for _ in range(50):
+        # Random tokens contain incomplete utf-8 bytes and special tokens
+        gen_ids = [rnd.randrange(len(tokenizer)) for _ in range(40)]
+        full_text = tokenizer.decode(prompt_ids + gen_ids, **_DECODE_KWARGS)
+        prompt_text = tokenizer.decode(prompt_ids, **_DECODE_KWARGS)
+        text = _incremental_decode(tokenizer, prompt_ids, gen_ids, stream_interval)
+        assert prompt_text + text == full_text
+
+        text = _incremental_decode(
+            tokenizer, prompt_ids, gen_ids, stream_interval, use_prompt_context=False
+        )
+        assert text == tokenizer.decode(gen_ids, **_DECODE_KWARGS)
+
+
+@pytest.mark.parametrize(
+    "stop_str, chunks",
+    [
+        ("###", ["Hello", " wor", "ld #", "## next"]),
+        (["</s>", "\nUSER:"], ["SELECT 1", ";\nUS", "ER: hi"]),
+        ("<eoa>", ["abc", "<eo", "x"]),
+        (None, ["abc", "def"]),
+    ],
+)
+def test_stop_string_matcher_same_as_rfind(stop_str, chunks):
+    matcher = StopStringMatcher(stop_str)
+    stop_strs = [stop_str] if isinstance(stop_str, str) else stop_str or []
+    output = ""
+    for chunk in chunks:
+        output += chunk
+        pos, partially_stopped = matcher.check(output)
+
+        expected_pos, expected_partially_stopped = -1, False
+        for each_stop in stop_strs:
+            expected_pos = output.rfind(each_stop)
+            if expected_pos != -1:
+                break
+            expected_partially_stopped = is_partial_stop(output, each_stop)
+            if expected_partially_stopped:
+                break
+        assert pos == expected_pos
+        assert partially_stopped == expected_partially_stopped
+        if pos != -1:
+            break
+
+
+def test_stop_string_matcher_skip_prompt():
+    prompt = "USER: hi ### ASSISTANT:"
+    matcher = StopStringMatcher("###", start=len(prompt))
+    assert matcher.check(prompt + " hello") == (-1, False)
+    assert matcher.check(prompt + " hello ###") == (len(prompt) + 7, False)
@@ -46,6 +46,12 @@ from pilot.summary.db_summary_client import DBSummaryClient
 from pilot.memory.chat_history.chat_hisotry_factory import ChatHistory
 from pilot.model.cluster import BaseModelController, WorkerManager, WorkerManagerFactory
 from pilot.model.base import FlatSupportedModel
+from pilot.utils.stream_utils import (
+    StreamCoalescePolicy,
+    StreamMetrics,
+    coalesce_stream,
+)
+from pilot.utils.tracer import root_tracer
 
 router = APIRouter()
 CFG = Config()
@@ -190,14 +196,10 @@ async def dialogue_list(user_id: str = None):
         conv_uid = item.get("conv_uid")
         summary = item.get("summary")
         chat_mode = item.get("chat_mode")
-        model_name = item.get("model_name", CFG.LLM_MODEL)
-
-        messages = json.loads(item.get("messages"))
-        last_round = max(messages, key=lambda x: x["chat_order"])
-        if "param_value" in last_round:
-            select_param = last_round["param_value"]
-        else:
-            select_param = ""
+        model_name = item.get("model_name") or CFG.LLM_MODEL
+        # The param of the last round is saved with the conversation, the messages
+        # are not loaded
+        select_param = item.get("select_param") or ""
         conv_vo: ConversationVo = ConversationVo(
             conv_uid=conv_uid,
             user_input=summary,
@@ -358,7 +360,7 @@ async def chat_prepare(dialogue: ConversationVo = Body()):
     logger.info(f"chat_prepare:{dialogue}")
     ## check conv_uid
     chat: BaseChat = get_chat_instance(dialogue)
-    if len(chat.history_message) > 0:
+    if chat.history_rounds_count > 0:
         return Result.succ(None)
     resp = await chat.prepare()
     return Result.succ(resp)
@@ -442,8 +444,23 @@ async def stream_generator(chat, incremental: bool, model_name: str):
 
     stream_id = f"chatcmpl-{str(uuid.uuid1())}"
     previous_response = ""
-    async for chunk in chat.stream_call():
-        if chunk:
+    coalesce_policy = StreamCoalescePolicy(
+        flush_interval_ms=CFG.SSE_FLUSH_INTERVAL_MS, flush_chars=CFG.SSE_FLUSH_CHARS
+    )
+    span = root_tracer.start_span(
+        "stream_generator",
+        metadata={
+            "model_name": model_name,
+            "incremental": incremental,
+            "flush_interval_ms": coalesce_policy.flush_interval_ms,
+            "flush_chars": coalesce_policy.flush_chars,
+        },
+    )
+    metrics = StreamMetrics()
+    try:
+        async for chunk in coalesce_stream(
+            _non_empty_stream(chat.stream_call()), coalesce_policy
+        ):
             msg = chunk.replace("\ufffd", "")
             if incremental:
                 incremental_output = msg[len(previous_response) :]
@@ -460,9 +477,17 @@ async def stream_generator(chat, incremental: bool, model_name: str):
                 msg = msg.replace("\n", "\\n")
                 yield f"data:{msg}\n\n"
             previous_response = msg
-            await asyncio.sleep(0.02)
-    if incremental:
-        yield "data: [DONE]\n\n"
+            metrics.on_output(len(msg))
+        if incremental:
+            yield "data: [DONE]\n\n"
+    finally:
+        span.end(metadata=metrics.to_dict())
+
+
+async def _non_empty_stream(stream):
+    async for chunk in stream:
+        if chunk:
+            yield chunk
 
 
 def message2Vo(message: dict, order, model_name) -> MessageVo:
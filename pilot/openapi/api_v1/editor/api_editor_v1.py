@@ -1,11 +1,14 @@
+import base64
+import hashlib
 import json
 import time
 from fastapi import (
     APIRouter,
     Body,
+    Request,
 )
 
-from typing import List
+from typing import List, Optional
 import logging
 
 from pilot.configs.config import Config
@@ -37,30 +40,62 @@ CHAT_FACTORY = ChatFactory()
 logger = logging.getLogger(__name__)
 
 
+def _sql_digest(sql: str) -> str:
+    return hashlib.sha256(sql.encode("utf-8")).hexdigest()[:16]
+
+
+def _encode_page_token(sql: str, offset: int) -> str:
+    token = json.dumps({"sql": _sql_digest(sql), "offset": offset})
+    return base64.urlsafe_b64encode(token.encode("utf-8")).decode("utf-8")
+
+
+def _decode_page_token(sql: str, page_token: Optional[str]) -> int:
+    """The offset of the page, the token must be of the same sql"""
+    if not page_token:
+        return 0
+    try:
+        token = json.loads(base64.urlsafe_b64decode(page_token.encode("utf-8")))
+        offset = int(token["offset"])
+    except Exception:
+        raise ValueError("Invalid page token!")
+    if token.get("sql") != _sql_digest(sql) or offset < 0:
+        raise ValueError("The page token does not belong to the sql!")
+    return offset
+
+
 @router.get("/v1/editor/db/tables", response_model=Result[DbTable])
 async def get_editor_tables(
-    db_name: str, page_index: int, page_size: int, search_str: str = ""
+    request: Request,
+    db_name: str,
+    page_index: int,
+    page_size: int,
+    search_str: str = "",
 ):
     logger.info(f"get_editor_tables:{db_name},{page_index},{page_size},{search_str}")
-    db_conn = CFG.LOCAL_DB_MANAGE.get_connect(db_name)
-    tables = db_conn.get_table_names()
-    db_node: DataNode = DataNode(title=db_name, key=db_name, type="db")
-    for table in tables:
-        table_node: DataNode = DataNode(title=table, key=table, type="table")
-        db_node.children.append(table_node)
-        fields = db_conn.get_fields(table)
-        for field in fields:
-            table_node.children.append(
-                DataNode(
-                    title=field[0],
-                    key=field[0],
-                    type=field[1],
-                    default_value=field[2],
-                    can_null=field[3],
-                    comment=field[-1],
+
+    def _get_tables(db_conn) -> DataNode:
+        tables = db_conn.get_table_names()
+        db_node: DataNode = DataNode(title=db_name, key=db_name, type="db")
+        for table in tables:
+            table_node: DataNode = DataNode(title=table, key=table, type="table")
+            db_node.children.append(table_node)
+            fields = db_conn.get_fields(table)
+            for field in fields:
+                table_node.children.append(
+                    DataNode(
+                        title=field[0],
+                        key=field[0],
+                        type=field[1],
+                        default_value=field[2],
+                        can_null=field[3],
+                        comment=field[-1],
+                    )
                 )
-            )
+        return db_node
 
+    db_node = await CFG.LOCAL_DB_MANAGE.async_run(
+        db_name, _get_tables, is_cancelled=request.is_disconnected
+    )
     return Result.succ(db_node)
 
 
@@ -111,26 +146,33 @@ async def get_editor_sql(con_uid: str, round: int):
 
 
 @router.post("/v1/editor/sql/run", response_model=Result[SqlRunData])
-async def editor_sql_run(run_param: dict = Body()):
+async def editor_sql_run(request: Request, run_param: dict = Body()):
     logger.info(f"editor_sql_run:{run_param}")
     db_name = run_param["db_name"]
     sql = run_param["sql"]
     if not db_name and not sql:
         return Result.faild("SQL run param error！")
-    conn = CFG.LOCAL_DB_MANAGE.get_connect(db_name)
+    page_size = int(run_param.get("page_size") or CFG.SQL_EDITOR_PAGE_SIZE)
 
     try:
+        offset = _decode_page_token(sql, run_param.get("page_token"))
         start_time = time.time() * 1000
-        colunms, sql_result = conn.query_ex(sql)
-        # 转换结果类型
-        sql_result = [tuple(x) for x in sql_result]
+        # Only the rows of the page are fetched
+        page = await CFG.LOCAL_DB_MANAGE.async_run(
+            db_name,
+            lambda conn: conn.query_page(sql, page_size, offset),
+            is_cancelled=request.is_disconnected,
+        )
         # 计算执行耗时
         end_time = time.time() * 1000
         sql_run_data: SqlRunData = SqlRunData(
             result_info="",
             run_cost=(end_time - start_time) / 1000,
-            colunms=colunms,
-            values=sql_result,
+            colunms=page.field_names,
+            values=page.rows,
+            next_page_token=_encode_page_token(sql, offset + len(page.rows))
+            if page.has_more
+            else None,
         )
         return Result.succ(sql_run_data)
     except Exception as e:
@@ -140,15 +182,15 @@ async def editor_sql_run(run_param: dict = Body()):
 
 
 @router.post("/v1/sql/editor/submit")
-async def sql_editor_submit(sql_edit_context: ChatSqlEditContext = Body()):
+async def sql_editor_submit(
+    request: Request, sql_edit_context: ChatSqlEditContext = Body()
+):
     logger.info(f"sql_editor_submit:{sql_edit_context.__dict__}")
 
     chat_history_fac = ChatHistory()
     history_mem = chat_history_fac.get_store_instance(sql_edit_context.con_uid)
     history_messages: List[OnceConversation] = history_mem.get_messages()
     if history_messages:
-        conn = CFG.LOCAL_DB_MANAGE.get_connect(sql_edit_context.db_name)
-
         edit_round = list(
             filter(
                 lambda x: x["chat_order"] == sql_edit_context.conv_round,
@@ -164,8 +206,13 @@ async def sql_editor_submit(sql_edit_context: ChatSqlEditContext = Body()):
                     element["data"]["content"] = json.dumps(db_resp)
                 if element["type"] == "view":
                     data_loader = DbDataLoader()
+                    data = await CFG.LOCAL_DB_MANAGE.async_run(
+                        sql_edit_context.db_name,
+                        lambda conn: conn.run(sql_edit_context.new_sql),
+                        is_cancelled=request.is_disconnected,
+                    )
                     element["data"]["content"] = data_loader.get_table_view_by_conn(
-                        conn.run(sql_edit_context.new_sql), sql_edit_context.new_speak
+                        data, sql_edit_context.new_speak
                     )
             history_mem.update(history_messages)
             return Result.succ(None)
@@ -195,7 +242,7 @@ async def get_editor_chart_list(con_uid: str):
 
 
 @router.post("/v1/editor/chart/info", response_model=Result[ChartDetail])
-async def get_editor_chart_info(param: dict = Body()):
+async def get_editor_chart_info(request: Request, param: dict = Body()):
     logger.info(f"get_editor_chart_info:{param}")
     conv_uid = param["con_uid"]
     chart_title = param["chart_title"]
@@ -221,7 +268,11 @@ async def get_editor_chart_info(param: dict = Body()):
                     filter(lambda x: x["chart_name"] == chart_title, charts)
                 )[0]
 
-                conn = CFG.LOCAL_DB_MANAGE.get_connect(db_name)
+                table_value = await CFG.LOCAL_DB_MANAGE.async_run(
+                    db_name,
+                    lambda conn: conn.run(find_chart["chart_sql"]),
+                    is_cancelled=request.is_disconnected,
+                )
                 detail: ChartDetail = ChartDetail(
                     chart_uid=find_chart["chart_uid"],
                     chart_type=find_chart["chart_type"],
@@ -230,7 +281,7 @@ async def get_editor_chart_info(param: dict = Body()):
                     db_name=db_name,
                     chart_name=find_chart["chart_name"],
                     chart_value=find_chart["values"],
-                    table_value=conn.run(find_chart["chart_sql"]),
+                    table_value=table_value,
                 )
 
                 return Result.succ(detail)
@@ -238,7 +289,7 @@ async def get_editor_chart_info(param: dict = Body()):
 
 
 @router.post("/v1/editor/chart/run", response_model=Result[ChartRunData])
-async def editor_chart_run(run_param: dict = Body()):
+async def editor_chart_run(request: Request, run_param: dict = Body()):
     logger.info(f"editor_chart_run:{run_param}")
     db_name = run_param["db_name"]
     sql = run_param["sql"]
@@ -247,8 +298,11 @@ async def editor_chart_run(run_param: dict = Body()):
         return Result.faild("SQL run param error！")
     try:
         dashboard_data_loader: DashboardDataLoader = DashboardDataLoader()
-        db_conn = CFG.LOCAL_DB_MANAGE.get_connect(db_name)
-        colunms, sql_result = db_conn.query_ex(sql)
+        colunms, sql_result = await CFG.LOCAL_DB_MANAGE.async_run(
+            db_name,
+            lambda conn: conn.query_ex(sql),
+            is_cancelled=request.is_disconnected,
+        )
         field_names, chart_values = dashboard_data_loader.get_chart_values_by_data(
             colunms, sql_result, sql
         )
@@ -275,7 +329,9 @@ async def editor_chart_run(run_param: dict = Body()):
 
 
 @router.post("/v1/chart/editor/submit", response_model=Result[bool])
-async def chart_editor_submit(chart_edit_context: ChatChartEditContext = Body()):
+async def chart_editor_submit(
+    request: Request, chart_edit_context: ChatChartEditContext = Body()
+):
     logger.info(f"sql_editor_submit:{chart_edit_context.__dict__}")
 
     chat_history_fac = ChatHistory()
@@ -283,7 +339,6 @@ async def chart_editor_submit(chart_edit_context: ChatChartEditContext = Body())
     history_messages: List[OnceConversation] = history_mem.get_messages()
     if history_messages:
         dashboard_data_loader: DashboardDataLoader = DashboardDataLoader()
-        db_conn = CFG.LOCAL_DB_MANAGE.get_connect(chart_edit_context.db_name)
 
         edit_round = max(history_messages, key=lambda x: x["chat_order"])
         if edit_round:
@@ -307,8 +362,12 @@ async def chart_editor_submit(chart_edit_context: ChatChartEditContext = Body())
                         (
                             field_names,
                             chart_values,
-                        ) = dashboard_data_loader.get_chart_values_by_conn(
-                            db_conn, chart_edit_context.new_sql
+                        ) = await CFG.LOCAL_DB_MANAGE.async_run(
+                            chart_edit_context.db_name,
+                            lambda conn: dashboard_data_loader.get_chart_values_by_conn(
+                                conn, chart_edit_context.new_sql
+                            ),
+                            is_cancelled=request.is_disconnected,
                         )
                         find_chart["chart_sql"] = chart_edit_context.new_sql
                         find_chart["values"] = [value.dict() for value in chart_values]
@@ -1,4 +1,4 @@
-from typing import List
+from typing import List, Optional
 from pydantic import BaseModel, Field, root_validator, validator, Extra
 from pilot.scene.chat_dashboard.data_preparation.report_schma import ValueItem
 
@@ -19,6 +19,8 @@ class SqlRunData(BaseModel):
     run_cost: str
     colunms: List[str]
     values: List
+    # Pass it back with the same sql to get the next page, None if it is the last page
+    next_page_token: Optional[str] = None
 
 
 class ChartRunData(BaseModel):
@@ -4,13 +4,14 @@ import warnings
 import asyncio
 import logging
 from abc import ABC, abstractmethod
-from typing import Any, List, Dict
+from typing import Any, AsyncIterator, List, Dict, Optional
 
 from pilot.configs.config import Config
 from pilot.component import ComponentType
 from pilot.prompts.prompt_new import PromptTemplate
 from pilot.scene.base_message import ModelMessage, ModelMessageRoleType
 from pilot.scene.message import OnceConversation
+from pilot.scene.prompt_budget import PromptBudget, TOKEN_COUNT_KEY, count_tokens
 from pilot.utils import get_or_create_event_loop
 from pydantic import Extra
 from pilot.memory.chat_history.chat_hisotry_factory import ChatHistory
@@ -70,7 +71,9 @@ class BaseChat(ABC):
         ### can configurable storage methods
         self.memory = chat_history_fac.get_store_instance(chat_param["chat_session_id"])
 
-        self.history_message: List[OnceConversation] = self.memory.messages()
+        # The rounds of history are loaded when used
+        self._history_message: Optional[List[Dict]] = None
+        self._history_rounds_count: Optional[int] = None
         self.current_message: OnceConversation = OnceConversation(
             self.chat_mode.value()
         )
@@ -80,6 +83,8 @@ class BaseChat(ABC):
                 self.current_message.param_type = self.chat_mode.param_types()[0]
             self.current_message.param_value = chat_param["select_param"]
         self.current_tokens_used: int = 0
+        # The history rounds in the prompt of the current message
+        self._history_rounds: Optional[List[Dict]] = None
 
     class Config:
         """Configuration for this pydantic object."""
@@ -91,6 +96,23 @@ class BaseChat(ABC):
     def chat_type(self) -> str:
         raise NotImplementedError("Not supported for this chat type.")
 
+    @property
+    def history_message(self) -> List[Dict]:
+        """All rounds of history of the conversation"""
+        if self._history_message is None:
+            self._history_message = self.memory.messages()
+        return self._history_message
+
+    @property
+    def history_rounds_count(self) -> int:
+        """The number of history rounds, without loading the rounds"""
+        if self._history_rounds_count is None:
+            if self._history_message is not None:
+                self._history_rounds_count = len(self._history_message)
+            else:
+                self._history_rounds_count = self.memory.count_rounds()
+        return self._history_rounds_count
+
     @abstractmethod
     def generate_input_values(self):
         pass
@@ -98,6 +120,11 @@ class BaseChat(ABC):
     def do_action(self, prompt_response):
         return prompt_response
 
+    async def async_do_action(self, prompt_response):
+        """Run the action of model response without blocking the event loop, the
+        chats with blocking actions override it"""
+        return self.do_action(prompt_response)
+
     def get_llm_speak(self, prompt_define_response):
         if hasattr(prompt_define_response, "thoughts"):
             if isinstance(prompt_define_response.thoughts, dict):
@@ -119,7 +146,7 @@ class BaseChat(ABC):
     def __call_base(self):
         input_values = self.generate_input_values()
         ### Chat sequence advance
-        self.current_message.chat_order = len(self.history_message) + 1
+        self.current_message.chat_order = self.history_rounds_count + 1
         self.current_message.add_user_message(self.current_user_input)
         self.current_message.start_date = datetime.datetime.now().strftime(
             "%Y-%m-%d %H:%M:%S"
@@ -145,11 +172,20 @@ class BaseChat(ABC):
             "stop": self.prompt_template.sep,
             "echo": self.llm_echo,
         }
+        if self.chat_mode.value() in CFG.LLM_CACHE_SCENES:
+            # Answer the same request of this scene from the LLM response cache
+            payload["cache"] = True
         return payload
 
     def stream_plugin_call(self, text):
         return text
 
+    async def wait_plugin_calls(self) -> AsyncIterator[None]:
+        """Wait the plugin calls still running after the model output is finished,
+        yields every time a call is finished"""
+        return
+        yield
+
     async def check_iterator_end(iterator):
         try:
             await asyncio.anext(iterator)
@@ -178,6 +214,11 @@ class BaseChat(ABC):
                 view_msg = self.stream_plugin_call(msg)
                 view_msg = view_msg.replace("\n", "\\n")
                 yield view_msg
+            async for _ in self.wait_plugin_calls():
+                # Stream the result of every plugin call when it is finished
+                view_msg = self.stream_plugin_call(msg)
+                view_msg = view_msg.replace("\n", "\\n")
+                yield view_msg
             self.current_message.add_ai_message(msg)
             self.current_message.add_view_message(view_msg)
         except Exception as e:
@@ -187,6 +228,7 @@ class BaseChat(ABC):
                 f"""<span style=\"color:red\">ERROR!</span>{str(e)}\n  {ai_response_text} """
             )
             ### store current conversation
+        self._cache_message_tokens()
         self.memory.append(self.current_message)
 
     async def nostream_call(self):
@@ -216,7 +258,7 @@ class BaseChat(ABC):
                 )
             )
             ###  run
-            result = self.do_action(prompt_define_response)
+            result = await self.async_do_action(prompt_define_response)
 
             ### llm speaker
             speak_to_user = self.get_llm_speak(prompt_define_response)
@@ -233,6 +275,7 @@ class BaseChat(ABC):
                 f"""<span style=\"color:red\">ERROR!</span>{str(e)}\n  {ai_response_text} """
             )
         ### store dialogue
+        self._cache_message_tokens()
         self.memory.append(self.current_message)
         return self.current_ai_response()
 
@@ -366,72 +409,99 @@ class BaseChat(ABC):
     def __load_histroy_messages(self, str_message: bool = True):
         history_text = ""
         history_messages = []
-        if self.prompt_template.need_historical_messages:
-            if self.history_message:
-                logger.info(
-                    f"There are already {len(self.history_message)} rounds of conversations! Will use {self.chat_retention_rounds} rounds of content as history!"
-                )
-            if len(self.history_message) > self.chat_retention_rounds:
-                for first_message in self.history_message[0]["messages"]:
-                    if not first_message["type"] in [
-                        ModelMessageRoleType.VIEW,
-                        ModelMessageRoleType.SYSTEM,
-                    ]:
-                        message_type = first_message["type"]
-                        message_content = first_message["data"]["content"]
-                        history_text += (
-                            message_type
-                            + ":"
-                            + message_content
-                            + self.prompt_template.sep
-                        )
-                        history_messages.append(
-                            ModelMessage(role=message_type, content=message_content)
-                        )
-                if self.chat_retention_rounds > 1:
-                    index = self.chat_retention_rounds - 1
-                    for round_conv in self.history_message[-index:]:
-                        for round_message in round_conv["messages"]:
-                            if not round_message["type"] in [
-                                ModelMessageRoleType.VIEW,
-                                ModelMessageRoleType.SYSTEM,
-                            ]:
-                                message_type = round_message["type"]
-                                message_content = round_message["data"]["content"]
-                                history_text += (
-                                    message_type
-                                    + ":"
-                                    + message_content
-                                    + self.prompt_template.sep
-                                )
-                                history_messages.append(
-                                    ModelMessage(
-                                        role=message_type, content=message_content
-                                    )
-                                )
+        for round_conv in self._history_rounds_in_budget():
+            for round_message in round_conv["messages"]:
+                ### histroy message not have promot and view info
+                if self._is_history_prompt_message(round_message):
+                    message_type = round_message["type"]
+                    message_content = round_message["data"]["content"]
+                    history_text += (
+                        message_type + ":" + message_content + self.prompt_template.sep
+                    )
+                    history_messages.append(
+                        ModelMessage(role=message_type, content=message_content)
+                    )
+        return history_text if str_message else history_messages
 
-            else:
-                ### user all history
-                for conversation in self.history_message:
-                    for message in conversation["messages"]:
-                        ### histroy message not have promot and view info
-                        if not message["type"] in [
-                            ModelMessageRoleType.VIEW,
-                            ModelMessageRoleType.SYSTEM,
-                        ]:
-                            message_type = message["type"]
-                            message_content = message["data"]["content"]
-                            history_text += (
-                                message_type
-                                + ":"
-                                + message_content
-                                + self.prompt_template.sep
-                            )
-                            history_messages.append(
-                                ModelMessage(role=message_type, content=message_content)
-                            )
+    @staticmethod
+    def _is_history_prompt_message(message: Dict) -> bool:
+        return message["type"] not in [
+            ModelMessageRoleType.VIEW,
+            ModelMessageRoleType.SYSTEM,
+        ]
+
+    def _retained_history_rounds(self) -> List[Dict]:
+        if not self.prompt_template.need_historical_messages:
+            return []
+        history_rounds_count = self.history_rounds_count
+        if history_rounds_count:
+            logger.info(
+                f"There are already {history_rounds_count} rounds of conversations! Will use {self.chat_retention_rounds} rounds of content as history!"
+            )
+        if history_rounds_count > self.chat_retention_rounds:
+            # The first round and the last rounds, only they are loaded
+            tail = max(self.chat_retention_rounds - 1, 0)
+            if self._history_message is not None:
+                rounds = self._history_message
+                return rounds[:1] + (rounds[-tail:] if tail else [])
+            return self.memory.select_rounds(head=1, tail=tail)
+        ### user all history
+        return list(self.history_message)
+
+    def prompt_budget(self) -> PromptBudget:
+        """The budget of the prompt after the required parts: the scene definition,
+        the system prompt and the user input"""
+        budget = PromptBudget(
+            CFG.MAX_POSITION_EMBEDDINGS, int(self.prompt_template.max_new_tokens)
+        )
+        required = [self.prompt_template.template_define]
+        system_convs = self.current_message.get_system_conv()
+        if system_convs:
+            required += [conv.content for conv in system_convs]
+        else:
+            # The system prompt is not formatted yet, count the template
+            required.append(self.prompt_template.template)
+        user_conv = self.current_message.get_user_conv()
+        required.append(user_conv.content if user_conv else self.current_user_input)
+        budget.consume(sum(count_tokens(text) for text in required))
+        return budget
+
+    def _history_rounds_in_budget(self) -> List[Dict]:
+        """The retained history rounds which fit into the context window, computed
+        once for the current message"""
+        if self._history_rounds is not None:
+            return self._history_rounds
+        rounds = self._retained_history_rounds()
+        if not rounds:
+            self._history_rounds = []
+            return self._history_rounds
+        budget = self.prompt_budget()
+        if self.prompt_template.example_selector:
+            budget.consume(
+                sum(
+                    count_tokens(message["data"]["content"])
+                    for round_conv in self.prompt_template.example_selector.examples()
+                    for message in round_conv["messages"]
+                    if self._is_history_prompt_message(message)
+                )
+            )
+        self._history_rounds = budget.fit_rounds(
+            rounds, self._is_history_prompt_message
+        )
+        if len(self._history_rounds) < len(rounds):
+            logger.info(
+                f"Only {len(self._history_rounds)} of {len(rounds)} rounds of history fit into the context window, tokens used: {budget.used}, total: {budget.total}"
+            )
+        return self._history_rounds
 
-        return history_text if str_message else history_messages
+    def _cache_message_tokens(self) -> None:
+        """Save the tokens of the current messages with them, so the history is not
+        counted again by the next chats"""
+        for message in self.current_message.messages:
+            if self._is_history_prompt_message({"type": message.type}):
+                message.additional_kwargs[TOKEN_COUNT_KEY] = count_tokens(
+                    message.content
+                )
 
     def current_ai_response(self) -> str:
         for message in self.current_message.messages:
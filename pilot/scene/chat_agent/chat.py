@@ -1,4 +1,4 @@
-from typing import List, Dict
+from typing import AsyncIterator, List, Dict
 import logging
 
 from pilot.scene.base_chat import BaseChat
@@ -11,6 +11,7 @@ from pilot.common.string_utils import extract_content
 from .prompt import prompt
 from pilot.component import ComponentType
 from pilot.base_modules.agent.controller import ModuleAgent
+from pilot.utils.executor_utils import ExecutorFactory
 
 CFG = Config()
 
@@ -49,7 +50,14 @@ class ChatAgent(BaseChat):
             self.plugins_prompt_generator, self.select_plugins
         )
 
-        self.api_call = ApiCall(plugin_generator=self.plugins_prompt_generator)
+        self.api_call = ApiCall(
+            plugin_generator=self.plugins_prompt_generator,
+            executor=CFG.SYSTEM_APP.get_component(
+                ComponentType.EXECUTOR_DEFAULT, ExecutorFactory
+            ).create(),
+            max_concurrency=CFG.PLUGIN_CALL_CONCURRENCY,
+            timeout=CFG.PLUGIN_CALL_TIMEOUT,
+        )
 
     def generate_input_values(self):
         input_values = {
@@ -65,5 +73,8 @@ class ChatAgent(BaseChat):
         text = text.replace("\n", " ")
         return self.api_call.run(text)
 
+    def wait_plugin_calls(self) -> AsyncIterator[None]:
+        return self.api_call.wait_running()
+
     def __list_to_prompt_str(self, list: List) -> str:
         return "\n".join(f"{i + 1 + 1}. {item}" for i, item in enumerate(list))
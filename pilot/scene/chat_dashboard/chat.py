@@ -1,4 +1,6 @@
+import asyncio
 import json
+import logging
 import os
 import uuid
 from typing import List, Dict
@@ -15,6 +17,8 @@ from pilot.scene.chat_dashboard.data_loader import DashboardDataLoader
 
 CFG = Config()
 
+logger = logging.getLogger(__name__)
+
 
 class ChatDashboard(BaseChat):
     chat_scene: str = ChatScene.ChatDashboard.value()
@@ -78,28 +82,65 @@ class ChatDashboard(BaseChat):
         return input_values
 
     def do_action(self, prompt_response):
-        ### TODO 记录整体信息，处理成功的，和未成功的分开记录处理
-        chart_datas: List[ChartData] = []
         dashboard_data_loader = DashboardDataLoader()
+        chart_datas: List[ChartData] = []
         for chart_item in prompt_response:
             try:
-                field_names, values = dashboard_data_loader.get_chart_values_by_conn(
-                    self.database, chart_item.sql
-                )
                 chart_datas.append(
-                    ChartData(
-                        chart_uid=str(uuid.uuid1()),
-                        chart_name=chart_item.title,
-                        chart_type=chart_item.showcase,
-                        chart_desc=chart_item.thoughts,
-                        chart_sql=chart_item.sql,
-                        column_name=field_names,
-                        values=values,
+                    self._chart_data(
+                        chart_item,
+                        *dashboard_data_loader.get_chart_values_by_conn(
+                            self.database, chart_item.sql
+                        ),
                     )
                 )
             except Exception as e:
-                # TODO 修复流程
-                print(str(e))
+                logger.warning(f"Chart {chart_item.title} failed: {str(e)}")
+        return self._report_data(chart_datas)
+
+    async def async_do_action(self, prompt_response):
+        """Query the charts at the same time on the pooled connections, the charts
+        which fail or time out are left out of the report"""
+        dashboard_data_loader = DashboardDataLoader()
+        semaphore = asyncio.Semaphore(max(CFG.DASHBOARD_CHART_CONCURRENCY, 1))
+
+        async def _query_chart(chart_item):
+            async with semaphore:
+                return await CFG.LOCAL_DB_MANAGE.async_run(
+                    self.db_name,
+                    lambda conn: dashboard_data_loader.get_chart_values_by_conn(
+                        conn, chart_item.sql
+                    ),
+                    timeout=CFG.DASHBOARD_CHART_TIMEOUT,
+                )
+
+        results = await asyncio.gather(
+            *[_query_chart(chart_item) for chart_item in prompt_response],
+            return_exceptions=True,
+        )
+        chart_datas: List[ChartData] = []
+        for chart_item, result in zip(prompt_response, results):
+            if isinstance(result, BaseException):
+                logger.warning(f"Chart {chart_item.title} failed: {str(result)}")
+                continue
+            try:
+                chart_datas.append(self._chart_data(chart_item, *result))
+            except Exception as e:
+                logger.warning(f"Chart {chart_item.title} failed: {str(e)}")
+        return self._report_data(chart_datas)
+
+    def _chart_data(self, chart_item, field_names, values) -> ChartData:
+        return ChartData(
+            chart_uid=str(uuid.uuid1()),
+            chart_name=chart_item.title,
+            chart_type=chart_item.showcase,
+            chart_desc=chart_item.thoughts,
+            chart_sql=chart_item.sql,
+            column_name=field_names,
+            values=values,
+        )
+
+    def _report_data(self, chart_datas: List[ChartData]) -> ReportData:
         return ReportData(
             conv_uid=self.chat_session_id,
             template_name=self.report_name,
@@ -9,6 +9,18 @@ CFG = Config()
 logger = logging.getLogger(__name__)
 
 
+_NUMERIC_TYPES = (int, float, Decimal)
+
+
+def _is_numeric_column(column) -> bool:
+    """Check the distinct types of the column instead of every value"""
+    if not column:
+        return False
+    return all(
+        issubclass(value_type, _NUMERIC_TYPES) for value_type in set(map(type, column))
+    )
+
+
 class DashboardDataLoader:
     def get_sql_value(self, db_conn, chart_sql: str):
         return db_conn.query_ex(chart_sql)
@@ -18,38 +30,23 @@ class DashboardDataLoader:
         return self.get_chart_values_by_data(field_names, datas, chart_sql)
 
     def get_chart_values_by_data(self, field_names, datas, chart_sql: str):
+        """The values of the numeric columns, named by the first column"""
         logger.info(f"get_chart_values_by_conn:{chart_sql}")
         try:
             values: List[ValueItem] = []
-            data_map = {}
-            field_map = {}
-            index = 0
-            for field_name in field_names:
-                data_map.update({f"{field_name}": [row[index] for row in datas]})
-                index += 1
-                if not data_map[field_name]:
-                    field_map.update({f"{field_name}": False})
-                else:
-                    field_map.update(
-                        {
-                            f"{field_name}": all(
-                                isinstance(item, (int, float, Decimal))
-                                for item in data_map[field_name]
-                            )
-                        }
-                    )
-
-            for field_name in field_names[1:]:
-                if not field_map[field_name]:
+            # Column by column, the rows are transposed once
+            columns = list(zip(*datas)) if datas else [() for _ in field_names]
+            if len(columns) != len(field_names):
+                raise ValueError("The columns of data do not match the field names")
+            names = columns[0] if columns else ()
+            for field_name, column in zip(field_names[1:], columns[1:]):
+                if not _is_numeric_column(column):
                     logger.info("More than 2 non-numeric column:" + field_name)
-                else:
-                    for data in datas:
-                        value_item = ValueItem(
-                            name=data[0],
-                            type=field_name,
-                            value=data[field_names.index(field_name)],
-                        )
-                        values.append(value_item)
+                    continue
+                values.extend(
+                    ValueItem(name=name, type=field_name, value=value)
+                    for name, value in zip(names, column)
+                )
             return field_names, values
         except Exception as e:
             logger.debug("Prepare Chart Data Faild!" + str(e))
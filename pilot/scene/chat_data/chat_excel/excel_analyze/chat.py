@@ -2,7 +2,7 @@ import json
 import os
 import asyncio
 
-from typing import List, Any, Dict
+from typing import AsyncIterator, List, Any, Dict
 from pilot.scene.base_chat import BaseChat, logger
 from pilot.scene.base import ChatScene
 from pilot.common.sql_database import Database
@@ -14,6 +14,8 @@ from pilot.scene.chat_data.chat_excel.excel_learning.chat import ExcelLearning
 from pilot.common.path_utils import has_path
 from pilot.configs.model_config import LLM_MODEL_CONFIG, KNOWLEDGE_UPLOAD_ROOT_PATH
 from pilot.base_modules.agent.common.schema import Status
+from pilot.component import ComponentType
+from pilot.utils.executor_utils import ExecutorFactory
 
 CFG = Config()
 
@@ -46,7 +48,14 @@ class ChatExcel(BaseChat):
                     KNOWLEDGE_UPLOAD_ROOT_PATH, chat_mode.value(), self.select_param
                 )
             )
-        self.api_call = ApiCall(display_registry=CFG.command_disply)
+        self.api_call = ApiCall(
+            display_registry=CFG.command_disply,
+            executor=CFG.SYSTEM_APP.get_component(
+                ComponentType.EXECUTOR_DEFAULT, ExecutorFactory
+            ).create(),
+            max_concurrency=CFG.PLUGIN_CALL_CONCURRENCY,
+            timeout=CFG.PLUGIN_CALL_TIMEOUT,
+        )
         super().__init__(chat_param=chat_param)
 
     def _generate_numbered_list(self) -> str:
@@ -72,7 +81,7 @@ class ChatExcel(BaseChat):
 
     async def prepare(self):
         logger.info(f"{self.chat_mode} prepare start!")
-        if len(self.history_message) > 0:
+        if self.history_rounds_count > 0:
             return None
         chat_param = {
             "chat_session_id": self.chat_session_id,
@@ -89,3 +98,6 @@ class ChatExcel(BaseChat):
     def stream_plugin_call(self, text):
         text = text.replace("\n", " ")
         return self.api_call.run_display_sql(text, self.excel_reader.get_df_by_sql_ex)
+
+    def wait_plugin_calls(self) -> AsyncIterator[None]:
+        return self.api_call.wait_running()
@@ -1,4 +1,5 @@
 import logging
+import threading
 
 import duckdb
 import os
@@ -291,6 +292,9 @@ class ExcelReader:
         self.table_name = "excel_data"
         # write data in duckdb
         self.db.register(self.table_name, self.df)
+        # The connection is shared by the plugin calls running in parallel, the
+        # registered table is only visible to this connection (not its cursors)
+        self._db_lock = threading.Lock()
 
     def run(self, sql):
         try:
@@ -298,11 +302,12 @@ class ExcelReader:
                 sql = sql.replace(f'"{self.table_name}"', self.table_name)
             sql = add_quotes_to_chinese_columns(sql)
             print(f"excute sql:{sql}")
-            results = self.db.execute(sql)
-            colunms = []
-            for descrip in results.description:
-                colunms.append(descrip[0])
-            return colunms, results.fetchall()
+            with self._db_lock:
+                results = self.db.execute(sql)
+                colunms = []
+                for descrip in results.description:
+                    colunms.append(descrip[0])
+                return colunms, results.fetchall()
         except Exception as e:
             logging.error("excel sql run error!", e)
             raise ValueError(f"Data Query Exception!\\nSQL[{sql}].\\nError:{str(e)}")
@@ -72,3 +72,9 @@ class ChatWithDbAutoExecute(BaseChat):
     def do_action(self, prompt_response):
         print(f"do_action:{prompt_response}")
         return self.database.run(prompt_response.sql)
+
+    async def async_do_action(self, prompt_response):
+        print(f"do_action:{prompt_response}")
+        return await CFG.LOCAL_DB_MANAGE.async_run(
+            self.db_name, lambda conn: conn.run(prompt_response.sql)
+        )
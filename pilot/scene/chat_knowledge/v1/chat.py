@@ -32,6 +32,7 @@ class ChatKnowledge(BaseChat):
         """
         from pilot.embedding_engine.embedding_engine import EmbeddingEngine
         from pilot.embedding_engine.embedding_factory import EmbeddingFactory
+        from pilot.embedding_engine.retriever import KnowledgeRetriever
 
         self.knowledge_space = chat_param["select_param"]
         chat_param["chat_mode"] = ChatScene.ChatKnowledge
@@ -44,7 +45,14 @@ class ChatKnowledge(BaseChat):
             if self.space_context is None
             else int(self.space_context["embedding"]["topk"])
         )
-        # self.recall_score = CFG.KNOWLEDGE_SEARCH_TOP_SIZE if self.space_context is None else self.space_context["embedding"]["recall_score"]
+        recall_score = (
+            float(self.space_context["embedding"].get("recall_score") or 0.0)
+            if self.space_context
+            else 0.0
+        )
+        self.score_threshold = (
+            recall_score if recall_score > 0 else CFG.KNOWLEDGE_SEARCH_SCORE_THRESHOLD
+        )
         self.max_token = (
             CFG.KNOWLEDGE_SEARCH_MAX_TOKEN
             if self.space_context is None
@@ -62,6 +70,13 @@ class ChatKnowledge(BaseChat):
             vector_store_config=vector_store_config,
             embedding_factory=embedding_factory,
         )
+        self.knowledge_retriever = KnowledgeRetriever(
+            vector_store_config,
+            top_k=self.top_k,
+            score_threshold=self.score_threshold,
+            hybrid=CFG.KNOWLEDGE_SEARCH_HYBRID,
+            rerank_model=CFG.KNOWLEDGE_RERANK_MODEL,
+        )
         self.prompt_template.template_is_strict = False
 
     async def stream_call(self):
@@ -89,15 +104,18 @@ class ChatKnowledge(BaseChat):
         if self.space_context:
             self.prompt_template.template_define = self.space_context["prompt"]["scene"]
             self.prompt_template.template = self.space_context["prompt"]["template"]
-        docs = self.knowledge_embedding_client.similar_search(
-            self.current_user_input, self.top_k
-        )
-        if not docs:
+        docs = self.knowledge_retriever.retrieve(self.current_user_input)
+        # No chunk may be relevant enough in an existing space
+        if not docs and not self.knowledge_embedding_client.vector_exist():
             raise ValueError(
                 "you have no knowledge space, please add your knowledge space"
             )
+        # The most similar chunks which fit into the context window
         context = [d.page_content for d in docs]
-        context = context[: self.max_token]
+        context = (
+            self.prompt_budget().fit_texts(context, max_tokens=self.max_token)
+            or context[:1]
+        )
         relations = list(
             set([os.path.basename(str(d.metadata.get("source", ""))) for d in docs])
         )
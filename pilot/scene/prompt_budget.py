@@ -0,0 +1,152 @@
+"""Token budget of the prompt sent to LLM.
+
+The prompt of a chat is assembled by priority into the context window of the model,
+the tokens of the output (`max_new_tokens`) are reserved first:
+
+    system prompt and user input -> retrieved knowledge -> examples -> history
+
+The history is added round by round from the newest one, the rounds which do not fit
+are dropped as a whole instead of being cut in the middle by the model worker.
+
+Tokens are counted with tiktoken if it is installed, otherwise they are estimated from
+the text. The count of a stored message is cached in its `additional_kwargs`, so the
+history is only counted once.
+"""
+from __future__ import annotations
+
+import logging
+import math
+import re
+from typing import Callable, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+TOKEN_COUNT_KEY = "token_count"
+
+# CJK characters are one token or more in most tokenizers
+_CJK_PATTERN = re.compile(
+    r"[\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uac00-\ud7af\uf900-\ufaff]"
+)
+
+_encoder = None
+_encoder_loaded = False
+
+
+def _get_encoder() -> Optional[Callable[[str], List[int]]]:
+    global _encoder, _encoder_loaded
+    if not _encoder_loaded:
+        _encoder_loaded = True
+        try:
+            import tiktoken
+
+            _encoder = tiktoken.get_encoding("cl100k_base").encode
+        except Exception as e:
+            logger.info(f"tiktoken is not available, estimate tokens of text: {e}")
+    return _encoder
+
+
+def estimate_tokens(text: str) -> int:
+    """Estimate the tokens of text, about 4 characters per token for latin text"""
+    if not text:
+        return 0
+    num_cjk = len(_CJK_PATTERN.findall(text))
+    return num_cjk + math.ceil((len(text) - num_cjk) / 4)
+
+
+def count_tokens(text: str) -> int:
+    if not text:
+        return 0
+    encode = _get_encoder()
+    if encode:
+        try:
+            return len(encode(text, disallowed_special=()))
+        except Exception:
+            pass
+    return estimate_tokens(text)
+
+
+def message_token_count(message: Dict) -> int:
+    """The tokens of a stored message dict, the count is cached in the message"""
+    data = message.setdefault("data", {})
+    additional_kwargs = data.get("additional_kwargs")
+    if not isinstance(additional_kwargs, dict):
+        additional_kwargs = data["additional_kwargs"] = {}
+    tokens = additional_kwargs.get(TOKEN_COUNT_KEY)
+    if tokens is None:
+        tokens = count_tokens(data.get("content"))
+        additional_kwargs[TOKEN_COUNT_KEY] = tokens
+    return tokens
+
+
+class PromptBudget:
+    """The tokens left in the context window for the prompt.
+
+    Args:
+        context_len (int): Max context length of the model.
+        max_new_tokens (int): Tokens reserved for the output.
+    """
+
+    def __init__(self, context_len: int, max_new_tokens: int = 0) -> None:
+        self.context_len = context_len
+        self.max_new_tokens = max_new_tokens
+        self.used = 0
+
+    @property
+    def total(self) -> int:
+        return max(self.context_len - self.max_new_tokens, 0)
+
+    @property
+    def remaining(self) -> int:
+        return max(self.total - self.used, 0)
+
+    def consume(self, tokens: int) -> None:
+        """Use the tokens of a required part, which is added even over the budget"""
+        self.used += tokens
+
+    def try_consume(self, tokens: int) -> bool:
+        """Use the tokens of an optional part if it fits into the remaining budget"""
+        if tokens > self.remaining:
+            return False
+        self.used += tokens
+        return True
+
+    def fit_texts(
+        self, texts: List[str], max_tokens: Optional[int] = None
+    ) -> List[str]:
+        """The texts in order which fit into the budget, stops at the first text
+        which does not fit"""
+        limit = (
+            self.remaining if max_tokens is None else min(max_tokens, self.remaining)
+        )
+        selected = []
+        used = 0
+        for text in texts:
+            tokens = count_tokens(text)
+            if used + tokens > limit:
+                break
+            selected.append(text)
+            used += tokens
+        self.used += used
+        return selected
+
+    def fit_rounds(
+        self, rounds: List[Dict], is_prompt_message: Callable[[Dict], bool]
+    ) -> List[Dict]:
+        """The newest history rounds which fit into the budget, in the original order.
+
+        Args:
+            rounds: The stored conversations, oldest first.
+            is_prompt_message: Whether a message of the round is sent to model.
+        """
+        selected = []
+        for round_conv in reversed(rounds):
+            tokens = sum(
+                message_token_count(message)
+                for message in round_conv.get("messages", [])
+                if is_prompt_message(message)
+            )
+            if not self.try_consume(tokens):
+                break
+            selected.append(round_conv)
+        selected.reverse()
+        return selected
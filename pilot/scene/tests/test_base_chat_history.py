@@ -0,0 +1,47 @@
+from types import SimpleNamespace
+
+from pilot.memory.chat_history.store_type.mem_history import MemHistoryMemory
+from pilot.scene.chat_normal.chat import ChatNormal
+
+
+class _Memory(MemHistoryMemory):
+    def __init__(self, chat_session_id: str):
+        super().__init__(chat_session_id)
+        self.loaded = []
+
+    def count_rounds(self) -> int:
+        return len(MemHistoryMemory.messages(self))
+
+    def messages(self):
+        self.loaded.append("all")
+        return super().messages()
+
+    def select_rounds(self, head=0, tail=None):
+        self.loaded.append((head, tail))
+        return super().select_rounds(head, tail)
+
+
+def _chat(memory, retention_rounds: int) -> ChatNormal:
+    chat = ChatNormal.__new__(ChatNormal)
+    chat.memory = memory
+    chat._history_message = None
+    chat._history_rounds_count = None
+    chat.chat_retention_rounds = retention_rounds
+    chat.prompt_template = SimpleNamespace(need_historical_messages=True)
+    return chat
+
+
+def test_only_retained_rounds_loaded():
+    rounds = [{"chat_order": i + 1, "messages": []} for i in range(10)]
+    MemHistoryMemory("conv_retained").update(rounds)
+    chat = _chat(_Memory("conv_retained"), 3)
+    assert chat.history_rounds_count == 10
+    assert chat._retained_history_rounds() == [rounds[0], rounds[8], rounds[9]]
+    assert chat.memory.loaded[0] == (1, 2)
+
+    chat = _chat(_Memory("conv_retained"), 1)
+    assert chat._retained_history_rounds() == [rounds[0]]
+
+    chat = _chat(_Memory("conv_retained"), 20)
+    assert chat._retained_history_rounds() == rounds
+    assert chat.memory.loaded == ["all"]
@@ -0,0 +1,93 @@
+import asyncio
+import time
+from decimal import Decimal
+
+import pytest
+
+from pilot.scene.chat_dashboard.chat import CFG, ChatDashboard
+from pilot.scene.chat_dashboard.data_loader import DashboardDataLoader
+from pilot.scene.chat_dashboard.out_parser import ChartItem
+
+
+class _Connect:
+    def __init__(self, results):
+        self.results = results
+
+    def query_ex(self, sql):
+        result = self.results[sql]
+        if isinstance(result, Exception):
+            raise result
+        time.sleep(0.2)
+        return result
+
+
+class _ConnectManager:
+    def __init__(self, results):
+        self.results = results
+        self.timeouts = []
+
+    async def async_run(self, db_name, func, timeout=None, is_cancelled=None):
+        self.timeouts.append(timeout)
+        return await asyncio.get_running_loop().run_in_executor(
+            None, func, _Connect(self.results)
+        )
+
+
+def test_get_chart_values_by_data():
+    field_names = ["city", "sales", "comment", "profit"]
+    datas = [
+        ("a", 1, "x", Decimal("1.5")),
+        ("b", 2.5, "y", 3),
+    ]
+    names, values = DashboardDataLoader().get_chart_values_by_data(
+        field_names, datas, "sql"
+    )
+    assert names == field_names
+    assert [value.dict() for value in values] == [
+        {"name": "a", "type": "sales", "value": 1.0},
+        {"name": "b", "type": "sales", "value": 2.5},
+        {"name": "a", "type": "profit", "value": 1.5},
+        {"name": "b", "type": "profit", "value": 3.0},
+    ]
+
+
+def test_get_chart_values_by_data_not_numeric():
+    loader = DashboardDataLoader()
+    # None is not numeric
+    _, values = loader.get_chart_values_by_data(
+        ["city", "sales"], [("a", 1), ("b", None)], "sql"
+    )
+    assert values == []
+    _, values = loader.get_chart_values_by_data(["city", "sales"], [], "sql")
+    assert values == []
+    with pytest.raises(ValueError):
+        loader.get_chart_values_by_data(["city", "sales"], [("a", 1, 2)], "sql")
+
+
+@pytest.mark.asyncio
+async def test_charts_queried_in_parallel(monkeypatch):
+    results = {
+        f"sql{i}": (["city", "sales"], [("a", i), ("b", i + 1)]) for i in range(4)
+    }
+    results["bad_sql"] = ValueError("no such table")
+    manager = _ConnectManager(results)
+    monkeypatch.setattr(CFG, "LOCAL_DB_MANAGE", manager, raising=False)
+    monkeypatch.setattr(CFG, "DASHBOARD_CHART_CONCURRENCY", 4)
+    chat = ChatDashboard.__new__(ChatDashboard)
+    chat.db_name = "test_db"
+    chat.chat_session_id = "conv_uid"
+    chat.report_name = "report"
+    charts = [ChartItem(f"sql{i}", f"chart{i}", "", "BarChart") for i in range(2)]
+    charts.append(ChartItem("bad_sql", "bad chart", "", "BarChart"))
+    charts += [ChartItem(f"sql{i}", f"chart{i}", "", "BarChart") for i in range(2, 4)]
+
+    start = time.time()
+    report = await chat.async_do_action(charts)
+    # 4 charts of 0.2s in parallel
+    assert time.time() - start < 0.6
+    # The failed chart is left out, the others keep the order
+    assert [chart.chart_name for chart in report.charts] == [
+        f"chart{i}" for i in range(4)
+    ]
+    assert report.charts[3].values[1].value == 4
+    assert manager.timeouts == [CFG.DASHBOARD_CHART_TIMEOUT] * 5
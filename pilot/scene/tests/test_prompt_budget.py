@@ -0,0 +1,71 @@
+from pilot.scene.prompt_budget import (
+    TOKEN_COUNT_KEY,
+    PromptBudget,
+    count_tokens,
+    estimate_tokens,
+    message_token_count,
+)
+
+
+def _round(*contents, message_type="human"):
+    return {
+        "messages": [
+            {"type": message_type, "data": {"content": content}} for content in contents
+        ]
+        + [{"type": "view", "data": {"content": "view " * 1000}}]
+    }
+
+
+def _is_prompt_message(message):
+    return message["type"] != "view"
+
+
+def test_estimate_tokens():
+    assert estimate_tokens("") == 0
+    assert estimate_tokens("abcdefgh") == 2
+    # One token per CJK character
+    assert estimate_tokens("你好") == 2
+    assert count_tokens("hello world") > 0
+
+
+def test_message_token_count_cached():
+    message = {"type": "human", "data": {"content": "hello world"}}
+    tokens = message_token_count(message)
+    assert message["data"]["additional_kwargs"][TOKEN_COUNT_KEY] == tokens
+    message["data"]["additional_kwargs"][TOKEN_COUNT_KEY] = 100
+    assert message_token_count(message) == 100
+
+
+def test_budget():
+    budget = PromptBudget(context_len=100, max_new_tokens=30)
+    assert budget.total == 70
+    budget.consume(50)
+    assert budget.remaining == 20
+    assert not budget.try_consume(21)
+    assert budget.try_consume(20)
+    assert budget.remaining == 0
+    # Required parts are added over the budget
+    budget.consume(10)
+    assert budget.remaining == 0
+
+
+def test_fit_rounds_newest_first():
+    rounds = [_round(f"round {i}") for i in range(5)]
+    for round_conv in rounds:
+        for message in round_conv["messages"]:
+            if message["type"] != "view":
+                message["data"]["additional_kwargs"] = {TOKEN_COUNT_KEY: 10}
+    budget = PromptBudget(context_len=100, max_new_tokens=50)
+    budget.consume(15)
+    selected = budget.fit_rounds(rounds, _is_prompt_message)
+    # The view messages are not counted
+    assert selected == rounds[2:]
+    assert budget.used == 45
+
+
+def test_fit_texts():
+    budget = PromptBudget(context_len=1000)
+    texts = ["a" * 40, "b" * 40, "c" * 40]
+    tokens = count_tokens(texts[0])
+    assert budget.fit_texts(texts, max_tokens=tokens * 2) == texts[:2]
+    assert budget.used == tokens * 2
@@ -29,6 +29,24 @@ def async_db_summary(system_app: SystemApp):
     thread.start()
 
 
+def async_migrate_chat_history():
+    """Move the conversations saved in the old format (a json list of all rounds)
+    to a row for every message in background, a conversation used before that is
+    migrated when it is used"""
+    from pilot.memory.chat_history.chat_hisotry_factory import ChatHistory
+
+    def _migrate():
+        try:
+            count = ChatHistory().get_store_cls().migrate()
+            if count:
+                print(f"Migrated {count} conversations of chat history")
+        except Exception as e:
+            print(f"Migrate chat history error: {str(e)}")
+
+    thread = threading.Thread(target=_migrate, daemon=True)
+    thread.start()
+
+
 def server_init(args, system_app: SystemApp):
     from pilot.base_modules.agent.commands.command_mange import CommandRegistry
 
@@ -39,6 +57,7 @@ def server_init(args, system_app: SystemApp):
     cfg.SYSTEM_APP = system_app
 
     ddl_init_and_upgrade()
+    async_migrate_chat_history()
 
     # load_native_plugins(cfg)
     signal.signal(signal.SIGINT, signal_handler)
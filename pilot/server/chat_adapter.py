@@ -24,6 +24,14 @@ class BaseChatAdpter:
 
         return generate_stream
 
+    def support_async(self) -> bool:
+        """Whether the model has an asynchronous generate stream func"""
+        return False
+
+    def get_async_generate_stream_func(self, model_path: str):
+        """Return the asynchronous generate stream handler func"""
+        raise NotImplementedError
+
     def get_conv_template(self, model_path: str) -> Conversation:
         return None
 
@@ -186,6 +194,14 @@ class ProxyllmChatAdapter(BaseChatAdpter):
 
         return proxyllm_generate_stream
 
+    def support_async(self) -> bool:
+        return True
+
+    def get_async_generate_stream_func(self, model_path: str):
+        from pilot.model.llm_out.proxy_llm import async_proxyllm_generate_stream
+
+        return async_proxyllm_generate_stream
+
 
 class GorillaChatAdapter(BaseChatAdpter):
     def match(self, model_path: str):
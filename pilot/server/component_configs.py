@@ -6,7 +6,9 @@ import os
 
 from pilot.component import ComponentType, SystemApp
 from pilot.utils.executor_utils import DefaultExecutorFactory
+from pilot.utils.http_client import initialize_http_client
 from pilot.embedding_engine.embedding_factory import EmbeddingFactory
+from pilot.embedding_engine.embedding_cache import wrap_embeddings_with_cache
 from pilot.server.base import WebWerverParameters
 
 if TYPE_CHECKING:
@@ -26,6 +28,8 @@ def initialize_components(
 
     # Register global default executor factory first
     system_app.register(DefaultExecutorFactory)
+    # Shared connection pools for the RPC to model controller and workers
+    initialize_http_client(system_app)
     system_app.register_instance(controller)
 
     from pilot.base_modules.agent.controller import module_agent
@@ -77,7 +81,10 @@ class RemoteEmbeddingFactory(EmbeddingFactory):
             ComponentType.WORKER_MANAGER_FACTORY, WorkerManagerFactory
         ).create()
         # Ignore model_name args
-        return RemoteEmbeddings(self._default_model_name, worker_manager)
+        return wrap_embeddings_with_cache(
+            self._default_model_name,
+            RemoteEmbeddings(self._default_model_name, worker_manager),
+        )
 
 
 class LocalEmbeddingFactory(EmbeddingFactory):
@@ -92,7 +99,7 @@ class LocalEmbeddingFactory(EmbeddingFactory):
         self._default_model_name = default_model_name
         self._default_model_path = default_model_path
         self._kwargs = kwargs
-        self._model = self._load_model()
+        self._model = wrap_embeddings_with_cache(default_model_name, self._load_model())
 
     def init_app(self, system_app):
         pass
@@ -14,6 +14,7 @@ from pilot.configs.model_config import (
 from pilot.openapi.api_view_model import Result
 from pilot.embedding_engine.embedding_engine import EmbeddingEngine
 from pilot.embedding_engine.embedding_factory import EmbeddingFactory
+from pilot.embedding_engine.embedding_cache import get_embedding_cache
 
 from pilot.server.knowledge.service import KnowledgeService
 from pilot.server.knowledge.request.request import (
@@ -172,6 +173,16 @@ def document_sync(space_name: str, request: DocumentSyncRequest):
         return Result.faild(code="E000X", msg=f"document sync error {e}")
 
 
+@router.post("/knowledge/{space_name}/document/sync/progress")
+def document_sync_progress(space_name: str, request: DocumentSyncRequest):
+    try:
+        return Result.succ(
+            knowledge_space_service.get_sync_progress(space_name, request.doc_ids)
+        )
+    except Exception as e:
+        return Result.faild(code="E000X", msg=f"document sync progress error {e}")
+
+
 @router.post("/knowledge/{space_name}/chunk/list")
 def document_list(space_name: str, query_request: ChunkQueryRequest):
     print(f"/document/list params: {space_name}, {query_request}")
@@ -181,6 +192,14 @@ def document_list(space_name: str, query_request: ChunkQueryRequest):
         return Result.faild(code="E000X", msg=f"document chunk list error {e}")
 
 
+@router.get("/knowledge/embedding/cache/stats")
+def embedding_cache_stats():
+    cache = get_embedding_cache()
+    if not cache:
+        return Result.faild(code="E000X", msg="embedding cache is disabled")
+    return Result.succ(cache.stats())
+
+
 @router.post("/knowledge/{vector_name}/query")
 def similar_query(space_name: str, query_request: KnowledgeQueryRequest):
     print(f"Received params: {space_name}, {query_request}")
@@ -1,16 +1,20 @@
 import json
 import logging
+import threading
 from datetime import datetime
+from typing import Dict, List, Optional
 
-from pilot.vector_store.connector import VectorStoreConnector
+from pilot.embedding_engine.lexical_index import delete_chunks, drop_lexical_index
+from pilot.vector_store.connector import (
+    VectorStoreConnector,
+    invalidate_vector_store,
+)
 
 from pilot.configs.config import Config
 from pilot.configs.model_config import (
     EMBEDDING_MODEL_CONFIG,
     KNOWLEDGE_UPLOAD_ROOT_PATH,
 )
-from pilot.component import ComponentType
-from pilot.utils.executor_utils import ExecutorFactory
 
 from pilot.server.knowledge.chunk_db import (
     DocumentChunkEntity,
@@ -32,7 +36,12 @@ from pilot.server.knowledge.request.request import (
     SpaceArgumentRequest,
     DocumentSyncRequest,
 )
-from enum import Enum
+from pilot.server.knowledge.sync_pipeline import (
+    DocumentSyncStore,
+    DocumentSyncTask,
+    KnowledgeSyncPipeline,
+    SyncStatus,
+)
 
 from pilot.server.knowledge.request.response import (
     ChunkQueryResponse,
@@ -48,11 +57,51 @@ logger = logging.getLogger(__name__)
 CFG = Config()
 
 
-class SyncStatus(Enum):
-    TODO = "TODO"
-    FAILED = "FAILED"
-    RUNNING = "RUNNING"
-    FINISHED = "FINISHED"
+class _KnowledgeSyncStore(DocumentSyncStore):
+    def update_document(self, doc) -> None:
+        knowledge_document_dao.update_knowledge_document(doc)
+        if doc.status != SyncStatus.RUNNING.name:
+            # Reopen the vector store of the synced space (e.g. a milvus collection
+            # created by the sync)
+            invalidate_vector_store(doc.space, CFG.VECTOR_STORE_TYPE)
+
+    def delete_chunks(self, doc) -> None:
+        document_chunk_dao.delete(doc.id)
+
+    def save_chunks(self, doc, chunk_docs) -> None:
+        chunk_entities = [
+            DocumentChunkEntity(
+                doc_name=doc.doc_name,
+                doc_type=doc.doc_type,
+                document_id=doc.id,
+                content=chunk_doc.page_content,
+                meta_info=str(chunk_doc.metadata),
+                gmt_created=datetime.now(),
+                gmt_modified=datetime.now(),
+            )
+            for chunk_doc in chunk_docs
+        ]
+        document_chunk_dao.create_documents_chunks(chunk_entities)
+
+
+_sync_pipeline: Optional[KnowledgeSyncPipeline] = None
+_sync_pipeline_lock = threading.Lock()
+
+
+def get_sync_pipeline() -> KnowledgeSyncPipeline:
+    """The process-wide document sync pipeline configured by the KNOWLEDGE_SYNC_*
+    settings"""
+    global _sync_pipeline
+    with _sync_pipeline_lock:
+        if _sync_pipeline is None:
+            _sync_pipeline = KnowledgeSyncPipeline(
+                _KnowledgeSyncStore(),
+                batch_size=CFG.KNOWLEDGE_SYNC_BATCH_SIZE,
+                embedding_concurrency=CFG.KNOWLEDGE_SYNC_CONCURRENCY,
+                max_retries=CFG.KNOWLEDGE_SYNC_MAX_RETRIES,
+                queue_size=CFG.KNOWLEDGE_SYNC_QUEUE_SIZE,
+            )
+        return _sync_pipeline
 
 
 # @singleton
@@ -194,6 +243,7 @@ class KnowledgeService:
 
         # import langchain is very very slow!!!
 
+        pipeline = get_sync_pipeline()
         doc_ids = sync_request.doc_ids
         for doc_id in doc_ids:
             query = KnowledgeDocumentEntity(
@@ -209,6 +259,17 @@ class KnowledgeService:
                     f" doc:{doc.doc_name} status is {doc.status}, can not sync"
                 )
 
+            sync_key = sync_request.json(exclude={"doc_ids"})
+            task = pipeline.get_task(doc.id)
+            if (
+                doc.status == SyncStatus.FAILED.name
+                and task
+                and task.sync_key == sync_key
+                and pipeline.resume(doc.id, doc)
+            ):
+                logger.info(f"resume failed chunk batches, doc:{doc.doc_name}")
+                continue
+
             space_context = self.get_space_context(space_name)
             chunk_size = (
                 CFG.KNOWLEDGE_CHUNK_SIZE
@@ -271,32 +332,8 @@ class KnowledgeService:
                 text_splitter=text_splitter,
                 embedding_factory=embedding_factory,
             )
-            chunk_docs = client.read()
-            # update document status
-            doc.status = SyncStatus.RUNNING.name
-            doc.chunk_size = len(chunk_docs)
-            doc.gmt_modified = datetime.now()
-            knowledge_document_dao.update_knowledge_document(doc)
-            executor = CFG.SYSTEM_APP.get_component(
-                ComponentType.EXECUTOR_DEFAULT, ExecutorFactory
-            ).create()
-            executor.submit(self.async_doc_embedding, client, chunk_docs, doc)
-
-            logger.info(f"begin save document chunks, doc:{doc.doc_name}")
-            # save chunk details
-            chunk_entities = [
-                DocumentChunkEntity(
-                    doc_name=doc.doc_name,
-                    doc_type=doc.doc_type,
-                    document_id=doc.id,
-                    content=chunk_doc.page_content,
-                    meta_info=str(chunk_doc.metadata),
-                    gmt_created=datetime.now(),
-                    gmt_modified=datetime.now(),
-                )
-                for chunk_doc in chunk_docs
-            ]
-            document_chunk_dao.create_documents_chunks(chunk_entities)
+            # Read, split, embed and save the chunks in the sync pipeline
+            pipeline.submit(DocumentSyncTask(doc, client, sync_key=sync_key))
 
         return True
 
@@ -329,6 +366,7 @@ class KnowledgeService:
         )
         # delete vectors
         vector_client.delete_vector_name(space.name)
+        drop_lexical_index(space.name)
         document_query = KnowledgeDocumentEntity(space=space.name)
         # delete chunks
         documents = knowledge_document_dao.get_documents(document_query)
@@ -360,6 +398,7 @@ class KnowledgeService:
             )
             # delete vector by ids
             vector_client.delete_by_ids(vector_ids)
+            delete_chunks(space_name, vector_ids)
         # delete chunks
         document_chunk_dao.delete(documents[0].id)
         # delete document
@@ -384,28 +423,35 @@ class KnowledgeService:
         res.page = request.page
         return res
 
-    def async_doc_embedding(self, client, chunk_docs, doc):
-        """async document embedding into vector db
+    def get_sync_progress(self, space_name, doc_ids: List) -> List[Dict]:
+        """get the sync progress of documents
         Args:
-            - client: EmbeddingEngine Client
-            - chunk_docs: List[Document]
-            - doc: doc
+            - space_name: Knowledge Space Name
+            - doc_ids: doc ids
         """
-        logger.info(
-            f"async_doc_embedding, doc:{doc.doc_name}, chunk_size:{len(chunk_docs)}, begin embedding to vector store-{CFG.VECTOR_STORE_TYPE}"
-        )
-        try:
-            vector_ids = client.knowledge_embedding_batch(chunk_docs)
-            doc.status = SyncStatus.FINISHED.name
-            doc.result = "document embedding success"
-            if vector_ids is not None:
-                doc.vector_ids = ",".join(vector_ids)
-            logger.info(f"async document embedding, success:{doc.doc_name}")
-        except Exception as e:
-            doc.status = SyncStatus.FAILED.name
-            doc.result = "document embedding failed" + str(e)
-            logger.error(f"document embedding, failed:{doc.doc_name}, {str(e)}")
-        return knowledge_document_dao.update_knowledge_document(doc)
+        pipeline = get_sync_pipeline()
+        progresses = []
+        for doc_id in doc_ids:
+            progress = pipeline.progress(doc_id)
+            if progress is None:
+                query = KnowledgeDocumentEntity(id=doc_id, space=space_name)
+                docs = knowledge_document_dao.get_knowledge_documents(query)
+                if not docs:
+                    raise Exception(f"there is no document {doc_id} in {space_name}")
+                doc = docs[0]
+                # Not synced since the server started
+                done_chunks = (
+                    doc.chunk_size if doc.status == SyncStatus.FINISHED.name else 0
+                )
+                progress = {
+                    "doc_id": doc.id,
+                    "doc_name": doc.doc_name,
+                    "status": doc.status,
+                    "total_chunks": doc.chunk_size,
+                    "done_chunks": done_chunks,
+                }
+            progresses.append(progress)
+        return progresses
 
     def _build_default_context(self):
         from pilot.scene.chat_knowledge.v1.prompt import (
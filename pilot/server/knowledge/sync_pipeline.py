@@ -0,0 +1,353 @@
+"""Staged ingestion pipeline of knowledge documents.
+
+    read and split -> embed and upsert in batches -> persist chunks -> finish document
+
+Every stage runs on its own threads and the stages are connected by queues, the queue
+of chunk batches is bounded so the readers stop splitting new documents when the
+embedding stage falls behind. Reading the next documents overlaps with embedding the
+current ones, so syncing a space with many documents keeps the embedding model busy
+instead of idling between documents.
+
+A failed batch is retried with backoff, the batches still failing after the retries
+are kept in memory and a later sync of the document only runs these batches again.
+"""
+from __future__ import annotations
+
+import logging
+import queue
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime
+from enum import Enum
+from typing import Any, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+_FINISH = object()
+
+
+class SyncStatus(Enum):
+    TODO = "TODO"
+    FAILED = "FAILED"
+    RUNNING = "RUNNING"
+    FINISHED = "FINISHED"
+
+
+class DocumentSyncStore:
+    """Persistence of the pipeline, the default implementation is in the knowledge
+    service."""
+
+    def update_document(self, doc) -> None:
+        """Save the status, chunk size, result and vector ids of the document"""
+
+    def delete_chunks(self, doc) -> None:
+        """Delete the chunk rows of the document left by the previous sync"""
+
+    def save_chunks(self, doc, chunk_docs: List) -> None:
+        """Save the chunk rows of the chunks embedded into vector store"""
+
+
+class _ChunkBatch:
+    def __init__(self, task: "DocumentSyncTask", index: int, docs: List) -> None:
+        self.task = task
+        self.index = index
+        self.docs = docs
+        self.attempts = 0
+
+
+class DocumentSyncTask:
+    """The sync state of one document.
+
+    Args:
+        doc: The KnowledgeDocumentEntity to sync.
+        client: The EmbeddingEngine of the document, which reads and splits the
+            document and writes the chunks into vector store.
+        sync_key: The split arguments of the document, the failed batches can only be
+            resumed by a sync with the same arguments.
+    """
+
+    def __init__(self, doc, client, sync_key: Optional[str] = None) -> None:
+        self.doc = doc
+        self.client = client
+        self.sync_key = sync_key
+        self.batches: List[_ChunkBatch] = []
+        self.total_chunks = 0
+        self.total_batches = 0
+        self.done_chunks = 0
+        self.vector_ids: Dict[int, List[str]] = {}
+        self.failed_batches: Dict[int, str] = {}
+        self._pending = 0
+        self._resume = False
+        self._lock = threading.Lock()
+
+    @property
+    def resumable(self) -> bool:
+        return bool(self.failed_batches) and bool(self.batches)
+
+    def progress(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "doc_id": self.doc.id,
+                "doc_name": self.doc.doc_name,
+                "status": self.doc.status,
+                "total_chunks": self.total_chunks,
+                "done_chunks": self.done_chunks,
+                "total_batches": self.total_batches,
+                "failed_batches": len(self.failed_batches),
+            }
+
+    def _batch_done(self, batch: _ChunkBatch, vector_ids: Optional[List[str]]) -> bool:
+        with self._lock:
+            self.vector_ids[batch.index] = list(vector_ids or [])
+            self.failed_batches.pop(batch.index, None)
+            self.done_chunks += len(batch.docs)
+            self._pending -= 1
+            return self._pending == 0
+
+    def _batch_failed(self, batch: _ChunkBatch, error: str) -> bool:
+        with self._lock:
+            self.failed_batches[batch.index] = error
+            self._pending -= 1
+            return self._pending == 0
+
+
+class KnowledgeSyncPipeline:
+    """Sync knowledge documents into vector store with a staged pipeline.
+
+    Args:
+        store (DocumentSyncStore): Persistence of documents and chunks.
+        batch_size (int): Number of chunks embedded and written in one batch.
+        embedding_concurrency (int): Number of batches embedded concurrently.
+        max_retries (int): Number of retries of a failed batch.
+        retry_backoff (float): Seconds to wait before the first retry, doubled for
+            every next retry.
+        queue_size (int): Max number of batches waiting for the embedding stage.
+        num_readers (int): Number of threads reading and splitting documents.
+        max_finished_tasks (int): Number of finished documents whose progress is
+            kept in memory.
+    """
+
+    def __init__(
+        self,
+        store: DocumentSyncStore,
+        batch_size: int = 64,
+        embedding_concurrency: int = 4,
+        max_retries: int = 3,
+        retry_backoff: float = 1.0,
+        queue_size: int = 16,
+        num_readers: int = 2,
+        max_finished_tasks: int = 1000,
+    ) -> None:
+        self.store = store
+        self.batch_size = max(batch_size, 1)
+        self.embedding_concurrency = max(embedding_concurrency, 1)
+        self.max_retries = max(max_retries, 0)
+        self.retry_backoff = retry_backoff
+        self.num_readers = max(num_readers, 1)
+        self.max_finished_tasks = max_finished_tasks
+        # Documents are cheap to hold before they are read, only the batches of split
+        # chunks are bounded
+        self._read_queue: queue.Queue = queue.Queue()
+        self._batch_queue: queue.Queue = queue.Queue(maxsize=max(queue_size, 1))
+        self._tasks: "OrderedDict[int, DocumentSyncTask]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._threads: List[threading.Thread] = []
+
+    def start(self) -> None:
+        with self._lock:
+            if self._threads:
+                return
+            for i in range(self.num_readers):
+                self._threads.append(
+                    threading.Thread(
+                        target=self._read_loop,
+                        name=f"knowledge_sync_reader_{i}",
+                        daemon=True,
+                    )
+                )
+            for i in range(self.embedding_concurrency):
+                self._threads.append(
+                    threading.Thread(
+                        target=self._embedding_loop,
+                        name=f"knowledge_sync_embedding_{i}",
+                        daemon=True,
+                    )
+                )
+            for thread in self._threads:
+                thread.start()
+
+    def stop(self) -> None:
+        """Stop the pipeline after the submitted documents are finished"""
+        with self._lock:
+            threads, self._threads = self._threads, []
+        if not threads:
+            return
+        for _ in range(self.num_readers):
+            self._read_queue.put(_FINISH)
+        for thread in threads[: self.num_readers]:
+            thread.join()
+        for _ in range(self.embedding_concurrency):
+            self._batch_queue.put(_FINISH)
+        for thread in threads[self.num_readers :]:
+            thread.join()
+
+    def get_task(self, doc_id: int) -> Optional[DocumentSyncTask]:
+        with self._lock:
+            return self._tasks.get(doc_id)
+
+    def progress(self, doc_id: int) -> Optional[Dict[str, Any]]:
+        task = self.get_task(doc_id)
+        return task.progress() if task else None
+
+    def submit(self, task: DocumentSyncTask) -> None:
+        """Sync all chunks of the document, returns at once"""
+        self._enqueue(task, resume=False)
+
+    def resume(self, doc_id: int, doc) -> bool:
+        """Run the failed batches of the document again, returns False if there is
+        nothing to resume and the document should be synced from scratch."""
+        task = self.get_task(doc_id)
+        if not task or not task.resumable:
+            return False
+        task.doc = doc
+        self._enqueue(task, resume=True)
+        return True
+
+    def _enqueue(self, task: DocumentSyncTask, resume: bool) -> None:
+        task._resume = resume
+        task.doc.status = SyncStatus.RUNNING.name
+        task.doc.gmt_modified = datetime.now()
+        self.store.update_document(task.doc)
+        with self._lock:
+            self._tasks[task.doc.id] = task
+            self._tasks.move_to_end(task.doc.id)
+        self.start()
+        self._read_queue.put(task)
+
+    def _read_loop(self) -> None:
+        while True:
+            task = self._read_queue.get()
+            if task is _FINISH:
+                break
+            try:
+                batches = self._failed_batches(task) if task._resume else None
+                if batches is None:
+                    batches = self._read(task)
+            except Exception as e:
+                logger.error(f"document read failed:{task.doc.doc_name}, {str(e)}")
+                task.doc.status = SyncStatus.FAILED.name
+                task.doc.result = "document read failed: " + str(e)
+                self.store.update_document(task.doc)
+                continue
+            if not batches:
+                self._finish(task)
+                continue
+            logger.info(
+                f"begin embedding document:{task.doc.doc_name}, chunks:{task.total_chunks}, batches:{len(batches)}"
+            )
+            for batch in batches:
+                # Blocks when the embedding stage is behind
+                self._batch_queue.put(batch)
+
+    def _read(self, task: DocumentSyncTask) -> List[_ChunkBatch]:
+        chunk_docs = task.client.read()
+        # Chunk rows of a previous failed sync
+        self.store.delete_chunks(task.doc)
+        task.doc.chunk_size = len(chunk_docs)
+        task.doc.vector_ids = None
+        task.doc.gmt_modified = datetime.now()
+        self.store.update_document(task.doc)
+        with task._lock:
+            task.batches = [
+                _ChunkBatch(
+                    task, i // self.batch_size, chunk_docs[i : i + self.batch_size]
+                )
+                for i in range(0, len(chunk_docs), self.batch_size)
+            ]
+            task.total_chunks = len(chunk_docs)
+            task.total_batches = len(task.batches)
+            task.done_chunks = 0
+            task.vector_ids = {}
+            task.failed_batches = {}
+            task._pending = len(task.batches)
+            return list(task.batches)
+
+    def _failed_batches(self, task: DocumentSyncTask) -> List[_ChunkBatch]:
+        with task._lock:
+            batches = [task.batches[i] for i in sorted(task.failed_batches)]
+            for batch in batches:
+                batch.attempts = 0
+            task._pending = len(batches)
+            return batches
+
+    def _embedding_loop(self) -> None:
+        while True:
+            batch = self._batch_queue.get()
+            if batch is _FINISH:
+                break
+            task = batch.task
+            try:
+                vector_ids = self._run_batch(batch)
+                self.store.save_chunks(task.doc, batch.docs)
+                finished = task._batch_done(batch, vector_ids)
+            except Exception as e:
+                logger.error(
+                    f"document embedding batch {batch.index} failed:{task.doc.doc_name}, {str(e)}"
+                )
+                finished = task._batch_failed(batch, str(e))
+            if finished:
+                self._finish(task)
+
+    def _run_batch(self, batch: _ChunkBatch) -> Optional[List[str]]:
+        while True:
+            batch.attempts += 1
+            try:
+                return batch.task.client.knowledge_embedding_batch(batch.docs)
+            except Exception as e:
+                if batch.attempts > self.max_retries:
+                    raise
+                backoff = self.retry_backoff * (2 ** (batch.attempts - 1))
+                logger.warning(
+                    f"document embedding batch {batch.index} of {batch.task.doc.doc_name} error, retry after {backoff}s: {str(e)}"
+                )
+                time.sleep(backoff)
+
+    def _finish(self, task: DocumentSyncTask) -> None:
+        doc = task.doc
+        with task._lock:
+            vector_ids = [
+                vector_id
+                for index in sorted(task.vector_ids)
+                for vector_id in task.vector_ids[index]
+            ]
+            failed = dict(task.failed_batches)
+            num_batches = task.total_batches
+        if failed:
+            doc.status = SyncStatus.FAILED.name
+            last_error = failed[max(failed)]
+            doc.result = f"document embedding failed, {len(failed)} of {num_batches} batches failed, sync again to retry them: {last_error}"
+            logger.error(f"document embedding, failed:{doc.doc_name}, {last_error}")
+        else:
+            doc.status = SyncStatus.FINISHED.name
+            doc.result = "document embedding success"
+            logger.info(f"document embedding, success:{doc.doc_name}")
+        # Keep the ids of the written chunks, so deleting the document removes them
+        doc.vector_ids = ",".join(vector_ids) if vector_ids else None
+        doc.gmt_modified = datetime.now()
+        self.store.update_document(doc)
+        if not failed:
+            # Only the failed documents need the chunks to resume
+            task.batches = []
+            task.client = None
+        self._prune_tasks()
+
+    def _prune_tasks(self) -> None:
+        with self._lock:
+            finished = [
+                doc_id
+                for doc_id, task in self._tasks.items()
+                if task.doc.status != SyncStatus.RUNNING.name
+            ]
+            for doc_id in finished[: max(len(finished) - self.max_finished_tasks, 0)]:
+                del self._tasks[doc_id]
@@ -0,0 +1,170 @@
+import threading
+import time
+from types import SimpleNamespace
+from typing import List
+
+import pytest
+
+from pilot.server.knowledge.sync_pipeline import (
+    DocumentSyncStore,
+    DocumentSyncTask,
+    KnowledgeSyncPipeline,
+    SyncStatus,
+)
+
+
+class _Chunk:
+    def __init__(self, content: str) -> None:
+        self.page_content = content
+        self.metadata = {}
+
+
+class _FakeStore(DocumentSyncStore):
+    def __init__(self) -> None:
+        self.chunks = {}
+        self.lock = threading.Lock()
+
+    def delete_chunks(self, doc) -> None:
+        with self.lock:
+            self.chunks[doc.id] = []
+
+    def save_chunks(self, doc, chunk_docs: List) -> None:
+        with self.lock:
+            self.chunks.setdefault(doc.id, []).extend(chunk_docs)
+
+
+class _FakeClient:
+    def __init__(self, num_chunks: int, fail_times=None, delay: float = 0) -> None:
+        self.num_chunks = num_chunks
+        # chunk content -> times to fail
+        self.fail_times = dict(fail_times or {})
+        self.delay = delay
+        self.calls = 0
+        self.lock = threading.Lock()
+
+    def read(self):
+        return [_Chunk(f"chunk-{i}") for i in range(self.num_chunks)]
+
+    def knowledge_embedding_batch(self, docs):
+        time.sleep(self.delay)
+        with self.lock:
+            self.calls += 1
+            first = docs[0].page_content
+            if self.fail_times.get(first, 0) > 0:
+                self.fail_times[first] -= 1
+                raise ValueError(f"embedding {first} error")
+        return [f"id-{doc.page_content}" for doc in docs]
+
+
+def _doc(doc_id: int):
+    return SimpleNamespace(
+        id=doc_id,
+        doc_name=f"doc-{doc_id}",
+        status=SyncStatus.TODO.name,
+        chunk_size=0,
+        result="",
+        vector_ids=None,
+        gmt_modified=None,
+    )
+
+
+def _wait_done(pipeline: KnowledgeSyncPipeline, doc_ids, timeout: float = 5):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if all(
+            pipeline.progress(doc_id)["status"] != SyncStatus.RUNNING.name
+            for doc_id in doc_ids
+        ):
+            return
+        time.sleep(0.01)
+    raise TimeoutError("documents are not synced")
+
+
+@pytest.fixture
+def store():
+    return _FakeStore()
+
+
+def test_sync_documents(store):
+    pipeline = KnowledgeSyncPipeline(store, batch_size=4, embedding_concurrency=3)
+    docs = [_doc(i) for i in range(5)]
+    for doc in docs:
+        pipeline.submit(DocumentSyncTask(doc, _FakeClient(10)))
+    _wait_done(pipeline, range(5))
+    pipeline.stop()
+    for doc in docs:
+        assert doc.status == SyncStatus.FINISHED.name
+        assert doc.chunk_size == 10
+        # Vector ids keep the chunk order
+        assert doc.vector_ids == ",".join(f"id-chunk-{i}" for i in range(10))
+        assert len(store.chunks[doc.id]) == 10
+        progress = pipeline.progress(doc.id)
+        assert progress["done_chunks"] == progress["total_chunks"] == 10
+        assert progress["total_batches"] == 3
+
+
+def test_embedding_batches_run_concurrently(store):
+    pipeline = KnowledgeSyncPipeline(
+        store, batch_size=1, embedding_concurrency=8, queue_size=8
+    )
+    doc = _doc(1)
+    start = time.time()
+    pipeline.submit(DocumentSyncTask(doc, _FakeClient(16, delay=0.1)))
+    _wait_done(pipeline, [1])
+    pipeline.stop()
+    assert doc.status == SyncStatus.FINISHED.name
+    # 16 batches of 0.1s on 8 workers
+    assert time.time() - start < 1.2
+
+
+def test_retry_failed_batch(store):
+    pipeline = KnowledgeSyncPipeline(store, batch_size=2, retry_backoff=0)
+    doc = _doc(1)
+    client = _FakeClient(4, fail_times={"chunk-2": 2})
+    pipeline.submit(DocumentSyncTask(doc, client))
+    _wait_done(pipeline, [1])
+    pipeline.stop()
+    assert doc.status == SyncStatus.FINISHED.name
+    assert client.calls == 4
+
+
+def test_resume_failed_batches(store):
+    pipeline = KnowledgeSyncPipeline(
+        store, batch_size=2, max_retries=1, retry_backoff=0
+    )
+    doc = _doc(1)
+    client = _FakeClient(6, fail_times={"chunk-2": 2})
+    pipeline.submit(DocumentSyncTask(doc, client, sync_key="k"))
+    _wait_done(pipeline, [1])
+    assert doc.status == SyncStatus.FAILED.name
+    assert doc.vector_ids == "id-chunk-0,id-chunk-1,id-chunk-4,id-chunk-5"
+    progress = pipeline.progress(1)
+    assert progress["done_chunks"] == 4
+    assert progress["failed_batches"] == 1
+
+    calls = client.calls
+    assert pipeline.resume(1, doc)
+    _wait_done(pipeline, [1])
+    pipeline.stop()
+    assert doc.status == SyncStatus.FINISHED.name
+    # Only the failed batch runs again
+    assert client.calls == calls + 1
+    assert doc.vector_ids == ",".join(f"id-chunk-{i}" for i in range(6))
+    assert len(store.chunks[1]) == 6
+    assert pipeline.progress(1)["done_chunks"] == 6
+    # Nothing to resume after finished
+    assert not pipeline.resume(1, doc)
+
+
+def test_read_failed(store):
+    class _BrokenClient(_FakeClient):
+        def read(self):
+            raise ValueError("bad document")
+
+    pipeline = KnowledgeSyncPipeline(store)
+    doc = _doc(1)
+    pipeline.submit(DocumentSyncTask(doc, _BrokenClient(0)))
+    _wait_done(pipeline, [1])
+    pipeline.stop()
+    assert doc.status == SyncStatus.FAILED.name
+    assert "bad document" in doc.result
@@ -0,0 +1,268 @@
+"""Shared HTTP clients for the RPC between webserver, model controller and workers.
+
+Opening a new client per request pays the TCP (and TLS) setup on every LLM call, the
+clients here are created once per host and keep the connections alive.
+
+`httpx.AsyncClient` must only be used in the event loop where its connections are
+created, so the asynchronous clients are cached per event loop.
+"""
+from abc import ABC, abstractmethod
+import asyncio
+from dataclasses import dataclass, field
+import logging
+import os
+import threading
+from typing import Dict, Optional, Tuple
+from urllib.parse import urlsplit
+import weakref
+
+import httpx
+
+from pilot.component import BaseComponent, ComponentType, SystemApp
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class HttpClientParameters:
+    max_connections: Optional[int] = field(
+        default=100, metadata={"help": "The maximum connections to each host"}
+    )
+    max_keepalive_connections: Optional[int] = field(
+        default=20,
+        metadata={"help": "The maximum idle connections kept alive to each host"},
+    )
+    keepalive_expiry: Optional[float] = field(
+        default=60.0, metadata={"help": "Seconds to keep an idle connection alive"}
+    )
+    connect_timeout: Optional[float] = field(
+        default=10.0, metadata={"help": "The connect timeout (seconds)"}
+    )
+    timeout: Optional[float] = field(
+        default=180.0,
+        metadata={
+            "help": "The default read/write/pool timeout (seconds), can be overridden per request"
+        },
+    )
+    http2: Optional[bool] = field(
+        default=True,
+        metadata={
+            "help": "Use HTTP/2 where available, it requires the h2 package and TLS"
+        },
+    )
+
+    @classmethod
+    def from_env(cls) -> "HttpClientParameters":
+        """Read the parameters from environment variables, e.g. DBGPT_HTTP_MAX_CONNECTIONS"""
+        defaults = cls()
+        kwargs = {}
+        for name, value in defaults.__dict__.items():
+            env_value = os.getenv(f"DBGPT_HTTP_{name.upper()}")
+            if env_value is None:
+                continue
+            if isinstance(value, bool):
+                kwargs[name] = env_value.lower() == "true"
+            else:
+                kwargs[name] = type(value)(env_value)
+        return cls(**kwargs)
+
+
+class HttpClientFactory(BaseComponent, ABC):
+    name = ComponentType.HTTP_CLIENT_FACTORY.value
+
+    @abstractmethod
+    def get_async_client(self, url: str) -> httpx.AsyncClient:
+        """Get the shared asynchronous client for the host of url in current event loop"""
+
+    @abstractmethod
+    def get_sync_client(self, url: str) -> httpx.Client:
+        """Get the shared synchronous client for the host of url"""
+
+    @abstractmethod
+    def metrics(self) -> Dict:
+        """Get the pool utilization metrics"""
+
+
+class DefaultHttpClientFactory(HttpClientFactory):
+    def __init__(
+        self,
+        system_app: SystemApp | None = None,
+        params: HttpClientParameters = None,
+    ):
+        self._params = params or HttpClientParameters.from_env()
+        self._lock = threading.Lock()
+        # Event loop -> {host: client}
+        self._async_clients = weakref.WeakKeyDictionary()
+        self._sync_clients: Dict[str, httpx.Client] = {}
+        self._num_requests: Dict[str, int] = {}
+        super().__init__(system_app)
+
+    def init_app(self, system_app: SystemApp):
+        global _http_client_factory
+        _http_client_factory = self
+
+    def get_async_client(self, url: str) -> httpx.AsyncClient:
+        host = _host_of(url)
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            clients = self._async_clients.setdefault(loop, {})
+            client = clients.get(host)
+            if client is None or client.is_closed:
+                client = httpx.AsyncClient(
+                    **self._client_kwargs(),
+                    event_hooks={"request": [self._async_request_hook(host)]},
+                )
+                clients[host] = client
+            return client
+
+    def get_sync_client(self, url: str) -> httpx.Client:
+        host = _host_of(url)
+        with self._lock:
+            client = self._sync_clients.get(host)
+            if client is None or client.is_closed:
+                client = httpx.Client(
+                    **self._client_kwargs(),
+                    event_hooks={"request": [self._sync_request_hook(host)]},
+                )
+                self._sync_clients[host] = client
+            return client
+
+    def metrics(self) -> Dict:
+        hosts: Dict[str, Dict] = {}
+
+        def _add_client(host: str, client):
+            host_metrics = hosts.setdefault(
+                host,
+                {
+                    "clients": 0,
+                    "connections": 0,
+                    "active_connections": 0,
+                    "idle_connections": 0,
+                    "max_connections": self._params.max_connections,
+                },
+            )
+            host_metrics["clients"] += 1
+            active, idle = _pool_connections(client)
+            host_metrics["active_connections"] += active
+            host_metrics["idle_connections"] += idle
+            host_metrics["connections"] += active + idle
+
+        with self._lock:
+            for clients in list(self._async_clients.values()):
+                for host, client in clients.items():
+                    _add_client(host, client)
+            for host, client in self._sync_clients.items():
+                _add_client(host, client)
+            num_requests = dict(self._num_requests)
+        for host, host_metrics in hosts.items():
+            host_metrics["requests"] = num_requests.get(host, 0)
+            if self._params.max_connections:
+                # One pool per client (event loop)
+                host_metrics["utilization"] = round(
+                    host_metrics["active_connections"]
+                    / (self._params.max_connections * host_metrics["clients"]),
+                    4,
+                )
+        return {"http2": self._http2_enabled(), "hosts": hosts}
+
+    async def async_before_stop(self):
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            clients = self._async_clients.pop(loop, {})
+        for client in clients.values():
+            await client.aclose()
+
+    def before_stop(self):
+        with self._lock:
+            clients = list(self._sync_clients.values())
+            self._sync_clients.clear()
+        for client in clients:
+            client.close()
+
+    def _client_kwargs(self) -> Dict:
+        params = self._params
+        return {
+            "limits": httpx.Limits(
+                max_connections=params.max_connections,
+                max_keepalive_connections=params.max_keepalive_connections,
+                keepalive_expiry=params.keepalive_expiry,
+            ),
+            "timeout": httpx.Timeout(params.timeout, connect=params.connect_timeout),
+            "http2": self._http2_enabled(),
+        }
+
+    def _http2_enabled(self) -> bool:
+        if not self._params.http2:
+            return False
+        try:
+            import h2  # noqa: F401
+
+            return True
+        except ImportError:
+            return False
+
+    def _count_request(self, host: str):
+        with self._lock:
+            self._num_requests[host] = self._num_requests.get(host, 0) + 1
+
+    def _async_request_hook(self, host: str):
+        async def hook(request):
+            self._count_request(host)
+
+        return hook
+
+    def _sync_request_hook(self, host: str):
+        def hook(request):
+            self._count_request(host)
+
+        return hook
+
+
+_http_client_factory: Optional[HttpClientFactory] = None
+
+
+def get_http_client_factory() -> HttpClientFactory:
+    """Get the factory registered to the SystemApp, a default one is created if no
+    factory has been registered (e.g. in the model worker process without webserver).
+    """
+    global _http_client_factory
+    if _http_client_factory is None:
+        _http_client_factory = DefaultHttpClientFactory()
+    return _http_client_factory
+
+
+def initialize_http_client(
+    system_app: SystemApp, params: HttpClientParameters = None
+) -> HttpClientFactory:
+    if not system_app:
+        return get_http_client_factory()
+    factory = system_app.get_component(
+        ComponentType.HTTP_CLIENT_FACTORY, HttpClientFactory, None
+    )
+    if factory is None:
+        factory = DefaultHttpClientFactory(params=params)
+        system_app.register_instance(factory)
+    return factory
+
+
+def _host_of(url: str) -> str:
+    parts = urlsplit(url)
+    return f"{parts.scheme}://{parts.netloc}"
+
+
+def _pool_connections(client) -> Tuple[int, int]:
+    """Return the number of active and idle connections of the client"""
+    try:
+        # httpcore.ConnectionPool of the default transport
+        connections = client._transport._pool.connections
+    except AttributeError:
+        return 0, 0
+    active, idle = 0, 0
+    for conn in connections:
+        if conn.is_closed():
+            continue
+        if conn.is_idle():
+            idle += 1
+        else:
+            active += 1
+    return active, idle
@@ -0,0 +1,135 @@
+import asyncio
+import time
+from dataclasses import dataclass
+from typing import AsyncIterator, Dict, Optional
+
+
+@dataclass
+class StreamCoalescePolicy:
+    """When to flush the coalesced stream output
+
+    The latest output is flushed when `flush_interval_ms` milliseconds have passed
+    since the previous flush or the output has grown by `flush_chars` characters,
+    whichever comes first. The first output is always flushed at once to keep the
+    time to first token low.
+    """
+
+    flush_interval_ms: int = 30
+    flush_chars: int = 512
+
+    @property
+    def disabled(self) -> bool:
+        return self.flush_interval_ms <= 0 and self.flush_chars <= 0
+
+
+async def coalesce_stream(
+    stream: AsyncIterator[str], policy: StreamCoalescePolicy
+) -> AsyncIterator[str]:
+    """Coalesce a stream of full text outputs, only the latest output is yielded
+    on each flush.
+
+    The stream is never polled by sleeping, it waits on the next output of the
+    upstream with the remaining time of current flush interval as timeout.
+
+    Args:
+        stream (AsyncIterator[str]): Each output contains the full text so far.
+        policy (StreamCoalescePolicy): The flush policy.
+    """
+    if policy.disabled:
+        async for output in stream:
+            yield output
+        return
+
+    interval = policy.flush_interval_ms / 1000
+    iterator = stream.__aiter__()
+    pending: Optional[str] = None
+    flushed_len = 0
+    last_flush_time = None
+    next_task = None
+    try:
+        while True:
+            if next_task is None:
+                next_task = asyncio.ensure_future(iterator.__anext__())
+            timeout = None
+            if pending is not None and interval > 0:
+                timeout = max(interval - (time.perf_counter() - last_flush_time), 0)
+            done, _ = await asyncio.wait({next_task}, timeout=timeout)
+            if not done:
+                # Upstream is slow, flush the pending output when the interval is up
+                yield pending
+                flushed_len, pending = len(pending), None
+                last_flush_time = time.perf_counter()
+                continue
+            try:
+                output = next_task.result()
+            except StopAsyncIteration:
+                break
+            finally:
+                next_task = None
+            if last_flush_time is None:
+                yield output
+                flushed_len = len(output)
+                last_flush_time = time.perf_counter()
+                continue
+            pending = output
+            now = time.perf_counter()
+            if (
+                policy.flush_chars > 0
+                and len(output) - flushed_len >= policy.flush_chars
+            ) or (interval > 0 and now - last_flush_time >= interval):
+                yield pending
+                flushed_len, pending = len(pending), None
+                last_flush_time = now
+        if pending is not None:
+            yield pending
+    finally:
+        if next_task is not None and not next_task.done():
+            next_task.cancel()
+
+
+class StreamMetrics:
+    """Collect the time to first token and throughput of a stream
+
+    Examples:
+
+        .. code-block:: python
+
+            metrics = StreamMetrics()
+            for output in stream:
+                metrics.on_output(len(output))
+            span.end(metadata=metrics.to_dict(completion_tokens=100))
+    """
+
+    def __init__(self) -> None:
+        self.start_time = time.perf_counter()
+        self.first_output_time: Optional[float] = None
+        self.last_output_time: Optional[float] = None
+        self.num_outputs = 0
+        self.output_chars = 0
+
+    def on_output(self, output_chars: int) -> None:
+        """Record an output, `output_chars` is the length of the full text so far"""
+        now = time.perf_counter()
+        if self.first_output_time is None:
+            self.first_output_time = now
+        self.last_output_time = now
+        self.num_outputs += 1
+        self.output_chars = output_chars
+
+    def to_dict(self, completion_tokens: Optional[int] = None) -> Dict:
+        end_time = self.last_output_time or time.perf_counter()
+        duration = end_time - self.start_time
+        metrics = {
+            "duration_ms": round(duration * 1000, 2),
+            "num_outputs": self.num_outputs,
+            "output_chars": self.output_chars,
+        }
+        if self.first_output_time is not None:
+            metrics["ttft_ms"] = round(
+                (self.first_output_time - self.start_time) * 1000, 2
+            )
+        if duration > 0:
+            metrics["chars_per_second"] = round(self.output_chars / duration, 2)
+            if completion_tokens:
+                metrics["tokens_per_second"] = round(completion_tokens / duration, 2)
+        return metrics
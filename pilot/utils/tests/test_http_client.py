@@ -0,0 +1,69 @@
+import asyncio
+import pytest
+from pilot.component import ComponentType, SystemApp
+from pilot.utils.http_client import (
+    DefaultHttpClientFactory,
+    HttpClientFactory,
+    HttpClientParameters,
+    get_http_client_factory,
+    initialize_http_client,
+)
+
+
+def test_parameters_from_env(monkeypatch):
+    monkeypatch.setenv("DBGPT_HTTP_MAX_CONNECTIONS", "8")
+    monkeypatch.setenv("DBGPT_HTTP_TIMEOUT", "2.5")
+    monkeypatch.setenv("DBGPT_HTTP_HTTP2", "false")
+    params = HttpClientParameters.from_env()
+    assert params.max_connections == 8
+    assert params.timeout == 2.5
+    assert params.http2 is False
+    assert params.max_keepalive_connections == 20
+
+
+def test_sync_client_shared_per_host():
+    factory = DefaultHttpClientFactory(params=HttpClientParameters())
+    client = factory.get_sync_client("http://127.0.0.1:8000/api/worker/embeddings")
+    assert client is factory.get_sync_client("http://127.0.0.1:8000/api/controller")
+    assert client is not factory.get_sync_client("http://127.0.0.1:8001/api/worker")
+    factory.before_stop()
+    assert client.is_closed
+
+
+@pytest.mark.asyncio
+async def test_async_client_shared_per_event_loop():
+    factory = DefaultHttpClientFactory(params=HttpClientParameters())
+    url = "http://127.0.0.1:8000/api/worker/generate"
+    client = factory.get_async_client(url)
+    assert client is factory.get_async_client(url)
+
+    def _client_in_new_loop():
+        async def _get():
+            return factory.get_async_client(url)
+
+        return asyncio.run(_get())
+
+    other_client = await asyncio.get_running_loop().run_in_executor(
+        None, _client_in_new_loop
+    )
+    assert other_client is not client
+
+    # The clients of the finished event loop are released with it
+    metrics = factory.metrics()
+    host_metrics = metrics["hosts"]["http://127.0.0.1:8000"]
+    assert host_metrics["clients"] == 1
+    assert host_metrics["requests"] == 0
+    assert host_metrics["utilization"] == 0
+    await factory.async_before_stop()
+    assert client.is_closed
+
+
+def test_initialize_http_client():
+    system_app = SystemApp()
+    factory = initialize_http_client(system_app)
+    assert factory is system_app.get_component(
+        ComponentType.HTTP_CLIENT_FACTORY, HttpClientFactory
+    )
+    assert get_http_client_factory() is factory
+    # Registered only once
+    assert initialize_http_client(system_app) is factory
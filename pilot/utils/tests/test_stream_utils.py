@@ -0,0 +1,69 @@
+import asyncio
+import pytest
+from pilot.utils.stream_utils import (
+    StreamCoalescePolicy,
+    StreamMetrics,
+    coalesce_stream,
+)
+
+
+async def _full_text_stream(num_outputs: int, delay: float = 0):
+    text = ""
+    for i in range(num_outputs):
+        if delay:
+            await asyncio.sleep(delay)
+        text += f"t{i} "
+        yield text
+
+
+async def _collect(stream):
+    return [output async for output in stream]
+
+
+@pytest.mark.asyncio
+async def test_coalesce_disabled():
+    outputs = await _collect(
+        coalesce_stream(_full_text_stream(10), StreamCoalescePolicy(0, 0))
+    )
+    assert outputs == await _collect(_full_text_stream(10))
+
+
+@pytest.mark.asyncio
+async def test_coalesce_fast_stream():
+    outputs = await _collect(
+        coalesce_stream(_full_text_stream(100), StreamCoalescePolicy(10_000, 0))
+    )
+    # The first output is flushed at once, the last one is always flushed
+    expected = await _collect(_full_text_stream(100))
+    assert outputs == ["t0 ", expected[-1]]
+
+
+@pytest.mark.asyncio
+async def test_coalesce_by_chars():
+    policy = StreamCoalescePolicy(flush_interval_ms=10_000, flush_chars=30)
+    outputs = await _collect(coalesce_stream(_full_text_stream(100), policy))
+    assert len(outputs) > 2
+    for prev, cur in zip(outputs, outputs[1:]):
+        assert cur.startswith(prev)
+        assert len(cur) - len(prev) <= 30 + len("t99 ")
+    assert outputs[-1].endswith("t99 ")
+
+
+@pytest.mark.asyncio
+async def test_coalesce_slow_stream_flush_by_interval():
+    policy = StreamCoalescePolicy(flush_interval_ms=1, flush_chars=0)
+    outputs = await _collect(coalesce_stream(_full_text_stream(5, delay=0.02), policy))
+    # Upstream is slower than the flush interval, nothing to coalesce
+    assert outputs == await _collect(_full_text_stream(5))
+
+
+def test_stream_metrics():
+    metrics = StreamMetrics()
+    assert "ttft_ms" not in metrics.to_dict()
+    metrics.on_output(10)
+    metrics.on_output(20)
+    result = metrics.to_dict(completion_tokens=5)
+    assert result["num_outputs"] == 2
+    assert result["output_chars"] == 20
+    assert result["ttft_ms"] >= 0
+    assert result["ttft_ms"] <= result["duration_ms"]
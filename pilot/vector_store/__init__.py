@@ -25,6 +25,12 @@ def _import_weaviate() -> Any:
     return WeaviateStore
 
 
+def _import_local() -> Any:
+    from pilot.vector_store.local_store import LocalStore
+
+    return LocalStore
+
+
 def __getattr__(name: str) -> Any:
     if name == "Chroma":
         return _import_chroma()
@@ -34,8 +40,10 @@ def __getattr__(name: str) -> Any:
         return _import_weaviate()
     elif name == "PGVector":
         return _import_pgvector()
+    elif name == "Local":
+        return _import_local()
     else:
         raise AttributeError(f"Could not find: {name}")
 
 
-__all__ = ["Chroma", "Milvus", "Weaviate", "PGVector"]
+__all__ = ["Chroma", "Milvus", "Weaviate", "PGVector", "Local"]
@@ -1,9 +1,58 @@
+import hashlib
+import json
+import logging
+import time
+import uuid
 from abc import ABC, abstractmethod
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import (
+    Callable,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Tuple,
+    TYPE_CHECKING,
+)
+
+from pilot.configs.config import Config
+
+if TYPE_CHECKING:
+    from langchain.schema import Document
+
+logger = logging.getLogger(__name__)
+CFG = Config()
+
+
+def document_id(document: "Document", namespace: str = "") -> str:
+    """The content hash id of a document in the vector store `namespace`.
+
+    The same chunk always gets the same id, so writing it again replaces the previous
+    vector instead of appending a duplicate one. The id is a UUID string, which is
+    accepted by all the backends.
+    """
+    digest = hashlib.sha256()
+    for part in (
+        namespace,
+        document.page_content,
+        json.dumps(
+            document.metadata or {}, sort_keys=True, ensure_ascii=False, default=str
+        ),
+    ):
+        digest.update(part.encode("utf-8"))
+        digest.update(b"\0")
+    return str(uuid.UUID(bytes=digest.digest()[:16]))
 
 
 class VectorStoreBase(ABC):
     """base class for vector store database"""
 
+    # The store can write several batches concurrently
+    support_parallel_batches: bool = False
+    # Seconds to wait before retrying a failed batch, doubled for every retry
+    batch_retry_backoff: float = 1.0
+
     @abstractmethod
     def load_document(self, documents) -> None:
         """load document in vector database."""
@@ -14,6 +63,17 @@ class VectorStoreBase(ABC):
         """similar search in vector database."""
         pass
 
+    def similar_search_with_scores(
+        self, text, topk, score_threshold: float = 0.0
+    ) -> List[Tuple["Document", Optional[float]]]:
+        """similar search with relevance scores in vector database.
+
+        The relevance score is in [0, 1], higher is more similar, the documents whose
+        score is lower than score_threshold are dropped. The stores which can't score
+        the documents return None scores and ignore the threshold.
+        """
+        return [(doc, None) for doc in self.similar_search(text, topk)]
+
     @abstractmethod
     def vector_name_exists(self) -> bool:
         """is vector store name exist."""
@@ -28,3 +88,116 @@ class VectorStoreBase(ABC):
     def delete_vector_name(self, vector_name):
         """delete vector name."""
         pass
+
+    def _load_document_batches(
+        self,
+        documents: Iterable["Document"],
+        write_batch: Callable[[List["Document"], List[str]], Optional[List]],
+    ) -> List[str]:
+        """Write the documents in batches with their content hash ids.
+
+        write_batch(documents, ids) writes a batch, it must replace the documents of the
+        same ids, so a retried batch or a synced again document is not duplicated. It
+        returns the ids assigned by the store, or None if the store keeps the given ids.
+
+        The documents are read lazily and at most VECTOR_STORE_BATCH_PARALLELISM batches
+        are in memory. The first batch is written alone, it may create the collection.
+
+        Return the ids of the documents, in order.
+        """
+        ctx = getattr(self, "ctx", None) or {}
+        batch_size = max(
+            1, int(ctx.get("VECTOR_STORE_BATCH_SIZE", CFG.VECTOR_STORE_BATCH_SIZE))
+        )
+        retries = max(
+            0,
+            int(ctx.get("VECTOR_STORE_BATCH_RETRIES", CFG.VECTOR_STORE_BATCH_RETRIES)),
+        )
+        parallelism = 1
+        if self.support_parallel_batches:
+            parallelism = max(
+                1,
+                int(
+                    ctx.get(
+                        "VECTOR_STORE_BATCH_PARALLELISM",
+                        CFG.VECTOR_STORE_BATCH_PARALLELISM,
+                    )
+                ),
+            )
+        namespace = ctx.get("vector_store_name") or ""
+        store_name = type(self).__name__
+
+        ids: List[str] = []
+        # The content hash id -> the id assigned by the store
+        store_ids: Dict[str, str] = {}
+
+        def batches() -> Iterator[List[Tuple["Document", str]]]:
+            seen = set()
+            batch = []
+            for document in documents:
+                doc_id = document_id(document, namespace)
+                ids.append(doc_id)
+                if doc_id in seen:
+                    # The same chunk is written once
+                    continue
+                seen.add(doc_id)
+                batch.append((document, doc_id))
+                if len(batch) == batch_size:
+                    yield batch
+                    batch = []
+            if batch:
+                yield batch
+
+        def write(index: int, batch: List[Tuple["Document", str]]):
+            docs = [document for document, _ in batch]
+            batch_ids = [doc_id for _, doc_id in batch]
+            for attempt in range(retries + 1):
+                start = time.perf_counter()
+                try:
+                    written_ids = write_batch(docs, batch_ids)
+                    break
+                except Exception as e:
+                    if attempt == retries:
+                        raise
+                    logger.warning(
+                        f"{store_name} batch {index} failed, retry {attempt + 1}/{retries}: {str(e)}"
+                    )
+                    time.sleep(self.batch_retry_backoff * 2**attempt)
+            seconds = time.perf_counter() - start
+            logger.info(
+                f"{store_name} wrote batch {index}: {len(docs)} documents in {seconds:.3f}s, "
+                f"{len(docs) / max(seconds, 1e-9):.1f} docs/s"
+            )
+            return batch_ids, written_ids
+
+        def collect(result) -> None:
+            batch_ids, written_ids = result
+            if written_ids is not None:
+                store_ids.update(zip(batch_ids, (str(i) for i in written_ids)))
+
+        start = time.perf_counter()
+        indexed_batches = enumerate(batches())
+        first = next(indexed_batches, None)
+        if first is None:
+            return []
+        collect(write(*first))
+        if parallelism == 1:
+            for index, batch in indexed_batches:
+                collect(write(index, batch))
+        else:
+            with ThreadPoolExecutor(parallelism) as executor:
+                pending = set()
+                for index, batch in indexed_batches:
+                    if len(pending) >= parallelism:
+                        done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                        for future in done:
+                            collect(future.result())
+                    pending.add(executor.submit(write, index, batch))
+                for future in wait(pending)[0]:
+                    collect(future.result())
+        seconds = time.perf_counter() - start
+        logger.info(
+            f"{store_name} wrote {len(ids)} documents in {seconds:.3f}s, "
+            f"{len(ids) / max(seconds, 1e-9):.1f} docs/s"
+        )
+        return [store_ids.get(doc_id, doc_id) for doc_id in ids]
@@ -44,6 +44,19 @@ class ChromaStore(VectorStoreBase):
         logger.info("ChromaStore similar search")
         return self.vector_store_client.similarity_search(text, topk)
 
+    def similar_search_with_scores(self, text, topk, score_threshold: float = 0.0):
+        logger.info("ChromaStore similar search with scores")
+        docs_and_distances = self.vector_store_client.similarity_search_with_score(
+            text, topk
+        )
+        # The collection uses the cosine distance
+        docs_and_scores = [
+            (doc, 1.0 - distance) for doc, distance in docs_and_distances
+        ]
+        return [
+            (doc, score) for doc, score in docs_and_scores if score >= score_threshold
+        ]
+
     def vector_name_exists(self):
         logger.info(f"Check persist_dir: {self.persist_dir}")
         if not os.path.exists(self.persist_dir):
@@ -55,12 +68,18 @@ class ChromaStore(VectorStoreBase):
 
     def load_document(self, documents):
         logger.info("ChromaStore load document")
-        texts = [doc.page_content for doc in documents]
-        metadatas = [doc.metadata for doc in documents]
-        ids = self.vector_store_client.add_texts(texts=texts, metadatas=metadatas)
+        ids = self._load_document_batches(documents, self._upsert_batch)
         self.vector_store_client.persist()
         return ids
 
+    def _upsert_batch(self, documents, ids):
+        # add_texts upserts the documents by the ids
+        self.vector_store_client.add_texts(
+            texts=[doc.page_content for doc in documents],
+            metadatas=[doc.metadata for doc in documents],
+            ids=ids,
+        )
+
     def delete_vector_name(self, vector_name):
         logger.info(f"chroma vector_name:{vector_name} begin delete...")
         self.vector_store_client.delete_collection()
@@ -69,6 +88,8 @@ class ChromaStore(VectorStoreBase):
 
     def delete_by_ids(self, ids):
         logger.info(f"begin delete chroma ids...")
+        if isinstance(ids, str):
+            ids = ids.split(",")
         collection = self.vector_store_client._collection
         collection.delete(ids=ids)
 
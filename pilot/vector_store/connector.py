@@ -1,7 +1,129 @@
+import logging
+import threading
+from collections import OrderedDict
+from typing import Callable, Dict, Hashable, Optional, Tuple
+
 from pilot import vector_store
+from pilot.configs.config import Config
 from pilot.vector_store.base import VectorStoreBase
 
+logger = logging.getLogger(__name__)
+
 connector = {}
+_register_lock = threading.Lock()
+
+
+def _embeddings_key(embeddings) -> Optional[Hashable]:
+    if embeddings is None:
+        return None
+    return getattr(embeddings, "model_name", None) or id(embeddings)
+
+
+def _pool_key(vector_store_type: str, ctx: Dict) -> Tuple:
+    """The clients are shared by (backend, vector store name, embedding model), the
+    other scalar params (e.g. persist path) are part of the key too"""
+    params = frozenset(
+        (k, v)
+        for k, v in ctx.items()
+        if k not in ("embeddings", "vector_store_name", "vector_store_type")
+        and isinstance(v, (str, int, float, bool))
+    )
+    return (
+        vector_store_type,
+        ctx.get("vector_store_name"),
+        _embeddings_key(ctx.get("embeddings")),
+        params,
+    )
+
+
+class VectorStoreClientPool:
+    """Process-wide LRU of the live vector store clients.
+
+    Opening a client is expensive (e.g. chroma loads the HNSW index of the collection
+    from disk, milvus connects to the server), so the clients are kept and shared by
+    all requests of the same key. The least recently used client is dropped when there
+    are more than max_size clients, set max_size to 0 to disable the pool.
+    """
+
+    def __init__(self, max_size: int = 16) -> None:
+        self.max_size = max_size
+        self._clients: "OrderedDict[Tuple, VectorStoreBase]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get_client(
+        self,
+        vector_store_type: str,
+        ctx: Dict,
+        create: Callable[[], VectorStoreBase],
+    ) -> VectorStoreBase:
+        if self.max_size <= 0:
+            return create()
+        key = _pool_key(vector_store_type, ctx)
+        with self._lock:
+            client = self._clients.get(key)
+            if client is not None:
+                self._clients.move_to_end(key)
+                return client
+        # Don't block the other keys while the client is opening
+        client = create()
+        with self._lock:
+            if key in self._clients:
+                # Opened by another thread
+                self._clients.move_to_end(key)
+                return self._clients[key]
+            self._clients[key] = client
+            while len(self._clients) > self.max_size:
+                evicted_key, _ = self._clients.popitem(last=False)
+                logger.info(f"Evict vector store client {evicted_key[:2]}")
+        return client
+
+    def invalidate(
+        self, vector_store_name: str, vector_store_type: Optional[str] = None
+    ) -> int:
+        """Drop the clients of a vector store, return the number of dropped clients"""
+        with self._lock:
+            keys = [
+                key
+                for key in self._clients
+                if key[1] == vector_store_name
+                and (vector_store_type is None or key[0] == vector_store_type)
+            ]
+            for key in keys:
+                del self._clients[key]
+        if keys:
+            logger.info(
+                f"Invalidate {len(keys)} clients of vector store {vector_store_name}"
+            )
+        return len(keys)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._clients.clear()
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._clients)
+
+
+_client_pool: Optional[VectorStoreClientPool] = None
+_client_pool_lock = threading.Lock()
+
+
+def get_vector_store_pool() -> VectorStoreClientPool:
+    """The process-wide pool of vector store clients, its size is configured by
+    VECTOR_STORE_POOL_SIZE"""
+    global _client_pool
+    with _client_pool_lock:
+        if _client_pool is None:
+            _client_pool = VectorStoreClientPool(Config().VECTOR_STORE_POOL_SIZE)
+        return _client_pool
+
+
+def invalidate_vector_store(
+    vector_store_name: str, vector_store_type: Optional[str] = None
+) -> int:
+    """Drop the pooled clients of a vector store after it is changed or deleted"""
+    return get_vector_store_pool().invalidate(vector_store_name, vector_store_type)
 
 
 class VectorStoreConnector:
@@ -18,8 +140,12 @@ class VectorStoreConnector:
         Args:
             - vector_store_type: vector store type Milvus, Chroma, Weaviate
             - ctx: vector store config params.
+
+        The client of the vector store is shared with the other connectors of the same
+        (vector_store_type, vector_store_name, embedding model).
         """
         self.ctx = ctx
+        self.vector_store_type = vector_store_type
         self._register()
 
         if self._match(vector_store_type):
@@ -27,8 +153,9 @@ class VectorStoreConnector:
         else:
             raise Exception(f"Vector Type Not support. {0}", vector_store_type)
 
-        print(self.connector_class)
-        self.client = self.connector_class(ctx)
+        self.client = get_vector_store_pool().get_client(
+            vector_store_type, ctx, lambda: self.connector_class(ctx)
+        )
 
     def load_document(self, docs):
         """load document in vector database."""
@@ -42,6 +169,17 @@ class VectorStoreConnector:
         """
         return self.client.similar_search(doc, topk)
 
+    def similar_search_with_scores(
+        self, doc: str, topk: int, score_threshold: float = 0.0
+    ):
+        """similar search with relevance scores in vector database.
+        Args:
+           - doc: query text
+           - topk: topk
+           - score_threshold: the documents with lower relevance score are dropped
+        """
+        return self.client.similar_search_with_scores(doc, topk, score_threshold)
+
     def vector_name_exists(self):
         """is vector store name exist."""
         return self.client.vector_name_exists()
@@ -51,7 +189,11 @@ class VectorStoreConnector:
         Args:
             - vector_name: vector store name
         """
-        return self.client.delete_vector_name(vector_name)
+        try:
+            return self.client.delete_vector_name(vector_name)
+        finally:
+            # The clients of the deleted vector store are stale
+            invalidate_vector_store(vector_name, self.vector_store_type)
 
     def delete_by_ids(self, ids):
         """vector store delete by ids.
@@ -67,7 +209,19 @@ class VectorStoreConnector:
             return False
 
     def _register(self):
-        for cls in vector_store.__all__:
-            if issubclass(getattr(vector_store, cls), VectorStoreBase):
-                _k, _v = cls, getattr(vector_store, cls)
-                connector.update({_k: _v})
+        if connector:
+            return
+        with _register_lock:
+            if connector:
+                return
+            registered = {}
+            for cls in vector_store.__all__:
+                try:
+                    store_cls = getattr(vector_store, cls)
+                except ImportError as e:
+                    # The client package of the vector store is not installed
+                    logger.warning(f"Vector store {cls} is not available: {str(e)}")
+                    continue
+                if issubclass(store_cls, VectorStoreBase):
+                    registered.update({cls: store_cls})
+            connector.update(registered)
@@ -0,0 +1,828 @@
+"""Dependency-light vector store in local files, only numpy and sqlite3 are needed.
+
+Layout of a vector store::
+
+    <vector_store_name>.localvec/
+        meta.db               SQLite, the content, metadata and position of every vector
+        segment_000001.vec    Matrix of normalized float32/float16 vectors, one per row
+        segment_000002.vec
+        ...
+
+The vectors are appended to the active segment and the segment is sealed when it has
+`segment_rows` rows, so loading documents never rewrites the stored vectors. The
+segments are memory-mapped for search:
+
+1. Spaces with less than `ivf_threshold` vectors are searched exactly, the blocks of a
+   segment are scored with one matrix product.
+2. Larger spaces build an IVF index (k-means lists of the vectors) in background and
+   only the `nprobe` nearest lists are scored, the vectors appended after the index is
+   built are searched exactly.
+
+Deleted vectors are tombstones, a sealed segment with many tombstones is rewritten
+without them in background. The files are shared by all stores of the same directory
+in the process, they should not be written by other processes.
+"""
+from __future__ import annotations
+
+import json
+import logging
+import os
+import shutil
+import sqlite3
+import threading
+import weakref
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from pilot.configs.config import Config
+from pilot.vector_store.base import VectorStoreBase
+
+logger = logging.getLogger(__name__)
+CFG = Config()
+
+# Rows scored in one matrix product
+_BLOCK_ROWS = 4096
+# Max number of host parameters in one sqlite statement
+_SQLITE_MAX_VARIABLES = 500
+# A sealed segment is compacted when this ratio of its rows are deleted
+_COMPACT_DELETED_RATIO = 0.3
+# The IVF index is rebuilt when this ratio of the vectors are not indexed
+_IVF_REBUILD_RATIO = 0.2
+_KMEANS_ITERATIONS = 10
+_KMEANS_SAMPLES_PER_LIST = 64
+
+# Compaction and index builds of all stores
+_maintenance_executor = ThreadPoolExecutor(
+    max_workers=1, thread_name_prefix="local_vector_store"
+)
+
+
+def _normalize(vectors: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+
+def _top_k(scores: np.ndarray, k: int) -> np.ndarray:
+    """The indexes of the k largest scores, in descending order"""
+    if k < len(scores):
+        indexes = np.argpartition(-scores, k - 1)[:k]
+    else:
+        indexes = np.arange(len(scores))
+    return indexes[np.argsort(-scores[indexes], kind="stable")]
+
+
+class _Segment:
+    """A file of vectors, the in-memory arrays map every row to its sqlite id and
+    tombstone"""
+
+    def __init__(
+        self,
+        segment_id: int,
+        path: str,
+        dim: int,
+        dtype: np.dtype,
+        row_ids: np.ndarray,
+        deleted: np.ndarray,
+        sealed: bool,
+    ) -> None:
+        self.segment_id = segment_id
+        self.path = path
+        self.dim = dim
+        self.dtype = dtype
+        # Replaced (not resized) on append, so a search can keep using the old arrays
+        self.row_ids = row_ids
+        self.deleted = deleted
+        self.sealed = sealed
+        self._matrix: Optional[np.ndarray] = None
+
+    @property
+    def rows(self) -> int:
+        return len(self.row_ids)
+
+    @property
+    def live_rows(self) -> int:
+        return self.rows - int(self.deleted.sum())
+
+    def matrix(self) -> np.ndarray:
+        rows = self.rows
+        matrix = self._matrix
+        if matrix is None or len(matrix) < rows:
+            if rows == 0:
+                return np.zeros((0, self.dim), dtype=self.dtype)
+            matrix = np.memmap(
+                self.path, dtype=self.dtype, mode="r", shape=(rows, self.dim)
+            )
+            self._matrix = matrix
+        return matrix
+
+    def append(self, vectors: np.ndarray, row_ids: np.ndarray) -> None:
+        with open(self.path, "ab") as f:
+            f.write(np.ascontiguousarray(vectors, dtype=self.dtype).tobytes())
+        self.row_ids = np.concatenate([self.row_ids, row_ids])
+        self.deleted = np.concatenate(
+            [self.deleted, np.zeros(len(row_ids), dtype=bool)]
+        )
+
+
+class _IvfIndex:
+    """Inverted lists of the vectors, a vector is keyed by its segment and row"""
+
+    def __init__(
+        self,
+        centroids: np.ndarray,
+        lists: List[Tuple[np.ndarray, np.ndarray]],
+        indexed_rows: Dict[int, int],
+        layout_version: int,
+    ) -> None:
+        self.centroids = centroids
+        self.lists = lists
+        # Rows of every segment when the index is built
+        self.indexed_rows = indexed_rows
+        self.layout_version = layout_version
+
+    @property
+    def size(self) -> int:
+        return sum(self.indexed_rows.values())
+
+
+class LocalVectorIndex:
+    """Vectors of one store directory.
+
+    Args:
+        path: The store directory.
+        dtype: float32 or float16, the type of the stored vectors.
+        segment_rows: Rows of a segment before it is sealed.
+        ivf_threshold: Number of vectors to build an IVF index, 0 to always search
+            exactly.
+        nprobe: Number of IVF lists searched for a query.
+        background: Compact and build the index in background, otherwise call
+            `maintain` to do it.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        dtype: str = "float32",
+        segment_rows: int = 65536,
+        ivf_threshold: int = 50000,
+        nprobe: int = 16,
+        background: bool = True,
+    ) -> None:
+        os.makedirs(path, exist_ok=True)
+        self.path = path
+        self.segment_rows = max(segment_rows, 1)
+        self.ivf_threshold = ivf_threshold
+        self.nprobe = max(nprobe, 1)
+        self.background = background
+        self._lock = threading.RLock()
+        self._segments: Dict[int, _Segment] = {}
+        self._ivf: Optional[_IvfIndex] = None
+        self._layout_version = 0
+        self._maintenance_pending = False
+        self._closed = False
+        self._conn = sqlite3.connect(
+            os.path.join(path, "meta.db"), check_same_thread=False
+        )
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS store_info (key TEXT PRIMARY KEY, value TEXT);
+            CREATE TABLE IF NOT EXISTS segments (
+                segment_id INTEGER PRIMARY KEY, sealed INTEGER NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS vectors (
+                id INTEGER PRIMARY KEY,
+                doc_id TEXT NOT NULL,
+                segment_id INTEGER NOT NULL,
+                row_offset INTEGER NOT NULL,
+                content TEXT,
+                metadata TEXT,
+                deleted INTEGER NOT NULL DEFAULT 0
+            );
+            CREATE INDEX IF NOT EXISTS idx_vectors_doc_id ON vectors (doc_id);
+            CREATE INDEX IF NOT EXISTS idx_vectors_position
+                ON vectors (segment_id, row_offset);
+            """
+        )
+        self._conn.commit()
+        info = dict(self._conn.execute("SELECT key, value FROM store_info").fetchall())
+        # The type of the stored vectors can't be changed
+        self.dtype = np.dtype(info.get("dtype", dtype))
+        if self.dtype not in (np.float32, np.float16):
+            raise ValueError(f"Unsupported vector dtype {self.dtype}")
+        self.dim = int(info["dim"]) if "dim" in info else None
+        self._next_id = (
+            self._conn.execute("SELECT max(id) FROM vectors").fetchone()[0] or 0
+        ) + 1
+        self._load_segments()
+
+    def _segment_path(self, segment_id: int) -> str:
+        return os.path.join(self.path, f"segment_{segment_id:06d}.vec")
+
+    def _load_segments(self) -> None:
+        for segment_id, sealed in self._conn.execute(
+            "SELECT segment_id, sealed FROM segments ORDER BY segment_id"
+        ).fetchall():
+            rows = self._conn.execute(
+                "SELECT id, deleted FROM vectors WHERE segment_id=? ORDER BY row_offset",
+                [segment_id],
+            ).fetchall()
+            row_ids = np.array([row[0] for row in rows], dtype=np.int64)
+            deleted = np.array([bool(row[1]) for row in rows], dtype=bool)
+            path = self._segment_path(segment_id)
+            # Drop the vectors written by an interrupted append
+            size = len(row_ids) * self.dim * self.dtype.itemsize if self.dim else 0
+            if not os.path.exists(path) or os.path.getsize(path) < size:
+                raise ValueError(f"Segment file {path} is broken")
+            if os.path.getsize(path) > size:
+                with open(path, "r+b") as f:
+                    f.truncate(size)
+            self._segments[segment_id] = _Segment(
+                segment_id, path, self.dim, self.dtype, row_ids, deleted, bool(sealed)
+            )
+        if self.count() >= self.ivf_threshold > 0:
+            self._schedule_maintenance()
+
+    def count(self) -> int:
+        """Number of the vectors not deleted"""
+        with self._lock:
+            return sum(segment.live_rows for segment in self._segments.values())
+
+    def add(
+        self,
+        doc_ids: Sequence[str],
+        vectors: np.ndarray,
+        contents: Sequence[str],
+        metadatas: Sequence[Optional[Dict]],
+    ) -> None:
+        """Append the vectors, the previous vectors of the same doc ids are deleted"""
+        vectors = np.asarray(vectors, dtype=np.float32)
+        if len(doc_ids) == 0:
+            return
+        if vectors.ndim != 2 or len(vectors) != len(doc_ids):
+            raise ValueError("Every document needs one vector")
+        vectors = _normalize(vectors).astype(self.dtype)
+        with self._lock:
+            self._check_open()
+            if self.dim is None:
+                self.dim = vectors.shape[1]
+                self._conn.executemany(
+                    "INSERT INTO store_info(key, value) VALUES (?, ?)",
+                    [("dim", str(self.dim)), ("dtype", self.dtype.name)],
+                )
+            elif vectors.shape[1] != self.dim:
+                raise ValueError(
+                    f"Vector dimension {vectors.shape[1]} does not match the store dimension {self.dim}"
+                )
+            self._delete(doc_ids)
+            start = 0
+            while start < len(doc_ids):
+                segment = self._active_segment()
+                end = min(start + self.segment_rows - segment.rows, len(doc_ids))
+                self._append(
+                    segment,
+                    doc_ids[start:end],
+                    vectors[start:end],
+                    contents[start:end],
+                    metadatas[start:end],
+                )
+                start = end
+            self._conn.commit()
+        self._schedule_maintenance()
+
+    def _active_segment(self) -> _Segment:
+        for segment in self._segments.values():
+            if not segment.sealed:
+                return segment
+        segment_id = max(self._segments, default=0) + 1
+        self._conn.execute(
+            "INSERT INTO segments(segment_id, sealed) VALUES (?, 0)", [segment_id]
+        )
+        path = self._segment_path(segment_id)
+        open(path, "wb").close()
+        segment = _Segment(
+            segment_id,
+            path,
+            self.dim,
+            self.dtype,
+            np.zeros(0, dtype=np.int64),
+            np.zeros(0, dtype=bool),
+            sealed=False,
+        )
+        self._segments[segment_id] = segment
+        return segment
+
+    def _append(self, segment: _Segment, doc_ids, vectors, contents, metadatas):
+        row_ids = np.arange(self._next_id, self._next_id + len(doc_ids))
+        self._conn.executemany(
+            "INSERT INTO vectors(id, doc_id, segment_id, row_offset, content, metadata) VALUES (?, ?, ?, ?, ?, ?)",
+            [
+                (
+                    int(row_id),
+                    doc_id,
+                    segment.segment_id,
+                    segment.rows + i,
+                    content,
+                    json.dumps(metadata or {}, ensure_ascii=False),
+                )
+                for i, (row_id, doc_id, content, metadata) in enumerate(
+                    zip(row_ids, doc_ids, contents, metadatas)
+                )
+            ],
+        )
+        # The vectors are written before the rows are committed, the vectors of the
+        # rows not committed are dropped when the store is opened again
+        segment.append(vectors, row_ids)
+        self._next_id += len(doc_ids)
+        if segment.rows >= self.segment_rows:
+            segment.sealed = True
+            self._conn.execute(
+                "UPDATE segments SET sealed=1 WHERE segment_id=?",
+                [segment.segment_id],
+            )
+
+    def delete(self, doc_ids: Sequence[str]) -> int:
+        """Mark the vectors of the doc ids deleted, return the number of them"""
+        with self._lock:
+            self._check_open()
+            deleted = self._delete(doc_ids)
+            self._conn.commit()
+        if deleted:
+            self._schedule_maintenance()
+        return deleted
+
+    def _delete(self, doc_ids: Sequence[str]) -> int:
+        deleted = 0
+        doc_ids = list(doc_ids)
+        for i in range(0, len(doc_ids), _SQLITE_MAX_VARIABLES):
+            chunk = doc_ids[i : i + _SQLITE_MAX_VARIABLES]
+            placeholders = ",".join("?" * len(chunk))
+            rows = self._conn.execute(
+                f"SELECT segment_id, row_offset FROM vectors WHERE deleted=0 AND doc_id IN ({placeholders})",
+                chunk,
+            ).fetchall()
+            if not rows:
+                continue
+            self._conn.execute(
+                f"UPDATE vectors SET deleted=1 WHERE deleted=0 AND doc_id IN ({placeholders})",
+                chunk,
+            )
+            for segment_id, row_offset in rows:
+                self._segments[segment_id].deleted[row_offset] = True
+            deleted += len(rows)
+        return deleted
+
+    def search(
+        self, query: np.ndarray, topk: int, filters: Optional[Dict[str, Any]] = None
+    ) -> List[Tuple[str, str, Dict, float]]:
+        """The (doc_id, content, metadata, cosine similarity) of the nearest vectors
+
+        Args:
+            query: The query vector.
+            topk: Number of the results.
+            filters: Only the vectors whose metadata has these values are searched.
+        """
+        if topk <= 0:
+            return []
+        with self._lock:
+            self._check_open()
+            if self.dim is None:
+                return []
+            segments = list(self._segments.values())
+            ivf = self._ivf
+            if ivf is not None and ivf.layout_version != self._layout_version:
+                ivf = None
+            positions = self._filter_positions(filters) if filters else None
+        query = _normalize(np.asarray(query, dtype=np.float32).reshape(-1))
+        if query.shape[0] != self.dim:
+            raise ValueError(
+                f"Query dimension {query.shape[0]} does not match the store dimension {self.dim}"
+            )
+        if positions is not None:
+            candidates = self._score_positions(segments, positions, query)
+        elif ivf is not None:
+            candidates = self._search_ivf(segments, ivf, query, topk)
+        else:
+            candidates = [
+                self._search_flat(segment, 0, query, topk) for segment in segments
+            ]
+        scores = np.concatenate([c[0] for c in candidates] or [np.zeros(0)])
+        row_ids = np.concatenate(
+            [c[1] for c in candidates] or [np.zeros(0, dtype=np.int64)]
+        )
+        best = _top_k(scores, topk)
+        return self._fetch(row_ids[best], scores[best])
+
+    def _search_flat(
+        self, segment: _Segment, start: int, query: np.ndarray, topk: int
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        row_ids, deleted = segment.row_ids, segment.deleted
+        matrix = segment.matrix()
+        scores, ids = [], []
+        for block_start in range(start, len(row_ids), _BLOCK_ROWS):
+            block_end = min(block_start + _BLOCK_ROWS, len(row_ids))
+            block_scores = (
+                matrix[block_start:block_end].astype(np.float32, copy=False) @ query
+            )
+            block_scores[deleted[block_start:block_end]] = -np.inf
+            best = _top_k(block_scores, topk)
+            best = best[np.isfinite(block_scores[best])]
+            scores.append(block_scores[best])
+            ids.append(row_ids[block_start:block_end][best])
+        if not scores:
+            return np.zeros(0, dtype=np.float32), np.zeros(0, dtype=np.int64)
+        return np.concatenate(scores), np.concatenate(ids)
+
+    def _score_rows(
+        self, segment: _Segment, offsets: np.ndarray, query: np.ndarray
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        offsets = offsets[offsets < len(segment.row_ids)]
+        offsets = offsets[~segment.deleted[offsets]]
+        if len(offsets) == 0:
+            return np.zeros(0, dtype=np.float32), np.zeros(0, dtype=np.int64)
+        offsets = np.sort(offsets)
+        scores = segment.matrix()[offsets].astype(np.float32, copy=False) @ query
+        return scores, segment.row_ids[offsets]
+
+    def _score_positions(
+        self,
+        segments: List[_Segment],
+        positions: Dict[int, np.ndarray],
+        query: np.ndarray,
+    ) -> List[Tuple[np.ndarray, np.ndarray]]:
+        return [
+            self._score_rows(segment, positions[segment.segment_id], query)
+            for segment in segments
+            if segment.segment_id in positions
+        ]
+
+    def _search_ivf(
+        self, segments: List[_Segment], ivf: _IvfIndex, query: np.ndarray, topk: int
+    ) -> List[Tuple[np.ndarray, np.ndarray]]:
+        probes = _top_k(ivf.centroids @ query, self.nprobe)
+        segment_ids = np.concatenate([ivf.lists[i][0] for i in probes])
+        offsets = np.concatenate([ivf.lists[i][1] for i in probes])
+        positions = {
+            int(segment_id): offsets[segment_ids == segment_id]
+            for segment_id in np.unique(segment_ids)
+        }
+        candidates = self._score_positions(segments, positions, query)
+        # The vectors appended after the index is built
+        for segment in segments:
+            start = ivf.indexed_rows.get(segment.segment_id, 0)
+            if start < segment.rows:
+                candidates.append(self._search_flat(segment, start, query, topk))
+        return candidates
+
+    def _filter_positions(self, filters: Dict[str, Any]) -> Dict[int, np.ndarray]:
+        sql = "SELECT segment_id, row_offset FROM vectors WHERE deleted=0"
+        params = []
+        for key, value in filters.items():
+            sql += " AND json_extract(metadata, ?) = ?"
+            params += [f'$."{key}"', value]
+        positions: Dict[int, List[int]] = {}
+        for segment_id, row_offset in self._conn.execute(sql, params).fetchall():
+            positions.setdefault(segment_id, []).append(row_offset)
+        return {
+            segment_id: np.array(offsets, dtype=np.int64)
+            for segment_id, offsets in positions.items()
+        }
+
+    def _fetch(
+        self, row_ids: np.ndarray, scores: np.ndarray
+    ) -> List[Tuple[str, str, Dict, float]]:
+        if len(row_ids) == 0:
+            return []
+        placeholders = ",".join("?" * len(row_ids))
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT id, doc_id, content, metadata FROM vectors WHERE id IN ({placeholders})",
+                [int(row_id) for row_id in row_ids],
+            ).fetchall()
+        details = {row[0]: row[1:] for row in rows}
+        results = []
+        for row_id, score in zip(row_ids, scores):
+            detail = details.get(int(row_id))
+            if detail:
+                doc_id, content, metadata = detail
+                results.append(
+                    (doc_id, content, json.loads(metadata or "{}"), float(score))
+                )
+        return results
+
+    def _schedule_maintenance(self) -> None:
+        if not self.background:
+            return
+        with self._lock:
+            if self._maintenance_pending or self._closed:
+                return
+            self._maintenance_pending = True
+        _maintenance_executor.submit(self._run_maintenance)
+
+    def _run_maintenance(self) -> None:
+        with self._lock:
+            self._maintenance_pending = False
+        try:
+            self.maintain()
+        except Exception as e:
+            logger.warning(f"Maintain local vector store {self.path} error: {str(e)}")
+
+    def maintain(self) -> None:
+        """Compact the sealed segments with many deleted vectors and build the IVF
+        index if needed"""
+        with self._lock:
+            if self._closed:
+                return
+            for segment in list(self._segments.values()):
+                if (
+                    segment.sealed
+                    and segment.rows
+                    and segment.rows - segment.live_rows
+                    >= segment.rows * _COMPACT_DELETED_RATIO
+                ):
+                    self._compact(segment)
+        if self._need_ivf():
+            self.build_ivf()
+
+    def _compact(self, segment: _Segment) -> None:
+        live = np.nonzero(~segment.deleted)[0]
+        self._conn.execute(
+            "DELETE FROM vectors WHERE segment_id=? AND deleted=1",
+            [segment.segment_id],
+        )
+        self._conn.execute(
+            "DELETE FROM segments WHERE segment_id=?", [segment.segment_id]
+        )
+        if len(live):
+            segment_id = max(self._segments) + 1
+            path = self._segment_path(segment_id)
+            with open(path, "wb") as f:
+                for block_start in range(0, len(live), _BLOCK_ROWS):
+                    block = live[block_start : block_start + _BLOCK_ROWS]
+                    f.write(np.ascontiguousarray(segment.matrix()[block]).tobytes())
+            self._conn.execute(
+                "INSERT INTO segments(segment_id, sealed) VALUES (?, 1)", [segment_id]
+            )
+            self._conn.executemany(
+                "UPDATE vectors SET segment_id=?, row_offset=? WHERE id=?",
+                [
+                    (segment_id, new_offset, int(row_id))
+                    for new_offset, row_id in enumerate(segment.row_ids[live])
+                ],
+            )
+            self._segments[segment_id] = _Segment(
+                segment_id,
+                path,
+                self.dim,
+                self.dtype,
+                segment.row_ids[live],
+                np.zeros(len(live), dtype=bool),
+                sealed=True,
+            )
+        self._conn.commit()
+        del self._segments[segment.segment_id]
+        # The positions of the index are changed
+        self._layout_version += 1
+        try:
+            os.remove(segment.path)
+        except OSError as e:
+            logger.warning(f"Remove compacted segment {segment.path} error: {str(e)}")
+        logger.info(
+            f"Compact segment {segment.segment_id} of {self.path}, {len(live)} of {segment.rows} vectors kept"
+        )
+
+    def _need_ivf(self) -> bool:
+        with self._lock:
+            if self.ivf_threshold <= 0 or self.count() < self.ivf_threshold:
+                return False
+            ivf = self._ivf
+            if ivf is None or ivf.layout_version != self._layout_version:
+                return True
+            total = sum(segment.rows for segment in self._segments.values())
+            return total - ivf.size > ivf.size * _IVF_REBUILD_RATIO
+
+    def build_ivf(self) -> None:
+        """Build the IVF index of the current vectors, the store can be searched and
+        written while it is building"""
+        with self._lock:
+            segments = [(segment, segment.rows) for segment in self._segments.values()]
+            layout_version = self._layout_version
+        total = sum(rows for _, rows in segments)
+        if total == 0:
+            return
+        n_lists = int(min(max(np.sqrt(total), 1), 4096))
+        rng = np.random.default_rng(0)
+        sample_size = min(total, n_lists * _KMEANS_SAMPLES_PER_LIST)
+        sample_positions = np.sort(rng.choice(total, size=sample_size, replace=False))
+        samples, start = [], 0
+        for segment, rows in segments:
+            offsets = sample_positions[
+                (sample_positions >= start) & (sample_positions < start + rows)
+            ]
+            samples.append(
+                segment.matrix()[offsets - start].astype(np.float32, copy=False)
+            )
+            start += rows
+        centroids = self._kmeans(np.concatenate(samples), n_lists, rng)
+
+        list_segments = [[] for _ in range(n_lists)]
+        list_offsets = [[] for _ in range(n_lists)]
+        for segment, rows in segments:
+            matrix = segment.matrix()
+            for block_start in range(0, rows, _BLOCK_ROWS):
+                block_end = min(block_start + _BLOCK_ROWS, rows)
+                assignments = np.argmax(
+                    matrix[block_start:block_end].astype(np.float32, copy=False)
+                    @ centroids.T,
+                    axis=1,
+                )
+                order = np.argsort(assignments, kind="stable")
+                bounds = np.searchsorted(assignments[order], np.arange(n_lists + 1))
+                for i in range(n_lists):
+                    offsets = order[bounds[i] : bounds[i + 1]] + block_start
+                    if len(offsets):
+                        list_offsets[i].append(offsets)
+                        list_segments[i].append(
+                            np.full(len(offsets), segment.segment_id)
+                        )
+        lists = [
+            (
+                np.concatenate(list_segments[i] or [np.zeros(0, dtype=np.int64)]),
+                np.concatenate(list_offsets[i] or [np.zeros(0, dtype=np.int64)]),
+            )
+            for i in range(n_lists)
+        ]
+        ivf = _IvfIndex(
+            centroids,
+            lists,
+            {segment.segment_id: rows for segment, rows in segments},
+            layout_version,
+        )
+        with self._lock:
+            if layout_version != self._layout_version:
+                # Compacted while building, built again by the next maintenance
+                self._schedule_maintenance()
+                return
+            self._ivf = ivf
+        logger.info(f"Build IVF index of {self.path}, {total} vectors, {n_lists} lists")
+
+    @staticmethod
+    def _kmeans(samples: np.ndarray, n_lists: int, rng) -> np.ndarray:
+        """Spherical k-means, the centroids are normalized"""
+        n_lists = min(n_lists, len(samples))
+        centroids = samples[rng.choice(len(samples), size=n_lists, replace=False)]
+        for _ in range(_KMEANS_ITERATIONS):
+            assignments = np.argmax(samples @ centroids.T, axis=1)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, assignments, samples)
+            empty = np.bincount(assignments, minlength=n_lists) == 0
+            # Reseed the empty lists with random samples
+            sums[empty] = samples[rng.choice(len(samples), size=int(empty.sum()))]
+            centroids = _normalize(sums)
+        return centroids
+
+    def _check_open(self) -> None:
+        if self._closed:
+            raise ValueError(f"Local vector store {self.path} is closed")
+
+    def close(self) -> None:
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+            self._segments.clear()
+            self._ivf = None
+            self._conn.close()
+
+
+_indexes: "weakref.WeakValueDictionary[str, LocalVectorIndex]" = (
+    weakref.WeakValueDictionary()
+)
+_indexes_lock = threading.Lock()
+
+
+def _open_index(path: str, **kwargs) -> LocalVectorIndex:
+    """The stores of the same directory share one index in the process"""
+    path = os.path.realpath(path)
+    with _indexes_lock:
+        index = _indexes.get(path)
+        if index is None or index._closed:
+            index = LocalVectorIndex(path, **kwargs)
+            _indexes[path] = index
+        return index
+
+
+def _drop_index(path: str) -> None:
+    path = os.path.realpath(path)
+    with _indexes_lock:
+        index = _indexes.pop(path, None)
+        if index is not None:
+            index.close()
+        if os.path.exists(path):
+            shutil.rmtree(path)
+
+
+class LocalStore(VectorStoreBase):
+    """Vector store in local files"""
+
+    def __init__(self, ctx: dict) -> None:
+        self.ctx = ctx
+        self.vector_name = ctx["vector_store_name"]
+        self.embeddings = ctx.get("embeddings", None)
+        store_path = ctx.get("LOCAL_VECTOR_STORE_PATH", CFG.LOCAL_VECTOR_STORE_PATH)
+        if not store_path:
+            store_path = os.path.join(
+                os.path.dirname(os.path.dirname(__file__)), "data"
+            )
+        self.persist_dir = os.path.join(store_path, self.vector_name + ".localvec")
+        self.index_params = {
+            "dtype": ctx.get("LOCAL_VECTOR_STORE_DTYPE", CFG.LOCAL_VECTOR_STORE_DTYPE),
+            "segment_rows": int(
+                ctx.get(
+                    "LOCAL_VECTOR_STORE_SEGMENT_ROWS",
+                    CFG.LOCAL_VECTOR_STORE_SEGMENT_ROWS,
+                )
+            ),
+            "ivf_threshold": int(
+                ctx.get(
+                    "LOCAL_VECTOR_STORE_IVF_THRESHOLD",
+                    CFG.LOCAL_VECTOR_STORE_IVF_THRESHOLD,
+                )
+            ),
+            "nprobe": int(
+                ctx.get("LOCAL_VECTOR_STORE_NPROBE", CFG.LOCAL_VECTOR_STORE_NPROBE)
+            ),
+        }
+        self._index: Optional[LocalVectorIndex] = None
+
+    @property
+    def index(self) -> LocalVectorIndex:
+        if self._index is None or self._index._closed:
+            self._index = _open_index(self.persist_dir, **self.index_params)
+        return self._index
+
+    def load_document(self, documents) -> List[str]:
+        logger.info("LocalStore load document")
+        return self._load_document_batches(documents, self._upsert_batch)
+
+    def _upsert_batch(self, documents, ids):
+        # The index replaces the vectors of the same doc ids
+        texts = [doc.page_content for doc in documents]
+        vectors = np.array(self.embeddings.embed_documents(texts), dtype=np.float32)
+        self.index.add(ids, vectors, texts, [doc.metadata for doc in documents])
+
+    def similar_search(
+        self, text, topk, filters: Optional[Dict[str, Any]] = None, **kwargs: Any
+    ):
+        """Similar search of the text
+
+        Args:
+            text: The query text.
+            topk: Number of the documents.
+            filters: Only the documents whose metadata has these values are returned.
+        """
+        logger.info("LocalStore similar search")
+        return [
+            doc
+            for doc, _ in self.similar_search_with_scores(text, topk, filters=filters)
+        ]
+
+    def similar_search_with_scores(
+        self,
+        text,
+        topk,
+        score_threshold: float = 0.0,
+        filters: Optional[Dict[str, Any]] = None,
+    ):
+        from langchain.schema import Document
+
+        if not self.vector_name_exists():
+            return []
+        query = np.array(self.embeddings.embed_query(text), dtype=np.float32)
+        return [
+            (Document(page_content=content, metadata=metadata), score)
+            for _, content, metadata, score in self.index.search(query, topk, filters)
+            if score >= score_threshold
+        ]
+
+    def vector_name_exists(self) -> bool:
+        if not os.path.exists(os.path.join(self.persist_dir, "meta.db")):
+            return False
+        return self.index.count() > 0
+
+    def delete_vector_name(self, vector_name):
+        logger.info(f"local vector store {vector_name} begin delete...")
+        _drop_index(self.persist_dir)
+        self._index = None
+        return True
+
+    def delete_by_ids(self, ids):
+        logger.info(f"begin delete local vector store ids...")
+        if isinstance(ids, str):
+            ids = ids.split(",")
+        if not os.path.exists(os.path.join(self.persist_dir, "meta.db")):
+            return 0
+        return self.index.delete(ids)
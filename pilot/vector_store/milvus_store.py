@@ -1,4 +1,5 @@
 from __future__ import annotations
+import json
 import logging
 import os
 from typing import Any, Iterable, List, Optional, Tuple
@@ -12,6 +13,8 @@ logger = logging.getLogger(__name__)
 class MilvusStore(VectorStoreBase):
     """Milvus database"""
 
+    support_parallel_batches = True
+
     def __init__(self, ctx: {}) -> None:
         from pymilvus import Collection, DataType, connections, utility
 
@@ -55,6 +58,7 @@ class MilvusStore(VectorStoreBase):
         self.primary_field = "pk_id"
         self.vector_field = "vector"
         self.text_field = "content"
+        self.content_id_field = "content_id"
 
         if (self.username is None) != (self.password is None):
             raise ValueError(
@@ -71,11 +75,12 @@ class MilvusStore(VectorStoreBase):
             # secure=self.secure,
         )
 
-    def init_schema_and_load(self, vector_name, documents):
+    def init_schema_and_load(self, vector_name, documents, content_ids=None):
         """Create a Milvus collection, indexes it with HNSW, load document.
         Args:
             vector_name (Embeddings): your collection name.
             documents (List[str]): Text to insert.
+            content_ids (List[str]): The content hash ids of the documents.
         Returns:
             VectorStore: The MilvusStore vector store.
         """
@@ -103,15 +108,14 @@ class MilvusStore(VectorStoreBase):
             )
         texts = [d.page_content for d in documents]
         metadatas = [d.metadata for d in documents]
-        embeddings = self.embedding.embed_query(texts[0])
 
         if utility.has_collection(self.collection_name):
-            self.col = Collection(self.collection_name, using=self.alias)
-            self.fields = []
-            for x in self.col.schema.fields:
-                self.fields.append(x.name)
-                if x.auto_id:
-                    self.fields.remove(x.name)
+            # The batches may be loaded concurrently, the fields are replaced at once
+            col = Collection(self.collection_name, using=self.alias)
+            fields = []
+            for x in col.schema.fields:
+                if not x.auto_id:
+                    fields.append(x.name)
                 if x.is_primary:
                     self.primary_field = x.name
                 if (
@@ -119,9 +123,12 @@ class MilvusStore(VectorStoreBase):
                     or x.dtype == DataType.BINARY_VECTOR
                 ):
                     self.vector_field = x.name
-            return self._add_documents(texts, metadatas)
+            self.col = col
+            self.fields = fields
+            return self._add_documents(texts, metadatas, content_ids=content_ids)
             # return self.collection_name
 
+        embeddings = self.embedding.embed_query(texts[0])
         dim = len(embeddings)
         # Generate unique names
         primary_field = self.primary_field
@@ -135,6 +142,10 @@ class MilvusStore(VectorStoreBase):
             max_length = max(max_length, len(y))
         # Create the text field
         fields.append(FieldSchema(text_field, DataType.VARCHAR, max_length=65535))
+        # The content hash id, the documents of the same ids are replaced
+        fields.append(
+            FieldSchema(self.content_id_field, DataType.VARCHAR, max_length=64)
+        )
         # primary key field
         fields.append(
             FieldSchema(primary_field, DataType.INT64, is_primary=True, auto_id=True)
@@ -158,7 +169,7 @@ class MilvusStore(VectorStoreBase):
                 self.primary_field = x.name
             if x.dtype == DataType.FLOAT_VECTOR or x.dtype == DataType.BINARY_VECTOR:
                 self.vector_field = x.name
-        ids = self._add_documents(texts, metadatas)
+        ids = self._add_documents(texts, metadatas, content_ids=content_ids)
 
         return ids
 
@@ -223,9 +234,17 @@ class MilvusStore(VectorStoreBase):
         metadatas: Optional[List[dict]] = None,
         partition_name: Optional[str] = None,
         timeout: Optional[int] = None,
+        content_ids: Optional[List[str]] = None,
     ) -> List[str]:
         """add text data into Milvus."""
         insert_dict: Any = {self.text_field: list(texts)}
+        if self.content_id_field in self.fields:
+            # Upsert by the content ids, the collections created before the content id
+            # field can only append the documents
+            if content_ids is None:
+                raise ValueError("The content ids of the documents are required")
+            self.col.delete(f"{self.content_id_field} in {json.dumps(content_ids)}")
+            insert_dict[self.content_id_field] = content_ids
         try:
             insert_dict[self.vector_field] = self.embedding.embed_documents(list(texts))
         except NotImplementedError:
@@ -244,21 +263,19 @@ class MilvusStore(VectorStoreBase):
         res = self.col.insert(
             insert_list, partition_name=partition_name, timeout=timeout
         )
-        # make sure data is searchable.
-        self.col.flush()
         return res.primary_keys
 
-    def load_document(self, documents) -> None:
+    def load_document(self, documents) -> List[str]:
         """load document in vector database."""
-        # self.init_schema_and_load(self.collection_name, documents)
-        batch_size = 500
-        batched_list = [
-            documents[i : i + batch_size] for i in range(0, len(documents), batch_size)
-        ]
-        doc_ids = []
-        for doc_batch in batched_list:
-            doc_ids.extend(self.init_schema_and_load(self.collection_name, doc_batch))
-        doc_ids = [str(doc_id) for doc_id in doc_ids]
+        doc_ids = self._load_document_batches(
+            documents,
+            lambda docs, ids: self.init_schema_and_load(
+                self.collection_name, docs, ids
+            ),
+        )
+        if doc_ids:
+            # make sure data is searchable.
+            self.col.flush()
         return doc_ids
 
     def similar_search(self, text, topk) -> None:
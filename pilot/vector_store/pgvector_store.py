@@ -1,4 +1,4 @@
-from typing import Any
+from typing import Any, List
 import logging
 from pilot.vector_store.base import VectorStoreBase
 from pilot.configs.config import Config
@@ -14,6 +14,8 @@ class PGVectorStore(VectorStoreBase):
     To use this, you should have the ``pgvector`` python package installed.
     """
 
+    support_parallel_batches = True
+
     def __init__(self, ctx: dict) -> None:
         """init pgvector storage"""
 
@@ -33,6 +35,11 @@ class PGVectorStore(VectorStoreBase):
     def similar_search(self, text, topk, **kwargs: Any) -> None:
         return self.vector_store_client.similarity_search(text, topk)
 
+    def similar_search_with_scores(self, text, topk, score_threshold: float = 0.0):
+        return self.vector_store_client.similarity_search_with_relevance_scores(
+            text, topk, score_threshold=score_threshold
+        )
+
     def vector_name_exists(self):
         try:
             self.vector_store_client.create_collection()
@@ -41,11 +48,23 @@ class PGVectorStore(VectorStoreBase):
             logger.error("vector_name_exists error", e.message)
             return False
 
-    def load_document(self, documents) -> None:
-        return self.vector_store_client.from_documents(documents)
+    def load_document(self, documents) -> List[str]:
+        return self._load_document_batches(documents, self._upsert_batch)
+
+    def _upsert_batch(self, documents, ids):
+        # PGVector adds a new row for every id, the previous rows of the ids are
+        # deleted first
+        self.vector_store_client.delete(ids)
+        self.vector_store_client.add_texts(
+            texts=[doc.page_content for doc in documents],
+            metadatas=[doc.metadata for doc in documents],
+            ids=ids,
+        )
 
     def delete_vector_name(self, vector_name):
         return self.vector_store_client.delete_collection()
 
     def delete_by_ids(self, ids):
+        if isinstance(ids, str):
+            ids = ids.split(",")
         return self.vector_store_client.delete(ids)
@@ -1,5 +1,7 @@
 import os
 import logging
+from typing import List
+
 from langchain.schema import Document
 
 from pilot.configs.config import Config
@@ -120,24 +122,44 @@ class WeaviateStore(VectorStoreBase):
         # Create the schema in Weaviate
         self.vector_store_client.schema.create(schema)
 
-    def load_document(self, documents: list) -> None:
+    def load_document(self, documents: list) -> List[str]:
         """Load documents into Weaviate"""
         logger.info("Weaviate load document")
-        texts = [doc.page_content for doc in documents]
-        metadatas = [doc.metadata for doc in documents]
-
-        # Import data
-        with self.vector_store_client.batch as batch:
-            batch.batch_size = 100
-
-            # Batch import all documents
-            for i in range(len(texts)):
-                properties = {
-                    "metadata": metadatas[i]["source"],
-                    "page_content": texts[i],
-                }
-
-                self.vector_store_client.batch.add_data_object(
-                    data_object=properties, class_name=self.vector_name
-                )
-            self.vector_store_client.batch.flush()
+        if not self.vector_name_exists():
+            self._default_schema()
+        return self._load_document_batches(documents, self._upsert_batch)
+
+    def _upsert_batch(self, documents, ids):
+        # The objects of the same uuids are replaced
+        batch = self.vector_store_client.batch
+        for doc, doc_id in zip(documents, ids):
+            properties = {
+                "metadata": doc.metadata.get("source", ""),
+                "page_content": doc.page_content,
+            }
+            batch.add_data_object(
+                data_object=properties, class_name=self.vector_name, uuid=doc_id
+            )
+        results = batch.create_objects() or []
+        errors = [
+            result["result"]["errors"]
+            for result in results
+            if result.get("result", {}).get("errors")
+        ]
+        if errors:
+            raise ValueError(f"Weaviate batch import error: {errors[0]}")
+
+    def delete_vector_name(self, vector_name):
+        logger.info(f"weaviate vector_name:{vector_name} begin delete...")
+        self.vector_store_client.schema.delete_class(vector_name)
+        return True
+
+    def delete_by_ids(self, ids):
+        logger.info(f"begin delete weaviate ids...")
+        if isinstance(ids, str):
+            ids = ids.split(",")
+        for doc_id in ids:
+            self.vector_store_client.data_object.delete(
+                uuid=doc_id, class_name=self.vector_name
+            )
+        return True
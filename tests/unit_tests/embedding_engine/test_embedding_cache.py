@@ -0,0 +1,101 @@
+from typing import List
+
+import numpy as np
+import pytest
+from langchain.embeddings.base import Embeddings
+
+from pilot.embedding_engine.embedding_cache import (
+    CachedEmbeddings,
+    EmbeddingCache,
+    embedding_cache_key,
+)
+
+
+class MockEmbeddings(Embeddings):
+    def __init__(self) -> None:
+        self.embedded: List[str] = []
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        self.embedded.extend(texts)
+        return [[float(len(text)), 0.5, -1.0] for text in texts]
+
+    def embed_query(self, text: str) -> List[float]:
+        self.embedded.append(text)
+        return [float(len(text)), 1.5, 1.0]
+
+
+def test_embedding_cache_key():
+    assert embedding_cache_key("m1", "text") == embedding_cache_key("m1", "text")
+    assert embedding_cache_key("m1", "text") != embedding_cache_key("m2", "text")
+    assert embedding_cache_key("m1", "text") != embedding_cache_key(
+        "m1", "text", namespace="query"
+    )
+
+
+def test_cached_embed_documents():
+    mock = MockEmbeddings()
+    cache = EmbeddingCache(max_memory_entries=100)
+    embeddings = CachedEmbeddings("text2vec", mock, cache)
+
+    vectors = embeddings.embed_documents(["a", "bb", "a"])
+    assert vectors == [[1.0, 0.5, -1.0], [2.0, 0.5, -1.0], [1.0, 0.5, -1.0]]
+    # Duplicated texts are embedded once
+    assert mock.embedded == ["a", "bb"]
+
+    vectors = embeddings.embed_documents(["bb", "ccc"])
+    assert vectors == [[2.0, 0.5, -1.0], [3.0, 0.5, -1.0]]
+    assert mock.embedded == ["a", "bb", "ccc"]
+    stats = cache.stats()
+    assert stats["memory_hits"] == 1
+    assert stats["misses"] == 4
+
+
+def test_cached_embed_query():
+    mock = MockEmbeddings()
+    embeddings = CachedEmbeddings("text2vec", mock, EmbeddingCache())
+    assert embeddings.embed_query("abc") == [3.0, 1.5, 1.0]
+    assert embeddings.embed_query("abc") == [3.0, 1.5, 1.0]
+    # Query vectors are not shared with document vectors
+    assert embeddings.embed_documents(["abc"]) == [[3.0, 0.5, -1.0]]
+    assert mock.embedded == ["abc", "abc"]
+
+
+@pytest.mark.asyncio
+async def test_cached_async_embeddings():
+    mock = MockEmbeddings()
+    embeddings = CachedEmbeddings("text2vec", mock, EmbeddingCache())
+    assert await embeddings.aembed_documents(["a", "a"]) == [[1.0, 0.5, -1.0]] * 2
+    assert await embeddings.aembed_query("a") == [1.0, 1.5, 1.0]
+    assert await embeddings.aembed_query("a") == [1.0, 1.5, 1.0]
+    assert mock.embedded == ["a", "a"]
+
+
+def test_memory_lru_eviction():
+    cache = EmbeddingCache(max_memory_entries=2)
+    vector = np.ones(3, dtype=np.float32)
+    cache.put_many({"k1": vector, "k2": vector})
+    cache.get_many(["k1"])
+    cache.put_many({"k3": vector})
+    assert [v is not None for v in cache.get_many(["k1", "k2", "k3"])] == [
+        True,
+        False,
+        True,
+    ]
+
+
+def test_disk_tier(tmp_path):
+    disk_path = str(tmp_path / "embedding_cache.db")
+    mock = MockEmbeddings()
+    embeddings = CachedEmbeddings(
+        "text2vec", mock, EmbeddingCache(max_memory_entries=1, disk_path=disk_path)
+    )
+    texts = [f"text{i}" for i in range(1200)]
+    expected = embeddings.embed_documents(texts)
+
+    # A new cache (e.g. after restart) reads the vectors from disk
+    new_cache = EmbeddingCache(max_memory_entries=10, disk_path=disk_path)
+    new_mock = MockEmbeddings()
+    embeddings = CachedEmbeddings("text2vec", new_mock, new_cache)
+    assert embeddings.embed_documents(texts) == expected
+    assert not new_mock.embedded
+    assert new_cache.stats()["disk_hits"] == 1200
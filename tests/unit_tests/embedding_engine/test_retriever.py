@@ -0,0 +1,155 @@
+import zlib
+
+import numpy as np
+import pytest
+from langchain.schema import Document
+
+from pilot.embedding_engine import lexical_index
+from pilot.embedding_engine.lexical_index import (
+    LexicalIndex,
+    delete_chunks,
+    drop_lexical_index,
+    get_lexical_index,
+    index_chunks,
+    tokenize,
+)
+from pilot.embedding_engine.retriever import KnowledgeRetriever, reciprocal_rank_fusion
+from pilot.vector_store import connector as connector_module
+from pilot.vector_store.connector import VectorStoreClientPool, VectorStoreConnector
+
+
+class HashEmbeddings:
+    model_name = "hash"
+
+    def _embed(self, text):
+        vector = np.zeros(64, dtype=np.float32)
+        for word in tokenize(text):
+            vector[zlib.crc32(word.encode()) % 64] += 1.0
+        return vector.tolist()
+
+    def embed_documents(self, texts):
+        return [self._embed(text) for text in texts]
+
+    def embed_query(self, text):
+        return self._embed(text)
+
+
+_CHUNKS = [
+    "the user table stores the name and age of the users",
+    "the order table stores the orders of the users",
+    "error code E1024 means the disk of the database is full",
+    "the weather is sunny today",
+]
+
+
+@pytest.fixture
+def space(tmp_path, monkeypatch):
+    monkeypatch.setattr(connector_module, "_client_pool", VectorStoreClientPool(4))
+    monkeypatch.setattr(
+        lexical_index.CFG, "KNOWLEDGE_LEXICAL_INDEX_PATH", str(tmp_path / "lexical")
+    )
+    config = {
+        "vector_store_name": "space1",
+        "vector_store_type": "Local",
+        "embeddings": HashEmbeddings(),
+        "LOCAL_VECTOR_STORE_PATH": str(tmp_path / "vectors"),
+    }
+    docs = [
+        Document(page_content=c, metadata={"source": str(i)})
+        for i, c in enumerate(_CHUNKS)
+    ]
+    ids = VectorStoreConnector("Local", config).load_document(docs)
+    index_chunks("space1", ids, docs)
+    yield config, ids
+    drop_lexical_index("space1")
+
+
+def test_tokenize():
+    assert tokenize("Error code E1024, user_table") == [
+        "error",
+        "code",
+        "e1024",
+        "user",
+        "table",
+    ]
+    assert tokenize("数据库 表") == ["数据", "据库", "表"]
+
+
+def test_lexical_index(tmp_path):
+    index = LexicalIndex(str(tmp_path / "index.db"))
+    index.add(["1", "2", "3"], _CHUNKS[:3], [{"source": "a"}, None, None])
+    results = index.search("what is E1024?", 3)
+    assert [r[0] for r in results] == ["3"]
+    results = index.search("user table", 3)
+    assert results[0][0] == "1"
+    assert results[0][2] == {"source": "a"}
+    assert results[0][3] >= results[-1][3]
+    # The query syntax of FTS5 is escaped
+    assert index.search('user" OR (*', 1)[0][0] == "1"
+    assert index.search('"( *', 3) == []
+    # The chunks of the same ids are replaced
+    index.add(["2"], [_CHUNKS[3]], [None])
+    assert index.count() == 3
+    assert index.search("weather", 3)[0][0] == "2"
+    index.delete(["1"])
+    assert "1" not in [r[0] for r in index.search("user table", 3)]
+    assert index.count() == 2
+
+
+def test_reciprocal_rank_fusion():
+    fused = reciprocal_rank_fusion([["a", "b", "c"], ["c", "a"]])
+    assert [key for key, _ in fused] == ["a", "c", "b"]
+    assert fused[0][1] > fused[1][1] > fused[2][1]
+
+
+def test_hybrid_retrieve(space):
+    config, _ = space
+    retriever = KnowledgeRetriever(config, top_k=2, hybrid=True)
+    docs = retriever.retrieve("E1024")
+    assert docs[0].page_content == _CHUNKS[2]
+    assert docs[0].metadata == {"source": "2"}
+    assert len(docs) <= 2
+
+
+def test_score_threshold(space):
+    config, _ = space
+    retriever = KnowledgeRetriever(config, top_k=4, hybrid=False)
+    assert len(retriever.retrieve("user table")) == 4
+    retriever = KnowledgeRetriever(config, top_k=4, score_threshold=0.3, hybrid=False)
+    assert [doc.page_content for doc in retriever.retrieve("user table")] == [
+        _CHUNKS[0]
+    ]
+    # The unrelated chunks are not padded by the lexical search
+    retriever = KnowledgeRetriever(config, top_k=4, score_threshold=0.3)
+    assert _CHUNKS[3] not in [
+        doc.page_content for doc in retriever.retrieve("user table")
+    ]
+
+
+def test_rerank(space, monkeypatch):
+    config, _ = space
+
+    class ReverseReranker:
+        def rerank(self, query, texts):
+            return [float(i) for i in range(len(texts))]
+
+    from pilot.embedding_engine import retriever as retriever_module
+
+    monkeypatch.setattr(
+        retriever_module, "get_reranker", lambda model: ReverseReranker()
+    )
+    plain = KnowledgeRetriever(config, top_k=4, hybrid=False).retrieve("user table")
+    reranked = KnowledgeRetriever(
+        config, top_k=4, hybrid=False, rerank_model="fake"
+    ).retrieve("user table")
+    assert [d.page_content for d in reranked] == [
+        d.page_content for d in reversed(plain)
+    ]
+
+
+def test_delete_chunks(space):
+    config, ids = space
+    delete_chunks("space1", ",".join(ids[2:3]))
+    assert get_lexical_index("space1").search("E1024", 3) == []
+    drop_lexical_index("space1")
+    assert get_lexical_index("space1", create=False) is None
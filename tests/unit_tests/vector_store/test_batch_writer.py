@@ -0,0 +1,170 @@
+import threading
+import zlib
+
+import numpy as np
+import pytest
+from langchain.schema import Document
+
+from pilot.vector_store.base import VectorStoreBase, document_id
+from pilot.vector_store.local_store import LocalStore
+
+
+class HashEmbeddings:
+    model_name = "hash"
+
+    def _embed(self, text):
+        vector = np.zeros(64, dtype=np.float32)
+        for word in text.lower().split():
+            vector[zlib.crc32(word.encode()) % 64] += 1.0
+        return vector.tolist()
+
+    def embed_documents(self, texts):
+        return [self._embed(text) for text in texts]
+
+    def embed_query(self, text):
+        return self._embed(text)
+
+
+class FakeStore(VectorStoreBase):
+    batch_retry_backoff = 0.0
+
+    def __init__(self, ctx, fail_batches=(), parallel=False):
+        self.ctx = ctx
+        self.support_parallel_batches = parallel
+        self.rows = {}
+        self.batches = []
+        self.fail_batches = set(fail_batches)
+        self.threads = set()
+        self._lock = threading.Lock()
+
+    def load_document(self, documents):
+        return self._load_document_batches(documents, self._upsert_batch)
+
+    def _upsert_batch(self, documents, ids):
+        with self._lock:
+            self.threads.add(threading.get_ident())
+            self.batches.append(len(documents))
+            if ids[0] in self.fail_batches:
+                # Fail once
+                self.fail_batches.remove(ids[0])
+                raise ConnectionError("timeout")
+            for doc, doc_id in zip(documents, ids):
+                self.rows[doc_id] = doc.page_content
+
+    def similar_search(self, text, topk):
+        return []
+
+    def vector_name_exists(self):
+        return bool(self.rows)
+
+    def delete_by_ids(self, ids):
+        pass
+
+    def delete_vector_name(self, vector_name):
+        pass
+
+
+def _docs(n, source="a.md"):
+    return [
+        Document(page_content=f"chunk {i}", metadata={"source": source})
+        for i in range(n)
+    ]
+
+
+def _ctx(**kwargs):
+    ctx = {"vector_store_name": "space1", "VECTOR_STORE_BATCH_SIZE": 4}
+    ctx.update(kwargs)
+    return ctx
+
+
+def test_document_id():
+    doc = Document(page_content="chunk", metadata={"source": "a.md", "page": 1})
+    same = Document(page_content="chunk", metadata={"page": 1, "source": "a.md"})
+    assert document_id(doc, "space1") == document_id(same, "space1")
+    assert document_id(doc, "space1") != document_id(doc, "space2")
+    other = Document(page_content="chunk", metadata={"source": "b.md", "page": 1})
+    assert document_id(doc, "space1") != document_id(other, "space1")
+
+
+def test_batches_and_resync():
+    store = FakeStore(_ctx())
+    # A generator is read lazily
+    ids = store.load_document(doc for doc in _docs(10))
+    assert store.batches == [4, 4, 2]
+    assert len(ids) == 10 and len(store.rows) == 10
+    # Synced again, the same ids are written
+    assert store.load_document(_docs(10)) == ids
+    assert len(store.rows) == 10
+    # The same chunk twice in a document is written once
+    ids = store.load_document(_docs(2) + _docs(2))
+    assert ids[:2] == ids[2:]
+
+
+def test_retry_failed_batch():
+    docs = _docs(10)
+    failed_id = document_id(docs[4], "space1")
+    store = FakeStore(_ctx(), fail_batches=[failed_id])
+    store.load_document(docs)
+    # Only the failed batch is written again
+    assert store.batches == [4, 4, 4, 2]
+    assert len(store.rows) == 10
+
+    store = FakeStore(_ctx(VECTOR_STORE_BATCH_RETRIES=0), fail_batches=[failed_id])
+    with pytest.raises(ConnectionError):
+        store.load_document(docs)
+
+
+def test_parallel_batches():
+    store = FakeStore(_ctx(VECTOR_STORE_BATCH_PARALLELISM=3), parallel=True)
+    ids = store.load_document(_docs(50))
+    assert ids == [document_id(doc, "space1") for doc in _docs(50)]
+    assert len(store.rows) == 50
+    assert sum(store.batches) == 50
+    assert len(store.threads) > 1
+
+    store = FakeStore(_ctx(VECTOR_STORE_BATCH_PARALLELISM=3))
+    store.load_document(_docs(50))
+    assert len(store.threads) == 1
+
+
+def test_store_assigned_ids():
+    class AutoIdStore(FakeStore):
+        def _upsert_batch(self, documents, ids):
+            start = len(self.rows)
+            self.rows.update((start + i, doc) for i, doc in enumerate(documents))
+            return range(start, len(self.rows))
+
+    store = AutoIdStore(_ctx())
+    # The ids of the store are returned, the same chunk gets the same id
+    assert store.load_document(_docs(6) + _docs(1)) == [
+        "0",
+        "1",
+        "2",
+        "3",
+        "4",
+        "5",
+        "0",
+    ]
+
+
+def test_local_store_resync(tmp_path):
+    ctx = _ctx(embeddings=HashEmbeddings(), LOCAL_VECTOR_STORE_PATH=str(tmp_path))
+    store = LocalStore(ctx)
+    ids = store.load_document(_docs(10))
+    assert store.load_document(_docs(10)) == ids
+    assert store.index.count() == 10
+    store.index.close()
+
+
+def test_chroma_store_resync(tmp_path):
+    pytest.importorskip("chromadb")
+    from pilot.vector_store.chroma_store import ChromaStore
+
+    ctx = _ctx(embeddings=HashEmbeddings(), CHROMA_PERSIST_PATH=str(tmp_path))
+    store = ChromaStore(ctx)
+    ids = store.load_document(_docs(10))
+    assert store.load_document(_docs(10)) == ids
+    collection = store.vector_store_client._collection
+    assert collection.count() == 10
+    store.delete_by_ids(",".join(ids[:3]))
+    assert collection.count() == 7
@@ -0,0 +1,173 @@
+import os
+
+import numpy as np
+import pytest
+from langchain.schema import Document
+
+from pilot.vector_store.connector import VectorStoreClientPool, VectorStoreConnector
+from pilot.vector_store import connector as connector_module
+from pilot.vector_store.local_store import LocalStore, LocalVectorIndex
+
+
+class HashEmbeddings:
+    """Deterministic embeddings, the texts sharing words are similar"""
+
+    model_name = "hash"
+
+    def _embed(self, text):
+        vector = np.zeros(64, dtype=np.float32)
+        for word in text.lower().split():
+            vector[hash(word) % 64] += 1.0
+        return vector.tolist()
+
+    def embed_documents(self, texts):
+        return [self._embed(text) for text in texts]
+
+    def embed_query(self, text):
+        return self._embed(text)
+
+
+def _ctx(tmp_path, **kwargs):
+    ctx = {
+        "vector_store_name": "space1",
+        "vector_store_type": "Local",
+        "embeddings": HashEmbeddings(),
+        "LOCAL_VECTOR_STORE_PATH": str(tmp_path),
+    }
+    ctx.update(kwargs)
+    return ctx
+
+
+def _random_vectors(n, dim=16, seed=0):
+    return np.random.default_rng(seed).standard_normal((n, dim)).astype(np.float32)
+
+
+def _exact_top_k(vectors, query, k):
+    vectors = vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+    return list(np.argsort(-(vectors @ (query / np.linalg.norm(query))))[:k])
+
+
+def test_load_search_and_delete(tmp_path):
+    store = LocalStore(_ctx(tmp_path))
+    assert not store.vector_name_exists()
+    ids = store.load_document(
+        [
+            Document(page_content="mysql database tables", metadata={"source": "a"}),
+            Document(page_content="chinese food recipes", metadata={"source": "b"}),
+            Document(page_content="postgres database index", metadata={"source": "b"}),
+        ]
+    )
+    assert store.vector_name_exists()
+    docs = store.similar_search("database", 2)
+    assert {doc.page_content for doc in docs} == {
+        "mysql database tables",
+        "postgres database index",
+    }
+    docs = store.similar_search("database", 3, filters={"source": "b"})
+    assert [doc.page_content for doc in docs][0] == "postgres database index"
+    assert {doc.metadata["source"] for doc in docs} == {"b"}
+
+    # The ids of a document are saved as a comma separated string
+    assert store.delete_by_ids(",".join(ids[:1])) == 1
+    docs = store.similar_search("database", 3)
+    assert "mysql database tables" not in [doc.page_content for doc in docs]
+
+    # Opened again from the files
+    LocalStore(_ctx(tmp_path)).delete_vector_name("space1")
+    assert not os.path.exists(store.persist_dir)
+    assert not LocalStore(_ctx(tmp_path)).vector_name_exists()
+
+
+@pytest.mark.parametrize("dtype", ["float32", "float16"])
+def test_exact_search(tmp_path, dtype):
+    vectors = _random_vectors(500)
+    index = LocalVectorIndex(
+        str(tmp_path / "index"), dtype=dtype, segment_rows=128, background=False
+    )
+    doc_ids = [str(i) for i in range(len(vectors))]
+    index.add(doc_ids, vectors, doc_ids, [{"i": i} for i in range(len(vectors))])
+    query = _random_vectors(1, seed=1)[0]
+    results = index.search(query, 5)
+    assert [int(r[0]) for r in results] == _exact_top_k(vectors, query, 5)
+    assert results[0][2] == {"i": int(results[0][0])}
+    scores = [r[3] for r in results]
+    assert scores == sorted(scores, reverse=True)
+
+
+def test_reopen_and_upsert(tmp_path):
+    path = str(tmp_path / "index")
+    vectors = _random_vectors(300)
+    doc_ids = [str(i) for i in range(300)]
+    index = LocalVectorIndex(path, segment_rows=100, background=False)
+    index.add(doc_ids, vectors, doc_ids, [None] * 300)
+    # The same doc ids replace the previous vectors
+    index.add(doc_ids[:10], vectors[10:20], doc_ids[:10], [None] * 10)
+    assert index.count() == 300
+    index.close()
+
+    index = LocalVectorIndex(path, segment_rows=100, background=False)
+    assert index.count() == 300
+    assert len(index._segments) == 4
+    results = index.search(vectors[15], 2)
+    assert {r[0] for r in results} == {"5", "15"}
+
+
+def test_compaction(tmp_path):
+    path = str(tmp_path / "index")
+    vectors = _random_vectors(250)
+    doc_ids = [str(i) for i in range(250)]
+    index = LocalVectorIndex(path, segment_rows=100, background=False)
+    index.add(doc_ids, vectors, doc_ids, [None] * 250)
+    files = set(os.listdir(path))
+    index.delete(doc_ids[:50])
+    index.maintain()
+    # The first sealed segment is rewritten without the deleted vectors
+    assert set(os.listdir(path)) != files
+    assert index.count() == 200
+    assert sum(segment.rows for segment in index._segments.values()) == 200
+    query = vectors[120]
+    assert [int(r[0]) for r in index.search(query, 3)] == [
+        50 + i for i in _exact_top_k(vectors[50:], query, 3)
+    ]
+    index.close()
+    assert LocalVectorIndex(path, segment_rows=100, background=False).count() == 200
+
+
+def test_ivf_search(tmp_path):
+    rng = np.random.default_rng(0)
+    centers = rng.standard_normal((20, 16))
+    vectors = (
+        centers[rng.integers(0, 20, 3000)] + 0.1 * rng.standard_normal((3000, 16))
+    ).astype(np.float32)
+    doc_ids = [str(i) for i in range(len(vectors))]
+    index = LocalVectorIndex(
+        str(tmp_path / "index"), ivf_threshold=1000, nprobe=8, background=False
+    )
+    index.add(doc_ids, vectors, doc_ids, [None] * len(vectors))
+    index.maintain()
+    assert index._ivf is not None
+    # Appended after the index is built
+    index.add(["new"], vectors[:1] * 1.0, ["new"], [None])
+
+    hits = 0
+    for i in range(0, 3000, 100):
+        expected = {str(j) for j in _exact_top_k(vectors, vectors[i], 10)}
+        hits += len(expected & {r[0] for r in index.search(vectors[i], 10)})
+    assert hits / (30 * 10) > 0.9
+    assert "new" in {r[0] for r in index.search(vectors[0], 2)}
+
+
+def test_connector(tmp_path, monkeypatch):
+    monkeypatch.setattr(connector_module, "_client_pool", VectorStoreClientPool(4))
+    ctx = _ctx(tmp_path)
+    connector = VectorStoreConnector("Local", ctx)
+    connector.load_document([Document(page_content="mysql database", metadata={})])
+    assert VectorStoreConnector("Local", ctx).vector_name_exists()
+    VectorStoreConnector(
+        "Local",
+        {
+            "vector_store_name": "space1",
+            "LOCAL_VECTOR_STORE_PATH": str(tmp_path),
+        },
+    ).delete_vector_name("space1")
+    assert not VectorStoreConnector("Local", ctx).vector_name_exists()
@@ -0,0 +1,129 @@
+import threading
+
+import pytest
+
+from pilot.vector_store import connector as connector_module
+from pilot.vector_store.base import VectorStoreBase
+from pilot.vector_store.connector import VectorStoreClientPool, VectorStoreConnector
+
+
+class FakeStore(VectorStoreBase):
+    opened = 0
+
+    def __init__(self, ctx):
+        FakeStore.opened += 1
+        self.ctx = ctx
+        self.deleted = False
+
+    def load_document(self, documents):
+        return [str(i) for i, _ in enumerate(documents)]
+
+    def similar_search(self, text, topk):
+        return [text] * topk
+
+    def vector_name_exists(self):
+        return not self.deleted
+
+    def delete_by_ids(self, ids):
+        pass
+
+    def delete_vector_name(self, vector_name):
+        self.deleted = True
+        return True
+
+
+class FakeEmbeddings:
+    def __init__(self, model_name):
+        self.model_name = model_name
+
+
+@pytest.fixture
+def pool(monkeypatch):
+    pool = VectorStoreClientPool(max_size=2)
+    FakeStore.opened = 0
+    monkeypatch.setitem(connector_module.connector, "Fake", FakeStore)
+    monkeypatch.setattr(connector_module, "_client_pool", pool)
+    return pool
+
+
+def _ctx(name, model="text2vec"):
+    return {
+        "vector_store_name": name,
+        "vector_store_type": "Fake",
+        "embeddings": FakeEmbeddings(model),
+    }
+
+
+def test_connectors_share_client(pool):
+    first = VectorStoreConnector("Fake", _ctx("space1"))
+    second = VectorStoreConnector("Fake", _ctx("space1"))
+    assert first.client is second.client
+    assert FakeStore.opened == 1
+    assert second.similar_search("q", 2) == ["q", "q"]
+
+    # Different embedding model or space
+    assert (
+        VectorStoreConnector("Fake", _ctx("space1", "m3e")).client is not first.client
+    )
+    assert FakeStore.opened == 2
+
+
+def test_lru_eviction(pool):
+    client1 = VectorStoreConnector("Fake", _ctx("space1")).client
+    VectorStoreConnector("Fake", _ctx("space2"))
+    # Touch space1, space2 is the least recently used
+    VectorStoreConnector("Fake", _ctx("space1"))
+    VectorStoreConnector("Fake", _ctx("space3"))
+    assert len(pool) == 2
+    assert VectorStoreConnector("Fake", _ctx("space1")).client is client1
+    assert FakeStore.opened == 3
+    VectorStoreConnector("Fake", _ctx("space2"))
+    assert FakeStore.opened == 4
+
+
+def test_invalidate(pool):
+    client = VectorStoreConnector("Fake", _ctx("space1")).client
+    VectorStoreConnector("Fake", _ctx("space2"))
+    assert connector_module.invalidate_vector_store("space1") == 1
+    assert VectorStoreConnector("Fake", _ctx("space1")).client is not client
+    assert connector_module.invalidate_vector_store("space1", "Other") == 0
+
+
+def test_delete_vector_name_invalidates(pool):
+    chat_client = VectorStoreConnector("Fake", _ctx("space1")).client
+    # The connector of space delete has no embeddings
+    connector = VectorStoreConnector(
+        "Fake", {"vector_store_name": "space1", "vector_store_type": "Fake"}
+    )
+    assert connector.client is not chat_client
+    connector.delete_vector_name("space1")
+    assert len(pool) == 0
+    assert VectorStoreConnector("Fake", _ctx("space1")).vector_name_exists()
+
+
+def test_pool_disabled(pool):
+    pool.max_size = 0
+    first = VectorStoreConnector("Fake", _ctx("space1"))
+    second = VectorStoreConnector("Fake", _ctx("space1"))
+    assert first.client is not second.client
+    assert len(pool) == 0
+
+
+def test_concurrent_get_client(pool):
+    barrier = threading.Barrier(8)
+    clients = []
+
+    def create():
+        barrier.wait(timeout=5)
+        return FakeStore({})
+
+    def get():
+        clients.append(pool.get_client("Fake", _ctx("space1"), create))
+
+    threads = [threading.Thread(target=get) for _ in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert len({id(client) for client in clients}) == 1
+    assert len(pool) == 1